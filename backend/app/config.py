@@ -4,7 +4,7 @@ Loads environment variables and provides application configuration.
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Tuple
 
 
 class Settings(BaseSettings):
@@ -16,12 +16,124 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./crypto_trading.db"
+    sqlite_wal: bool = True
+    sqlite_synchronous: str = ""  # Empty: NORMAL with the trade journal (its fsync covers commits), else FULL
+    sql_instrumentation_enabled: bool = True  # Per-request query counts and timings; X-DB-* headers in debug
+    sql_slow_query_ms: float = 100.0
+    sql_repeat_threshold: int = 5  # Same SELECT shape this often in one request is flagged as N+1
+    
+    # Trade journal (group-committed writes for create_trade)
+    trade_journal_enabled: bool = False
+    trade_journal_path: str = "./trade_journal.log"
+    trade_journal_group_size: int = 256
+    trade_journal_group_delay_ms: float = 2.0
     
     # Security
     secret_key: str = "your-secret-key-change-this-in-production-min-32-characters"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Exchange API key encryption (envelope: per-value data keys wrapped by the master key)
+    credential_master_key: str = "change-this-credential-master-key-in-production"
+    credential_previous_master_keys: str = ""  # Comma-separated; still opened until rewrap_api_keys.py has run
+    credential_cache_size: int = 10000  # Decrypted key pairs kept in memory
+    credential_cache_ttl_seconds: float = 300.0
+    
+    # Trading
+    max_batch_orders: int = 100
+    
+    # Fees and position accounting
+    accounting_method: str = "fifo"  # fifo or average: which cost a sell realizes profit/loss against
+    fee_schedules: str = "binance=0.001/0.001,coinbase=0.004/0.006,kraken=0.0025/0.004,kucoin=0.001/0.001"  # exchange=maker/taker
+    default_maker_fee: float = 0.001
+    default_taker_fee: float = 0.001
+    
+    # Pre-trade risk limits (0 disables a limit)
+    risk_max_user_exposure: float = 0.0
+    risk_max_open_order_notional: float = 0.0
+    risk_max_daily_loss: float = 0.0
+    risk_reconcile_interval_seconds: float = 60.0
+    
+    # Strategy scheduler
+    strategy_scheduler_enabled: bool = False
+    strategy_eval_timeout_seconds: float = 2.0
+    strategy_eval_workers: int = 8  # Threads for synchronous evaluators; an overrunning one holds its thread until done
+    strategy_close_delay_seconds: float = 2.0  # Wait for the exchange to publish the closed candle
+    
+    # Grid strategies
+    grid_max_levels: int = 1000
+    grid_reload_interval_seconds: float = 30.0  # Pick up grids activated, stopped or edited since
+    
+    # Price alerts
+    alert_reload_interval_seconds: float = 30.0  # Pick up alerts added or edited since
+    
+    # Background ticker polling (drives conditional orders, alerts, grids and risk marks)
+    price_poll_enabled: bool = True
+    price_poll_interval_seconds: float = 2.0
+    
+    # Conditional orders (stop-loss / take-profit)
+    conditional_order_reload_interval_seconds: float = 5.0  # Arm orders placed through other workers
+
+    # Event bus
+    event_queue_size: int = 1024  # Default bound of each subscriber's queue
+
+    # Notifications (per-user server-sent event streams)
+    notification_history_size: int = 256  # Recent notifications kept per user for Last-Event-ID resume
+    notification_resume_seconds: float = 300.0  # How long a disconnected user's history is kept
+    notification_queue_size: int = 1024  # Per connection; a client this far behind is disconnected to resume
+    notification_heartbeat_seconds: float = 15.0
+    notification_ticket_seconds: float = 30.0  # Stream tickets expire this long after they are issued
+    
+    # Order books
+    orderbook_snapshot_depth: int = 1000
+    orderbook_snapshot_ttl_seconds: float = 5.0  # Books without a diff feed are refreshed from snapshots
+    orderbook_feed_symbols: str = ""  # Kept live from the exchange depth stream, e.g. "BTC/USDT,ETH/USDT"
+    orderbook_feed_url: str = "wss://stream.binance.com:9443/ws"
+    orderbook_max_pending_diffs: int = 1000  # Per symbol while out of sync; past this the buffer is dropped
+    
+    # Consolidated quotes
+    quote_venues: str = "binance,coinbase,kraken,kucoin"
+    quote_polling_enabled: bool = False
+    quote_venue_timeout_seconds: float = 2.0
+    quote_poll_interval_seconds: float = 1.0
+    quote_max_age_seconds: float = 10.0
+    
+    # Shared latest-price table (market_data.py writes it, web workers read it)
+    shared_prices_enabled: bool = False
+    shared_price_table_name: str = "crypto_trading_prices"
+    shared_price_interval_seconds: float = 1.0
+    shared_price_max_age_seconds: float = 10.0  # Older tables are ignored and workers call the exchange
+    
+    # Price history charts
+    candle_page_limit: int = 1000
+    candle_refresh_seconds: float = 15.0
+    candle_max_history_days: int = 365  # 1m base candles kept per symbol; coarser timeframes are derived
+    chart_cache_size: int = 256
+    chart_oversample: int = 4  # Source candles per returned point when picking a timeframe
+    chart_max_points: int = 5000  # Cap on points returned when no point budget is given
+    
+    # Portfolio equity curve
+    equity_snapshot_interval_hours: int = 24  # Replay state is checkpointed at these boundaries
+    equity_max_points: int = 5000
+    
+    # Market listing
+    market_listing_ttl_seconds: float = 30.0
+    
+    # Tick recording
+    tick_recorder_enabled: bool = False
+    tick_data_dir: str = "./tick_data"
+    tick_retention_days: int = 30
+    
+    # Request profiling (admins: X-Profile header or ?profile=; routes: every Nth request)
+    profiling_enabled: bool = False  # Off: the middleware is not installed at all
+    profile_dir: str = "./profiles"
+    profile_max_files: int = 200
+    profile_sample_interval_ms: float = 1.0
+    profile_sample_routes: str = ""  # e.g. "/api/market/prices/{symbol}=100,/api/trading/trades=20"
+    
+    # Trade history export
+    export_chunk_size: int = 5000
+    
     # CORS
     allowed_origins: str = "http://localhost:5173,http://localhost:3000"
     
@@ -30,6 +142,54 @@ class Settings(BaseSettings):
         """Parse CORS origins from comma-separated string."""
         return [origin.strip() for origin in self.allowed_origins.split(",")]
     
+    @property
+    def quote_venue_list(self) -> List[str]:
+        """Parse quote venues from comma-separated string."""
+        return [venue.strip() for venue in self.quote_venues.split(",") if venue.strip()]
+    
+    @property
+    def sqlite_synchronous_mode(self) -> str:
+        """SQLite synchronous level; NORMAL only when the trade journal makes groups durable."""
+        if self.sqlite_synchronous:
+            return self.sqlite_synchronous.upper()
+        return "NORMAL" if self.trade_journal_enabled else "FULL"
+    
+    @property
+    def orderbook_feed_symbol_list(self) -> List[str]:
+        """Parse order book feed symbols from comma-separated string."""
+        return [symbol.strip() for symbol in self.orderbook_feed_symbols.split(",") if symbol.strip()]
+    
+    @property
+    def credential_master_key_is_default(self) -> bool:
+        """Whether the master key is still the placeholder shipped in the source."""
+        return self.credential_master_key == type(self).model_fields["credential_master_key"].default
+    
+    @property
+    def credential_previous_master_key_list(self) -> List[str]:
+        """Parse previous credential master keys from comma-separated string."""
+        return [key.strip() for key in self.credential_previous_master_keys.split(",") if key.strip()]
+    
+    @property
+    def profile_sample_route_map(self) -> Dict[str, int]:
+        """Parse 'route=N' pairs: profile every Nth request to the route."""
+        routes = {}
+        for item in self.profile_sample_routes.split(","):
+            if item.strip():
+                route, every = item.rsplit("=", 1)
+                routes[route.strip()] = int(every)
+        return routes
+    
+    @property
+    def fee_schedule_map(self) -> Dict[str, Tuple[float, float]]:
+        """Parse 'exchange=maker/taker' pairs."""
+        schedules = {}
+        for item in self.fee_schedules.split(","):
+            if item.strip():
+                exchange, rates = item.split("=", 1)
+                maker, taker = rates.split("/", 1)
+                schedules[exchange.strip().lower()] = (float(maker), float(taker))
+        return schedules
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -2,16 +2,86 @@
 Database configuration and session management.
 """
 
-from sqlalchemy import create_engine
+from typing import List
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.services.query_stats import instrument, query_metrics
+
+
+def create_app_engine(
+    database_url: str,
+    sqlite_wal: bool = settings.sqlite_wal,
+    sqlite_synchronous: str = settings.sqlite_synchronous_mode
+) -> Engine:
+    """
+    Create an engine for the given URL.
+    SQLite connections get WAL journaling and write-friendly pragmas when
+    sqlite_wal is set; other databases are left as configured.
+    """
+    is_sqlite = database_url.startswith("sqlite")
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False} if is_sqlite else {}
+    )
+
+    if is_sqlite and sqlite_wal:
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={sqlite_synchronous}")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+            cursor.close()
+
+    return engine
+
+
+# Columns added to existing tables after their first release: (table, column, DDL type).
+# create_all only creates missing tables, so databases created before a column
+# existed get it from upgrade_schema.
+ADDED_COLUMNS = [
+    ("trades", "linked_trade_id", "INTEGER REFERENCES trades(id)"),
+    ("strategies", "last_execution_latency_ms", "FLOAT"),
+]
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Add ADDED_COLUMNS and model indexes that existing tables lack. Safe to run
+    on every start; tables that do not exist yet are left to create_all.
+
+    Returns:
+        Added columns as table.column and added indexes by name
+    """
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for table, column, ddl in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                added.append(f"{table}.{column}")
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    added.append(index.name)
+    return added
+
 
 # Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+engine = create_app_engine(settings.database_url)
+if settings.sql_instrumentation_enabled:
+    instrument(engine, query_metrics)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -2,15 +2,22 @@
 Authentication middleware and dependencies.
 """
 
-from fastapi import Depends, HTTPException, status
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User
+from app.config import settings
+from app.database import SessionLocal, get_db
+from app.models import StreamTicket, User, UserRole
 from app.auth import decode_access_token
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 
 async def get_current_user(
@@ -27,6 +34,89 @@ async def get_current_user(
     Returns:
         User object
         
+    Raises:
+        HTTPException: If token is invalid or user not found
+    """
+    return user_from_token(token, db)
+
+
+async def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /api/notifications/ticket")
+) -> User:
+    """
+    Dependency for long-lived streaming endpoints.
+    Takes the token from the Authorization header or, since browsers' EventSource
+    cannot set headers, a single-use ticket in the ticket query parameter; a JWT in
+    the URL would end up in access and proxy logs. The user is loaded with a
+    session of its own that is closed right away: a session from get_db would hold
+    a pooled connection for as long as the stream stays open.
+    
+    Returns:
+        User object, detached from its session
+        
+    Raises:
+        HTTPException: If token or ticket is invalid or user not found
+    """
+    db = SessionLocal()
+    try:
+        if token or not ticket:
+            return user_from_token(token, db)
+        return user_from_ticket(ticket, db)
+    finally:
+        db.close()
+
+
+def issue_stream_ticket(user_id: int, db: Session) -> str:
+    """
+    Issue a ticket that opens one stream for the user within NOTIFICATION_TICKET_SECONDS.
+    Only its hash is stored, in the database so any worker can redeem it.
+    Expired tickets are deleted on the way.
+    """
+    now = datetime.utcnow()
+    ticket = secrets.token_urlsafe(32)
+    db.execute(delete(StreamTicket).where(StreamTicket.expires_at <= now))
+    db.add(StreamTicket(
+        ticket_hash=hash_ticket(ticket),
+        user_id=user_id,
+        expires_at=now + timedelta(seconds=settings.notification_ticket_seconds)
+    ))
+    db.commit()
+    return ticket
+
+
+def user_from_ticket(ticket: str, db: Session) -> User:
+    """
+    Redeem a stream ticket and load the active user it was issued to. The ticket is
+    deleted with a conditional DELETE ... RETURNING, so it is used at most once even
+    when several workers race for it.
+    
+    Raises:
+        HTTPException: If the ticket is unknown, used, expired or its user inactive
+    """
+    user_id = db.scalar(
+        delete(StreamTicket)
+        .where(StreamTicket.ticket_hash == hash_ticket(ticket), StreamTicket.expires_at > datetime.utcnow())
+        .returning(StreamTicket.user_id)
+    )
+    db.commit()
+    user = db.get(User, user_id) if user_id is not None else None
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired stream ticket",
+        )
+    return user
+
+
+def hash_ticket(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+def user_from_token(token: Optional[str], db: Session) -> User:
+    """
+    Load the active user a JWT token was issued to.
+    
     Raises:
         HTTPException: If token is invalid or user not found
     """
@@ -37,7 +127,7 @@ async def get_current_user(
     )
     
     # Decode token
-    payload = decode_access_token(token)
+    payload = decode_access_token(token) if token else None
     if payload is None:
         raise credentials_exception
     
@@ -80,3 +170,26 @@ async def get_current_active_user(
             detail="Inactive user"
         )
     return current_user
+
+
+async def get_current_admin(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    """
+    Dependency to restrict an endpoint to administrators.
+    
+    Args:
+        current_user: Current user from get_current_user dependency
+        
+    Returns:
+        Admin user object
+        
+    Raises:
+        HTTPException: If the user is not an admin
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
@@ -3,7 +3,7 @@ Database models for the Crypto Trading Bot.
 Defines the schema for users, trades, API keys, strategies, and alerts.
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, Text, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -93,6 +93,9 @@ class ExchangeAPIKey(Base):
 class Trade(Base):
     """Trade history and execution records."""
     __tablename__ = "trades"
+    __table_args__ = (
+        Index("ix_trades_user_id_id", "user_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -115,6 +118,7 @@ class Trade(Base):
     
     # External references
     exchange_order_id = Column(String(255), nullable=True)
+    linked_trade_id = Column(Integer, ForeignKey("trades.id"), nullable=True)  # OCO sibling
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -154,6 +158,7 @@ class Strategy(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
     last_executed_at = Column(DateTime(timezone=True), nullable=True)
+    last_execution_latency_ms = Column(Float, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="strategies")
@@ -222,3 +227,107 @@ class Alert(Base):
     
     # Relationships
     user = relationship("User", back_populates="alerts")
+
+
+class StreamTicket(Base):
+    """Single-use ticket that opens one notification stream, so browsers need not put the JWT in the URL."""
+    __tablename__ = "stream_tickets"
+    
+    ticket_hash = Column(String(64), primary_key=True)  # SHA-256 of the ticket; the ticket itself is not stored
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)  # UTC
+
+
+class DailyTradeRollup(Base):
+    """Daily per-user/per-symbol trade aggregates used by the analytics endpoints."""
+    __tablename__ = "daily_trade_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "symbol", "day", name="uq_daily_trade_rollups_user_symbol_day"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    symbol = Column(String(20), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    
+    # Activity
+    trade_count = Column(Integer, default=0, nullable=False)
+    buy_count = Column(Integer, default=0, nullable=False)
+    sell_count = Column(Integer, default=0, nullable=False)
+    volume = Column(Float, default=0.0, nullable=False)  # Base currency quantity
+    notional = Column(Float, default=0.0, nullable=False)  # Quote currency value
+    fees = Column(Float, default=0.0, nullable=False)
+    
+    # Results of closing (sell) fills
+    realized_profit_loss = Column(Float, default=0.0, nullable=False)
+    closing_trades = Column(Integer, default=0, nullable=False)
+    winning_trades = Column(Integer, default=0, nullable=False)
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class JournalCheckpoint(Base):
+    """Last journal sequence number applied to the database, per journal."""
+    __tablename__ = "journal_checkpoints"
+    
+    name = Column(String(50), primary_key=True)
+    last_sequence = Column(Integer, default=0, nullable=False)
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class PositionCheckpoint(Base):
+    """Open lots replayed from the filled trades up to a trade id, so startup only replays the trades after it."""
+    __tablename__ = "position_checkpoints"
+    
+    method = Column(String(20), primary_key=True)  # Accounting method the lots were matched under
+    last_trade_id = Column(Integer, nullable=False)
+    fill_count = Column(Integer, nullable=False)  # Filled trades covered, to detect older trades filled later
+    state = Column(Text, nullable=False)  # JSON: [user_id, asset, [[quantity, price], ...]] per open position
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class IndicatorState(Base):
+    """Streaming indicator of one symbol and timeframe, so a restarted scheduler resumes it instead of refetching history."""
+    __tablename__ = "indicator_states"
+    
+    symbol = Column(String(20), primary_key=True)
+    timeframe = Column(String(5), primary_key=True)
+    indicator = Column(String(50), primary_key=True)  # Name and parameters, e.g. "sma:20"
+    last_bar = Column(BigInteger, nullable=False)  # Open time (ms) of the last candle fed
+    state = Column(Text, nullable=False)  # JSON: indicator checkpoint and its value on the bar before
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class EquitySnapshot(Base):
+    """Replayed position state of a user's fills up to a point in time, used to resume equity curves."""
+    __tablename__ = "equity_snapshots"
+    __table_args__ = (
+        UniqueConstraint("user_id", "taken_at", name="uq_equity_snapshots_user_taken_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    taken_at = Column(DateTime, nullable=False)  # UTC; covers fills at or before this time
+    fill_count = Column(Integer, nullable=False)  # Fills covered, to detect fills recorded later
+    state = Column(Text, nullable=False)  # JSON: positions, realized P&L, last fill prices
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class GridState(Base):
+    """Slot state of a running grid strategy, so a restart resumes the grid instead of opening it again."""
+    __tablename__ = "grid_states"
+    
+    strategy_id = Column(Integer, ForeignKey("strategies.id"), primary_key=True)
+    state = Column(Text, nullable=False)  # JSON: grid parameters, held slots and their costs, fill counts
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
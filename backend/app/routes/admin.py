@@ -0,0 +1,105 @@
+"""
+Admin routes: stored request profiles, SQL and event bus metrics.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import List
+from app.models import User
+from app.schemas import ProfileInfo
+from app.middleware import get_current_admin
+from app.services.events import event_bus
+from app.services.profiling import FORMATS, profile_store
+from app.services.query_stats import query_metrics
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def list_profiles(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    List stored request profiles, newest first.
+
+    Args:
+        limit: Maximum number of profiles
+        current_user: Authenticated admin
+
+    Returns:
+        Profile metadata
+    """
+    return profile_store.list(limit)
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: str = Query("folded", pattern=f"^({'|'.join(FORMATS)})$"),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Download one output of a profile.
+    folded stacks (sampled profiles) feed flamegraph.pl or speedscope; pstats
+    and text come from cProfile runs.
+
+    Args:
+        profile_id: Id from the X-Profile-Id response header
+        format: folded, pstats or text
+        current_user: Authenticated admin
+
+    Returns:
+        Profile file
+    """
+    path = profile_store.path(profile_id, format)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} has no {format} output"
+        )
+    return FileResponse(path, media_type="text/plain" if format != "pstats" else "application/octet-stream",
+                        filename=f"{profile_id}{FORMATS[format]}")
+
+
+@router.get("/metrics/sql")
+async def get_sql_metrics(
+    format: str = Query("json", pattern="^(json|prometheus)$"),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Get SQL statistics per route: requests, statements, database time, slow
+    statements and requests that repeated one SELECT shape (possible N+1).
+
+    Args:
+        format: json, or prometheus for the text exposition format
+        current_user: Authenticated admin
+
+    Returns:
+        Aggregates since process start
+    """
+    if format == "prometheus":
+        return PlainTextResponse(query_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+    return query_metrics.snapshot()
+
+
+@router.get("/metrics/events")
+async def get_event_metrics(
+    format: str = Query("json", pattern="^(json|prometheus)$"),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Get event bus statistics per topic: events published (and per second),
+    delivered, dropped, coalesced and consumed, backlog, publisher blocking and
+    consumer lag.
+
+    Args:
+        format: json, or prometheus for the text exposition format
+        current_user: Authenticated admin
+
+    Returns:
+        Aggregates since process start
+    """
+    if format == "prometheus":
+        return PlainTextResponse(event_bus.prometheus(), media_type="text/plain; version=0.0.4")
+    return event_bus.snapshot()
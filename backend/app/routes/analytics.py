@@ -0,0 +1,95 @@
+"""
+Analytics routes for trading performance served from daily rollups.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from app.database import get_db
+from app.models import User
+from app.schemas import AnalyticsSummary, SymbolAnalytics, DailyAnalytics
+from app.middleware import get_current_user
+from app.services import analytics
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+
+def validate_range(start_date: Optional[date], end_date: Optional[date]) -> None:
+    """Reject date ranges that end before they start."""
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+
+
+@router.get("/summary", response_model=AnalyticsSummary)
+async def get_summary(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get P&L, volume, fee totals and win rate for a date range.
+    
+    Args:
+        start_date: First day of the range (inclusive)
+        end_date: Last day of the range (inclusive)
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Aggregated trading results
+    """
+    validate_range(start_date, end_date)
+    return analytics.get_summary(db, current_user.id, start_date, end_date)
+
+
+@router.get("/symbols", response_model=List[SymbolAnalytics])
+async def get_symbol_breakdown(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get trading results per symbol for a date range.
+    
+    Args:
+        start_date: First day of the range (inclusive)
+        end_date: Last day of the range (inclusive)
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Aggregated trading results per symbol
+    """
+    validate_range(start_date, end_date)
+    return analytics.get_symbol_breakdown(db, current_user.id, start_date, end_date)
+
+
+@router.get("/daily", response_model=List[DailyAnalytics])
+async def get_daily_series(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    symbol: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get trading results per day for a date range.
+    
+    Args:
+        start_date: First day of the range (inclusive)
+        end_date: Last day of the range (inclusive)
+        symbol: Optional trading pair filter (e.g. 'BTC/USDT')
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Aggregated trading results per day
+    """
+    validate_range(start_date, end_date)
+    return analytics.get_daily_series(db, current_user.id, start_date, end_date, symbol)
@@ -0,0 +1,159 @@
+"""
+Exchange API key routes: add, list, rotate and deactivate the user's keys.
+Keys are stored envelope-encrypted and only ever returned masked.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+from app.database import get_db
+from app.models import User, ExchangeAPIKey
+from app.schemas import ExchangeAPIKeyCreate, ExchangeAPIKeyResponse, ExchangeAPIKeyRotate
+from app.middleware import get_current_user
+from app.services.credentials import CredentialError, credential_vault, mask
+
+router = APIRouter(prefix="/api/trading/api-keys", tags=["Exchange API Keys"])
+
+
+def _response(key: ExchangeAPIKey) -> ExchangeAPIKeyResponse:
+    """A key with its api_key masked; opened without going through the credential cache."""
+    try:
+        masked = mask(credential_vault.open(key.api_key, key.user_id, "api_key"))
+    except CredentialError:
+        masked = mask("")
+    return ExchangeAPIKeyResponse(
+        id=key.id,
+        exchange_name=key.exchange_name,
+        api_key=masked,
+        is_active=key.is_active,
+        has_trading_permission=key.has_trading_permission,
+        has_withdrawal_permission=key.has_withdrawal_permission,
+        created_at=key.created_at
+    )
+
+
+def _get_key(db: Session, key_id: int, user_id: int) -> ExchangeAPIKey:
+    key = db.query(ExchangeAPIKey).filter(
+        ExchangeAPIKey.id == key_id,
+        ExchangeAPIKey.user_id == user_id
+    ).first()
+    if not key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="API key not found"
+        )
+    return key
+
+
+@router.post("", response_model=ExchangeAPIKeyResponse, status_code=status.HTTP_201_CREATED)
+async def add_api_key(
+    key_data: ExchangeAPIKeyCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Store an exchange API key, encrypted.
+    
+    Args:
+        key_data: Exchange, key and secret
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Stored key, masked
+    """
+    key = ExchangeAPIKey(
+        user_id=current_user.id,
+        exchange_name=key_data.exchange_name,
+        has_trading_permission=key_data.has_trading_permission,
+        **credential_vault.seal_columns(current_user.id, key_data.api_key, key_data.api_secret)
+    )
+    db.add(key)
+    db.commit()
+    db.refresh(key)
+    
+    return _response(key)
+
+
+@router.get("", response_model=List[ExchangeAPIKeyResponse])
+async def list_api_keys(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    List the user's exchange API keys, masked.
+    
+    Args:
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Keys, newest first
+    """
+    keys = db.query(ExchangeAPIKey).filter(
+        ExchangeAPIKey.user_id == current_user.id
+    ).order_by(ExchangeAPIKey.id.desc()).all()
+    
+    return [_response(key) for key in keys]
+
+
+@router.put("/{key_id}", response_model=ExchangeAPIKeyResponse)
+async def rotate_api_key(
+    key_id: int,
+    key_data: ExchangeAPIKeyRotate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Replace a key's credentials, e.g. after regenerating them on the exchange.
+    Orders placed from now on use the new credentials.
+    
+    Args:
+        key_id: API key ID
+        key_data: New key and secret
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Updated key, masked
+        
+    Raises:
+        HTTPException: If the key is not found or doesn't belong to user
+    """
+    key = _get_key(db, key_id, current_user.id)
+    for column, value in credential_vault.seal_columns(current_user.id, key_data.api_key, key_data.api_secret).items():
+        setattr(key, column, value)
+    db.commit()
+    db.refresh(key)
+    credential_vault.invalidate(key.id)
+    
+    return _response(key)
+
+
+@router.post("/{key_id}/deactivate", response_model=ExchangeAPIKeyResponse)
+async def deactivate_api_key(
+    key_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stop using a key for orders. Its decrypted credentials are dropped from memory.
+    
+    Args:
+        key_id: API key ID
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Deactivated key, masked
+        
+    Raises:
+        HTTPException: If the key is not found or doesn't belong to user
+    """
+    key = _get_key(db, key_id, current_user.id)
+    key.is_active = False
+    db.commit()
+    db.refresh(key)
+    credential_vault.invalidate(key.id)
+    
+    return _response(key)
@@ -2,17 +2,144 @@
 Market data routes for cryptocurrency prices and information.
 """
 
-from fastapi import APIRouter, HTTPException
-from typing import List
-from app.schemas import CoinPrice, CoinDetail, PriceHistory
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
+from app.config import settings
+from app.schemas import (
+    CoinPrice, CoinDetail, PriceHistory, OrderBookResponse, OrderBookLevel,
+    ConsolidatedQuoteResponse, VenueQuoteResponse, MarketListingResponse, PriceHistoryResponse
+)
+from app.services.candles import (
+    CandleStore, ChartHistory, ChartSeries, RANGE_PATTERN, TIMEFRAME_PATTERN, parse_range
+)
+from app.services.downsample import METHODS
+from app.services.market_listing import MarketListing
+from app.services.orderbook import OrderBookManager
+from app.services.quotes import QuoteAggregator, ConsolidatedQuote, ccxt_fetcher, normalize_symbol
+from app.services.alerts import alert_monitor
+from app.services.conditional_orders import order_monitor
+from app.services.events import Ticker, event_bus
+from app.services.grid import grid_engine
+from app.services.price_feed import PricePoller
+from app.services.price_table import PriceTableReader
+from app.services.risk import risk_engine
+from app.services.tick_recorder import TickRecorder
+import asyncio
 import ccxt
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/market", tags=["Market Data"])
 
 # Initialize exchange (using Binance for market data)
 exchange = ccxt.binance()
 
+# Major pairs shown on the dashboard
+MAJOR_PAIRS = [
+    'BTC/USDT', 'ETH/USDT', 'XRP/USDT', 'BCH/USDT', 'LTC/USDT',
+    'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'XLM/USDT', 'BNB/USDT'
+]
+
+# 1m candles fetched once and extended incrementally; coarser timeframes are derived
+# locally and downsampled chart series are cached
+candle_store = CandleStore(
+    exchange.fetch_ohlcv,
+    page_limit=settings.candle_page_limit,
+    refresh_seconds=settings.candle_refresh_seconds,
+    max_history_days=settings.candle_max_history_days
+)
+chart_history = ChartHistory(
+    candle_store,
+    cache_size=settings.chart_cache_size,
+    oversample=settings.chart_oversample,
+    max_points=settings.chart_max_points
+)
+
+# Every USDT pair, refreshed in the background once older than the TTL
+market_listing = MarketListing(exchange.fetch_tickers, ttl=settings.market_listing_ttl_seconds)
+
+# Tickers from every configured venue, each polled with its own timeout
+quote_aggregator = QuoteAggregator(
+    {
+        venue: ccxt_fetcher(exchange if venue == "binance" else getattr(ccxt, venue)())
+        for venue in settings.quote_venue_list
+    },
+    timeout=settings.quote_venue_timeout_seconds,
+    interval=settings.quote_poll_interval_seconds,
+    max_age=settings.quote_max_age_seconds
+)
+
+# In-memory L2 books, snapshotted from the exchange and kept current by diff feeds
+order_books = OrderBookManager(
+    lambda symbol, limit: exchange.fetch_order_book(symbol, limit),
+    snapshot_depth=settings.orderbook_snapshot_depth,
+    snapshot_ttl=settings.orderbook_snapshot_ttl_seconds,
+    max_pending=settings.orderbook_max_pending_diffs
+)
+
+# Latest major-pair tickers published by market_data.py, shared by all workers
+price_table = (
+    PriceTableReader(settings.shared_price_table_name, settings.shared_price_max_age_seconds)
+    if settings.shared_prices_enabled else None
+)
+
+# Records every ticker the backend sees, when enabled
+tick_recorder = TickRecorder(settings.tick_data_dir) if settings.tick_recorder_enabled else None
+
+
+async def record_ticker(symbol: str, ticker: dict) -> None:
+    """
+    Pass a ticker's last price to the risk engine, price alerts, conditional order
+    monitor and grid strategies, publish it on the event bus and, if enabled,
+    record it. Only the price poller calls this: the GET routes just read prices,
+    so a page view never fills an order or triggers an alert.
+    """
+    if ticker.get('last') is None:
+        return
+    try:
+        risk_engine.update_price(symbol, ticker['last'])
+        await alert_monitor.on_price(symbol, ticker['last'])
+        await order_monitor.on_price(symbol, ticker['last'])
+        await grid_engine.on_price(symbol, ticker['last'])
+    except Exception:
+        # A failed fill or alert is retried on the next price; it never turns into a price error
+        logger.exception("Price update for %s failed", symbol)
+    await event_bus.publish("ticker", Ticker(symbol, ticker['last'], ticker.get('timestamp')))
+    if tick_recorder is None:
+        return
+    timestamp = ticker.get('timestamp')
+    tick_recorder.record(
+        symbol,
+        ticker['last'],
+        timestamp_ns=timestamp * 1_000_000 if timestamp else None
+    )
+
+
+def watched_symbols() -> List[str]:
+    """Major pairs plus every symbol with a resting order, an alert or a grid."""
+    return sorted(set(MAJOR_PAIRS) | order_monitor.symbols() | alert_monitor.symbols() | grid_engine.symbols())
+
+
+async def fetch_watched_tickers(symbols: List[str]) -> Dict[str, Dict]:
+    """Major pairs from the shared table while its writer is up; everything else from the exchange."""
+    majors = [symbol for symbol in symbols if symbol in MAJOR_PAIRS]
+    tickers = (price_table.tickers(majors) if price_table is not None and majors else None) or {}
+    missing = [symbol for symbol in symbols if symbol not in tickers]
+    if missing:
+        tickers.update(await asyncio.to_thread(exchange.fetch_tickers, missing))
+    return tickers
+
+
+# The one source of prices for the price-driven services; the GET routes do not feed them
+price_poller = PricePoller(
+    fetch_watched_tickers,
+    record_ticker,
+    watched_symbols,
+    interval=settings.price_poll_interval_seconds
+)
+
 
 @router.get("/prices", response_model=List[CoinPrice])
 async def get_coin_prices():
@@ -23,41 +150,103 @@ async def get_coin_prices():
         List of coin prices with 24h change
     """
     try:
-        # Fetch tickers for major pairs
-        symbols = [
-            'BTC/USDT', 'ETH/USDT', 'XRP/USDT', 'BCH/USDT', 'LTC/USDT',
-            'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'XLM/USDT', 'BNB/USDT'
-        ]
-        
-        tickers = exchange.fetch_tickers(symbols)
-        
-        coin_data = []
-        for symbol, ticker in tickers.items():
-            base_currency = symbol.split('/')[0]
-            coin_data.append(CoinPrice(
-                id=base_currency.lower(),
-                symbol=base_currency,
-                name=base_currency,
-                current_price=ticker['last'],
-                price_change_percentage_24h=ticker.get('percentage', 0),
-                market_cap=None,
-                volume_24h=ticker.get('quoteVolume', 0)
-            ))
-        
-        return coin_data
-    
+        # Read major pairs from the shared table while its writer is up, else fetch them
+        tickers = price_table.tickers(MAJOR_PAIRS) if price_table is not None else None
+        if tickers is None:
+            tickers = exchange.fetch_tickers(MAJOR_PAIRS)
     except Exception as e:
         # Fallback to mock data if exchange fails
         return get_mock_prices()
+    
+    coin_data = []
+    for symbol, ticker in tickers.items():
+        base_currency = symbol.split('/')[0]
+        coin_data.append(CoinPrice(
+            id=base_currency.lower(),
+            symbol=base_currency,
+            name=base_currency,
+            current_price=ticker['last'],
+            price_change_percentage_24h=ticker.get('percentage', 0),
+            market_cap=None,
+            volume_24h=ticker.get('quoteVolume', 0)
+        ))
+    
+    return coin_data
+
+
+@router.get("/listing", response_model=MarketListingResponse)
+async def get_market_listing(
+    sort: str = Query("volume", pattern="^(volume|change|price|symbol)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    q: Optional[str] = Query(None, max_length=20, description="Symbol prefix, e.g. 'BT'"),
+    min_volume: Optional[float] = Query(None, ge=0),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_change: Optional[float] = None,
+    max_change: Optional[float] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500)
+):
+    """
+    List every USDT market with server-side sorting, search, filters and paging.
+    Answered from a cached snapshot of all tickers with precomputed sort orders.
+    
+    Args:
+        sort: volume, change, price or symbol
+        order: asc or desc
+        q: Base-asset prefix search
+        min_volume: Minimum 24h quote volume
+        min_price / max_price: Last price bounds
+        min_change / max_change: 24h change bounds in percent
+        page: 1-based page number
+        page_size: Rows per page
+        
+    Returns:
+        Total matching markets and the requested page
+    """
+    try:
+        snapshot = await market_listing.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail="Market data unavailable")
+    
+    result = snapshot.query(
+        sort=sort,
+        descending=order == "desc",
+        prefix=q,
+        min_volume=min_volume,
+        min_price=min_price,
+        max_price=max_price,
+        min_change=min_change,
+        max_change=max_change,
+        offset=(page - 1) * page_size,
+        limit=page_size
+    )
+    return MarketListingResponse(
+        total=result.total,
+        page=page,
+        page_size=page_size,
+        snapshot_at=result.built_at,
+        items=result.rows
+    )
 
 
 @router.get("/prices/{symbol}", response_model=CoinDetail)
-async def get_coin_detail(symbol: str):
+async def get_coin_detail(
+    symbol: str,
+    history_range: str = Query("30d", alias="range", pattern=RANGE_PATTERN, description="e.g. 24h, 30d, 1y"),
+    points: Optional[int] = Query(None, ge=10, le=5000, description="Downsample history to this many points"),
+    method: str = Query("lttb", pattern=f"^({'|'.join(METHODS)})$"),
+    timeframe: Optional[str] = Query(None, pattern=TIMEFRAME_PATTERN, description="Candle timeframe, e.g. 1h")
+):
     """
     Get detailed information for a specific cryptocurrency.
     
     Args:
         symbol: Cryptocurrency symbol (e.g., 'BTC', 'ETH')
+        history_range: Price history range
+        points: Target number of history points (default: one per candle)
+        method: Downsampling method, lttb or minmax
+        timeframe: Candle timeframe (default: 1d, or picked from range and points)
         
     Returns:
         Detailed coin information with price history
@@ -68,17 +257,7 @@ async def get_coin_detail(symbol: str):
         # Fetch current ticker
         ticker = exchange.fetch_ticker(pair)
         
-        # Fetch OHLCV data for price history (30 days)
-        since = exchange.parse8601((datetime.now() - timedelta(days=30)).isoformat())
-        ohlcv = exchange.fetch_ohlcv(pair, '1d', since=since, limit=30)
-        
-        price_history = [
-            PriceHistory(
-                date=datetime.fromtimestamp(candle[0] / 1000).strftime('%Y-%m-%d'),
-                price=candle[4]  # Close price
-            )
-            for candle in ohlcv
-        ]
+        history = await chart_history.get(pair, parse_range(history_range), points, method, timeframe)
         
         return CoinDetail(
             id=symbol.lower(),
@@ -88,13 +267,162 @@ async def get_coin_detail(symbol: str):
             price_change_percentage_24h=ticker.get('percentage', 0),
             market_cap=None,
             volume_24h=ticker.get('quoteVolume', 0),
-            price_history=price_history
+            price_history=history_points(history)
         )
     
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Coin {symbol} not found or API error")
 
 
+@router.get("/history/{symbol}", response_model=PriceHistoryResponse)
+async def get_price_history(
+    symbol: str,
+    history_range: str = Query("30d", alias="range", pattern=RANGE_PATTERN, description="e.g. 24h, 30d, 1y"),
+    points: int = Query(500, ge=10, le=5000),
+    method: str = Query("lttb", pattern=f"^({'|'.join(METHODS)})$"),
+    timeframe: Optional[str] = Query(None, pattern=TIMEFRAME_PATTERN, description="Candle timeframe, e.g. 1h")
+):
+    """
+    Get a chart-ready close price series.
+    Unless a timeframe is given, the coarsest one that still has several candles per
+    returned point is used; the series is then downsampled to the point budget,
+    keeping its shape. Every timeframe is aggregated from the same 1m candles.
+    
+    Args:
+        symbol: Cryptocurrency symbol (e.g., 'BTC', 'ETH')
+        history_range: Range ending now
+        points: Maximum number of points returned
+        method: lttb (line charts) or minmax (keeps every spike)
+        timeframe: Candle timeframe (1m, 5m, 15m, 1h, 4h, 1d, 1w)
+        
+    Returns:
+        Downsampled price history
+    """
+    pair = f"{symbol.upper()}/USDT"
+    try:
+        history = await chart_history.get(pair, parse_range(history_range), points, method, timeframe)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Price history for {symbol} not available")
+    
+    return PriceHistoryResponse(
+        symbol=symbol.upper(),
+        timeframe=history.timeframe,
+        range=history_range,
+        method=method,
+        source_points=history.source_points,
+        points=history_points(history)
+    )
+
+
+def history_points(history: ChartSeries) -> List[PriceHistory]:
+    """Convert a chart series to response points, dated by day for daily and weekly candles."""
+    date_format = '%Y-%m-%d' if history.timeframe in ('1d', '1w') else '%Y-%m-%d %H:%M'
+    return [
+        PriceHistory(
+            date=datetime.utcfromtimestamp(timestamp / 1000).strftime(date_format),
+            price=price,
+            timestamp=timestamp
+        )
+        for timestamp, price in zip(history.timestamps, history.prices)
+    ]
+
+
+@router.get("/orderbook/{symbol}", response_model=OrderBookResponse)
+async def get_order_book(symbol: str, depth: int = Query(20, ge=1, le=500)):
+    """
+    Get top-of-book depth for a cryptocurrency from the local order book.
+    
+    Args:
+        symbol: Cryptocurrency symbol (e.g., 'BTC', 'ETH')
+        depth: Number of price levels per side
+        
+    Returns:
+        Best bids and asks with spread and mid price
+    """
+    pair = f"{symbol.upper()}/USDT"
+    
+    try:
+        book = await order_books.get_book(pair)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Order book for {symbol} not available")
+    
+    view = book.view(depth)
+    return OrderBookResponse(
+        symbol=symbol.upper(),
+        bids=[OrderBookLevel(price=price, quantity=quantity) for price, quantity in view["bids"]],
+        asks=[OrderBookLevel(price=price, quantity=quantity) for price, quantity in view["asks"]],
+        spread=view["spread"],
+        mid_price=view["mid_price"],
+        last_update_id=view["last_update_id"],
+        updated_at=view["updated_at"]
+    )
+
+
+@router.get("/quotes", response_model=List[ConsolidatedQuoteResponse])
+async def get_consolidated_quotes(
+    symbols: Optional[str] = Query(None, description="Comma-separated symbols, e.g. BTC,ETH-USDT (default: major pairs)")
+):
+    """
+    Get best bid/ask across exchanges with per-exchange prices.
+    Served from the in-memory quote table; exchanges that have not quoted a symbol
+    within the max age are left out.
+    
+    Args:
+        symbols: Symbols in any common format
+        
+    Returns:
+        Consolidated quote per symbol, in request order
+    """
+    pairs = [normalize_symbol(symbol) for symbol in symbols.split(",") if symbol.strip()] if symbols else MAJOR_PAIRS
+    if len(pairs) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 symbols per request")
+    quotes = await quote_aggregator.quotes(pairs)
+    return [quote_response(pair, quotes[pair]) for pair in pairs]
+
+
+@router.get("/quotes/{symbol}", response_model=ConsolidatedQuoteResponse)
+async def get_consolidated_quote(symbol: str):
+    """
+    Get best bid/ask across exchanges for one symbol.
+    
+    Args:
+        symbol: Cryptocurrency symbol (e.g., 'BTC', 'ETH-USDT')
+        
+    Returns:
+        Consolidated quote with per-exchange prices
+    """
+    pair = normalize_symbol(symbol)
+    quote = (await quote_aggregator.quotes([pair]))[pair]
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"No exchange is quoting {pair}")
+    return quote_response(pair, quote)
+
+
+def quote_response(pair: str, quote: Optional[ConsolidatedQuote]) -> ConsolidatedQuoteResponse:
+    """Convert a consolidated quote (or its absence) to the response schema."""
+    if quote is None:
+        return ConsolidatedQuoteResponse(symbol=pair, venues=[])
+    now = quote_aggregator.table.clock()
+    spread = None
+    if quote.best_bid is not None and quote.best_ask is not None:
+        spread = quote.best_ask - quote.best_bid
+    return ConsolidatedQuoteResponse(
+        symbol=pair,
+        best_bid=quote.best_bid,
+        best_bid_venue=quote.best_bid_venue,
+        best_ask=quote.best_ask,
+        best_ask_venue=quote.best_ask_venue,
+        spread=spread,
+        venues=[
+            VenueQuoteResponse(
+                venue=venue.venue, bid=venue.bid, ask=venue.ask, last=venue.last,
+                age_ms=(now - venue.received_at) * 1000
+            )
+            for venue in quote.venues
+        ]
+    )
+
+
 def get_mock_prices() -> List[CoinPrice]:
     """Fallback mock data if exchange API fails."""
     return [
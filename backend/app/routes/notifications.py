@@ -0,0 +1,69 @@
+"""
+Notification routes: a live stream of the user's orders, fills and triggered alerts.
+"""
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import settings
+from app.database import get_db
+from app.models import User
+from app.middleware import get_current_user, get_stream_user, issue_stream_ticket
+from app.services.notifications import notification_hub
+
+router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
+
+
+@router.post("/ticket")
+async def create_stream_ticket(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Issue a single-use ticket for opening the stream from a browser EventSource,
+    which cannot set the Authorization header. Request a new ticket for every
+    (re)connection; it expires after NOTIFICATION_TICKET_SECONDS.
+
+    Returns:
+        The ticket and the seconds it stays valid
+    """
+    return {
+        "ticket": issue_stream_ticket(current_user.id, db),
+        "expires_in": settings.notification_ticket_seconds
+    }
+
+
+@router.get("/stream")
+async def stream_notifications(
+    last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_stream_user)
+):
+    """
+    Server-sent events for the current user.
+
+    Events are 'order' (status changes), 'fill' (with realized profit/loss) and
+    'alert' (triggered price alerts); each carries the payload as JSON. Every
+    connection starts with a 'ready' event. Reconnect with the Last-Event-ID header
+    (EventSource does this by itself) or last_event_id to receive what was missed;
+    when that is no longer possible, 'ready' has resync set and the client should
+    reload its orders and alerts. Comment lines are sent as heartbeats. Browsers
+    authenticate with ?ticket= from POST /api/notifications/ticket.
+
+    Streams only carry events raised in the worker process that serves them; see
+    app.services.notifications.
+
+    Args:
+        last_event_id: Id of the last event received, for clients that cannot set headers
+        last_event_id_header: Id of the last event received
+        current_user: Authenticated user (Authorization header or ticket query parameter)
+
+    Returns:
+        text/event-stream response that stays open
+    """
+    return StreamingResponse(
+        notification_hub.stream(current_user.id, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,75 @@
+"""
+Portfolio routes: holdings value over time.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import settings
+from app.database import get_db
+from app.models import User
+from app.schemas import EquityCurveResponse, EquityPoint
+from app.middleware import get_current_user
+from app.routes.market import candle_store
+from app.services.candles import RANGE_PATTERN, TIMEFRAME_PATTERN, parse_range
+from app.services import equity
+
+router = APIRouter(prefix="/api/portfolio", tags=["Portfolio"])
+
+
+@router.get("/equity", response_model=EquityCurveResponse)
+async def get_equity_curve(
+    history_range: str = Query("30d", alias="range", pattern=RANGE_PATTERN, description="e.g. 7d, 30d, 1y"),
+    resolution: Optional[str] = Query(None, pattern=TIMEFRAME_PATTERN, description="Bar size, e.g. 1h"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the value and P&L of the user's holdings over time.
+    Fills are replayed from the newest checkpoint before the range and valued at
+    candle closes; P&L uses the same average-cost rules as the holdings.
+
+    Args:
+        history_range: Range ending now
+        resolution: Candle timeframe of the points (default: at least 200 points)
+        current_user: Authenticated user
+        db: Database session
+
+    Returns:
+        One point per bar close plus the current value
+    """
+    range_seconds = parse_range(history_range)
+    resolution = resolution or equity.default_resolution(range_seconds)
+    try:
+        curve = await equity.get_equity_curve(
+            db,
+            current_user.id,
+            candle_store,
+            range_seconds,
+            resolution,
+            interval_hours=settings.equity_snapshot_interval_hours,
+            max_points=settings.equity_max_points
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    columns = [curve.points[name].tolist() for name in (
+        "timestamp", "value", "cost_basis", "realized_profit_loss", "unrealized_profit_loss", "profit_loss"
+    )]
+    return EquityCurveResponse(
+        range=history_range,
+        resolution=resolution,
+        replayed_fills=curve.replayed_fills,
+        checkpoint_at=curve.checkpoint_at,
+        points=[
+            EquityPoint(
+                timestamp=timestamp,
+                value=value,
+                cost_basis=cost_basis,
+                realized_profit_loss=realized,
+                unrealized_profit_loss=unrealized,
+                profit_loss=profit_loss
+            )
+            for timestamp, value, cost_basis, realized, unrealized, profit_loss in zip(*columns)
+        ]
+    )
@@ -3,17 +3,42 @@ Trading routes for executing trades and managing orders.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, date
+from app.config import settings
 from app.database import get_db
-from app.models import User, Trade, ExchangeAPIKey
-from app.schemas import TradeCreate, TradeResponse
+from app.models import User, Trade, ExchangeAPIKey, OrderStatus, OrderType, OrderSide
+from app.schemas import (
+    TradeCreate, TradeResponse, TradeBatchCreate, TradeBatchItemResult, TradeBatchResponse,
+    OcoOrderCreate, OcoOrderResponse
+)
 from app.middleware import get_current_user
-import ccxt
+from app.services.analytics import record_fill, record_fills
+from app.services.conditional_orders import order_monitor
+from app.services.credentials import CredentialError, Credentials, credential_vault
+from app.services.events import event_bus, publish_orders
+from app.services.journal import trade_journal
+from app.services.risk import risk_engine
+from app.services import export, orders
+import asyncio
 
 router = APIRouter(prefix="/api/trading", tags=["Trading"])
 
 
+def _open_credentials(api_key: ExchangeAPIKey) -> Credentials:
+    """Decrypted credentials of an API key (cached), or a 400 asking the user to add the key again."""
+    try:
+        return credential_vault.credentials(api_key)
+    except CredentialError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The stored exchange API key cannot be decrypted. Please add it again in settings."
+        )
+
+
 @router.post("/trades", response_model=TradeResponse, status_code=status.HTTP_201_CREATED)
 async def create_trade(
     trade_data: TradeCreate,
@@ -22,6 +47,7 @@ async def create_trade(
 ):
     """
     Create and execute a new trade.
+    Stop-loss and take-profit orders are left pending until their price is crossed.
     
     Args:
         trade_data: Trade details
@@ -32,13 +58,16 @@ async def create_trade(
         Created trade record
         
     Raises:
-        HTTPException: If no API keys configured or trade execution fails
+        HTTPException: If no API keys configured, a risk limit is hit or trade execution fails
     """
+    error = orders.validate_order(trade_data) or risk_engine.check(
+        current_user.id, trade_data.symbol, trade_data.order_side, trade_data.quantity, trade_data.price
+    )
+    if error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    
     # Get user's active API key
-    api_key = db.query(ExchangeAPIKey).filter(
-        ExchangeAPIKey.user_id == current_user.id,
-        ExchangeAPIKey.is_active == True
-    ).first()
+    api_key = orders.get_active_api_key(db, current_user.id)
     
     if not api_key:
         raise HTTPException(
@@ -46,42 +75,256 @@ async def create_trade(
             detail="No active exchange API key configured. Please add API keys in settings."
         )
     
+    credentials = _open_credentials(api_key)
+    
     # Create trade record
-    new_trade = Trade(
-        user_id=current_user.id,
-        exchange_name=api_key.exchange_name,
-        symbol=trade_data.symbol,
-        order_type=trade_data.order_type,
-        order_side=trade_data.order_side,
-        price=trade_data.price,
-        quantity=trade_data.quantity,
-        order_status="pending"
-    )
+    new_trade = Trade(**orders.build_trade_values(current_user.id, api_key.exchange_name, trade_data))
+    
+    if trade_journal is not None:
+        return await _create_journaled_trade(new_trade, trade_data, current_user.id, credentials)
     
     db.add(new_trade)
     db.commit()
     db.refresh(new_trade)
+    risk_engine.reserve_trade(new_trade)
+    
+    if orders.is_conditional(new_trade.order_type):
+        order_monitor.add_trade(new_trade)
+        await publish_orders(event_bus, [new_trade])
+        return new_trade
     
-    # TODO: Execute actual trade on exchange using CCXT
-    # For now, we'll simulate the trade
-    # In production, you would:
-    # 1. Initialize exchange with user's API keys
-    # 2. Execute the order
-    # 3. Update trade record with execution details
+    await orders.execute_order(new_trade, credentials=credentials)
     
-    # Simulated execution
-    new_trade.order_status = "filled"
-    new_trade.filled_quantity = trade_data.quantity
-    new_trade.average_price = trade_data.price if trade_data.price else 0
-    new_trade.total_cost = new_trade.filled_quantity * new_trade.average_price
-    new_trade.fee = new_trade.total_cost * 0.001  # 0.1% fee
+    # Update holdings and analytics rollups in the same transaction as the fill
+    record_fill(db, new_trade)
     
     db.commit()
     db.refresh(new_trade)
+    realized = risk_engine.on_fill(new_trade)
+    await publish_orders(event_bus, [new_trade], {new_trade.id: realized})
     
     return new_trade
 
 
+async def _create_journaled_trade(
+    new_trade: Trade,
+    trade_data: TradeCreate,
+    user_id: int,
+    credentials: Credentials
+) -> Trade:
+    """
+    Execute a trade and persist it through the group-commit journal.
+    The insert and the fill share one commit with other concurrent trades.
+    """
+    reservation = ("journal", id(new_trade))
+    risk_engine.reserve(
+        reservation, user_id, trade_data.symbol, trade_data.order_side, trade_data.quantity, trade_data.price
+    )
+    conditional = orders.is_conditional(new_trade.order_type)
+    try:
+        if not conditional:
+            await orders.execute_order(new_trade, credentials=credentials)
+        new_trade = await trade_journal.submit(new_trade)
+    finally:
+        risk_engine.release(reservation)
+
+    if conditional:
+        risk_engine.reserve_trade(new_trade)
+        order_monitor.add_trade(new_trade)
+        await publish_orders(event_bus, [new_trade])
+    else:
+        realized = risk_engine.on_fill(new_trade)
+        await publish_orders(event_bus, [new_trade], {new_trade.id: realized})
+    return new_trade
+
+
+@router.post("/trades/batch", response_model=TradeBatchResponse, status_code=status.HTTP_201_CREATED)
+async def create_trades_batch(
+    batch: TradeBatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create and execute several trades at once.
+    
+    All orders are validated before anything is written, inserted with a single
+    bulk statement in one transaction, then executed concurrently. Conditional
+    orders are left pending.
+    
+    Args:
+        batch: Orders to place
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Per-order results in request order
+        
+    Raises:
+        HTTPException: If the batch is too large, any order is invalid or over a risk limit,
+            or no API keys configured
+    """
+    if len(batch.trades) > settings.max_batch_orders:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {settings.max_batch_orders} orders"
+        )
+    
+    errors = [
+        {"index": index, "error": error}
+        for index, error in ((index, orders.validate_order(item)) for index, item in enumerate(batch.trades))
+        if error
+    ]
+    if not errors:
+        # Each order is checked with the earlier orders of the batch counted as open
+        for index, item in enumerate(batch.trades):
+            error = risk_engine.check(current_user.id, item.symbol, item.order_side, item.quantity, item.price)
+            if error:
+                errors.append({"index": index, "error": error})
+            else:
+                risk_engine.reserve(("batch", index), current_user.id, item.symbol, item.order_side, item.quantity, item.price)
+        for index in range(len(batch.trades)):
+            risk_engine.release(("batch", index))
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+    
+    api_key = orders.get_active_api_key(db, current_user.id)
+    
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No active exchange API key configured. Please add API keys in settings."
+        )
+    
+    credentials = _open_credentials(api_key)
+    
+    # One multi-row INSERT ... RETURNING for the whole batch
+    rows = [orders.build_trade_values(current_user.id, api_key.exchange_name, item) for item in batch.trades]
+    trade_ids = list(db.scalars(insert(Trade).returning(Trade.id, sort_by_parameter_order=True), rows))
+    db.commit()
+    
+    trades = orders.load_trades(db, trade_ids)
+    pending = [trades[trade_id] for trade_id in trade_ids]
+    for trade in pending:
+        risk_engine.reserve_trade(trade)
+        if orders.is_conditional(trade.order_type):
+            order_monitor.add_trade(trade)
+    executable = [trade for trade in pending if not orders.is_conditional(trade.order_type)]
+    
+    outcomes = await asyncio.gather(
+        *(orders.execute_order(trade, credentials=credentials) for trade in executable),
+        return_exceptions=True
+    )
+    
+    errors = {}
+    filled = []
+    for trade, outcome in zip(executable, outcomes):
+        if isinstance(outcome, Exception):
+            trade.order_status = OrderStatus.FAILED
+            errors[trade.id] = str(outcome) or outcome.__class__.__name__
+        else:
+            filled.append(trade)
+    # Each holding, rollup and strategy row is written once for the whole batch
+    record_fills(db, filled)
+    
+    db.commit()
+    
+    trades = orders.load_trades(db, trade_ids)
+    realized = {}
+    for trade_id in trade_ids:
+        if trade_id in errors:
+            risk_engine.release(trade_id)
+        elif trades[trade_id].order_status == OrderStatus.FILLED:
+            realized[trade_id] = risk_engine.on_fill(trades[trade_id])
+    await publish_orders(event_bus, [trades[trade_id] for trade_id in trade_ids], realized)
+    results = [
+        TradeBatchItemResult(
+            index=index,
+            success=trade_id not in errors,
+            trade=trades[trade_id],
+            error=errors.get(trade_id)
+        )
+        for index, trade_id in enumerate(trade_ids)
+    ]
+    
+    return TradeBatchResponse(
+        submitted=len(results),
+        filled=sum(1 for trade_id in trade_ids if trades[trade_id].order_status == OrderStatus.FILLED),
+        failed=len(errors),
+        results=results
+    )
+
+
+@router.post("/trades/oco", response_model=OcoOrderResponse, status_code=status.HTTP_201_CREATED)
+async def create_oco_order(
+    oco: OcoOrderCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Place a one-cancels-the-other pair: a stop-loss and a take-profit on the same quantity.
+    Whichever triggers first is filled and the other is cancelled.
+    
+    Args:
+        oco: Pair details
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Both pending legs
+        
+    Raises:
+        HTTPException: If the prices are on the wrong sides, a risk limit is hit or no API keys configured
+    """
+    if "/" not in oco.symbol:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Symbol must be a trading pair such as BTC/USDT")
+    protects_long = oco.order_side == OrderSide.SELL
+    if (oco.stop_price >= oco.take_profit_price) if protects_long else (oco.stop_price <= oco.take_profit_price):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"For a {oco.order_side.value} OCO the stop price must be "
+                   f"{'below' if protects_long else 'above'} the take-profit price"
+        )
+    
+    # Only one leg can fill, so only the stop leg is checked and counted as open
+    error = risk_engine.check(current_user.id, oco.symbol, oco.order_side, oco.quantity, oco.stop_price)
+    if error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    
+    api_key = orders.get_active_api_key(db, current_user.id)
+    
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No active exchange API key configured. Please add API keys in settings."
+        )
+    
+    legs = []
+    for order_type, price in ((OrderType.STOP_LOSS, oco.stop_price), (OrderType.TAKE_PROFIT, oco.take_profit_price)):
+        leg_data = TradeCreate(
+            symbol=oco.symbol,
+            order_type=order_type,
+            order_side=oco.order_side,
+            quantity=oco.quantity,
+            price=price
+        )
+        leg = Trade(**orders.build_trade_values(current_user.id, api_key.exchange_name, leg_data))
+        db.add(leg)
+        db.flush()
+        legs.append(leg)
+    stop_leg, take_profit_leg = legs
+    stop_leg.linked_trade_id = take_profit_leg.id
+    take_profit_leg.linked_trade_id = stop_leg.id
+    db.commit()
+    
+    for leg in legs:
+        db.refresh(leg)
+        order_monitor.add_trade(leg)
+    risk_engine.reserve_trade(stop_leg)
+    await publish_orders(event_bus, legs)
+    
+    return OcoOrderResponse(stop_loss=stop_leg, take_profit=take_profit_leg)
+
+
 @router.get("/trades", response_model=List[TradeResponse])
 async def get_user_trades(
     current_user: User = Depends(get_current_user),
@@ -106,6 +349,50 @@ async def get_user_trades(
     return trades
 
 
+@router.get("/trades/export")
+async def export_trades(
+    format: str = "csv",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export the user's full trade history as a streamed download.
+    
+    Args:
+        format: Output format - 'csv', 'parquet' or 'arrow' (Arrow IPC stream)
+        start_date: First creation day to include (inclusive)
+        end_date: Last creation day to include (inclusive)
+        current_user: Authenticated user
+        
+    Returns:
+        Streaming response with the encoded trades
+        
+    Raises:
+        HTTPException: If the format is unknown or unavailable
+    """
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format. Use one of: {', '.join(export.EXPORT_FORMATS)}"
+        )
+    
+    if format != "csv" and not export.columnar_available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{format} export requires pyarrow to be installed"
+        )
+    
+    media_type, extension = export.EXPORT_FORMATS[format]
+    filename = f"trades_{current_user.id}_{datetime.utcnow():%Y%m%d%H%M%S}.{extension}"
+    
+    return StreamingResponse(
+        export.stream_trades(current_user.id, format, start_date, end_date, settings.export_chunk_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/trades/{trade_id}", response_model=TradeResponse)
 async def get_trade(
     trade_id: int,
@@ -138,3 +425,59 @@ async def get_trade(
         )
     
     return trade
+
+
+@router.post("/trades/{trade_id}/cancel", response_model=TradeResponse)
+async def cancel_trade(
+    trade_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Cancel a pending order. Cancelling one leg of an OCO pair cancels both.
+    
+    Args:
+        trade_id: Trade ID
+        current_user: Authenticated user
+        db: Database session
+        
+    Returns:
+        Cancelled trade
+        
+    Raises:
+        HTTPException: If trade not found, doesn't belong to user or is no longer pending
+    """
+    trade = db.query(Trade).filter(
+        Trade.id == trade_id,
+        Trade.user_id == current_user.id
+    ).first()
+    
+    if not trade:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trade not found"
+        )
+    
+    # Claimed like a fill, so an order the monitor is filling right now is not cancelled too
+    if not orders.claim_pending(db, trade.id, OrderStatus.CANCELLED):
+        db.rollback()
+        db.refresh(trade)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Only pending orders can be cancelled (order is {trade.order_status.value})"
+        )
+    
+    cancelled = [trade]
+    if trade.linked_trade_id is not None:
+        sibling = db.query(Trade).filter(Trade.id == trade.linked_trade_id).first()
+        if sibling is not None and orders.claim_pending(db, sibling.id, OrderStatus.CANCELLED):
+            cancelled.append(sibling)
+    db.commit()
+    db.refresh(trade)
+    
+    for cancelled_trade in cancelled:
+        order_monitor.cancel(cancelled_trade.id)
+        risk_engine.release(cancelled_trade.id)
+    await publish_orders(event_bus, cancelled)
+    
+    return trade
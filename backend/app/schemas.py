@@ -4,7 +4,7 @@ Pydantic schemas for request/response validation.
 
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 
 
@@ -80,6 +80,11 @@ class ExchangeAPIKeyCreate(BaseModel):
     has_trading_permission: bool = True
 
 
+class ExchangeAPIKeyRotate(BaseModel):
+    api_key: str
+    api_secret: str
+
+
 class ExchangeAPIKeyResponse(BaseModel):
     id: int
     exchange_name: str
@@ -115,6 +120,7 @@ class TradeResponse(BaseModel):
     average_price: Optional[float]
     fee: float
     total_cost: Optional[float]
+    linked_trade_id: Optional[int] = None
     created_at: datetime
     executed_at: Optional[datetime]
     
@@ -122,6 +128,37 @@ class TradeResponse(BaseModel):
         from_attributes = True
 
 
+class TradeBatchCreate(BaseModel):
+    trades: List[TradeCreate] = Field(..., min_length=1)
+
+
+class OcoOrderCreate(BaseModel):
+    symbol: str
+    order_side: OrderSide
+    quantity: float = Field(..., gt=0)
+    stop_price: float = Field(..., gt=0)
+    take_profit_price: float = Field(..., gt=0)
+
+
+class OcoOrderResponse(BaseModel):
+    stop_loss: TradeResponse
+    take_profit: TradeResponse
+
+
+class TradeBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    trade: Optional[TradeResponse] = None
+    error: Optional[str] = None
+
+
+class TradeBatchResponse(BaseModel):
+    submitted: int
+    filled: int
+    failed: int
+    results: List[TradeBatchItemResult]
+
+
 # Strategy Schemas
 class StrategyCreate(BaseModel):
     name: str
@@ -147,6 +184,8 @@ class StrategyResponse(BaseModel):
     winning_trades: int
     total_profit_loss: float
     created_at: datetime
+    last_executed_at: Optional[datetime] = None
+    last_execution_latency_ms: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -179,6 +218,23 @@ class PortfolioResponse(BaseModel):
         from_attributes = True
 
 
+class EquityPoint(BaseModel):
+    timestamp: int  # Bar close time, ms; the last point is the current value
+    value: float  # Market value of the holdings
+    cost_basis: float
+    realized_profit_loss: float
+    unrealized_profit_loss: float
+    profit_loss: float
+
+
+class EquityCurveResponse(BaseModel):
+    range: str
+    resolution: str
+    replayed_fills: int  # Fills replayed after the checkpoint the curve resumed from
+    checkpoint_at: Optional[datetime]
+    points: List[EquityPoint]
+
+
 # Alert Schemas
 class AlertCreate(BaseModel):
     symbol: str
@@ -213,10 +269,103 @@ class CoinPrice(BaseModel):
     volume_24h: Optional[float] = None
 
 
+class MarketListingResponse(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    snapshot_at: float
+    items: List[CoinPrice]
+
+
 class PriceHistory(BaseModel):
     date: str
     price: float
+    timestamp: Optional[int] = None  # Candle open time, ms
+
+
+class PriceHistoryResponse(BaseModel):
+    symbol: str
+    timeframe: str
+    range: str
+    method: str
+    source_points: int
+    points: List[PriceHistory]
 
 
 class CoinDetail(CoinPrice):
     price_history: List[PriceHistory] = []
+
+
+# Analytics Schemas
+class AnalyticsTotals(BaseModel):
+    trade_count: int
+    buy_count: int
+    sell_count: int
+    volume: float
+    notional: float
+    fees: float
+    realized_profit_loss: float
+    closing_trades: int
+    winning_trades: int
+    win_rate: float
+
+
+class AnalyticsSummary(AnalyticsTotals):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+class SymbolAnalytics(AnalyticsTotals):
+    symbol: str
+
+
+class DailyAnalytics(AnalyticsTotals):
+    day: date
+
+
+class OrderBookLevel(BaseModel):
+    price: float
+    quantity: float
+
+
+class OrderBookResponse(BaseModel):
+    symbol: str
+    bids: List[OrderBookLevel]
+    asks: List[OrderBookLevel]
+    spread: Optional[float] = None
+    mid_price: Optional[float] = None
+    last_update_id: int
+    updated_at: float
+
+
+class VenueQuoteResponse(BaseModel):
+    venue: str
+    bid: Optional[float] = None
+    ask: Optional[float] = None
+    last: Optional[float] = None
+    age_ms: float
+
+
+class ConsolidatedQuoteResponse(BaseModel):
+    symbol: str
+    best_bid: Optional[float] = None
+    best_bid_venue: Optional[str] = None
+    best_ask: Optional[float] = None
+    best_ask_venue: Optional[str] = None
+    spread: Optional[float] = None
+    venues: List[VenueQuoteResponse]
+
+
+# Admin Schemas
+class ProfileInfo(BaseModel):
+    id: str
+    method: str
+    path: str
+    query: str
+    status: int
+    duration_ms: float
+    mode: str
+    trigger: str
+    started_at: float
+    samples: Optional[int] = None
+    formats: List[str]
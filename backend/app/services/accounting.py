@@ -0,0 +1,401 @@
+"""
+Position accounting: lot matching and exchange fees.
+Open positions are kept per key (user and asset) as lots in a deque, oldest
+first. Sells close lots first in, first out, or against the position's average
+cost when ACCOUNTING_METHOD is 'average' (the position is then a single lot).
+Either way the realized profit/loss of a sell is the closed quantity times the
+sell price, less the cost of the lots it closed and the sell's fee; a sell
+larger than the position only closes what is held.
+
+apply() takes live fills one at a time. apply_batch() replays many at once:
+FIFO is vectorized per key with cumulative sums. A sell closes the buys lying
+between the cumulative quantity closed before and after it, so its cost is the
+difference of the cumulative buy cost (interpolated) at those two points.
+
+Changes made through a database session are staged and only reach the book
+when that session commits, so rolled-back fills leave it untouched.
+
+Fees come from per-exchange maker/taker schedules (FEE_SCHEDULES): limit orders
+pay the maker rate, market and triggered orders the taker rate.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import OrderSide, OrderType
+
+METHODS = ("fifo", "average")
+
+# Session.info key of the lots staged in the session's transaction
+STAGED_KEY = "staged_lots"
+
+
+class FeeSchedule(NamedTuple):
+    """Fee rates of one exchange, as fractions of the notional."""
+    maker: float
+    taker: float
+
+
+DEFAULT_FEES = FeeSchedule(settings.default_maker_fee, settings.default_taker_fee)
+
+FEE_SCHEDULES: Dict[str, FeeSchedule] = {
+    exchange: FeeSchedule(*rates) for exchange, rates in settings.fee_schedule_map.items()
+}
+
+
+def fee_schedule(exchange_name: str) -> FeeSchedule:
+    """Maker/taker rates of an exchange; the default rates for unlisted ones."""
+    return FEE_SCHEDULES.get((exchange_name or "").lower(), DEFAULT_FEES)
+
+
+def fee_rate(exchange_name: str, order_type: OrderType) -> float:
+    """Rate charged on a fill: maker for limit orders, taker for everything else."""
+    schedule = fee_schedule(exchange_name)
+    return schedule.maker if order_type == OrderType.LIMIT else schedule.taker
+
+
+def apply_average_cost(
+    position_quantity: float,
+    average_price: float,
+    side: OrderSide,
+    quantity: float,
+    price: float,
+    fee: float
+) -> Tuple[float, float, float]:
+    """
+    Apply a fill to an average-cost position.
+
+    Args:
+        position_quantity: Quantity held before the fill
+        average_price: Average entry price before the fill
+        side: Fill side
+        quantity: Filled quantity
+        price: Fill price
+        fee: Fee charged on the fill
+
+    Returns:
+        Tuple of (new quantity, new average price, realized profit/loss)
+    """
+    if side == OrderSide.BUY:
+        new_quantity = position_quantity + quantity
+        if new_quantity > 0:
+            average_price = (position_quantity * average_price + quantity * price) / new_quantity
+        return new_quantity, average_price, 0.0
+
+    # Only the part of a sell covered by the position realizes profit/loss
+    closed_quantity = min(quantity, position_quantity)
+    realized = closed_quantity * (price - average_price) - fee
+    new_quantity = position_quantity - closed_quantity
+    if new_quantity <= 0:
+        return 0.0, 0.0, realized
+    return new_quantity, average_price, realized
+
+
+class Position:
+    """Open lots of one key, oldest first, with their total quantity and cost."""
+    __slots__ = ("lots", "quantity", "cost")
+
+    def __init__(self, lots: Iterable[Tuple[float, float]] = ()):
+        self.lots: Deque[Tuple[float, float]] = deque(lot for lot in lots if lot[0] > 0)  # (quantity, price)
+        self.quantity = sum(quantity for quantity, _ in self.lots)
+        self.cost = sum(quantity * price for quantity, price in self.lots)
+
+    @property
+    def average_price(self) -> float:
+        return self.cost / self.quantity if self.quantity > 0 else 0.0
+
+    def copy(self) -> "Position":
+        position = Position.__new__(Position)
+        position.lots, position.quantity, position.cost = deque(self.lots), self.quantity, self.cost
+        return position
+
+    def close(self, quantity: float, price: float, fee: float) -> float:
+        """Close up to quantity from the oldest lots; returns the realized profit/loss."""
+        held = self.quantity
+        if quantity >= held:
+            realized = held * price - self.cost - fee
+            self.lots.clear()
+            self.quantity = self.cost = 0.0
+            return realized
+        lots = self.lots
+        remaining = quantity
+        cost = 0.0
+        while lots:
+            lot_quantity, lot_price = lots[0]
+            if lot_quantity <= remaining:
+                remaining -= lot_quantity
+                cost += lot_quantity * lot_price
+                lots.popleft()
+            else:
+                lots[0] = (lot_quantity - remaining, lot_price)
+                cost += remaining * lot_price
+                break
+        if lots:
+            self.quantity = held - quantity
+            self.cost -= cost
+        else:
+            # Rounding left the total a hair above the lots
+            self.quantity = self.cost = 0.0
+        return quantity * price - cost - fee
+
+
+def _agrees(position: Position, recorded: Optional[Tuple[float, float]]) -> bool:
+    """Whether a position matches the quantity recorded for it (e.g. the holding row)."""
+    if recorded is None:
+        return True
+    return abs(position.quantity - recorded[0]) <= 1e-9 * max(1.0, abs(recorded[0]))
+
+
+class LotBook:
+    """Open positions by key under one matching method."""
+
+    def __init__(self, method: str = "fifo"):
+        if method not in METHODS:
+            raise ValueError(f"Unknown accounting method {method!r}; expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.positions: Dict[Hashable, Position] = {}
+
+    def apply(
+        self,
+        key: Hashable,
+        side: OrderSide,
+        quantity: float,
+        price: float,
+        fee: float,
+        opening: Optional[Tuple[float, float]] = None
+    ) -> float:
+        """
+        Apply one fill.
+
+        Args:
+            key: Position key, e.g. (user_id, asset)
+            side: Fill side
+            quantity: Filled quantity
+            price: Fill price
+            fee: Fee charged on the fill
+            opening: The position as recorded, (quantity, average price); the
+                book starts over from it, as one lot, if it has no position for
+                the key or a different quantity
+
+        Returns:
+            Realized profit/loss (0 for buys)
+        """
+        position = self.positions.get(key)
+        if position is None or not _agrees(position, opening):
+            position = self.positions[key] = Position([opening] if opening else ())
+        return self._apply(position, side, quantity, price, fee)
+
+    def load(self, holdings: Iterable[Tuple[Hashable, float, float]], source: "LotBook") -> None:
+        """
+        Replace the positions with recorded holdings (key, quantity, average price),
+        taking the lots from source where it agrees with the holding.
+        """
+        positions = {}
+        for key, quantity, average in holdings:
+            position = source.positions.get(key)
+            if position is not None and _agrees(position, (quantity, average)):
+                positions[key] = position.copy()
+            else:
+                positions[key] = Position([(quantity, average)])
+        self.positions = positions
+
+    def _apply(self, position: Position, side: OrderSide, quantity: float, price: float, fee: float) -> float:
+        if side != OrderSide.BUY:
+            return position.close(quantity, price, fee)
+        if self.method == "fifo":
+            position.lots.append((quantity, price))
+            position.quantity += quantity
+            position.cost += quantity * price
+        else:
+            held, average, _ = apply_average_cost(
+                position.quantity, position.average_price, side, quantity, price, fee
+            )
+            position.lots = deque([(held, average)])
+            position.quantity, position.cost = held, held * average
+        return 0.0
+
+    def apply_batch(
+        self,
+        keys: Sequence[Hashable],
+        buys: np.ndarray,
+        quantities: np.ndarray,
+        prices: np.ndarray,
+        fees: np.ndarray
+    ) -> np.ndarray:
+        """
+        Apply fills in order, from the book's current positions.
+        Same results as calling apply for each fill, to rounding.
+
+        Args:
+            keys: Position key per fill
+            buys: True for buys, False for sells
+            quantities: Filled quantities
+            prices: Fill prices
+            fees: Fees
+
+        Returns:
+            Realized profit/loss per fill
+        """
+        names = list(dict.fromkeys(keys))
+        index = {key: position for position, key in enumerate(names)}
+        # Small ids sort by radix
+        ids = np.fromiter(
+            map(index.__getitem__, keys), dtype=np.uint16 if len(names) <= 1 << 16 else np.int64, count=len(keys)
+        )
+        order = np.argsort(ids, kind="stable")
+        ends = np.bincount(ids, minlength=len(names)).cumsum().tolist()
+        buys, quantities = np.asarray(buys, dtype=bool)[order], np.asarray(quantities, dtype=np.float64)[order]
+        prices, fees = np.asarray(prices, dtype=np.float64)[order], np.asarray(fees, dtype=np.float64)[order]
+        if self.method == "fifo":
+            bought = np.where(buys, quantities, 0.0)
+            columns = (buys, bought, quantities - bought, bought * prices, prices, fees)
+            match = self._match_fifo
+        else:
+            columns = (buys, quantities, prices, fees)
+            match = self._match_average
+
+        realized = np.empty(len(order))
+        start = 0
+        for key, end in zip(names, ends):
+            position = self.positions.get(key)
+            if position is None:
+                position = self.positions[key] = Position()
+            realized[start:end] = match(position, *[column[start:end] for column in columns])
+            start = end
+        result = np.empty(len(order))
+        result[order] = realized
+        return result
+
+    @staticmethod
+    def _match_fifo(position: Position, buys, bought, sold, bought_cost, prices, fees) -> np.ndarray:
+        """FIFO over one key's fills, vectorized; updates the position."""
+        if position.lots:
+            opening_quantities, opening_prices = np.array(position.lots, dtype=np.float64).T
+        else:
+            opening_quantities = opening_prices = np.zeros(0)
+
+        # Cumulative quantity bought (including open lots) and asked to sell
+        total_bought = np.cumsum(bought)
+        total_bought += opening_quantities.sum()
+        total_sold = np.cumsum(sold)
+        # Cumulative quantity closed: a sell never closes more than is held, so
+        # closed[k] = min(closed[k-1] + sold[k], bought[k]) = sold + min(0, running min of bought - sold)
+        closed = np.minimum.accumulate(total_bought - total_sold)
+        np.minimum(closed, 0.0, out=closed)
+        closed += total_sold
+
+        # Cumulative cost as a function of cumulative quantity bought, one knot per lot
+        knots = np.concatenate(([0.0], opening_quantities, bought[buys])).cumsum()
+        costs = np.concatenate(([0.0], opening_quantities * opening_prices, bought_cost[buys])).cumsum()
+        closed_cost = np.interp(closed, knots, costs)
+
+        closed_quantity = closed.copy()
+        closed_quantity[1:] -= closed[:-1]
+        closed_cost_step = closed_cost.copy()
+        closed_cost_step[1:] -= closed_cost[:-1]
+        realized = closed_quantity * prices
+        realized -= closed_cost_step
+        realized -= fees
+        realized[buys] = 0.0
+
+        # Lots not fully closed stay open, the first one partly; rounding leftovers are dropped
+        final = closed[-1]
+        lot_prices = np.concatenate((opening_prices, prices[buys]))
+        first = int(np.searchsorted(knots[1:], final, side="right"))
+        remaining = knots[first + 1:] - np.maximum(knots[first:-1], final)
+        dust = 1e-12 * knots[-1]
+        position.lots = deque(
+            (quantity, price) for quantity, price in zip(remaining.tolist(), lot_prices[first:].tolist())
+            if quantity > dust
+        )
+        if position.lots:
+            position.quantity, position.cost = knots[-1] - final, costs[-1] - closed_cost[-1]
+        else:
+            position.quantity = position.cost = 0.0
+        return realized
+
+    @staticmethod
+    def _match_average(position: Position, buys, quantities, prices, fees) -> np.ndarray:
+        """Average cost over one key's fills; updates the position."""
+        held, average = position.quantity, position.average_price
+        realized = []
+        append = realized.append
+        for buy, quantity, price, fee in zip(buys.tolist(), quantities.tolist(), prices.tolist(), fees.tolist()):
+            if buy:
+                total = held + quantity
+                if total > 0:
+                    average = (held * average + quantity * price) / total
+                held = total
+                append(0.0)
+                continue
+            closed = quantity if quantity < held else held
+            append(closed * (price - average) - fee)
+            held -= closed
+            if held <= 0:
+                held = average = 0.0
+        position.lots = deque([(held, average)] if held > 0 else [])
+        position.quantity, position.cost = held, held * average
+        return np.array(realized)
+
+    def transaction(self, db: Session) -> "StagedLots":
+        """Lots changed within db's current transaction; merged into the book when it commits."""
+        staged = db.info.get(STAGED_KEY)
+        if staged is None:
+            staged = db.info[STAGED_KEY] = StagedLots(self)
+        return staged
+
+
+class StagedLots:
+    """Copy-on-write positions of one transaction."""
+
+    def __init__(self, book: LotBook):
+        self.book = book
+        self.positions: Dict[Hashable, Position] = {}
+
+    def apply(
+        self,
+        key: Hashable,
+        side: OrderSide,
+        quantity: float,
+        price: float,
+        fee: float,
+        opening: Optional[Tuple[float, float]] = None
+    ) -> float:
+        """LotBook.apply on the transaction's copy of the position."""
+        position = self.positions.get(key)
+        if position is None:
+            current = self.book.positions.get(key)
+            if current is not None and _agrees(current, opening):
+                position = current.copy()
+            else:
+                position = Position([opening] if opening else ())
+            self.positions[key] = position
+        return self.book._apply(position, side, quantity, price, fee)
+
+    def position(self, key: Hashable) -> Position:
+        """Position of a key as of this transaction."""
+        position = self.positions.get(key)
+        if position is None:
+            position = self.book.positions.get(key) or Position()
+        return position
+
+
+@event.listens_for(Session, "after_commit")
+def _merge_staged_lots(session: Session) -> None:
+    staged = session.info.pop(STAGED_KEY, None)
+    if staged is not None:
+        staged.book.positions.update(staged.positions)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_staged_lots(session: Session, transaction) -> None:
+    # Reached after after_commit on commit; whatever is left was rolled back or abandoned
+    if transaction.parent is None:
+        session.info.pop(STAGED_KEY, None)
+
+
+# Positions behind PortfolioHolding, keyed by (user_id, asset)
+lot_book = LotBook(settings.accounting_method)
@@ -0,0 +1,245 @@
+"""
+Price alert evaluation.
+Active alerts are held in memory as per-symbol sorted thresholds so a price
+update only touches the alerts it actually crosses. The monitor flags crossed
+alerts in the database and publishes them on the event bus, which delivers them
+to their owners' notification streams. Flagging is a conditional UPDATE, so when
+several workers see the same cross only the one that flags an alert publishes it.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import insort
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Alert
+from app.services.events import AlertTriggered, EventBus, event_bus
+
+logger = logging.getLogger(__name__)
+
+PRICE_ABOVE = "price_above"
+PRICE_BELOW = "price_below"
+
+
+class AlertBook:
+    """
+    Untriggered price alerts indexed by symbol.
+    'price_above' thresholds are kept ascending and consumed from the front,
+    'price_below' thresholds ascending and consumed from the back.
+    """
+
+    def __init__(self):
+        self.above: Dict[str, List[Tuple[float, int]]] = {}
+        self.below: Dict[str, List[Tuple[float, int]]] = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.above.values())) + sum(map(len, self.below.values()))
+
+    def add(self, alert_id: int, symbol: str, alert_type: str, target_price: float) -> bool:
+        """Index one alert; returns False for alert types that are not price thresholds."""
+        if alert_type == PRICE_ABOVE:
+            insort(self.above.setdefault(symbol, []), (target_price, alert_id))
+        elif alert_type == PRICE_BELOW:
+            insort(self.below.setdefault(symbol, []), (target_price, alert_id))
+        else:
+            return False
+        return True
+
+    def load(self, db: Session) -> int:
+        """Replace the book with every active, untriggered alert in the database."""
+        self.above.clear()
+        self.below.clear()
+        rows = db.query(Alert.id, Alert.symbol, Alert.alert_type, Alert.target_price).filter(
+            Alert.is_active == True,
+            Alert.is_triggered == False
+        ).order_by(Alert.id)
+        return sum(self.add(*row) for row in rows)
+
+    def check(self, symbol: str, low: float, high: float) -> List[int]:
+        """
+        Remove and return alerts crossed by a price range.
+        For a single price pass it as both low and high.
+
+        Args:
+            symbol: Trading pair
+            low: Lowest price seen
+            high: Highest price seen
+
+        Returns:
+            Triggered alert ids
+        """
+        triggered = []
+        above = self.above.get(symbol)
+        if above and above[0][0] <= high:
+            count = 0
+            while count < len(above) and above[count][0] <= high:
+                triggered.append(above[count][1])
+                count += 1
+            del above[:count]
+        below = self.below.get(symbol)
+        if below and below[-1][0] >= low:
+            start = len(below)
+            while start and below[start - 1][0] >= low:
+                start -= 1
+            triggered.extend(alert_id for _, alert_id in reversed(below[start:]))
+            del below[start:]
+        return triggered
+
+
+def mark_triggered(db: Session, alert_ids: List[int], triggered_at: datetime) -> Set[int]:
+    """
+    Flag alerts as triggered unless they already are (caller commits).
+    Every worker watches the same alerts; the conditional UPDATE lets exactly
+    one of them claim each alert, so it is notified once.
+
+    Returns:
+        Ids of the alerts this call flagged
+    """
+    claimed: Set[int] = set()
+    # One statement per chunk: every row gets the same values
+    for start in range(0, len(alert_ids), 1000):
+        claimed.update(db.scalars(
+            update(Alert)
+            .where(
+                Alert.id.in_(alert_ids[start:start + 1000]),
+                Alert.is_active == True,
+                Alert.is_triggered == False
+            )
+            .values(is_triggered=True, triggered_at=triggered_at)
+            .returning(Alert.id)
+            .execution_options(synchronize_session=False)
+        ))
+    return claimed
+
+
+class WatchedAlert(NamedTuple):
+    """What the monitor keeps of an alert to publish it when triggered."""
+    user_id: int
+    symbol: str
+    alert_type: str
+    target_price: float
+    message: Optional[str]
+
+
+class AlertMonitor:
+    """Watches untriggered alerts, flags them when crossed and publishes them."""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        clock: Callable[[], float] = time.time,
+        bus: Optional[EventBus] = None
+    ):
+        self.session_factory = session_factory
+        self.clock = clock
+        self.bus = bus or event_bus
+        self.book = AlertBook()
+        self.alerts: Dict[int, WatchedAlert] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def symbols(self) -> Set[str]:
+        """Symbols with untriggered alerts."""
+        return {alert.symbol for alert in self.alerts.values()}
+
+    def load(self, db: Session) -> int:
+        """Replace the book with every active, untriggered alert in the database."""
+        book = AlertBook()
+        alerts = {}
+        rows = db.query(
+            Alert.id, Alert.user_id, Alert.symbol, Alert.alert_type, Alert.target_price, Alert.message
+        ).filter(
+            Alert.is_active == True,
+            Alert.is_triggered == False
+        ).order_by(Alert.id)
+        for alert_id, *fields in rows:
+            alert = WatchedAlert(*fields)
+            if book.add(alert_id, alert.symbol, alert.alert_type, alert.target_price):
+                alerts[alert_id] = alert
+        self.book = book
+        self.alerts = alerts
+        return len(alerts)
+
+    async def on_price(self, symbol: str, low: float, high: Optional[float] = None) -> List[int]:
+        """
+        Trigger every alert crossed by a price update.
+
+        Args:
+            symbol: Trading pair
+            low: Price, or lowest price of the range
+            high: Highest price of the range (defaults to low)
+
+        Returns:
+            Ids of the alerts this monitor triggered (not those claimed by another worker)
+        """
+        if high is None:
+            high = low
+        triggered = self.book.check(symbol, low, high)
+        if not triggered:
+            return []
+
+        triggered_at = datetime.utcfromtimestamp(self.clock())
+        db = self.session_factory()
+        try:
+            claimed = mark_triggered(db, triggered, triggered_at)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to trigger %d alerts on %s", len(triggered), symbol)
+            # Put the alerts back so the next update retries them
+            for alert_id in triggered:
+                alert = self.alerts[alert_id]
+                self.book.add(alert_id, alert.symbol, alert.alert_type, alert.target_price)
+            return []
+        finally:
+            db.close()
+
+        timestamp = triggered_at.isoformat()
+        events = []
+        for alert_id in triggered:
+            alert = self.alerts.pop(alert_id)
+            if alert_id not in claimed:
+                continue  # Triggered by another worker, or deactivated, since the last reload
+            events.append(AlertTriggered(
+                alert_id, alert.user_id, alert.symbol, alert.alert_type, alert.target_price,
+                high if alert.alert_type == PRICE_ABOVE else low, alert.message, timestamp
+            ))
+        await self.bus.publish_many("alert", events)
+        return [alert_id for alert_id in triggered if alert_id in claimed]
+
+    async def run(self, interval: float) -> None:
+        """Reload the alerts every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            db = self.session_factory()
+            try:
+                self.load(db)
+            except Exception:
+                logger.exception("Alert reload failed")
+            finally:
+                db.close()
+
+    def start(self, interval: float) -> None:
+        """Start periodic reloading on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic reloading."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global alert monitor
+alert_monitor = AlertMonitor()
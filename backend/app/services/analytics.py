@@ -0,0 +1,457 @@
+"""
+Trade analytics backed by daily rollup tables.
+Rollups are updated incrementally as trades fill and summed per date range on read,
+so query cost depends on the number of days and symbols rather than on trade history.
+Realized profit/loss comes from the lot book (app.services.accounting), which also
+backs the quantity and average price of each portfolio holding.
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import bindparam, func, select, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import (
+    Trade, DailyTradeRollup, Portfolio, PortfolioHolding, OrderSide, OrderStatus, PositionCheckpoint, Strategy
+)
+from app.services.accounting import (  # noqa: F401 (apply_average_cost re-exported)
+    LotBook, Position, apply_average_cost, lot_book
+)
+
+logger = logging.getLogger(__name__)
+
+# Aggregate columns that are summed when rollups are combined
+ROLLUP_FIELDS = (
+    "trade_count",
+    "buy_count",
+    "sell_count",
+    "volume",
+    "notional",
+    "fees",
+    "realized_profit_loss",
+    "closing_trades",
+    "winning_trades",
+)
+
+_strategies = Strategy.__table__
+
+# Add fills, winning closes and realized profit/loss to strategies (executemany)
+ADD_STRATEGY_RESULTS = (
+    update(_strategies)
+    .where(_strategies.c.id == bindparam("strategy"))
+    .values(
+        total_trades=_strategies.c.total_trades + bindparam("trades"),
+        winning_trades=_strategies.c.winning_trades + bindparam("winning"),
+        total_profit_loss=_strategies.c.total_profit_loss + bindparam("profit"),
+    )
+)
+
+
+def base_asset(symbol: str) -> str:
+    """Return the base currency of a trading pair (e.g. 'BTC' for 'BTC/USDT')."""
+    return symbol.split('/')[0].upper()
+
+
+def fill_day(trade: Trade) -> date:
+    """Return the UTC day a trade is accounted to."""
+    timestamp = trade.executed_at or trade.created_at or datetime.utcnow()
+    return timestamp.date()
+
+
+def realize_fill(db: Session, trade: Trade) -> float:
+    """
+    Update the user's portfolio holding for a filled trade.
+
+    Args:
+        db: Database session
+        trade: Filled trade
+
+    Returns:
+        Realized profit/loss of the fill
+    """
+    return _apply_fill(db, _get_holding(db, trade.user_id, base_asset(trade.symbol)), trade)
+
+
+def _get_holding(db: Session, user_id: int, asset: str) -> PortfolioHolding:
+    """Return the user's holding of an asset, creating the portfolio and holding when missing."""
+    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user_id).first()
+    if portfolio is None:
+        portfolio = Portfolio(user_id=user_id)
+        db.add(portfolio)
+        db.flush()
+
+    holding = db.query(PortfolioHolding).filter(
+        PortfolioHolding.portfolio_id == portfolio.id,
+        PortfolioHolding.symbol == asset
+    ).first()
+    if holding is None:
+        holding = PortfolioHolding(portfolio_id=portfolio.id, symbol=asset, quantity=0.0, average_buy_price=0.0)
+        db.add(holding)
+        db.flush()
+    return holding
+
+
+def _apply_fill(db: Session, holding: PortfolioHolding, trade: Trade) -> float:
+    key = (trade.user_id, holding.symbol)
+    lots = lot_book.transaction(db)
+    realized = lots.apply(
+        key,
+        trade.order_side,
+        trade.filled_quantity,
+        trade.average_price or 0.0,
+        trade.fee or 0.0,
+        # Holdings the book has not seen yet (e.g. recorded before it was loaded) open as one lot
+        opening=(holding.quantity or 0.0, holding.average_buy_price or 0.0)
+    )
+    position = lots.position(key)
+    holding.quantity = position.quantity
+    holding.average_buy_price = position.average_price
+    holding.profit_loss = (holding.profit_loss or 0.0) + realized
+
+    return realized
+
+
+def rollup_values(trade: Trade, realized: float) -> Dict[str, float]:
+    """Build the rollup increments contributed by a single filled trade."""
+    is_buy = trade.order_side == OrderSide.BUY
+    return {
+        "trade_count": 1,
+        "buy_count": 1 if is_buy else 0,
+        "sell_count": 0 if is_buy else 1,
+        "volume": trade.filled_quantity or 0.0,
+        "notional": trade.total_cost or 0.0,
+        "fees": trade.fee or 0.0,
+        "realized_profit_loss": realized,
+        "closing_trades": 0 if is_buy else 1,
+        "winning_trades": 1 if (not is_buy and realized > 0) else 0,
+    }
+
+
+def _upsert_rollup(db: Session, user_id: int, symbol: str, day: date, values: Dict[str, float]) -> None:
+    """Atomically add values to a rollup row, creating it when missing."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        statement = dialect_insert(DailyTradeRollup).values(user_id=user_id, symbol=symbol, day=day, **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "symbol", "day"],
+            set_={
+                field: getattr(DailyTradeRollup, field) + getattr(statement.excluded, field)
+                for field in ROLLUP_FIELDS
+            }
+        )
+        db.execute(statement)
+        return
+
+    # Generic fallback for other databases
+    rollup = db.query(DailyTradeRollup).filter(
+        DailyTradeRollup.user_id == user_id,
+        DailyTradeRollup.symbol == symbol,
+        DailyTradeRollup.day == day
+    ).with_for_update().first()
+    if rollup is None:
+        db.add(DailyTradeRollup(user_id=user_id, symbol=symbol, day=day, **values))
+        db.flush()
+        return
+    for field, value in values.items():
+        setattr(rollup, field, getattr(rollup, field) + value)
+
+
+def record_fill(db: Session, trade: Trade, strategy_results: bool = True) -> float:
+    """
+    Account a filled trade in the holdings and daily rollups, and a strategy's
+    closing fill in its winning_trades and total_profit_loss.
+    Must be called inside the transaction that marks the trade filled.
+
+    Args:
+        db: Database session
+        trade: Filled trade
+        strategy_results: False when the caller credits the strategy itself
+
+    Returns:
+        Realized profit/loss of the fill
+    """
+    realized = realize_fill(db, trade)
+    _upsert_rollup(db, trade.user_id, trade.symbol, fill_day(trade), rollup_values(trade, realized))
+    if strategy_results and trade.strategy_id is not None and trade.order_side != OrderSide.BUY:
+        db.execute(ADD_STRATEGY_RESULTS, [
+            {"strategy": trade.strategy_id, "trades": 0, "winning": int(realized > 0), "profit": realized}
+        ])
+    return realized
+
+
+def record_fills(db: Session, trades: List[Trade], strategy_results: bool = True) -> List[float]:
+    """
+    Account several filled trades, in order, inside one transaction.
+    Same result as calling record_fill for each, but every holding is looked up
+    once and every rollup and strategy row is written once.
+
+    Args:
+        db: Database session
+        trades: Filled trades
+        strategy_results: False when the caller credits the strategies itself
+
+    Returns:
+        Realized profit/loss of each fill
+    """
+    holdings: Dict[Tuple[int, str], PortfolioHolding] = {}
+    rollups: Dict[Tuple[int, str, date], Dict[str, float]] = {}
+    strategies: Dict[int, List] = {}
+    results = []
+    for trade in trades:
+        key = (trade.user_id, base_asset(trade.symbol))
+        holding = holdings.get(key)
+        if holding is None:
+            holding = holdings[key] = _get_holding(db, *key)
+        realized = _apply_fill(db, holding, trade)
+        results.append(realized)
+        if strategy_results and trade.strategy_id is not None and trade.order_side != OrderSide.BUY:
+            totals = strategies.setdefault(trade.strategy_id, [0, 0.0])
+            totals[0] += realized > 0
+            totals[1] += realized
+
+        values = rollup_values(trade, realized)
+        rollup_key = (trade.user_id, trade.symbol, fill_day(trade))
+        totals = rollups.get(rollup_key)
+        if totals is None:
+            rollups[rollup_key] = values
+        else:
+            for field, value in values.items():
+                totals[field] += value
+
+    for (user_id, symbol, day), values in rollups.items():
+        _upsert_rollup(db, user_id, symbol, day, values)
+    if strategies:
+        db.execute(ADD_STRATEGY_RESULTS, [
+            {"strategy": strategy_id, "trades": 0, "winning": winning, "profit": profit}
+            for strategy_id, (winning, profit) in strategies.items()
+        ])
+    return results
+
+
+def _trade_history(user_id: Optional[int] = None, after_id: int = 0):
+    """Filled trades in per-user execution order, with the columns replays need."""
+    query = select(
+        Trade.id,
+        Trade.user_id,
+        Trade.symbol,
+        Trade.order_side,
+        Trade.filled_quantity,
+        Trade.average_price,
+        Trade.total_cost,
+        Trade.fee,
+        Trade.executed_at,
+        Trade.created_at
+    ).where(Trade.order_status == OrderStatus.FILLED)
+    if user_id is not None:
+        query = query.where(Trade.user_id == user_id)
+    if after_id:
+        query = query.where(Trade.id > after_id)
+    # Fill order, as the live path matched them; an order can fill after ones placed later
+    return query.order_by(Trade.user_id, Trade.executed_at, Trade.id)
+
+
+def _replay(db: Session, book: LotBook, chunk_size: int, user_id: Optional[int] = None, after_id: int = 0):
+    """
+    Run filled trades through a lot book in execution order, yielding each chunk
+    of rows with the realized profit/loss of every row.
+    A book that starts empty matches the live path: holdings are only written by
+    fills, so every position opens with the user's first fill of the asset.
+    """
+    query = _trade_history(user_id, after_id).execution_options(yield_per=chunk_size)
+    for rows in db.execute(query).partitions():
+        yield rows, _realize_rows(book, rows)
+
+
+def _realize_rows(book: LotBook, rows) -> List[float]:
+    """Run a chunk of trade rows through a lot book; realized profit/loss per row."""
+    return book.apply_batch(
+        [(row.user_id, base_asset(row.symbol)) for row in rows],
+        np.array([row.order_side == OrderSide.BUY for row in rows], dtype=bool),
+        np.array([row.filled_quantity or 0.0 for row in rows]),
+        np.array([row.average_price or 0.0 for row in rows]),
+        np.array([row.fee or 0.0 for row in rows]),
+    ).tolist()
+
+
+def _load_position_checkpoint(db: Session, book: LotBook) -> Tuple[int, int]:
+    """
+    Start a book from its saved checkpoint if the filled trades it covers are
+    unchanged. Returns the checkpoint's (last trade id, fill count), (0, 0) if none applies.
+    """
+    checkpoint = db.get(PositionCheckpoint, book.method)
+    if checkpoint is None:
+        return 0, 0
+    covered = db.scalar(select(func.count()).select_from(Trade).where(
+        Trade.order_status == OrderStatus.FILLED, Trade.id <= checkpoint.last_trade_id
+    ))
+    if covered != checkpoint.fill_count:
+        logger.info("Position checkpoint is stale (%d fills covered, %d recorded); replaying all trades",
+                    covered, checkpoint.fill_count)
+        return 0, 0
+    book.positions = {
+        (user_id, asset): Position(lots) for user_id, asset, lots in json.loads(checkpoint.state)
+    }
+    return checkpoint.last_trade_id, checkpoint.fill_count
+
+
+def rebuild_positions(db: Session, chunk_size: int = 10000) -> int:
+    """
+    Replace the lot book's positions with a replay of the trades table.
+    The replay starts from the saved PositionCheckpoint when no trade it covers
+    was filled since, so only newer trades are replayed; a new checkpoint is
+    then committed.
+
+    Args:
+        db: Database session
+        chunk_size: Number of trades fetched and matched per batch
+
+    Returns:
+        Number of trades replayed
+    """
+    book = LotBook(lot_book.method)
+    last_trade_id, fill_count = _load_position_checkpoint(db, book)
+    count = 0
+    for rows, _ in _replay(db, book, chunk_size, after_id=last_trade_id):
+        count += len(rows)
+        last_trade_id = max(last_trade_id, max(row.id for row in rows))
+    lot_book.positions = book.positions
+
+    if count:
+        state = [[user_id, asset, list(position.lots)] for (user_id, asset), position in book.positions.items()]
+        db.merge(PositionCheckpoint(
+            method=book.method, last_trade_id=last_trade_id, fill_count=fill_count + count, state=json.dumps(state)
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Another worker saved the same checkpoint first
+    return count
+
+
+def rebuild_rollups(
+    db: Session,
+    user_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    chunk_size: int = 10000
+) -> int:
+    """
+    Recompute rollups from the raw trades table.
+    Trades are streamed in chunks and replayed from the beginning of history
+    so lot state is correct, but only days in range are rewritten.
+
+    Args:
+        db: Database session
+        user_id: Restrict the rebuild to one user
+        start_date: First day to rewrite (inclusive)
+        end_date: Last day to rewrite (inclusive)
+        chunk_size: Number of trades fetched per round trip
+
+    Returns:
+        Number of rollup rows written
+    """
+    cleanup = delete(DailyTradeRollup)
+    if user_id is not None:
+        cleanup = cleanup.where(DailyTradeRollup.user_id == user_id)
+    if start_date is not None:
+        cleanup = cleanup.where(DailyTradeRollup.day >= start_date)
+    if end_date is not None:
+        cleanup = cleanup.where(DailyTradeRollup.day <= end_date)
+    db.execute(cleanup)
+
+    # Same method and opening state as the live book and rebuild_positions
+    book = LotBook(lot_book.method)
+    rollups: Dict[Tuple[int, str, date], Dict[str, float]] = {}
+
+    for chunk, realized_chunk in _replay(db, book, chunk_size, user_id):
+        for row, realized in zip(chunk, realized_chunk):
+            day = (row.executed_at or row.created_at).date()
+            if (start_date is not None and day < start_date) or (end_date is not None and day > end_date):
+                continue
+
+            values = rollup_values(row, realized)
+            totals = rollups.get((row.user_id, row.symbol, day))
+            if totals is None:
+                rollups[(row.user_id, row.symbol, day)] = values
+            else:
+                for field, value in values.items():
+                    totals[field] += value
+
+    rows = [
+        {"user_id": uid, "symbol": symbol, "day": day, **values}
+        for (uid, symbol, day), values in rollups.items()
+    ]
+    for offset in range(0, len(rows), chunk_size):
+        db.execute(insert(DailyTradeRollup), rows[offset:offset + chunk_size])
+    db.commit()
+
+    return len(rows)
+
+
+def _rollup_totals():
+    """Column expressions summing every rollup field."""
+    return [func.coalesce(func.sum(getattr(DailyTradeRollup, field)), 0).label(field) for field in ROLLUP_FIELDS]
+
+
+def _range_filter(query, user_id: int, start_date: Optional[date], end_date: Optional[date]):
+    """Restrict a rollup query to one user and an inclusive date range."""
+    query = query.where(DailyTradeRollup.user_id == user_id)
+    if start_date is not None:
+        query = query.where(DailyTradeRollup.day >= start_date)
+    if end_date is not None:
+        query = query.where(DailyTradeRollup.day <= end_date)
+    return query
+
+
+def _with_win_rate(totals: Dict[str, float]) -> Dict[str, float]:
+    """Add the win rate (percentage of closing trades with positive P&L)."""
+    closing = totals["closing_trades"]
+    totals["win_rate"] = (totals["winning_trades"] / closing * 100) if closing else 0.0
+    return totals
+
+
+def get_summary(db: Session, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+    """Total trading activity and results for a date range."""
+    query = _range_filter(select(*_rollup_totals()), user_id, start_date, end_date)
+    row = db.execute(query).one()
+    totals = _with_win_rate(dict(row._mapping))
+    totals.update(start_date=start_date, end_date=end_date)
+    return totals
+
+
+def get_symbol_breakdown(
+    db: Session,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> List[Dict]:
+    """Trading activity and results per symbol for a date range, largest notional first."""
+    query = select(DailyTradeRollup.symbol, *_rollup_totals())
+    query = _range_filter(query, user_id, start_date, end_date)
+    query = query.group_by(DailyTradeRollup.symbol).order_by(func.sum(DailyTradeRollup.notional).desc())
+    return [_with_win_rate(dict(row._mapping)) for row in db.execute(query)]
+
+
+def get_daily_series(
+    db: Session,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    symbol: Optional[str] = None
+) -> List[Dict]:
+    """Trading activity and results per day for a date range, optionally for one symbol."""
+    query = select(DailyTradeRollup.day, *_rollup_totals())
+    query = _range_filter(query, user_id, start_date, end_date)
+    if symbol is not None:
+        query = query.where(DailyTradeRollup.symbol == symbol)
+    query = query.group_by(DailyTradeRollup.day).order_by(DailyTradeRollup.day)
+    return [_with_win_rate(dict(row._mapping)) for row in db.execute(query)]
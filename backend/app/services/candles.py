@@ -0,0 +1,304 @@
+"""
+In-memory OHLCV candle store and chart-ready price history.
+Only 1m base candles are fetched from the exchange: page by page the first time a
+range is requested, afterwards only the newest ones. Every coarser timeframe
+(5m up to 1w) is aggregated locally from the base candles with vectorized
+reductions, cached, and brought up to date by re-aggregating only its last
+bucket when new base candles arrive. Charts ask for a time range and a point
+budget and get a downsampled close series, cached per (symbol, timeframe, range,
+points, method) until the underlying candles change.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from app.services.downsample import downsample
+from app.services.strategy_scheduler import TIMEFRAME_SECONDS as STRATEGY_TIMEFRAMES
+
+# ccxt-style fetch_ohlcv(symbol, timeframe, since_ms, limit) -> [[ts, o, h, l, c, v], ...]
+OhlcvFetcher = Callable[[str, str, Optional[int], int], List[list]]
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+# The only timeframe fetched from the exchange; all others are derived from it
+BASE_TIMEFRAME = "1m"
+TIMEFRAME_SECONDS = {**STRATEGY_TIMEFRAMES, "1w": 604800}
+TIMEFRAME_PATTERN = f"^({'|'.join(TIMEFRAME_SECONDS)})$"
+# Weekly candles open on Monday 00:00 UTC like the exchanges'; the epoch was a Thursday
+TIMEFRAME_OFFSET_MS = {"1w": 4 * 86400 * 1000}
+
+# Chart ranges: a count and a unit, e.g. 12h, 30d, 2w, 1y
+RANGE_PATTERN = r"^\d{1,3}[hdwy]$"
+RANGE_UNIT_SECONDS = {"h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+
+
+def parse_range(text: str) -> int:
+    """Length of a chart range in seconds."""
+    if not re.match(RANGE_PATTERN, text):
+        raise ValueError(f"Invalid range: {text}")
+    return int(text[:-1]) * RANGE_UNIT_SECONDS[text[-1]]
+
+
+class CandleSeries:
+    """Candles of one (symbol, timeframe) in timestamp order, one NumPy array per column."""
+
+    def __init__(self):
+        self.timestamp = np.empty(0, dtype=np.int64)
+        self.open = self.high = self.low = self.close = self.volume = np.empty(0, dtype=np.float64)
+        self.version = 0
+        self.loaded_from: Optional[int] = None
+        self.fetched_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def merge(self, rows: List[list]) -> None:
+        """Insert candles, replacing stored ones in the time span the rows cover."""
+        if not rows:
+            return
+        block = np.array(rows, dtype=np.float64)
+        timestamps = block[:, 0].astype(np.int64)
+        keep = (self.timestamp < timestamps[0]) | (self.timestamp > timestamps[-1])
+        merged = np.concatenate((self.timestamp[keep], timestamps))
+        order = np.argsort(merged, kind="stable")
+        self.timestamp = merged[order]
+        for column, name in enumerate(COLUMNS[1:], start=1):
+            setattr(self, name, np.concatenate((getattr(self, name)[keep], block[:, column]))[order])
+        self.version += 1
+
+    def window(self, start_ms: int, end_ms: int) -> slice:
+        """Positions of candles opening in [start_ms, end_ms]."""
+        return slice(
+            int(np.searchsorted(self.timestamp, start_ms, side="left")),
+            int(np.searchsorted(self.timestamp, end_ms, side="right"))
+        )
+
+    def columns(self, window: slice = slice(None)) -> Dict[str, np.ndarray]:
+        """Column arrays of the candles in window, by name."""
+        return {name: getattr(self, name)[window] for name in COLUMNS}
+
+    def replace_tail(self, position: int, columns: Dict[str, np.ndarray]) -> None:
+        """Drop the candles from position on and append columns in their place."""
+        for name in COLUMNS:
+            setattr(self, name, np.concatenate((getattr(self, name)[:position], columns[name])))
+        self.version += 1
+
+
+def resample(columns: Dict[str, np.ndarray], timeframe: str) -> Dict[str, np.ndarray]:
+    """
+    Aggregate candles into a coarser timeframe.
+    Candles are grouped by the bucket their open time falls in; each group becomes
+    one candle with the first open, highest high, lowest low, last close and
+    summed volume. Missing base candles simply leave their bucket shorter.
+
+    Args:
+        columns: Candles in timestamp order, as returned by CandleSeries.columns
+        timeframe: Target timeframe, a key of TIMEFRAME_SECONDS
+
+    Returns:
+        Aggregated columns; the last candle may cover a bucket that is still open
+    """
+    timestamp = columns["timestamp"]
+    if not len(timestamp):
+        return dict(columns)
+    step = TIMEFRAME_SECONDS[timeframe] * 1000
+    offset = TIMEFRAME_OFFSET_MS.get(timeframe, 0)
+    bucket = (timestamp - offset) // step
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    ends = np.append(starts[1:], len(timestamp)) - 1
+    return {
+        "timestamp": bucket[starts] * step + offset,
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": columns["close"][ends],
+        "volume": np.add.reduceat(columns["volume"], starts),
+    }
+
+
+class DerivedSeries(CandleSeries):
+    """Candles of a coarser timeframe aggregated from a base series and kept in step with it."""
+
+    def __init__(self, timeframe: str):
+        super().__init__()
+        self.timeframe = timeframe
+        self.base_version: Optional[int] = None
+        self.base_first: Optional[int] = None
+
+    def sync(self, base: CandleSeries) -> None:
+        """
+        Catch up with the base series.
+        The base only grows at the ends: new candles at the tail, backfilled history
+        at the head. New tail candles can only touch the last bucket, so just that
+        bucket is re-aggregated; backfill rebuilds the whole series.
+        """
+        if base.version == self.base_version:
+            return
+        first = int(base.timestamp[0]) if len(base) else None
+        if len(self) and first == self.base_first:
+            position = len(self) - 1
+            window = base.window(int(self.timestamp[position]), int(base.timestamp[-1]))
+        else:
+            position, window = 0, slice(None)
+        self.replace_tail(position, resample(base.columns(window), self.timeframe))
+        self.base_version = base.version
+        self.base_first = first
+
+
+class CandleStore:
+    """Base candles per symbol, loaded and extended on demand, and the timeframes derived from them."""
+
+    def __init__(
+        self,
+        fetch_ohlcv: OhlcvFetcher,
+        page_limit: int = 1000,
+        refresh_seconds: float = 15.0,
+        max_history_days: int = 365,
+        clock: Callable[[], float] = time.time
+    ):
+        self.fetch_ohlcv = fetch_ohlcv
+        self.page_limit = page_limit
+        self.refresh_seconds = refresh_seconds
+        self.max_history_days = max_history_days
+        self.clock = clock
+        self.series: Dict[str, CandleSeries] = {}
+        self.derived: Dict[Tuple[str, str], DerivedSeries] = {}
+        self.fetches = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _load(self, series: CandleSeries, symbol: str, since: int, until: int) -> None:
+        """Fetch base candles opening in [since, until) page by page and merge them."""
+        step = TIMEFRAME_SECONDS[BASE_TIMEFRAME] * 1000
+        rows: List[list] = []
+        while since < until:
+            page = await asyncio.to_thread(self.fetch_ohlcv, symbol, BASE_TIMEFRAME, since, self.page_limit)
+            self.fetches += 1
+            if not page:
+                break
+            rows.extend(page)
+            if len(page) < self.page_limit:
+                break
+            since = page[-1][0] + step
+        series.merge(rows)
+
+    async def base(self, symbol: str, start_ms: int) -> CandleSeries:
+        """
+        Base candles covering start_ms up to now.
+        Missing history is fetched once; the newest candles are re-fetched when a new
+        candle has opened or after refresh_seconds, whichever comes first.
+        """
+        async with self._locks.setdefault(symbol, asyncio.Lock()):
+            series = self.series.setdefault(symbol, CandleSeries())
+            step = TIMEFRAME_SECONDS[BASE_TIMEFRAME] * 1000
+            now = self.clock()
+            now_ms = int(now * 1000)
+
+            if series.loaded_from is None or start_ms < series.loaded_from:
+                until = series.loaded_from if series.loaded_from is not None else now_ms + step
+                await self._load(series, symbol, start_ms, until)
+                series.loaded_from = start_ms
+                if until > now_ms:
+                    series.fetched_at = now
+            if len(series) and (
+                now_ms >= int(series.timestamp[-1]) + step or now - series.fetched_at >= self.refresh_seconds
+            ):
+                await self._load(series, symbol, int(series.timestamp[-1]), now_ms + step)
+                series.fetched_at = now
+            return series
+
+    async def get(self, symbol: str, timeframe: str, start_ms: int) -> CandleSeries:
+        """
+        Candles of any timeframe covering start_ms up to now, at most max_history_days back.
+        Derived timeframes cost no upstream calls beyond keeping the base candles current.
+        """
+        now_ms = int(self.clock() * 1000)
+        start_ms = max(start_ms, now_ms - self.max_history_days * 86400 * 1000)
+        if timeframe != BASE_TIMEFRAME:
+            # Start on a bucket boundary so the first derived candle is complete
+            step = TIMEFRAME_SECONDS[timeframe] * 1000
+            start_ms -= (start_ms - TIMEFRAME_OFFSET_MS.get(timeframe, 0)) % step
+
+        base = await self.base(symbol, start_ms)
+        if timeframe == BASE_TIMEFRAME:
+            return base
+        derived = self.derived.setdefault((symbol, timeframe), DerivedSeries(timeframe))
+        derived.sync(base)
+        return derived
+
+
+class ChartSeries(NamedTuple):
+    """Close prices ready to plot."""
+    timeframe: str
+    timestamps: List[int]
+    prices: List[float]
+    source_points: int
+
+
+class ChartHistory:
+    """Downsampled close series served from a CandleStore, with an LRU result cache."""
+
+    def __init__(self, store: CandleStore, cache_size: int = 256, oversample: int = 4, max_points: int = 5000):
+        self.store = store
+        self.cache_size = cache_size
+        self.oversample = oversample
+        self.max_points = max_points
+        self.cache: "OrderedDict[tuple, Tuple[int, ChartSeries]]" = OrderedDict()
+
+    def pick_timeframe(self, range_seconds: int, points: int) -> str:
+        """Coarsest timeframe with at least oversample x points candles in the range."""
+        for timeframe, seconds in sorted(TIMEFRAME_SECONDS.items(), key=lambda item: -item[1]):
+            if range_seconds // seconds >= points * self.oversample:
+                return timeframe
+        return min(TIMEFRAME_SECONDS, key=TIMEFRAME_SECONDS.get)
+
+    async def get(
+        self,
+        symbol: str,
+        range_seconds: int,
+        points: Optional[int] = None,
+        method: str = "lttb",
+        timeframe: Optional[str] = None
+    ) -> ChartSeries:
+        """
+        Close prices over the last range_seconds.
+
+        Args:
+            symbol: Trading pair
+            range_seconds: Length of the range, ending at the newest candle
+            points: Point budget; None returns every candle, up to max_points
+            method: Downsampling method (lttb or minmax)
+            timeframe: Candle timeframe (default: picked from range and points)
+
+        Returns:
+            Timestamps and prices of the kept candles
+        """
+        if timeframe is None:
+            timeframe = self.pick_timeframe(range_seconds, points) if points else "1d"
+        range_ms = range_seconds * 1000
+        series = await self.store.get(symbol, timeframe, int(self.store.clock() * 1000) - range_ms)
+
+        key = (symbol, timeframe, range_seconds, points, method)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == series.version:
+            self.cache.move_to_end(key)
+            return cached[1]
+
+        # Anchor the range on the newest candle so the result only changes with the data
+        end_ms = int(series.timestamp[-1]) if len(series) else 0
+        window = series.window(end_ms - range_ms + 1, end_ms)
+        timestamps, closes = series.timestamp[window], series.close[window]
+        source_points = len(timestamps)
+        budget = points or self.max_points
+        if source_points > budget:
+            kept = downsample(timestamps, closes, budget, method)
+            timestamps, closes = timestamps[kept], closes[kept]
+        result = ChartSeries(timeframe, timestamps.tolist(), closes.tolist(), source_points)
+
+        self.cache[key] = (series.version, result)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
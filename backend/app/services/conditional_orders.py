@@ -0,0 +1,287 @@
+"""
+Resting stop-loss and take-profit orders.
+Pending conditional orders are held per symbol in two heaps: one for triggers
+that fire when the price rises to them and one for triggers that fire when it
+falls to them. A price update pops only the orders it crossed and releases them
+to the simulated fill path; their trade rows move from pending to filled. OCO
+siblings are cancelled when the other leg triggers.
+
+Every worker keeps its own book, so a triggered order is claimed with a
+conditional UPDATE (pending -> filled) before it is filled: only one worker wins,
+and an order cancelled or filled elsewhere is skipped. The book is reloaded every
+CONDITIONAL_ORDER_RELOAD_INTERVAL_SECONDS to arm orders placed through other workers.
+
+Trigger direction:
+    sell stop-loss, buy take-profit   -> fires when price <= trigger
+    buy stop-loss, sell take-profit   -> fires when price >= trigger
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Trade, OrderType, OrderSide, OrderStatus
+from app.services import orders
+from app.services.analytics import record_fills
+from app.services.events import EventBus, event_bus, publish_orders
+from app.services.risk import RiskEngine, risk_engine
+
+logger = logging.getLogger(__name__)
+
+RISING = 0
+FALLING = 1
+
+
+def trigger_direction(order_type: OrderType, side: OrderSide) -> int:
+    """Which way the price must move to trigger a conditional order."""
+    if (order_type == OrderType.STOP_LOSS) == (side == OrderSide.SELL):
+        return FALLING
+    return RISING
+
+
+class RestingOrder(NamedTuple):
+    """A conditional order waiting for its trigger."""
+    trade_id: int
+    symbol: str
+    direction: int
+    trigger: float
+    linked_id: Optional[int]
+
+
+class TriggerBook:
+    """
+    Per-symbol trigger heaps.
+    Cancelled orders are left in their heap and skipped when they surface; the heaps
+    are rebuilt once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self.rising: Dict[str, List[Tuple[float, int, int]]] = {}
+        self.falling: Dict[str, List[Tuple[float, int, int]]] = {}
+        self.orders: Dict[int, RestingOrder] = {}
+        self.sequence = 0
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def add(self, trade_id: int, symbol: str, direction: int, trigger: float, linked_id: Optional[int] = None) -> None:
+        """Start watching an order."""
+        self.orders[trade_id] = RestingOrder(trade_id, symbol, direction, trigger, linked_id)
+        self.sequence += 1
+        if direction == RISING:
+            heapq.heappush(self.rising.setdefault(symbol, []), (trigger, self.sequence, trade_id))
+        else:
+            heapq.heappush(self.falling.setdefault(symbol, []), (-trigger, self.sequence, trade_id))
+
+    def cancel(self, trade_id: int) -> Optional[RestingOrder]:
+        """Stop watching an order; returns it if it was resting."""
+        order = self.orders.pop(trade_id, None)
+        if order is not None:
+            self.stale += 1
+            if self.stale > 1024 and self.stale > len(self.orders):
+                self._compact()
+        return order
+
+    def _compact(self) -> None:
+        for heaps in (self.rising, self.falling):
+            for symbol, heap in list(heaps.items()):
+                live = [entry for entry in heap if entry[2] in self.orders]
+                if live:
+                    heapq.heapify(live)
+                    heaps[symbol] = live
+                else:
+                    del heaps[symbol]
+        self.stale = 0
+
+    def check(
+        self,
+        symbol: str,
+        low: float,
+        high: Optional[float] = None
+    ) -> Tuple[List[Tuple[RestingOrder, float]], List[RestingOrder]]:
+        """
+        Pop the orders crossed by a price (or a low/high range).
+
+        Args:
+            symbol: Trading pair
+            low: Price, or lowest price of the range
+            high: Highest price of the range (defaults to low)
+
+        Returns:
+            Tuple of ([(order, fill price)], cancelled OCO siblings). A single price
+            fills at that price; a range fills at the trigger, clamped into the range.
+        """
+        if high is None:
+            high = low
+        triggered: List[Tuple[RestingOrder, float]] = []
+        cancelled: List[RestingOrder] = []
+        orders_by_id = self.orders
+
+        heap = self.rising.get(symbol)
+        while heap and heap[0][0] <= high:
+            trigger, _, trade_id = heapq.heappop(heap)
+            order = orders_by_id.pop(trade_id, None)
+            if order is None:
+                self.stale -= 1
+                continue
+            triggered.append((order, max(trigger, low)))
+
+        heap = self.falling.get(symbol)
+        while heap and -heap[0][0] >= low:
+            negative, _, trade_id = heapq.heappop(heap)
+            order = orders_by_id.pop(trade_id, None)
+            if order is None:
+                self.stale -= 1
+                continue
+            triggered.append((order, min(-negative, high)))
+
+        # One leg of an OCO pair cancels the other, even if both were crossed
+        if triggered and any(order.linked_id is not None for order, _ in triggered):
+            popped = {order.trade_id: order for order, _ in triggered}
+            kept = []
+            for order, price in triggered:
+                if order.trade_id not in popped:
+                    continue
+                kept.append((order, price))
+                if order.linked_id is not None:
+                    sibling = self.cancel(order.linked_id) or popped.pop(order.linked_id, None)
+                    if sibling is not None:
+                        cancelled.append(sibling)
+            triggered = kept
+        return triggered, cancelled
+
+
+class ConditionalOrderMonitor:
+    """Watches pending conditional trades and fills them when their trigger is crossed."""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        risk: Optional[RiskEngine] = None,
+        clock: Callable[[], float] = time.time,
+        bus: Optional[EventBus] = None
+    ):
+        self.session_factory = session_factory
+        self.risk = risk or risk_engine
+        self.clock = clock
+        self.bus = bus or event_bus
+        self.book = TriggerBook()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, db: Session) -> int:
+        """Replace the book with every pending conditional trade in the database."""
+        self.book = TriggerBook()
+        pending = db.query(Trade).filter(
+            Trade.order_status == OrderStatus.PENDING,
+            Trade.order_type.in_(orders.CONDITIONAL_ORDER_TYPES)
+        ).order_by(Trade.id)
+        for trade in pending:
+            self.add_trade(trade)
+        return len(self.book)
+
+    def add_trade(self, trade: Trade) -> None:
+        """Rest a pending conditional trade; its price is the trigger."""
+        self.book.add(
+            trade.id,
+            trade.symbol,
+            trigger_direction(trade.order_type, trade.order_side),
+            trade.price,
+            trade.linked_trade_id
+        )
+
+    def symbols(self) -> Set[str]:
+        """Symbols with resting orders."""
+        return {order.symbol for order in self.book.orders.values()}
+
+    def cancel(self, trade_id: int) -> bool:
+        """Stop watching a trade (the caller updates its row)."""
+        return self.book.cancel(trade_id) is not None
+
+    async def on_price(self, symbol: str, low: float, high: Optional[float] = None) -> List[int]:
+        """
+        Fill every order crossed by a price update.
+
+        Args:
+            symbol: Trading pair
+            low: Price, or lowest price of the range
+            high: Highest price of the range (defaults to low)
+
+        Returns:
+            Ids of the trades filled
+        """
+        triggered, cancelled = self.book.check(symbol, low, high)
+        if not triggered and not cancelled:
+            return []
+
+        ids = [order.trade_id for order, _ in triggered]
+        cancelled_ids = [order.trade_id for order in cancelled]
+        db = self.session_factory()
+        try:
+            trades = orders.load_trades(db, ids + cancelled_ids)
+            executed_at = datetime.utcfromtimestamp(self.clock())
+            filled = []
+            for order, fill_price in triggered:
+                trade = trades.get(order.trade_id)
+                if trade is None or not orders.claim_pending(db, trade.id, OrderStatus.FILLED):
+                    continue  # Cancelled, or already filled by another worker
+                await orders.execute_order(trade, executed_at, fill_price)
+                filled.append(trade.id)
+            record_fills(db, [trades[trade_id] for trade_id in filled])
+            closed = []
+            for sibling in cancelled:
+                # Only the worker that filled a leg cancels its sibling
+                if sibling.linked_id in filled and orders.claim_pending(db, sibling.trade_id, OrderStatus.CANCELLED):
+                    closed.append(sibling.trade_id)
+            db.commit()
+
+            refreshed = orders.load_trades(db, filled + closed)
+            realized = {trade_id: self.risk.on_fill(refreshed[trade_id]) for trade_id in filled}
+            for trade_id in closed:
+                self.risk.release(trade_id)
+            await publish_orders(self.bus, [refreshed[trade_id] for trade_id in filled + closed], realized)
+            return filled
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to fill %d triggered orders on %s", len(ids), symbol)
+            # Put the orders back so the next update retries them
+            for order in [order for order, _ in triggered] + cancelled:
+                self.book.add(*order)
+            return []
+        finally:
+            db.close()
+
+    async def run(self, interval: float) -> None:
+        """Reload the pending conditional orders every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            db = self.session_factory()
+            try:
+                self.load(db)
+            except Exception:
+                logger.exception("Conditional order reload failed")
+            finally:
+                db.close()
+
+    def start(self, interval: float) -> None:
+        """Start periodic reloading on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic reloading."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global conditional order monitor
+order_monitor = ConditionalOrderMonitor()
@@ -0,0 +1,276 @@
+"""
+Envelope encryption of exchange API keys.
+Every stored api_key / api_secret value is encrypted with its own random data
+key (AES-256-GCM), and the data key is stored next to it wrapped by the master
+key. The master key is derived from CREDENTIAL_MASTER_KEY with scrypt once per
+process, so opening a value costs two AES-GCM operations rather than a KDF run.
+Rotating the master key only re-wraps the data keys (rewrap_api_keys.py); keys
+listed in CREDENTIAL_PREVIOUS_MASTER_KEYS keep opening values until then.
+
+Stored values look like enc:v1:<master key id>:<wrapped data key>:<ciphertext>,
+with the user id and column bound in as associated data, so a value copied to
+another row or column does not open. Values without the prefix are plaintext
+from before encryption and are returned as they are.
+
+CREDENTIAL_MASTER_KEY has to be a random secret of its own (see .env.example): the
+placeholder default is public, so outside debug mode the app refuses to start with
+it. The scrypt salt is a fixed constant because the derived key must be the same
+in every worker and after every restart; that is safe for a random key, which a
+salt would not make any harder to guess, but it gives no protection to a weak
+passphrase.
+
+Decrypted credentials are kept in a bounded cache in process memory and dropped
+CREDENTIAL_CACHE_TTL_SECONDS after they were opened. An entry only answers for
+the exact ciphertext it was opened from, so a rotated key is never served stale,
+even when another worker rotated it; rotation and deactivation also drop the
+entry right away. Nothing decrypted is logged, written to disk or shown in reprs.
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from app.config import settings
+from app.models import ExchangeAPIKey
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "enc:v1:"
+NONCE_SIZE = 12
+
+# scrypt cost: ~32 MB and a few hundred ms, paid once per process and master key.
+# The salt is fixed so every process derives the same key (see the module docstring).
+KDF_SALT = b"crypto-trading-bot/exchange-api-keys"
+KDF_N = 2 ** 15
+KDF_R = 8
+KDF_P = 1
+
+
+class CredentialError(Exception):
+    """A stored value that cannot be decrypted: unknown master key, tampering or a copied value."""
+
+
+class Credentials(NamedTuple):
+    api_key: str
+    api_secret: str
+
+    def __repr__(self) -> str:
+        return f"Credentials(api_key={mask(self.api_key)!r}, api_secret='***')"
+
+
+class CacheEntry(NamedTuple):
+    sealed: Tuple[str, str]  # The stored values the credentials were opened from
+    expires: float
+    credentials: Credentials
+
+
+def mask(value: str) -> str:
+    """A key shown as its last four characters."""
+    return "****" + value[-4:] if len(value) > 8 else "****"
+
+
+def check_master_key() -> None:
+    """
+    Refuse the placeholder CREDENTIAL_MASTER_KEY: anyone with the source could
+    open the stored API keys. In debug mode this is only logged as an error.
+
+    Raises:
+        RuntimeError: If the placeholder key is set and debug mode is off
+    """
+    if not settings.credential_master_key_is_default:
+        return
+    message = (
+        "CREDENTIAL_MASTER_KEY is the placeholder from the source; set a random key, e.g. "
+        "python -c \"import secrets; print(secrets.token_urlsafe(32))\""
+    )
+    if not settings.debug:
+        raise RuntimeError(message)
+    logger.error(message)
+
+
+def derive_master_key(passphrase: str) -> bytes:
+    return hashlib.scrypt(
+        passphrase.encode(), salt=KDF_SALT, n=KDF_N, r=KDF_R, p=KDF_P, maxmem=64 * 1024 * 1024, dklen=32
+    )
+
+
+def _context(user_id: int, column: str) -> bytes:
+    return f"exchange_api_keys:{user_id}:{column}".encode()
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _encrypt(key: bytes, plaintext: bytes, context: bytes) -> bytes:
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + AESGCM(key).encrypt(nonce, plaintext, context)
+
+
+def _decrypt(key: bytes, data: bytes, context: bytes) -> bytes:
+    return AESGCM(key).decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], context)
+
+
+class CredentialVault:
+    """Seals and opens API key columns; caches opened credentials by key id."""
+
+    def __init__(
+        self,
+        master_key: str,
+        previous_master_keys: Sequence[str] = (),
+        cache_size: int = 10000,
+        cache_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if not master_key:
+            raise ValueError("A master key is required")
+        self._passphrases = [master_key, *previous_master_keys]
+        self._master_keys: Optional[Dict[str, bytes]] = None
+        self.current_id: Optional[str] = None
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self.cache: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _keys(self) -> Dict[str, bytes]:
+        """Master keys by id, the current one first; derived on first use."""
+        if self._master_keys is None:
+            keys = {}
+            for passphrase in self._passphrases:
+                key = derive_master_key(passphrase)
+                keys.setdefault(hmac.new(key, b"key id", hashlib.sha256).hexdigest()[:8], key)
+            self.current_id = next(iter(keys))
+            self._master_keys = keys
+        return self._master_keys
+
+    def unlock(self) -> None:
+        """Derive the master keys now rather than on the first key opened."""
+        self._keys()
+
+    # Single values
+
+    def seal(self, plaintext: str, user_id: int, column: str) -> str:
+        """Encrypt one column value under a new data key."""
+        keys = self._keys()
+        context = _context(user_id, column)
+        data_key = AESGCM.generate_key(bit_length=256)
+        wrapped = _encrypt(keys[self.current_id], data_key, context)
+        ciphertext = _encrypt(data_key, plaintext.encode(), context)
+        return f"{PREFIX}{self.current_id}:{_encode(wrapped)}:{_encode(ciphertext)}"
+
+    def _data_key(self, sealed: str, context: bytes) -> Tuple[bytes, str]:
+        """Unwrapped data key and the still encoded ciphertext of a sealed value."""
+        try:
+            key_id, wrapped, ciphertext = sealed[len(PREFIX):].split(":")
+            master_key = self._keys().get(key_id)
+            if master_key is None:
+                raise CredentialError(f"Sealed with unknown master key {key_id}")
+            return _decrypt(master_key, _decode(wrapped), context), ciphertext
+        except (ValueError, InvalidTag) as e:
+            raise CredentialError(f"Cannot decrypt {context.decode()}") from e
+
+    def open(self, sealed: str, user_id: int, column: str) -> str:
+        """Decrypt one column value; plaintext from before encryption is returned as is."""
+        if not sealed.startswith(PREFIX):
+            return sealed
+        context = _context(user_id, column)
+        data_key, ciphertext = self._data_key(sealed, context)
+        try:
+            return _decrypt(data_key, _decode(ciphertext), context).decode()
+        except (ValueError, InvalidTag) as e:
+            raise CredentialError(f"Cannot decrypt {context.decode()}") from e
+
+    def is_current(self, sealed: str) -> bool:
+        """Whether a value is sealed under the current master key."""
+        self._keys()
+        return sealed.startswith(f"{PREFIX}{self.current_id}:")
+
+    def rewrap(self, sealed: str, user_id: int, column: str) -> str:
+        """
+        The value with its data key wrapped by the current master key; the
+        ciphertext itself is kept. Plaintext values are sealed.
+        """
+        if not sealed.startswith(PREFIX):
+            return self.seal(sealed, user_id, column)
+        if self.is_current(sealed):
+            return sealed
+        context = _context(user_id, column)
+        data_key, ciphertext = self._data_key(sealed, context)
+        wrapped = _encrypt(self._keys()[self.current_id], data_key, context)
+        return f"{PREFIX}{self.current_id}:{_encode(wrapped)}:{ciphertext}"
+
+    # API key rows
+
+    def seal_columns(self, user_id: int, api_key: str, api_secret: str) -> Dict[str, str]:
+        """Column values for storing a key pair."""
+        return {
+            "api_key": self.seal(api_key, user_id, "api_key"),
+            "api_secret": self.seal(api_secret, user_id, "api_secret"),
+        }
+
+    def credentials(self, key: ExchangeAPIKey) -> Credentials:
+        """
+        Decrypted credentials of an API key row, from the cache while the row
+        still holds the values they were opened from and the entry is fresh.
+
+        Raises:
+            CredentialError: If the stored values cannot be decrypted
+        """
+        sealed = (key.api_key, key.api_secret)
+        now = self.clock()
+        self.purge(now)
+        entry = self.cache.get(key.id)
+        if entry is not None and entry.sealed == sealed:
+            self.hits += 1
+            return entry.credentials
+
+        self.misses += 1
+        credentials = Credentials(
+            self.open(key.api_key, key.user_id, "api_key"),
+            self.open(key.api_secret, key.user_id, "api_secret")
+        )
+        if self.cache_size > 0:
+            # Kept in the order opened, so the oldest entry is both the first to expire and to evict
+            self.cache.pop(key.id, None)
+            self.cache[key.id] = CacheEntry(sealed, now + self.cache_ttl, credentials)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return credentials
+
+    def purge(self, now: Optional[float] = None) -> None:
+        """Drop expired entries."""
+        now = self.clock() if now is None else now
+        cache = self.cache
+        while cache and next(iter(cache.values())).expires <= now:
+            cache.popitem(last=False)
+
+    def invalidate(self, key_id: int) -> None:
+        """Forget a key's decrypted credentials (rotation, deactivation)."""
+        self.cache.pop(key_id, None)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+
+# Global credential vault
+credential_vault = CredentialVault(
+    settings.credential_master_key,
+    settings.credential_previous_master_key_list,
+    cache_size=settings.credential_cache_size,
+    cache_ttl=settings.credential_cache_ttl_seconds
+)
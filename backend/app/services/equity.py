@@ -0,0 +1,393 @@
+"""
+Portfolio equity curves from a user's fills and stored candle closes.
+Fills are replayed once in time order with the same average-cost rules as the
+portfolio holdings, giving the position after every fill. The curve is then
+evaluated on a time grid with searchsorted lookups into those per-fill arrays and
+into each asset's closes, so every grid point costs a few array operations.
+
+Replay state is checkpointed at fixed UTC boundaries (EquitySnapshot). A request
+resumes from the newest valid checkpoint before its range and only replays the
+fills after it.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app.models import EquitySnapshot, OrderSide, OrderStatus, Trade
+from app.services.analytics import apply_average_cost, base_asset
+from app.services.candles import TIMEFRAME_OFFSET_MS, TIMEFRAME_SECONDS, CandleStore
+
+logger = logging.getLogger(__name__)
+
+QUOTE_CURRENCY = "USDT"
+
+# Default resolution: the coarsest timeframe giving at least this many points
+MIN_DEFAULT_POINTS = 200
+
+# Time a fill is accounted to
+FILL_TIME = func.coalesce(Trade.executed_at, Trade.created_at)
+
+
+def to_ms(timestamp: datetime) -> int:
+    """Epoch milliseconds of a datetime; naive datetimes are UTC."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def from_ms(timestamp_ms: int) -> datetime:
+    """Naive UTC datetime of epoch milliseconds."""
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def default_resolution(range_seconds: int) -> str:
+    """Coarsest timeframe with at least MIN_DEFAULT_POINTS bars in the range."""
+    for timeframe, seconds in sorted(TIMEFRAME_SECONDS.items(), key=lambda item: -item[1]):
+        if range_seconds // seconds >= MIN_DEFAULT_POINTS:
+            return timeframe
+    return min(TIMEFRAME_SECONDS, key=TIMEFRAME_SECONDS.get)
+
+
+class Fill(NamedTuple):
+    """A filled trade as seen by the replay."""
+    time_ms: int
+    asset: str
+    side: OrderSide
+    quantity: float
+    price: float
+    fee: float
+
+
+class EquityState:
+    """Positions and cumulative results after a prefix of a user's fills."""
+
+    def __init__(
+        self,
+        positions: Optional[Dict[str, Tuple[float, float]]] = None,
+        realized: float = 0.0,
+        last_prices: Optional[Dict[str, float]] = None
+    ):
+        self.positions = positions or {}  # asset -> (quantity, average price)
+        self.realized = realized
+        self.last_prices = last_prices or {}  # asset -> price of its latest fill
+
+    def copy(self) -> "EquityState":
+        return EquityState(dict(self.positions), self.realized, dict(self.last_prices))
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "positions": {asset: list(position) for asset, position in self.positions.items()},
+            "realized": self.realized,
+            "last_prices": self.last_prices,
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "EquityState":
+        data = json.loads(text)
+        positions = {asset: (quantity, average) for asset, (quantity, average) in data["positions"].items()}
+        return cls(positions, data["realized"], data["last_prices"])
+
+
+class AssetFills:
+    """Per-fill arrays of one asset: fill time and the position right after the fill."""
+
+    def __init__(self, times: List[int], quantities: List[float], costs: List[float], prices: List[float]):
+        self.times = np.array(times, dtype=np.int64)
+        self.quantities = np.array(quantities, dtype=np.float64)
+        self.costs = np.array(costs, dtype=np.float64)
+        self.prices = np.array(prices, dtype=np.float64)
+
+
+class Replay(NamedTuple):
+    """Result of replaying fills on top of a starting state."""
+    start: EquityState
+    end: EquityState
+    times: np.ndarray  # Fill times, ms
+    realized: np.ndarray  # Cumulative realized P&L after each fill
+    assets: Dict[str, AssetFills]
+    checkpoints: List[Tuple[int, int, EquityState]]  # (boundary ms, fills covered, state)
+
+
+def replay_fills(
+    start: EquityState,
+    fills: List[Fill],
+    start_count: int = 0,
+    interval_ms: Optional[int] = None,
+    now_ms: Optional[int] = None
+) -> Replay:
+    """
+    Apply fills in order and record the state after each one.
+
+    Args:
+        start: State before the first fill (not modified)
+        fills: Fills in time order
+        start_count: Fills already covered by start
+        interval_ms: Checkpoint boundary spacing; None takes no checkpoints
+        now_ms: Only boundaries up to this time are checkpointed
+
+    Returns:
+        Per-fill arrays plus the state at each boundary that follows a fill
+    """
+    state = start.copy()
+    times = np.empty(len(fills), dtype=np.int64)
+    realized = np.empty(len(fills), dtype=np.float64)
+    columns: Dict[str, Tuple[list, list, list, list]] = {}
+    checkpoints = []
+
+    for index, fill in enumerate(fills):
+        quantity, average = state.positions.get(fill.asset, (0.0, 0.0))
+        quantity, average, pnl = apply_average_cost(quantity, average, fill.side, fill.quantity, fill.price, fill.fee)
+        state.positions[fill.asset] = (quantity, average)
+        state.realized += pnl
+        state.last_prices[fill.asset] = fill.price
+        times[index] = fill.time_ms
+        realized[index] = state.realized
+
+        asset_times, quantities, costs, prices = columns.setdefault(fill.asset, ([], [], [], []))
+        asset_times.append(fill.time_ms)
+        quantities.append(quantity)
+        costs.append(quantity * average)
+        prices.append(fill.price)
+
+        if interval_ms:
+            # First boundary at or after the fill; checkpoint once all fills up to it are applied
+            boundary = -(-fill.time_ms // interval_ms) * interval_ms
+            last_before_boundary = index + 1 == len(fills) or fills[index + 1].time_ms > boundary
+            if last_before_boundary and (now_ms is None or boundary <= now_ms):
+                checkpoints.append((boundary, start_count + index + 1, state.copy()))
+
+    assets = {asset: AssetFills(*lists) for asset, lists in columns.items()}
+    return Replay(start, state, times, realized, assets, checkpoints)
+
+
+def held_assets(replay: Replay, since_ms: int) -> List[str]:
+    """Assets with a nonzero position at some time from since_ms on."""
+    held = []
+    for asset in set(replay.start.positions) | set(replay.assets):
+        quantity = replay.start.positions.get(asset, (0.0, 0.0))[0]
+        fills = replay.assets.get(asset)
+        later = False
+        if fills is not None:
+            applied = int(np.searchsorted(fills.times, since_ms, side="right"))
+            if applied:
+                quantity = fills.quantities[applied - 1]
+            later = bool(fills.quantities[applied:].any())
+        if quantity or later:
+            held.append(asset)
+    return sorted(held)
+
+
+def equity_curve(
+    replay: Replay,
+    grid: np.ndarray,
+    closes: Dict[str, Tuple[np.ndarray, np.ndarray]]
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate holdings value and P&L at each grid time.
+
+    Args:
+        replay: Replayed fills
+        grid: Valuation times, ms, ascending
+        closes: asset -> (times each close became known, close prices); assets
+            without closes are valued at their latest fill price
+
+    Returns:
+        Arrays timestamp, value, cost_basis, realized_profit_loss,
+        unrealized_profit_loss and profit_loss, one entry per grid time
+    """
+    start = replay.start
+    value = np.zeros(len(grid))
+    cost_basis = np.zeros(len(grid))
+    for asset in set(start.positions) | set(replay.assets):
+        quantity, average = start.positions.get(asset, (0.0, 0.0))
+        fills = replay.assets.get(asset)
+        if fills is None:
+            quantities = np.full(len(grid), quantity)
+            costs = np.full(len(grid), quantity * average)
+            marks = np.full(len(grid), start.last_prices.get(asset, average))
+        else:
+            # Number of the asset's fills applied at each grid time; 0 means the starting position
+            applied = np.searchsorted(fills.times, grid, side="right")
+            quantities = np.concatenate(([quantity], fills.quantities))[applied]
+            costs = np.concatenate(([quantity * average], fills.costs))[applied]
+            marks = np.concatenate(([start.last_prices.get(asset, average)], fills.prices))[applied]
+
+        if asset == QUOTE_CURRENCY:
+            marks = np.ones(len(grid))
+        elif asset in closes:
+            close_times, close_prices = closes[asset]
+            latest = np.searchsorted(close_times, grid, side="right") - 1
+            marks = np.where(latest >= 0, close_prices[np.maximum(latest, 0)], marks)
+
+        value += np.where(quantities != 0, quantities * marks, 0.0)
+        cost_basis += costs
+
+    realized = np.concatenate(([start.realized], replay.realized))[np.searchsorted(replay.times, grid, side="right")]
+    unrealized = value - cost_basis
+    return {
+        "timestamp": grid,
+        "value": value,
+        "cost_basis": cost_basis,
+        "realized_profit_loss": realized,
+        "unrealized_profit_loss": unrealized,
+        "profit_loss": realized + unrealized,
+    }
+
+
+def _fill_count(db: Session, user_id: int, until: datetime) -> int:
+    """Number of the user's fills at or before until."""
+    query = select(func.count()).select_from(Trade).where(
+        Trade.user_id == user_id,
+        Trade.order_status == OrderStatus.FILLED,
+        FILL_TIME <= until
+    )
+    return db.execute(query).scalar_one()
+
+
+def resume_point(db: Session, user_id: int, before: datetime) -> Optional[EquitySnapshot]:
+    """
+    Newest checkpoint at or before a time that still covers every fill up to it.
+    A checkpoint with a different fill count has had fills recorded behind it
+    (journal recovery, imports); it and every later checkpoint are dropped.
+    """
+    while True:
+        snapshot = db.query(EquitySnapshot).filter(
+            EquitySnapshot.user_id == user_id,
+            EquitySnapshot.taken_at <= before
+        ).order_by(EquitySnapshot.taken_at.desc()).first()
+        if snapshot is None or _fill_count(db, user_id, snapshot.taken_at) == snapshot.fill_count:
+            return snapshot
+        logger.info("Dropping stale equity checkpoints of user %s from %s", user_id, snapshot.taken_at)
+        db.execute(delete(EquitySnapshot).where(
+            EquitySnapshot.user_id == user_id,
+            EquitySnapshot.taken_at >= snapshot.taken_at
+        ))
+
+
+def load_fills(db: Session, user_id: int, after: Optional[datetime] = None) -> List[Fill]:
+    """The user's fills after a time (all when None), in time order."""
+    query = select(
+        Trade.symbol,
+        Trade.order_side,
+        Trade.filled_quantity,
+        Trade.average_price,
+        Trade.fee,
+        FILL_TIME.label("fill_time")
+    ).where(Trade.user_id == user_id, Trade.order_status == OrderStatus.FILLED)
+    if after is not None:
+        query = query.where(FILL_TIME > after)
+    query = query.order_by(FILL_TIME, Trade.id)
+    return [
+        Fill(
+            to_ms(row.fill_time),
+            base_asset(row.symbol),
+            row.order_side,
+            row.filled_quantity or 0.0,
+            row.average_price or 0.0,
+            row.fee or 0.0
+        )
+        for row in db.execute(query)
+    ]
+
+
+def save_checkpoints(db: Session, user_id: int, replay: Replay) -> int:
+    """Store the replay's checkpoints, correcting existing ones; returns the number written."""
+    if not replay.checkpoints:
+        return 0
+    existing = {
+        to_ms(snapshot.taken_at): snapshot
+        for snapshot in db.query(EquitySnapshot).filter(
+            EquitySnapshot.user_id == user_id,
+            EquitySnapshot.taken_at >= from_ms(replay.checkpoints[0][0])
+        )
+    }
+    written = 0
+    for boundary, fill_count, state in replay.checkpoints:
+        snapshot = existing.get(boundary)
+        if snapshot is None:
+            db.add(EquitySnapshot(
+                user_id=user_id, taken_at=from_ms(boundary), fill_count=fill_count, state=state.to_json()
+            ))
+        elif snapshot.fill_count != fill_count:
+            snapshot.fill_count = fill_count
+            snapshot.state = state.to_json()
+        else:
+            continue
+        written += 1
+    return written
+
+
+class EquityCurve(NamedTuple):
+    """Equity series plus how it was computed."""
+    points: Dict[str, np.ndarray]
+    checkpoint_at: Optional[datetime]
+    replayed_fills: int
+
+
+async def get_equity_curve(
+    db: Session,
+    user_id: int,
+    store: CandleStore,
+    range_seconds: int,
+    resolution: str,
+    interval_hours: int = 24,
+    max_points: int = 5000
+) -> EquityCurve:
+    """
+    Holdings value and P&L of a user over the last range_seconds.
+
+    Args:
+        db: Database session
+        user_id: User whose fills are replayed
+        store: Candle store the closes are read from
+        range_seconds: Length of the range, ending now
+        resolution: Candle timeframe of the grid
+        interval_hours: Checkpoint spacing
+        max_points: Largest grid accepted
+
+    Returns:
+        One point per bar close in the range plus the current value
+
+    Raises:
+        ValueError: The range has more than max_points bars at this resolution
+    """
+    step = TIMEFRAME_SECONDS[resolution] * 1000
+    now_ms = int(store.clock() * 1000)
+    start_ms = now_ms - range_seconds * 1000
+    first_open = start_ms - (start_ms - TIMEFRAME_OFFSET_MS.get(resolution, 0)) % step
+    if (now_ms - first_open) // step > max_points:
+        raise ValueError(f"More than {max_points} points; use a coarser resolution")
+    grid = np.append(np.arange(first_open + step, now_ms, step, dtype=np.int64), now_ms)
+
+    snapshot = resume_point(db, user_id, from_ms(first_open))
+    start = EquityState.from_json(snapshot.state) if snapshot is not None else EquityState()
+    fills = load_fills(db, user_id, snapshot.taken_at if snapshot is not None else None)
+    replay = replay_fills(
+        start,
+        fills,
+        start_count=snapshot.fill_count if snapshot is not None else 0,
+        interval_ms=interval_hours * 3600 * 1000,
+        now_ms=now_ms
+    )
+    save_checkpoints(db, user_id, replay)
+    db.commit()
+
+    held = [asset for asset in held_assets(replay, first_open) if asset != QUOTE_CURRENCY]
+    series = await asyncio.gather(
+        *(store.get(f"{asset}/{QUOTE_CURRENCY}", resolution, first_open) for asset in held),
+        return_exceptions=True
+    )
+    closes = {}
+    for asset, result in zip(held, series):
+        if isinstance(result, Exception):
+            logger.warning("No closes for %s, valuing at fill prices: %s", asset, result)
+        elif len(result):
+            # A close is known once its bar ends; the open bar's latest price is known now
+            closes[asset] = (np.minimum(result.timestamp + step, now_ms), result.close)
+
+    return EquityCurve(equity_curve(replay, grid, closes), snapshot.taken_at if snapshot else None, len(fills))
@@ -0,0 +1,469 @@
+"""
+In-process event bus.
+Producers publish typed events on five topics: ticker, candle_close, fill,
+order_update and alert. Every subscriber of a topic gets each event in its own
+bounded queue, so a slow consumer only holds up producers if it subscribed with
+'block'.
+Per subscriber, what happens to a full queue is set by its policy:
+
+    drop_oldest      the oldest queued event is discarded
+    coalesce_latest  the queue keeps one event per key (symbol for tickers, symbol
+                     and timeframe for candles, trade or alert id otherwise); a
+                     newer event replaces the queued one in its place in line, and
+                     a new key on a full queue discards the oldest key
+    block            publish waits until the subscriber has taken events; other
+                     publishes to the topic queue up behind it, so every
+                     subscriber still gets the topic's events in order
+
+Delivery is a queue append per subscriber plus waking the consumers that are
+waiting. Consumers take events one at a time or in batches. Per topic the bus
+counts events published (and the rate over the last second), delivered,
+dropped, coalesced and consumed, the time producers spent blocked, and the lag
+of events when consumers took them.
+
+The replay engine runs on a bus of its own, so replayed events never reach the
+live subscribers.
+"""
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+from app.config import settings
+from app.models import Trade
+
+POLICIES = ("drop_oldest", "coalesce_latest", "block")
+DROP_OLDEST, COALESCE_LATEST, BLOCK = POLICIES
+
+
+class Ticker(NamedTuple):
+    symbol: str
+    price: float
+    timestamp: Optional[int]  # Exchange timestamp, epoch ms
+
+
+class CandleClose(NamedTuple):
+    symbol: str
+    timeframe: str
+    candle: List  # [timestamp ms, open, high, low, close, volume]
+
+
+class Fill(NamedTuple):
+    trade_id: int
+    user_id: int
+    strategy_id: Optional[int]
+    symbol: str
+    side: str
+    order_type: str
+    quantity: float
+    price: float
+    fee: float
+    realized_profit_loss: float
+    executed_at: Optional[str]  # ISO 8601
+
+
+class OrderUpdate(NamedTuple):
+    trade_id: int
+    user_id: int
+    strategy_id: Optional[int]
+    symbol: str
+    side: str
+    order_type: str
+    status: str
+    quantity: float
+    filled_quantity: float
+    price: Optional[float]
+
+
+class AlertTriggered(NamedTuple):
+    alert_id: int
+    user_id: int
+    symbol: str
+    alert_type: str
+    target_price: float
+    price: float  # Price that crossed the target
+    message: Optional[str]
+    triggered_at: str  # ISO 8601
+
+
+class Topic(NamedTuple):
+    """A topic's payload type and the key coalescing subscribers keep one event per."""
+    name: str
+    payload: type
+    key: Callable[[Any], Hashable]
+
+
+TOPICS: Dict[str, Topic] = {
+    topic.name: topic for topic in (
+        Topic("ticker", Ticker, attrgetter("symbol")),
+        Topic("candle_close", CandleClose, attrgetter("symbol", "timeframe")),
+        Topic("fill", Fill, attrgetter("trade_id")),
+        Topic("order_update", OrderUpdate, attrgetter("trade_id")),
+        Topic("alert", AlertTriggered, attrgetter("alert_id")),
+    )
+}
+
+
+class Event(NamedTuple):
+    topic: str
+    sequence: int  # Per topic, from 1
+    published: float  # time.monotonic() at publish
+    data: Any
+
+
+class SubscriptionClosed(Exception):
+    """Raised by Subscription.get* once the subscription is closed and drained."""
+
+
+class Subscription:
+    """One consumer's bounded queue on a topic."""
+
+    def __init__(self, channel: "Channel", maxsize: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        if maxsize < 1:
+            raise ValueError("Subscription queues hold at least one event")
+        self.channel = channel
+        self.topic = channel.topic.name
+        self.maxsize = maxsize
+        self.policy = policy
+        # Events in order; keyed by coalescing key for coalesce_latest
+        self.queue = {} if policy == COALESCE_LATEST else deque()
+        self.closed = False
+        self.waiter: Optional[asyncio.Future] = None  # Consumer waiting for events
+        self.space: Optional[asyncio.Future] = None  # Producers waiting for room
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.consumed = 0
+        self.lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        try:
+            return await self.get()
+        except SubscriptionClosed:
+            raise StopAsyncIteration
+
+    async def get(self) -> Event:
+        """Next event, waiting for one."""
+        return (await self.get_batch(1))[0]
+
+    async def get_batch(self, limit: int = 256) -> List[Event]:
+        """Up to limit queued events, oldest first, waiting until there is at least one."""
+        while not self.queue:
+            if self.closed:
+                raise SubscriptionClosed(self.topic)
+            waiter = self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await waiter
+            finally:
+                self.waiter = None
+        return self._take(limit)
+
+    def get_nowait(self, limit: int = 256) -> List[Event]:
+        """Up to limit queued events without waiting; empty if there are none."""
+        return self._take(limit) if self.queue else []
+
+    def _take(self, limit: int) -> List[Event]:
+        queue = self.queue
+        if self.policy == COALESCE_LATEST:
+            keys = list(queue)[:limit]
+            events = [queue.pop(key) for key in keys]
+        elif len(queue) <= limit:
+            events = list(queue)
+            queue.clear()
+        else:
+            popleft = queue.popleft
+            events = [popleft() for _ in range(limit)]
+
+        published = [event.published for event in events]
+        now = time.monotonic()
+        self.consumed += len(events)
+        self.lag_seconds += now * len(events) - sum(published)
+        lag = now - min(published)
+        if lag > self.max_lag_seconds:
+            self.max_lag_seconds = lag
+        if self.space is not None and not self.space.done():
+            self.space.set_result(None)
+        return events
+
+    def close(self) -> None:
+        """Stop receiving events; a waiting consumer gets what is queued, then SubscriptionClosed."""
+        if self.closed:
+            return
+        self.closed = True
+        self.channel.remove(self)
+        for future in (self.waiter, self.space):
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+class Channel:
+    """Subscribers and counters of one topic."""
+
+    def __init__(self, topic: Topic):
+        self.topic = topic
+        self.subscribers: List[Subscription] = []
+        self.coalescing = 0  # Subscribers with coalesce_latest
+        self.published = 0
+        self.blocked = 0  # Deliveries that waited for room
+        self.blocked_seconds = 0.0
+        # Publishes waiting for a full blocking subscriber, or queued behind one, take turns on the lock
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+        self.rate = 0.0  # Events per second over the last full window
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        # Counters of closed subscriptions
+        self.retired = {"delivered": 0, "dropped": 0, "coalesced": 0, "consumed": 0, "lag_seconds": 0.0}
+        self.max_lag_seconds = 0.0
+
+    def remove(self, subscription: Subscription) -> None:
+        if subscription in self.subscribers:
+            # Copy on write, so a delivery loop in progress keeps its list
+            self.subscribers = [item for item in self.subscribers if item is not subscription]
+            self.coalescing -= subscription.policy == COALESCE_LATEST
+            for name in self.retired:
+                self.retired[name] += getattr(subscription, name)
+            self.max_lag_seconds = max(self.max_lag_seconds, subscription.max_lag_seconds)
+
+    def count(self, events: int, now: float) -> None:
+        """Add published events to the rate window."""
+        self.window_count += events
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.rate = self.window_count / elapsed
+            self.window_start = now
+            self.window_count = 0
+
+    def deliver(self, event: Event) -> Optional[List[Subscription]]:
+        """Queue an event for every subscriber; returns the blocking subscribers that are full."""
+        blocked = None
+        key = None
+        if self.coalescing:
+            key = self.topic.key(event.data)
+        for subscription in self.subscribers:
+            queue = subscription.queue
+            policy = subscription.policy
+            if policy == DROP_OLDEST:
+                if len(queue) >= subscription.maxsize:
+                    queue.popleft()
+                    subscription.dropped += 1
+                queue.append(event)
+            elif policy == COALESCE_LATEST:
+                if key in queue:
+                    subscription.coalesced += 1
+                elif len(queue) >= subscription.maxsize:
+                    del queue[next(iter(queue))]
+                    subscription.dropped += 1
+                queue[key] = event
+            elif len(queue) >= subscription.maxsize:
+                if blocked is None:
+                    blocked = []
+                blocked.append(subscription)
+                continue
+            else:
+                queue.append(event)
+            subscription.delivered += 1
+            waiter = subscription.waiter
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+        return blocked
+
+
+class EventBus:
+    """Topics, their subscribers and metrics."""
+
+    def __init__(self, queue_size: int = 1024):
+        self.queue_size = queue_size
+        self.channels: Dict[str, Channel] = {name: Channel(topic) for name, topic in TOPICS.items()}
+
+    def _channel(self, topic: str) -> Channel:
+        channel = self.channels.get(topic)
+        if channel is None:
+            raise ValueError(f"Unknown topic {topic!r}; expected one of {', '.join(TOPICS)}")
+        return channel
+
+    def subscribe(self, topic: str, policy: str = DROP_OLDEST, maxsize: Optional[int] = None) -> Subscription:
+        """
+        Subscribe to a topic.
+
+        Args:
+            topic: Topic name
+            policy: drop_oldest, coalesce_latest or block
+            maxsize: Queue bound (default EVENT_QUEUE_SIZE)
+
+        Returns:
+            Subscription; close it (or use it as a context manager) when done
+        """
+        channel = self._channel(topic)
+        subscription = Subscription(channel, maxsize or self.queue_size, policy)
+        channel.subscribers = channel.subscribers + [subscription]
+        channel.coalescing += policy == COALESCE_LATEST
+        return subscription
+
+    async def publish(self, topic: str, data: Any) -> None:
+        """Publish one event; only waits if a blocking subscriber is full."""
+        await self.publish_many(topic, (data,))
+
+    async def publish_many(self, topic: str, items) -> None:
+        """Publish several events of a topic, in order."""
+        channel = self._channel(topic)
+        now = time.monotonic()
+        if channel.waiting:
+            # An earlier publish waits for a full subscriber; go after it so sequences stay in order
+            channel.waiting += 1
+            try:
+                async with channel.lock:
+                    count = await self._publish(channel, iter(items), now, True)
+            finally:
+                channel.waiting -= 1
+        else:
+            count = await self._publish(channel, iter(items), now, False)
+        channel.count(count, now)
+
+    async def _publish(self, channel: Channel, items, now: float, locked: bool) -> int:
+        """Deliver events until items run out; returns how many were published."""
+        payload = channel.topic.payload
+        deliver = channel.deliver
+        count = 0
+        for data in items:
+            if type(data) is not payload:
+                raise TypeError(f"{channel.topic.name} events carry {payload.__name__}, not {type(data).__name__}")
+            channel.published += 1
+            count += 1
+            event = Event(channel.topic.name, channel.published, now, data)
+            blocked = deliver(event)
+            if not blocked:
+                continue
+            if locked:
+                await self._wait(channel, blocked, event)
+                continue
+            # First to block: nobody holds the lock, so this takes it without yielding
+            channel.waiting += 1
+            try:
+                async with channel.lock:
+                    await self._wait(channel, blocked, event)
+                    count += await self._publish(channel, items, now, True)
+            finally:
+                channel.waiting -= 1
+            break
+        return count
+
+    async def _wait(self, channel: Channel, blocked: List[Subscription], event: Event) -> None:
+        """Hand an event to full blocking subscribers once they have room."""
+        started = time.monotonic()
+        for subscription in blocked:
+            while len(subscription.queue) >= subscription.maxsize and not subscription.closed:
+                if subscription.space is None or subscription.space.done():
+                    subscription.space = asyncio.get_running_loop().create_future()
+                await subscription.space
+            if subscription.closed:
+                continue
+            subscription.queue.append(event)
+            subscription.delivered += 1
+            if subscription.waiter is not None and not subscription.waiter.done():
+                subscription.waiter.set_result(None)
+        channel.blocked += len(blocked)
+        channel.blocked_seconds += time.monotonic() - started
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-topic counters as plain data."""
+        topics = {}
+        for name, channel in self.channels.items():
+            totals = dict(channel.retired)
+            max_lag = channel.max_lag_seconds
+            backlog = 0
+            for subscription in channel.subscribers:
+                for field in totals:
+                    totals[field] += getattr(subscription, field)
+                max_lag = max(max_lag, subscription.max_lag_seconds)
+                backlog += len(subscription.queue)
+            lag_seconds = totals.pop("lag_seconds")
+            topics[name] = {
+                "subscribers": len(channel.subscribers),
+                "published": channel.published,
+                "published_per_second": round(channel.rate, 1),
+                **totals,
+                "blocked": channel.blocked,
+                "blocked_seconds": round(channel.blocked_seconds, 6),
+                "backlog": backlog,
+                "mean_lag_ms": round(lag_seconds / totals["consumed"] * 1000, 3) if totals["consumed"] else 0.0,
+                "max_lag_ms": round(max_lag * 1000, 3),
+            }
+        return topics
+
+    def prometheus(self) -> str:
+        """Per-topic counters in the Prometheus text exposition format."""
+        series = [
+            ("event_bus_published_total", "counter", "Events published", "published"),
+            ("event_bus_delivered_total", "counter", "Events queued for subscribers", "delivered"),
+            ("event_bus_dropped_total", "counter", "Events discarded from full queues", "dropped"),
+            ("event_bus_coalesced_total", "counter", "Events replaced by a newer one with the same key", "coalesced"),
+            ("event_bus_consumed_total", "counter", "Events taken by subscribers", "consumed"),
+            ("event_bus_blocked_total", "counter", "Deliveries that waited for a full subscriber", "blocked"),
+            ("event_bus_blocked_seconds_total", "counter", "Time publishers waited for room", "blocked_seconds"),
+            ("event_bus_subscribers", "gauge", "Open subscriptions", "subscribers"),
+            ("event_bus_backlog", "gauge", "Events queued and not yet taken", "backlog"),
+            ("event_bus_max_lag_ms", "gauge", "Largest age of an event when taken", "max_lag_ms"),
+        ]
+        topics = self.snapshot()
+        lines = []
+        for name, kind, help_text, field in series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for topic, values in topics.items():
+                lines.append(f'{name}{{topic="{topic}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+
+def _value(enum) -> str:
+    return enum.value if enum is not None else None
+
+
+def order_update(trade: Trade) -> OrderUpdate:
+    """order_update payload of a trade's current state."""
+    return OrderUpdate(
+        trade.id, trade.user_id, trade.strategy_id, trade.symbol, _value(trade.order_side), _value(trade.order_type),
+        _value(trade.order_status), trade.quantity, trade.filled_quantity or 0.0, trade.price
+    )
+
+
+def fill(trade: Trade, realized: float) -> Fill:
+    """fill payload of a filled trade."""
+    return Fill(
+        trade.id, trade.user_id, trade.strategy_id, trade.symbol, _value(trade.order_side), _value(trade.order_type),
+        trade.filled_quantity or 0.0, trade.average_price or 0.0, trade.fee or 0.0, realized,
+        trade.executed_at.isoformat() if isinstance(trade.executed_at, datetime) else None
+    )
+
+
+async def publish_orders(bus: EventBus, trades: List[Trade], realized: Optional[Dict[int, float]] = None) -> None:
+    """
+    Publish order_update for trades whose status changed and, for the filled ones
+    listed in realized (trade id -> realized profit/loss), fill.
+    """
+    if not trades:
+        return
+    await bus.publish_many("order_update", [order_update(trade) for trade in trades])
+    if realized:
+        await bus.publish_many("fill", [fill(trade, realized[trade.id]) for trade in trades if trade.id in realized])
+
+
+# Bus of the application; the replay engine makes its own
+event_bus = EventBus(settings.event_queue_size)
@@ -0,0 +1,239 @@
+"""
+Streaming trade-history export.
+Trades are read from the database in server-side chunks and encoded chunk by chunk,
+so memory use stays flat no matter how many rows a user has.
+"""
+
+import csv
+import enum
+import io
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List, Optional, Sequence
+from sqlalchemy import select
+from app.database import engine
+from app.models import Trade
+
+# Columns included in exports, in output order
+EXPORT_COLUMNS = (
+    Trade.id,
+    Trade.created_at,
+    Trade.executed_at,
+    Trade.exchange_name,
+    Trade.symbol,
+    Trade.order_type,
+    Trade.order_side,
+    Trade.order_status,
+    Trade.price,
+    Trade.quantity,
+    Trade.filled_quantity,
+    Trade.average_price,
+    Trade.fee,
+    Trade.total_cost,
+    Trade.strategy_id,
+    Trade.exchange_order_id,
+)
+
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# Supported formats: media type and file extension
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def iter_trade_chunks(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    chunk_size: int = 5000
+) -> Iterator[Sequence]:
+    """
+    Stream a user's trades from the database in chunks.
+    Uses its own connection with a server-side cursor so rows are never
+    materialized all at once and the request session can close independently.
+
+    Args:
+        user_id: Owner of the trades
+        start_date: First creation day to include (inclusive)
+        end_date: Last creation day to include (inclusive)
+        chunk_size: Rows fetched per round trip
+
+    Yields:
+        Lists of result rows, in trade id order
+    """
+    query = select(*EXPORT_COLUMNS).where(Trade.user_id == user_id)
+    if start_date is not None:
+        query = query.where(Trade.created_at >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        query = query.where(Trade.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+    query = query.order_by(Trade.id)
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+
+def _plain(value):
+    """Convert enum members to their values for serialization."""
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def encode_csv(chunks: Iterator[Sequence]) -> Iterator[bytes]:
+    """Encode row chunks as CSV, one output block per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    for rows in chunks:
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else _plain(value)
+                for value in row
+            ]
+            for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    # Header only, when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the streaming generator."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_schema(pa):
+    """Arrow schema matching EXPORT_COLUMNS."""
+    text, number, stamp = pa.string(), pa.float64(), pa.timestamp("us")
+    return pa.schema([
+        ("id", pa.int64()),
+        ("created_at", stamp),
+        ("executed_at", stamp),
+        ("exchange_name", text),
+        ("symbol", text),
+        ("order_type", text),
+        ("order_side", text),
+        ("order_status", text),
+        ("price", number),
+        ("quantity", number),
+        ("filled_quantity", number),
+        ("average_price", number),
+        ("fee", number),
+        ("total_cost", number),
+        ("strategy_id", pa.int64()),
+        ("exchange_order_id", text),
+    ])
+
+
+def _record_batch(pa, schema, rows: Sequence):
+    """Build a columnar record batch from a chunk of rows."""
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array([_plain(value) for value in column], type=field.type)
+        for column, field in zip(columns, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def encode_columnar(chunks: Iterator[Sequence], export_format: str) -> Iterator[bytes]:
+    """
+    Encode row chunks as Parquet (one row group per chunk) or an Arrow IPC stream.
+
+    Args:
+        chunks: Row chunks from iter_trade_chunks
+        export_format: 'parquet' or 'arrow'
+
+    Yields:
+        Encoded bytes as soon as each chunk is written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    stream = pa.PythonFile(sink, mode="w")
+
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(stream, schema, compression="snappy")
+        write = writer.write_table
+        wrap = pa.Table.from_batches
+    else:
+        writer = pa.ipc.new_stream(stream, schema)
+        write = writer.write_batch
+        wrap = lambda batches: batches[0]
+
+    for rows in chunks:
+        if rows:
+            write(wrap([_record_batch(pa, schema, rows)]))
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
+
+
+def columnar_available() -> bool:
+    """Whether pyarrow is installed for Parquet/Arrow exports."""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_trades(
+    user_id: int,
+    export_format: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    chunk_size: int = 5000
+) -> Iterator[bytes]:
+    """
+    Stream a user's trade history encoded in the requested format.
+
+    Args:
+        user_id: Owner of the trades
+        export_format: One of EXPORT_FORMATS
+        start_date: First creation day to include (inclusive)
+        end_date: Last creation day to include (inclusive)
+        chunk_size: Rows fetched and encoded per step
+
+    Yields:
+        Encoded output blocks
+    """
+    chunks = iter_trade_chunks(user_id, start_date, end_date, chunk_size)
+    if export_format == "csv":
+        return encode_csv(chunks)
+    return encode_columnar(chunks, export_format)
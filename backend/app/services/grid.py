@@ -0,0 +1,586 @@
+"""
+Grid trading strategies.
+A grid spreads price levels between lower_price and upper_price. Each pair of
+neighbouring levels is a slot: a buy rests on the slot's lower level, and once it
+fills, a sell rests on its upper level; the sell closes the slot's cycle and the
+slot goes back to buying. Slots entirely above the price when the grid starts are
+bought at market, so that every level above the price has a sell resting.
+
+Levels are a sorted list and every grid knows its nearest resting buy and sell.
+A price update pops only the grids it reached from two per-symbol heaps keyed by
+those prices, and within a grid the crossed levels come from two bisects, so
+untouched grids and levels cost nothing. Every fill yields the replacement order
+on the neighbouring level.
+
+Parameters (Strategy.parameters JSON):
+    symbol        Trading pair
+    lower_price   Lowest level
+    upper_price   Highest level
+    levels        Number of levels, 2 to GRID_MAX_LEVELS (default 10)
+    quantity      Base quantity bought and sold per slot
+    spacing       'arithmetic' (equal steps, default) or 'geometric' (equal ratios)
+
+Fills are recorded as filled trades (limit orders at the level price; the opening
+buy is a market order) and accounted in holdings, rollups and the risk engine.
+Fees follow the exchange's schedule: maker on the limit fills, taker on the
+opening market buy; a slot's cost includes its buy fee. Cycle profit after fees
+on both legs is added to Strategy.total_profit_loss and profitable cycles to
+winning_trades, in place of the lot-matched results of record_fills. Slot state is saved in grid_states with the
+fills, so a restart resumes a grid instead of opening it again. Like the
+simulated execution in app.services.orders, resting orders exist only here.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ExchangeAPIKey, GridState, OrderSide, OrderType, Strategy, StrategyStatus, Trade
+from app.schemas import TradeCreate
+from app.services import orders
+from app.services.accounting import DEFAULT_FEES, FeeSchedule, fee_schedule
+from app.services.analytics import ADD_STRATEGY_RESULTS, record_fills
+from app.services.events import EventBus, event_bus, publish_orders
+from app.services.risk import RiskEngine, risk_engine
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_TYPE = "grid"
+
+SPACINGS = ("arithmetic", "geometric")
+
+def grid_levels(lower: float, upper: float, count: int, spacing: str = "arithmetic") -> List[float]:
+    """Ascending level prices from lower to upper, both included."""
+    if spacing == "geometric":
+        ratio = (upper / lower) ** (1 / (count - 1))
+        return [lower * ratio ** index for index in range(count - 1)] + [upper]
+    step = (upper - lower) / (count - 1)
+    return [lower + step * index for index in range(count - 1)] + [upper]
+
+
+class GridOrder(NamedTuple):
+    """A resting grid order."""
+    side: OrderSide
+    level: int
+    price: float
+
+
+class GridFill(NamedTuple):
+    """A filled grid order and the order replacing it."""
+    strategy_id: int
+    side: OrderSide
+    level: Optional[int]  # None for the market buy opening the grid
+    price: float
+    quantity: float
+    profit: float  # Cycle profit after fees on both legs for sells, 0 for buys
+    replacement: Optional[GridOrder]
+
+
+class Grid:
+    """
+    Levels and slot state of one grid strategy.
+    Slot k spans levels k and k + 1. While holding[k] is set its buy has filled
+    (costs[k] per unit, fee included) and its sell rests on level k + 1; otherwise its buy rests on level k.
+    Between updates every slot above the price holds and every slot below it does
+    not, so the resting buys and sells nearest the price are the next to fill.
+    """
+    __slots__ = (
+        "strategy_id", "user_id", "symbol", "exchange_name", "levels", "quantity", "fees", "signature",
+        "holding", "costs", "level_fills", "price", "realized", "cycles", "winning", "buy_at", "sell_at",
+    )
+
+    def __init__(
+        self,
+        strategy_id: int,
+        user_id: int,
+        symbol: str,
+        levels: List[float],
+        quantity: float,
+        exchange_name: str = "",
+        fees: FeeSchedule = DEFAULT_FEES,
+        signature: Optional[List] = None
+    ):
+        self.strategy_id = strategy_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.exchange_name = exchange_name
+        self.levels = levels
+        self.quantity = quantity
+        self.fees = fees
+        self.signature = signature if signature is not None else [levels[0], levels[-1], len(levels), quantity]
+        self.holding = bytearray(len(levels) - 1)
+        self.costs = array("d", bytes(8 * (len(levels) - 1)))
+        self.level_fills = array("q", bytes(8 * len(levels)))
+        self.price: Optional[float] = None  # Price of the last update that reached this grid
+        self.realized = 0.0
+        self.cycles = 0
+        self.winning = 0
+        self.buy_at = -math.inf
+        self.sell_at = math.inf
+
+    def start(self, price: float) -> List[GridFill]:
+        """Open the grid at a price: slots at or above it are bought at market."""
+        first = bisect_left(self.levels, price)
+        cost = price * (1 + self.fees.taker)
+        for slot in range(first, len(self.holding)):
+            self.holding[slot] = 1
+            self.costs[slot] = cost
+        self.price = price
+        self._set_triggers()
+        bought = len(self.holding) - first
+        if bought <= 0:
+            return []
+        return [GridFill(self.strategy_id, OrderSide.BUY, None, price, bought * self.quantity, 0.0, None)]
+
+    def move(self, price: float, fills: List[GridFill]) -> None:
+        """Fill every order crossed between the last price and price, in price order, appending to fills."""
+        levels, holding, costs = self.levels, self.holding, self.costs
+        last = self.price
+        if price < last:
+            # Free slots from the last price down buy on their lower level; the top level has no slot
+            top = min(bisect_right(levels, last), len(holding))
+            buy_cost = 1 + self.fees.maker
+            for slot in range(top - 1, bisect_left(levels, price) - 1, -1):
+                if not holding[slot]:
+                    holding[slot] = 1
+                    costs[slot] = levels[slot] * buy_cost
+                    self.level_fills[slot] += 1
+                    fills.append(GridFill(
+                        self.strategy_id, OrderSide.BUY, slot, levels[slot], self.quantity, 0.0,
+                        GridOrder(OrderSide.SELL, slot + 1, levels[slot + 1])
+                    ))
+        elif price > last:
+            # Held slots from the last price up sell on their upper level
+            sell_proceeds = 1 - self.fees.maker
+            for level in range(max(bisect_left(levels, last), 1), bisect_right(levels, price)):
+                slot = level - 1
+                if holding[slot]:
+                    holding[slot] = 0
+                    profit = self.quantity * (levels[level] * sell_proceeds - costs[slot])
+                    self.realized += profit
+                    self.cycles += 1
+                    if profit > 0:
+                        self.winning += 1
+                    self.level_fills[level] += 1
+                    fills.append(GridFill(
+                        self.strategy_id, OrderSide.SELL, level, levels[level], self.quantity, profit,
+                        GridOrder(OrderSide.BUY, slot, levels[slot])
+                    ))
+        self.price = price
+        self._set_triggers()
+
+    def _set_triggers(self) -> None:
+        """Nearest resting buy at or below the price and sell at or above it."""
+        levels, holding, price = self.levels, self.holding, self.price
+        slot = min(bisect_right(levels, price), len(holding)) - 1
+        while slot >= 0 and holding[slot]:
+            slot -= 1
+        self.buy_at = levels[slot] if slot >= 0 else -math.inf
+        level = max(bisect_left(levels, price), 1)
+        while level < len(levels) and not holding[level - 1]:
+            level += 1
+        self.sell_at = levels[level] if level < len(levels) else math.inf
+
+    def open_orders(self) -> List[GridOrder]:
+        """Every resting order, one per slot, in level order."""
+        return [
+            GridOrder(OrderSide.SELL, slot + 1, self.levels[slot + 1]) if held
+            else GridOrder(OrderSide.BUY, slot, self.levels[slot])
+            for slot, held in enumerate(self.holding)
+        ]
+
+    def state(self) -> Dict:
+        """Slot state as plain data."""
+        return {
+            "signature": self.signature,
+            "price": self.price,
+            "held": {str(slot): self.costs[slot] for slot, held in enumerate(self.holding) if held},
+            "level_fills": self.level_fills.tolist(),
+            "realized": self.realized,
+            "cycles": self.cycles,
+            "winning": self.winning,
+        }
+
+    def restore(self, state: Dict) -> bool:
+        """Resume from a saved state; False if it was saved for different parameters."""
+        if state.get("signature") != self.signature or state.get("price") is None:
+            return False
+        for slot, cost in state["held"].items():
+            self.holding[int(slot)] = 1
+            self.costs[int(slot)] = cost
+        self.level_fills = array("q", state["level_fills"])
+        self.realized = state["realized"]
+        self.cycles = state["cycles"]
+        self.winning = state["winning"]
+        self.price = state["price"]
+        self._set_triggers()
+        return True
+
+
+def parse_grid(strategy: Strategy, max_levels: int) -> Optional[Grid]:
+    """
+    Build a grid from a strategy row.
+
+    Args:
+        strategy: Strategy of type 'grid'
+        max_levels: Most levels accepted
+
+    Returns:
+        Grid (not started), or None if the parameters are not runnable
+    """
+    try:
+        params = json.loads(strategy.parameters or "{}")
+        symbol = params["symbol"]
+        lower = float(params["lower_price"])
+        upper = float(params["upper_price"])
+        count = int(params.get("levels", 10))
+        quantity = float(params["quantity"])
+        spacing = params.get("spacing", "arithmetic")
+    except (ValueError, TypeError, KeyError):
+        logger.warning("Grid strategy %s needs symbol, lower_price, upper_price and quantity", strategy.id)
+        return None
+
+    if not 0 < lower < upper or not 2 <= count <= max_levels or quantity <= 0 or spacing not in SPACINGS:
+        logger.warning("Grid strategy %s has invalid parameters", strategy.id)
+        return None
+    # Every slot holding is the largest position the grid can build
+    if strategy.max_position_size is not None and quantity * (count - 1) > strategy.max_position_size + 1e-12:
+        logger.warning("Grid strategy %s can hold more than its max_position_size", strategy.id)
+        return None
+
+    return Grid(
+        strategy.id,
+        strategy.user_id,
+        symbol,
+        grid_levels(lower, upper, count, spacing),
+        quantity,
+        signature=[lower, upper, count, spacing, quantity]
+    )
+
+
+class GridBook:
+    """
+    Running grids by symbol, with heaps of each grid's nearest resting sell
+    (min-heap) and buy (max-heap). A grid gets fresh entries whenever it moves;
+    superseded ones are skipped when they surface and a symbol's heaps are rebuilt
+    once they hold well over two entries per grid.
+    """
+
+    def __init__(self):
+        self.grids: Dict[int, Grid] = {}
+        self.by_symbol: Dict[str, Dict[int, Grid]] = {}
+        self.pending: Dict[str, Dict[int, Grid]] = {}  # Started at the next price of their symbol
+        self.rising: Dict[str, List] = {}  # (sell_at, sequence, strategy_id)
+        self.falling: Dict[str, List] = {}  # (-buy_at, sequence, strategy_id)
+        self.entries: Dict[int, int] = {}  # strategy_id -> sequence of its live entries
+        self.last_prices: Dict[str, float] = {}
+        self.sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.grids) + sum(len(grids) for grids in self.pending.values())
+
+    def add(self, grid: Grid) -> None:
+        """Run a grid; one that was never started opens at the next price of its symbol."""
+        self.remove(grid.strategy_id)
+        if grid.price is None:
+            self.pending.setdefault(grid.symbol, {})[grid.strategy_id] = grid
+            return
+        self.grids[grid.strategy_id] = grid
+        self.by_symbol.setdefault(grid.symbol, {})[grid.strategy_id] = grid
+        self._push(grid)
+
+    def remove(self, strategy_id: int) -> Optional[Grid]:
+        """Stop running a grid; returns it if it was running or pending."""
+        grid = self.grids.pop(strategy_id, None)
+        if grid is not None:
+            del self.by_symbol[grid.symbol][strategy_id]
+            del self.entries[strategy_id]
+            return grid
+        for pending in self.pending.values():
+            if strategy_id in pending:
+                return pending.pop(strategy_id)
+        return None
+
+    def _push(self, grid: Grid) -> None:
+        self.sequence += 1
+        self.entries[grid.strategy_id] = self.sequence
+        if grid.sell_at != math.inf:
+            heapq.heappush(self.rising.setdefault(grid.symbol, []), (grid.sell_at, self.sequence, grid.strategy_id))
+        if grid.buy_at != -math.inf:
+            heapq.heappush(self.falling.setdefault(grid.symbol, []), (-grid.buy_at, self.sequence, grid.strategy_id))
+
+    def on_price(self, symbol: str, low: float, high: Optional[float] = None) -> List[GridFill]:
+        """
+        Move the symbol's grids to a price (or through a low/high range) and fill
+        the orders crossed.
+
+        Args:
+            symbol: Trading pair
+            low: Price, or lowest price of the range
+            high: Highest price of the range (defaults to low). The extreme nearer
+                the last price is assumed to have traded first.
+
+        Returns:
+            Fills in the order they happened, grid by grid
+        """
+        fills: List[GridFill] = []
+        pending = self.pending.pop(symbol, None)
+        if pending:
+            for grid in pending.values():
+                fills.extend(grid.start(low))
+                self.add(grid)
+        if high is None or high == low:
+            self._move(symbol, low, fills)
+        else:
+            last = self.last_prices.get(symbol, low)
+            first, second = (low, high) if abs(last - low) <= abs(high - last) else (high, low)
+            self._move(symbol, first, fills)
+            self._move(symbol, second, fills)
+        return fills
+
+    def _move(self, symbol: str, price: float, fills: List[GridFill]) -> None:
+        self.last_prices[symbol] = price
+        entries = self.entries
+        reached = []
+        heap = self.rising.get(symbol)
+        while heap and heap[0][0] <= price:
+            _, sequence, strategy_id = heapq.heappop(heap)
+            if entries.get(strategy_id) == sequence:
+                reached.append(strategy_id)
+        heap = self.falling.get(symbol)
+        while heap and -heap[0][0] >= price:
+            _, sequence, strategy_id = heapq.heappop(heap)
+            if entries.get(strategy_id) == sequence:
+                reached.append(strategy_id)
+        if not reached:
+            return
+
+        grids = self.grids
+        for strategy_id in reached:
+            grid = grids[strategy_id]
+            grid.move(price, fills)
+            self._push(grid)
+
+        running = len(self.by_symbol[symbol])
+        if len(self.rising.get(symbol, ())) + len(self.falling.get(symbol, ())) > 4 * running + 64:
+            self._compact(symbol)
+
+    def _compact(self, symbol: str) -> None:
+        for heaps in (self.rising, self.falling):
+            heap = heaps.get(symbol)
+            if heap:
+                heaps[symbol] = [entry for entry in heap if self.entries.get(entry[2]) == entry[1]]
+                heapq.heapify(heaps[symbol])
+
+
+class GridEngine:
+    """Runs active grid strategies on price updates and records their fills."""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        risk: Optional[RiskEngine] = None,
+        clock: Callable[[], float] = time.time,
+        max_levels: Optional[int] = None,
+        bus: Optional[EventBus] = None
+    ):
+        self.session_factory = session_factory
+        self.risk = risk or risk_engine
+        self.clock = clock
+        self.bus = bus or event_bus
+        self.max_levels = max_levels or settings.grid_max_levels
+        self.book = GridBook()
+        self.saved: set = set()  # Strategies with a grid_states row
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, db: Session, reset: Iterable[int] = ()) -> int:
+        """
+        Sync the book with the active grid strategies. Running grids whose
+        parameters did not change keep going; others resume from their saved state,
+        or open at the next price when there is none (or it was saved for other
+        parameters). Grids in reset are reloaded from their saved state.
+
+        Args:
+            db: Database session
+            reset: Strategy ids to reload even if running
+
+        Returns:
+            Number of grids running or waiting to open
+        """
+        rows = db.query(Strategy).filter(
+            Strategy.strategy_type == STRATEGY_TYPE,
+            Strategy.status == StrategyStatus.ACTIVE
+        ).all()
+        user_ids = {row.user_id for row in rows}
+        exchanges: Dict[int, str] = {}
+        if user_ids:
+            for key in db.query(ExchangeAPIKey).filter(
+                ExchangeAPIKey.user_id.in_(user_ids),
+                ExchangeAPIKey.is_active == True
+            ):
+                exchanges.setdefault(key.user_id, key.exchange_name)
+        states = {
+            state.strategy_id: state.state
+            for state in db.query(GridState).filter(GridState.strategy_id.in_([row.id for row in rows]))
+        } if rows else {}
+        self.saved = set(states)
+
+        reset = set(reset)
+        active = set()
+        for row in rows:
+            self.risk.set_strategy(row)
+            grid = parse_grid(row, self.max_levels)
+            if grid is None:
+                continue
+            if row.user_id not in exchanges:
+                logger.warning("Grid strategy %s is active but its user has no active API key", row.id)
+                continue
+            grid.exchange_name = exchanges[row.user_id]
+            grid.fees = fee_schedule(grid.exchange_name)
+            active.add(row.id)
+            running = self.book.grids.get(row.id)
+            if running is not None and running.signature == grid.signature and row.id not in reset:
+                continue
+            if row.id in states and not grid.restore(json.loads(states[row.id])):
+                logger.info("Grid strategy %s parameters changed; opening it again", row.id)
+            self.book.add(grid)
+
+        stopped = [strategy_id for strategy_id in self.book.grids if strategy_id not in active]
+        stopped += [strategy_id for grids in self.book.pending.values() for strategy_id in grids
+                    if strategy_id not in active]
+        for strategy_id in stopped:
+            self.book.remove(strategy_id)
+        return len(self.book)
+
+    def symbols(self) -> Set[str]:
+        """Symbols with running grids or grids waiting for their first price."""
+        return {grid.symbol for grid in self.book.grids.values()} | {
+            symbol for symbol, grids in self.book.pending.items() if grids
+        }
+
+    async def on_price(self, symbol: str, low: float, high: Optional[float] = None) -> List[GridFill]:
+        """
+        Fill the grid orders crossed by a price update and record the fills.
+
+        Args:
+            symbol: Trading pair
+            low: Price, or lowest price of the range
+            high: Highest price of the range (defaults to low)
+
+        Returns:
+            Fills recorded; empty if none or if recording failed, in which case the
+            grids involved are reset to their saved state
+        """
+        if symbol not in self.book.by_symbol and symbol not in self.book.pending:
+            return []
+        fills = self.book.on_price(symbol, low, high)
+        if not fills:
+            return fills
+
+        db = self.session_factory()
+        try:
+            trade_ids = await self._record(db, fills)
+            db.commit()
+            self.saved.update(fill.strategy_id for fill in fills)
+            filled = orders.load_trades(db, trade_ids)
+            realized = {trade_id: self.risk.on_fill(filled[trade_id]) for trade_id in trade_ids}
+            await publish_orders(self.bus, [filled[trade_id] for trade_id in trade_ids], realized)
+            return fills
+        except Exception:
+            db.rollback()
+            strategy_ids = {fill.strategy_id for fill in fills}
+            logger.exception("Failed to record %d grid fills on %s", len(fills), symbol)
+            # The grids already moved; put them back so the next update retries the crossings
+            try:
+                self.load(db, reset=strategy_ids)
+            except Exception:
+                logger.exception("Failed to reload grids %s", sorted(strategy_ids))
+                for strategy_id in strategy_ids:
+                    self.book.remove(strategy_id)
+            return []
+        finally:
+            db.close()
+
+    async def _record(self, db: Session, fills: List[GridFill]) -> List[int]:
+        """Write the fills as filled trades, account them and save the grids' counters and state."""
+        grids = {fill.strategy_id: self.book.grids[fill.strategy_id] for fill in fills}
+        rows = []
+        for fill in fills:
+            grid = grids[fill.strategy_id]
+            trade_data = TradeCreate(
+                symbol=grid.symbol,
+                order_type=OrderType.LIMIT if fill.level is not None else OrderType.MARKET,
+                order_side=fill.side,
+                quantity=fill.quantity,
+                price=fill.price
+            )
+            rows.append(orders.build_trade_values(grid.user_id, grid.exchange_name, trade_data, grid.strategy_id))
+        trade_ids = list(db.scalars(insert(Trade).returning(Trade.id, sort_by_parameter_order=True), rows))
+        loaded = orders.load_trades(db, trade_ids)
+        trades = [loaded[trade_id] for trade_id in trade_ids]
+
+        executed_at = datetime.utcfromtimestamp(self.clock())
+        for trade, fill in zip(trades, fills):
+            await orders.execute_order(trade, executed_at, fill.price)
+        record_fills(db, trades, strategy_results=False)
+
+        results: Dict[int, Dict] = {}
+        for fill in fills:
+            totals = results.get(fill.strategy_id)
+            if totals is None:
+                totals = results[fill.strategy_id] = {
+                    "strategy": fill.strategy_id, "trades": 0, "winning": 0, "profit": 0.0
+                }
+            totals["trades"] += 1
+            if fill.side == OrderSide.SELL:
+                totals["winning"] += fill.profit > 0
+                totals["profit"] += fill.profit
+        db.execute(ADD_STRATEGY_RESULTS, list(results.values()))
+
+        states = [{"strategy_id": strategy_id, "state": json.dumps(grid.state())} for strategy_id, grid in grids.items()]
+        new = [state for state in states if state["strategy_id"] not in self.saved]
+        if new:
+            db.execute(insert(GridState), new)
+        if len(new) < len(states):
+            db.execute(update(GridState), [state for state in states if state["strategy_id"] in self.saved])
+        return trade_ids
+
+    async def run(self, interval: float) -> None:
+        """Reload the grid strategies every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            db = self.session_factory()
+            try:
+                self.load(db)
+            except Exception:
+                logger.exception("Grid reload failed")
+            finally:
+                db.close()
+
+    def start(self, interval: float) -> None:
+        """Start periodic reloading on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic reloading."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global grid engine
+grid_engine = GridEngine()
@@ -0,0 +1,432 @@
+"""
+Technical indicators used by trading strategies.
+Batch functions take a full price series and return a series of the same length,
+with None for bars that do not have enough history yet. Streaming classes update
+in constant time per price and produce the same values.
+"""
+
+import math
+from array import array
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Series = List[Optional[float]]
+
+
+def sma(values: Sequence[float], period: int) -> Series:
+    """Simple moving average."""
+    result: Series = [None] * len(values)
+    total = 0.0
+    for index, value in enumerate(values):
+        total += value
+        if index >= period:
+            total -= values[index - period]
+        if index >= period - 1:
+            result[index] = total / period
+    return result
+
+
+def ema(values: Sequence[float], period: int) -> Series:
+    """Exponential moving average, seeded with the SMA of the first period values."""
+    result: Series = [None] * len(values)
+    if len(values) < period:
+        return result
+    alpha = 2.0 / (period + 1)
+    current = sum(values[:period]) / period
+    result[period - 1] = current
+    for index in range(period, len(values)):
+        current += alpha * (values[index] - current)
+        result[index] = current
+    return result
+
+
+def rsi(values: Sequence[float], period: int = 14) -> Series:
+    """Relative strength index with Wilder smoothing."""
+    result: Series = [None] * len(values)
+    if len(values) <= period:
+        return result
+
+    gains = losses = 0.0
+    for index in range(1, period + 1):
+        change = values[index] - values[index - 1]
+        gains += max(change, 0.0)
+        losses += max(-change, 0.0)
+    average_gain = gains / period
+    average_loss = losses / period
+    result[period] = _rsi_value(average_gain, average_loss)
+
+    for index in range(period + 1, len(values)):
+        change = values[index] - values[index - 1]
+        average_gain = (average_gain * (period - 1) + max(change, 0.0)) / period
+        average_loss = (average_loss * (period - 1) + max(-change, 0.0)) / period
+        result[index] = _rsi_value(average_gain, average_loss)
+    return result
+
+
+def _rsi_value(average_gain: float, average_loss: float) -> float:
+    """RSI from smoothed average gain and loss."""
+    if average_loss == 0:
+        return 100.0 if average_gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+
+
+def macd(
+    values: Sequence[float],
+    fast_period: int = 12,
+    slow_period: int = 26,
+    signal_period: int = 9
+) -> Tuple[Series, Series, Series]:
+    """
+    Moving average convergence/divergence.
+
+    Returns:
+        Tuple of (MACD line, signal line, histogram)
+    """
+    fast = ema(values, fast_period)
+    slow = ema(values, slow_period)
+    line: Series = [
+        f - s if f is not None and s is not None else None
+        for f, s in zip(fast, slow)
+    ]
+
+    signal: Series = [None] * len(values)
+    start = slow_period - 1
+    defined = [value for value in line[start:] if value is not None]
+    for offset, value in enumerate(ema(defined, signal_period)):
+        signal[start + offset] = value
+
+    histogram: Series = [
+        m - s if m is not None and s is not None else None
+        for m, s in zip(line, signal)
+    ]
+    return line, signal, histogram
+
+
+def rolling_std(values: Sequence[float], period: int) -> Series:
+    """Rolling population standard deviation."""
+    result: Series = [None] * len(values)
+    for index in range(period - 1, len(values)):
+        window = values[index - period + 1:index + 1]
+        mean = sum(window) / period
+        result[index] = math.sqrt(sum((value - mean) ** 2 for value in window) / period)
+    return result
+
+
+def _rolling_extreme(values: Sequence[float], period: int, is_better) -> Series:
+    """Rolling min or max using a monotonic deque of indices."""
+    result: Series = [None] * len(values)
+    candidates = deque()
+    for index, value in enumerate(values):
+        while candidates and not is_better(values[candidates[-1]], value):
+            candidates.pop()
+        candidates.append(index)
+        if candidates[0] <= index - period:
+            candidates.popleft()
+        if index >= period - 1:
+            result[index] = values[candidates[0]]
+    return result
+
+
+def rolling_min(values: Sequence[float], period: int) -> Series:
+    """Rolling minimum."""
+    return _rolling_extreme(values, period, lambda kept, new: kept < new)
+
+
+def rolling_max(values: Sequence[float], period: int) -> Series:
+    """Rolling maximum."""
+    return _rolling_extreme(values, period, lambda kept, new: kept > new)
+
+
+# Batch indicators by name, as referenced by strategy indicator specs
+BATCH_INDICATORS = {
+    "sma": sma,
+    "ema": ema,
+    "rsi": rsi,
+    "macd": macd,
+    "rolling_std": rolling_std,
+    "rolling_min": rolling_min,
+    "rolling_max": rolling_max,
+}
+
+
+# Streaming indicators
+#
+# Streaming indicators are updated one price at a time in constant time and
+# give the same values as the batch functions above. Windows are kept in
+# fixed-size array('d') ring buffers, and state can be checkpointed to a
+# JSON-serializable dict and restored without refetching history.
+
+def _state_slots(indicator_class) -> List[str]:
+    """All __slots__ declared along an indicator class hierarchy."""
+    return [slot for klass in reversed(indicator_class.__mro__) for slot in getattr(klass, "__slots__", ())]
+
+
+class StreamingIndicator:
+    """Base class providing checkpoint/restore for __slots__-based indicators."""
+    __slots__ = ()
+
+    # Slots holding an array ring buffer, a deque, or a nested indicator
+    _kinds: Dict[str, str] = {}
+
+    def checkpoint(self) -> Dict:
+        """Snapshot the full indicator state as a JSON-serializable dict."""
+        state = {"type": type(self).__name__}
+        for slot in _state_slots(type(self)):
+            value = getattr(self, slot)
+            kind = self._kinds.get(slot)
+            if kind == "array":
+                value = value.tolist()
+            elif kind == "deque":
+                value = [list(item) for item in value]
+            elif kind == "indicator":
+                value = value.checkpoint()
+            state[slot] = value
+        return state
+
+    @classmethod
+    def restore(cls, state: Dict) -> "StreamingIndicator":
+        """Rebuild an indicator from a checkpoint."""
+        indicator_class = STREAMING_INDICATORS[state["type"]]
+        indicator = indicator_class.__new__(indicator_class)
+        for slot in _state_slots(indicator_class):
+            value = state[slot]
+            kind = indicator_class._kinds.get(slot)
+            if kind == "array":
+                value = array("d", value)
+            elif kind == "deque":
+                value = deque(tuple(item) for item in value)
+            elif kind == "indicator":
+                value = StreamingIndicator.restore(value)
+            setattr(indicator, slot, value)
+        return indicator
+
+
+class StreamingSMA(StreamingIndicator):
+    """Simple moving average over a ring buffer with a running sum."""
+    __slots__ = ("period", "window", "position", "count", "total", "value")
+    _kinds = {"window": "array"}
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = array("d", bytes(8 * period))
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, price: float) -> Optional[float]:
+        oldest = self.window[self.position]
+        self.window[self.position] = price
+        if self.count < self.period:
+            self.count += 1
+            self.total += price
+        else:
+            self.total += price - oldest
+
+        self.position += 1
+        if self.position == self.period:
+            self.position = 0
+            # Resum once per window to stop rounding drift (amortized O(1))
+            self.total = math.fsum(self.window)
+
+        if self.count == self.period:
+            self.value = self.total / self.period
+        return self.value
+
+
+class StreamingEMA(StreamingIndicator):
+    """Exponential moving average seeded with the SMA of the first period prices."""
+    __slots__ = ("period", "alpha", "count", "total", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, price: float) -> Optional[float]:
+        if self.count < self.period:
+            self.count += 1
+            self.total += price
+            if self.count == self.period:
+                self.value = self.total / self.period
+            return self.value
+        self.value += self.alpha * (price - self.value)
+        return self.value
+
+
+class StreamingRSI(StreamingIndicator):
+    """Relative strength index with Wilder smoothing."""
+    __slots__ = ("period", "previous", "count", "average_gain", "average_loss", "value")
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.previous: Optional[float] = None
+        self.count = 0
+        self.average_gain = 0.0
+        self.average_loss = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, price: float) -> Optional[float]:
+        if self.previous is None:
+            self.previous = price
+            return None
+        change = price - self.previous
+        self.previous = price
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        if self.count < self.period:
+            # Warm-up: accumulate sums, averaged once period changes are seen
+            self.count += 1
+            self.average_gain += gain
+            self.average_loss += loss
+            if self.count < self.period:
+                return None
+            self.average_gain /= self.period
+            self.average_loss /= self.period
+        else:
+            self.average_gain = (self.average_gain * (self.period - 1) + gain) / self.period
+            self.average_loss = (self.average_loss * (self.period - 1) + loss) / self.period
+
+        self.value = _rsi_value(self.average_gain, self.average_loss)
+        return self.value
+
+
+class StreamingMACD(StreamingIndicator):
+    """MACD line, signal line and histogram."""
+    __slots__ = ("fast", "slow", "signal", "value")
+    _kinds = {"fast": "indicator", "slow": "indicator", "signal": "indicator"}
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast = StreamingEMA(fast_period)
+        self.slow = StreamingEMA(slow_period)
+        self.signal = StreamingEMA(signal_period)
+        self.value: Optional[Tuple[Optional[float], Optional[float], Optional[float]]] = None
+
+    def update(self, price: float) -> Optional[Tuple[Optional[float], Optional[float], Optional[float]]]:
+        fast = self.fast.update(price)
+        slow = self.slow.update(price)
+        if fast is None or slow is None:
+            return None
+        line = fast - slow
+        signal = self.signal.update(line)
+        self.value = (line, signal, line - signal if signal is not None else None)
+        return self.value
+
+
+class RollingStd(StreamingIndicator):
+    """Rolling population standard deviation using a sliding Welford update."""
+    __slots__ = ("period", "window", "position", "count", "mean", "m2", "value")
+    _kinds = {"window": "array"}
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = array("d", bytes(8 * period))
+        self.position = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, price: float) -> Optional[float]:
+        if self.count < self.period:
+            self.count += 1
+            delta = price - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (price - self.mean)
+        else:
+            oldest = self.window[self.position]
+            mean = self.mean + (price - oldest) / self.period
+            self.m2 += (price - oldest) * (price - mean + oldest - self.mean)
+            self.mean = mean
+        self.window[self.position] = price
+
+        self.position += 1
+        if self.position == self.period:
+            self.position = 0
+            # Recompute exactly once per window to stop rounding drift (amortized O(1))
+            self.mean = math.fsum(self.window) / self.period
+            self.m2 = math.fsum((value - self.mean) ** 2 for value in self.window)
+
+        if self.count == self.period:
+            self.value = math.sqrt(max(self.m2, 0.0) / self.period)
+        return self.value
+
+
+class _RollingExtreme(StreamingIndicator):
+    """Rolling min/max over a monotonic deque of (index, price) candidates."""
+    __slots__ = ("period", "index", "candidates", "value")
+    _kinds = {"candidates": "deque"}
+
+    def __init__(self, period: int):
+        self.period = period
+        self.index = 0
+        self.candidates = deque()
+        self.value: Optional[float] = None
+
+    def _keeps(self, kept: float, new: float) -> bool:
+        raise NotImplementedError
+
+    def update(self, price: float) -> Optional[float]:
+        candidates = self.candidates
+        while candidates and not self._keeps(candidates[-1][1], price):
+            candidates.pop()
+        candidates.append((self.index, price))
+        if candidates[0][0] <= self.index - self.period:
+            candidates.popleft()
+        if self.index >= self.period - 1:
+            self.value = candidates[0][1]
+        self.index += 1
+        return self.value
+
+
+class RollingMin(_RollingExtreme):
+    """Rolling minimum."""
+    __slots__ = ()
+
+    def _keeps(self, kept: float, new: float) -> bool:
+        return kept < new
+
+
+class RollingMax(_RollingExtreme):
+    """Rolling maximum."""
+    __slots__ = ()
+
+    def _keeps(self, kept: float, new: float) -> bool:
+        return kept > new
+
+
+class RollingWindow(StreamingIndicator):
+    """The last period prices, oldest first."""
+    __slots__ = ("period", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value: List[float] = []
+
+    def update(self, price: float) -> List[float]:
+        self.value.append(price)
+        if len(self.value) > self.period:
+            del self.value[0]
+        return self.value
+
+
+# Streaming indicators by class name (for restore) and by batch indicator name
+STREAMING_INDICATORS = {
+    cls.__name__: cls
+    for cls in (
+        StreamingSMA, StreamingEMA, StreamingRSI, StreamingMACD, RollingStd, RollingMin, RollingMax, RollingWindow
+    )
+}
+
+STREAMING_BY_NAME = {
+    "sma": StreamingSMA,
+    "ema": StreamingEMA,
+    "rsi": StreamingRSI,
+    "macd": StreamingMACD,
+    "rolling_std": RollingStd,
+    "rolling_min": RollingMin,
+    "rolling_max": RollingMax,
+}
@@ -0,0 +1,268 @@
+"""
+Group-commit journal for trade writes.
+create_trade hands its (already executed) trade to the journal instead of
+committing twice itself. A single flusher collects trades for up to
+TRADE_JOURNAL_GROUP_DELAY_MS or TRADE_JOURNAL_GROUP_SIZE records, appends them to
+an append-only file with one fsync, then inserts the group and records its fills
+in one database transaction that also advances the journal checkpoint. Callers
+are released once their group has committed, so they still get the trade id.
+
+The fsynced journal is what makes a group durable, so SQLite runs with
+synchronous=NORMAL while the journal is enabled. On startup, entries past the checkpoint (journaled but lost
+from the database by a crash) are replayed before the journal is truncated.
+
+Line format: "<sequence> <crc32 hex> <json>\\n". Reading stops at the first torn
+or corrupt line, which can only be the tail of an interrupted write.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import DateTime, Enum
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Trade, JournalCheckpoint, OrderStatus
+from app.services.analytics import record_fills
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_NAME = "trades"
+
+# Truncate the file once it grows past this and every entry in it is applied
+ROTATE_BYTES = 64 * 1024 * 1024
+
+KIND_TRADE = "trade"
+KIND_ABORT = "abort"
+
+# Columns assigned by the database rather than journaled
+GENERATED_COLUMNS = {"id", "created_at", "updated_at"}
+TRADE_COLUMNS = [column for column in Trade.__table__.columns if column.name not in GENERATED_COLUMNS]
+DATETIME_COLUMNS = {column.name for column in TRADE_COLUMNS if isinstance(column.type, DateTime)}
+ENUM_COLUMNS = {column.name: column.type.enum_class for column in TRADE_COLUMNS if isinstance(column.type, Enum)}
+
+
+def encode_trade(trade: Trade) -> Dict:
+    """Journal payload for a trade that has not been inserted yet."""
+    values = {}
+    for column in TRADE_COLUMNS:
+        value = getattr(trade, column.name)
+        values[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return values
+
+
+def decode_trade(values: Dict) -> Trade:
+    """Rebuild a transient trade from its journal payload."""
+    values = dict(values)
+    for name in DATETIME_COLUMNS:
+        if values.get(name) is not None:
+            values[name] = datetime.fromisoformat(values[name])
+    for name, enum_class in ENUM_COLUMNS.items():
+        if values.get(name) is not None:
+            values[name] = enum_class(values[name])
+    return Trade(**values)
+
+
+def format_line(sequence: int, record: Dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%d %08x %s\n" % (sequence, zlib.crc32(payload), payload)
+
+
+def read_journal(path: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (sequence, record) for every intact entry, oldest first."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as handle:
+        for line in handle:
+            try:
+                sequence, checksum, payload = line.rstrip(b"\n").split(b" ", 2)
+                if not line.endswith(b"\n") or int(checksum, 16) != zlib.crc32(payload):
+                    raise ValueError("checksum mismatch")
+                yield int(sequence), json.loads(payload)
+            except ValueError:
+                logger.warning("Ignoring torn journal entry in %s", path)
+                return
+
+
+class TradeJournal:
+    """Durable, group-committed write path for new trades."""
+
+    def __init__(
+        self,
+        path: str,
+        session_factory: Callable = SessionLocal,
+        group_size: Optional[int] = None,
+        group_delay_ms: Optional[float] = None,
+        name: str = JOURNAL_NAME
+    ):
+        self.path = path
+        self.session_factory = session_factory
+        self.group_size = group_size or settings.trade_journal_group_size
+        self.group_delay = (settings.trade_journal_group_delay_ms if group_delay_ms is None else group_delay_ms) / 1000
+        self.name = name
+        self.sequence = 0
+        self.fd: Optional[int] = None
+        self.pending: List[Tuple[Trade, asyncio.Future]] = []
+        self.groups = 0
+        self.records = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _checkpoint(self, db: Session) -> int:
+        row = db.get(JournalCheckpoint, self.name)
+        return row.last_sequence if row else 0
+
+    def _apply(self, db: Session, entries: List[Tuple[int, Trade]]) -> None:
+        """Insert trades, record fills and advance the checkpoint (caller commits)."""
+        trades = [trade for _, trade in entries]
+        db.add_all(trades)
+        db.flush()
+        record_fills(db, [trade for trade in trades if trade.order_status == OrderStatus.FILLED])
+        db.merge(JournalCheckpoint(name=self.name, last_sequence=entries[-1][0]))
+
+    def recover(self) -> int:
+        """
+        Apply journaled trades the database does not have, then truncate the journal.
+
+        Returns:
+            Number of trades replayed
+        """
+        entries = list(read_journal(self.path))
+        aborted = {record["sequence"] for _, record in entries if record["kind"] == KIND_ABORT}
+        db = self.session_factory()
+        try:
+            checkpoint = self._checkpoint(db)
+            replay = [
+                (sequence, decode_trade(record["trade"]))
+                for sequence, record in entries
+                if record["kind"] == KIND_TRADE and sequence > checkpoint and sequence not in aborted
+            ]
+            if replay:
+                self._apply(db, replay)
+                db.commit()
+                logger.warning("Replayed %d journaled trades into the database", len(replay))
+        finally:
+            db.close()
+
+        self.sequence = max([checkpoint] + [sequence for sequence, _ in entries])
+        if os.path.exists(self.path):
+            os.truncate(self.path, 0)
+        return len(replay)
+
+    def open(self) -> int:
+        """Recover, then open the journal for appending."""
+        replayed = self.recover()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        return replayed
+
+    def _write(self, lines: List[bytes]) -> None:
+        data = b"".join(lines)
+        written = 0
+        while written < len(data):
+            written += os.write(self.fd, data[written:])
+        os.fsync(self.fd)
+
+    def commit_group(self, trades: List[Trade]) -> List[Trade]:
+        """
+        Journal a group with one fsync, then apply it in one transaction.
+        Runs in a worker thread; only one group is in flight at a time.
+        """
+        first = self.sequence + 1
+        self.sequence += len(trades)
+        entries = list(zip(range(first, self.sequence + 1), trades))
+        self._write([
+            format_line(sequence, {"kind": KIND_TRADE, "trade": encode_trade(trade)})
+            for sequence, trade in entries
+        ])
+
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            self._apply(db, entries)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Make sure recovery never replays a group the callers were told failed
+            aborts = []
+            for sequence, _ in entries:
+                self.sequence += 1
+                aborts.append(format_line(self.sequence, {"kind": KIND_ABORT, "sequence": sequence}))
+            self._write(aborts)
+            raise
+        finally:
+            db.close()
+
+        self.groups += 1
+        self.records += len(trades)
+        if os.fstat(self.fd).st_size > ROTATE_BYTES:
+            os.ftruncate(self.fd, 0)
+        return trades
+
+    async def submit(self, trade: Trade) -> Trade:
+        """
+        Queue a new trade and wait until its group is committed.
+
+        Args:
+            trade: Transient trade (executed, or pending for conditional orders)
+
+        Returns:
+            The trade, inserted and with its id
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((trade, future))
+        self._wakeup.set()
+        return await future
+
+    async def run(self) -> None:
+        """Flush queued trades in groups until cancelled."""
+        while True:
+            await self._wakeup.wait()
+            if len(self.pending) < self.group_size and self.group_delay:
+                await asyncio.sleep(self.group_delay)
+            group, self.pending = self.pending[:self.group_size], self.pending[self.group_size:]
+            if not self.pending:
+                self._wakeup.clear()
+            if not group:
+                continue
+            try:
+                await asyncio.to_thread(self.commit_group, [trade for trade, _ in group])
+            except Exception as exc:
+                logger.exception("Journal group of %d trades failed", len(group))
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for trade, future in group:
+                    if not future.done():
+                        future.set_result(trade)
+
+    def start(self) -> int:
+        """Recover and start the flusher on the running event loop; returns trades replayed."""
+        replayed = self.open()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        return replayed
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop the flusher and close the journal."""
+        while self.pending:
+            await asyncio.sleep(self.group_delay or 0.001)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# Global journal instance, when enabled
+trade_journal = TradeJournal(settings.trade_journal_path) if settings.trade_journal_enabled else None
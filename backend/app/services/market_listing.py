@@ -0,0 +1,171 @@
+"""
+Whole-market USDT listing served from an array-backed ticker snapshot.
+A snapshot holds one row per pair in NumPy columns and is built once per refresh,
+together with a permutation for every sort key and an alphabetical index of base
+assets for prefix search. Requests only slice a precomputed order, or mask it when
+filters are given; nothing is sorted per call.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, NamedTuple, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUOTE_CURRENCY = "USDT"
+
+# Supported sort keys
+SORT_KEYS = ("volume", "change", "price", "symbol")
+
+# Fetches every ticker on the exchange: {symbol: ccxt ticker}
+TickerSource = Callable[[], Dict[str, Dict]]
+
+
+class ListingPage(NamedTuple):
+    """One page of the filtered, sorted listing."""
+    total: int
+    rows: List[Dict]
+    built_at: float
+
+
+class MarketSnapshot:
+    """Immutable column arrays for every USDT pair plus precomputed orders."""
+
+    def __init__(self, tickers: Dict[str, Dict], built_at: Optional[float] = None):
+        suffix = "/" + QUOTE_CURRENCY
+        listed = [
+            (symbol, ticker) for symbol, ticker in tickers.items()
+            if symbol.endswith(suffix) and ticker.get("last") is not None
+        ]
+        self.built_at = built_at or time.time()
+        self.bases = [symbol[:-len(suffix)] for symbol, _ in listed]
+        self.price = np.array([ticker["last"] for _, ticker in listed], dtype=np.float64)
+        self.change = np.array([ticker.get("percentage") or 0.0 for _, ticker in listed], dtype=np.float64)
+        self.volume = np.array([ticker.get("quoteVolume") or 0.0 for _, ticker in listed], dtype=np.float64)
+
+        # Ascending permutations; descending requests read them backwards
+        alphabetical = np.array(sorted(range(len(self.bases)), key=self.bases.__getitem__), dtype=np.int64)
+        self.orders: Dict[str, np.ndarray] = {
+            "volume": np.argsort(self.volume, kind="stable"),
+            "change": np.argsort(self.change, kind="stable"),
+            "price": np.argsort(self.price, kind="stable"),
+            "symbol": alphabetical,
+        }
+        self.sorted_bases = [self.bases[index] for index in alphabetical]
+
+        # Response rows are built once per snapshot, not per request
+        self.rows = [
+            {
+                "id": base.lower(),
+                "symbol": base,
+                "name": base,
+                "current_price": float(price),
+                "price_change_percentage_24h": float(change),
+                "market_cap": None,
+                "volume_24h": float(volume),
+            }
+            for base, price, change, volume in zip(self.bases, self.price, self.change, self.volume)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.bases)
+
+    def prefix_rows(self, prefix: str) -> np.ndarray:
+        """Row indices whose base asset starts with prefix (case-insensitive)."""
+        prefix = prefix.upper()
+        start = bisect_left(self.sorted_bases, prefix)
+        # Every string with the prefix sorts before prefix + U+FFFF
+        stop = bisect_left(self.sorted_bases, prefix + "\uffff", start)
+        return self.orders["symbol"][start:stop]
+
+    def query(
+        self,
+        sort: str = "volume",
+        descending: bool = True,
+        prefix: Optional[str] = None,
+        min_volume: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_change: Optional[float] = None,
+        max_change: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> ListingPage:
+        """
+        Return one page of the listing.
+
+        Args:
+            sort: One of SORT_KEYS
+            descending: Largest first (Z-A for symbol)
+            prefix: Base-asset prefix, e.g. 'BT'
+            min_volume: Minimum 24h quote volume
+            min_price / max_price: Last price bounds
+            min_change / max_change: 24h change bounds in percent
+            offset: Rows to skip
+            limit: Page size
+
+        Returns:
+            Total matching rows and the rows of the page
+        """
+        order = self.orders[sort]
+        if descending:
+            order = order[::-1]
+
+        mask = None
+        for column, low, high in (
+            (self.volume, min_volume, None),
+            (self.price, min_price, max_price),
+            (self.change, min_change, max_change),
+        ):
+            if low is not None:
+                mask = column >= low if mask is None else mask & (column >= low)
+            if high is not None:
+                mask = column <= high if mask is None else mask & (column <= high)
+        if prefix:
+            matches = np.zeros(len(self), dtype=bool)
+            matches[self.prefix_rows(prefix)] = True
+            mask = matches if mask is None else mask & matches
+
+        if mask is not None:
+            order = order[mask[order]]
+        rows = self.rows
+        return ListingPage(len(order), [rows[index] for index in order[offset:offset + limit].tolist()], self.built_at)
+
+
+class MarketListing:
+    """Keeps the current snapshot and rebuilds it in the background once it is older than ttl."""
+
+    def __init__(self, source: TickerSource, ttl: float = 30.0):
+        self.source = source
+        self.ttl = ttl
+        self.snapshot: Optional[MarketSnapshot] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> MarketSnapshot:
+        """Fetch all tickers and swap in a new snapshot."""
+        tickers = await asyncio.to_thread(self.source)
+        snapshot = await asyncio.to_thread(MarketSnapshot, tickers)
+        self.snapshot = snapshot
+        return snapshot
+
+    async def get(self) -> MarketSnapshot:
+        """
+        Current snapshot. The first call waits for a build; after that a stale
+        snapshot keeps being served while a single refresh runs behind it.
+        """
+        if self.snapshot is None:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.create_task(self.refresh())
+            return await asyncio.shield(self._refresh)
+        if time.time() - self.snapshot.built_at > self.ttl and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self.refresh())
+            self._refresh.add_done_callback(self._log_failure)
+        return self.snapshot
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Market listing refresh failed: %s", task.exception())
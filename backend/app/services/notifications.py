@@ -0,0 +1,269 @@
+"""
+Per-user notification streams.
+The hub takes the order_update, fill and alert topics off the event bus and
+routes each event to its owner's open connections through a registry keyed by
+user id: one dict lookup, then one queue append per connection of that user,
+however many users are connected. An event is encoded as a server-sent event
+once and the same bytes go to every connection of the user.
+
+Each user's notifications are numbered, and the latest NOTIFICATION_HISTORY_SIZE
+are kept so a client reconnecting with Last-Event-ID gets what it missed. A
+user's history is dropped NOTIFICATION_RESUME_SECONDS after their last
+connection closes. Ids carry the hub's start time and which of the user's
+histories they belong to; an id from before a restart, from a dropped history
+or older than the history gets a 'ready' event with resync set instead, telling
+the client to refetch its orders and alerts. A client whose connection queue
+fills up is disconnected and resumes the same way. Idle connections get a
+comment line every NOTIFICATION_HEARTBEAT_SECONDS, which keeps proxies from
+closing them and lets the server notice dead peers.
+
+The hub is per process: it only sees the event bus of its own worker. With
+uvicorn --workers N, an order filled or an alert triggered in one worker is
+never delivered to a connection held by another, nor kept in its history.
+Run a single worker for notifications, or route the user's requests and streams
+to the same worker, until events are shared between processes.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from app.config import settings
+from app.services.events import EventBus, Subscription, SubscriptionClosed, event_bus
+
+logger = logging.getLogger(__name__)
+
+# Bus topic -> server-sent event name
+EVENT_NAMES = {"order_update": "order", "fill": "fill", "alert": "alert"}
+
+RETRY = b"retry: 3000\n\n"  # Reconnect delay for EventSource clients, ms
+HEARTBEAT = b": heartbeat\n\n"
+
+
+class Notification(NamedTuple):
+    number: int
+    frame: bytes  # Encoded server-sent event
+
+
+class Connection:
+    """One open stream: frames waiting to be written and the consumer's waiter."""
+
+    __slots__ = ("maxsize", "queue", "waiter", "closed", "overflowed", "heartbeat")
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.queue: deque = deque()
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+        self.overflowed = False
+        self.heartbeat = False
+
+    def push(self, frame: bytes) -> None:
+        """Queue a frame; a connection already maxsize frames behind is closed instead."""
+        if self.closed:
+            return
+        if len(self.queue) >= self.maxsize:
+            self.queue.clear()
+            self.overflowed = True
+            self.closed = True
+        else:
+            self.queue.append(frame)
+        self._wake()
+
+    def beat(self) -> None:
+        """Ask for a heartbeat if nothing is waiting to be written."""
+        if not self.queue:
+            self.heartbeat = True
+            self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def read(self) -> Optional[bytes]:
+        """Everything queued as one chunk, a heartbeat, or None once closed."""
+        while True:
+            if self.queue:
+                chunk = b"".join(self.queue)
+                self.queue.clear()
+                return chunk
+            if self.closed:
+                return None
+            if self.heartbeat:
+                self.heartbeat = False
+                return HEARTBEAT
+            waiter = self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await waiter
+            finally:
+                self.waiter = None
+
+
+class UserStream:
+    """A user's notification numbering, recent history and open connections."""
+
+    __slots__ = ("epoch", "sequence", "history", "connections", "idle_since")
+
+    def __init__(self, epoch: str, history_size: int):
+        self.epoch = epoch  # Prefix of the ids numbered from this history
+        self.sequence = 0
+        self.history: deque = deque(maxlen=history_size)
+        self.connections: List[Connection] = []
+        self.idle_since = 0.0  # monotonic time the last connection closed
+
+
+class NotificationHub:
+    """Registry of open notification streams by user id, fed from the event bus."""
+
+    def __init__(
+        self,
+        bus: Optional[EventBus] = None,
+        history_size: int = settings.notification_history_size,
+        queue_size: int = settings.notification_queue_size,
+        heartbeat_seconds: float = settings.notification_heartbeat_seconds,
+        resume_seconds: float = settings.notification_resume_seconds
+    ):
+        self.bus = bus or event_bus
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.resume_seconds = resume_seconds
+        self.epoch = format(int(time.time()), "x")
+        self.generation = 0  # User streams created
+        self.users: Dict[int, UserStream] = {}
+        self.connections = 0
+        self._subscriptions: List[Subscription] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def dispatch(self, topic: str, items) -> None:
+        """Number, encode and route bus payloads of a topic to their users' connections."""
+        name = EVENT_NAMES[topic]
+        users = self.users
+        for data in items:
+            stream = users.get(data.user_id)
+            if stream is None:
+                continue  # Not connected; a new connection starts from the current state
+            stream.sequence += 1
+            frame = (
+                f"id: {stream.epoch}-{stream.sequence}\nevent: {name}\n"
+                f"data: {json.dumps(data._asdict(), separators=(',', ':'))}\n\n"
+            ).encode()
+            stream.history.append(Notification(stream.sequence, frame))
+            for connection in stream.connections:
+                connection.push(frame)
+
+    def _missed(self, stream: UserStream, last_event_id: Optional[str]) -> Optional[List[bytes]]:
+        """Frames after last_event_id, or None if they are not all in the history."""
+        if last_event_id is None:
+            return []
+        epoch, _, number = last_event_id.partition("-")
+        if epoch != stream.epoch or not number.isdigit() or int(number) > stream.sequence:
+            return None
+        number = int(number)
+        history = stream.history
+        if number == stream.sequence:
+            return []
+        if not history or history[0].number > number + 1:
+            return None
+        return [item.frame for item in islice(history, number + 1 - history[0].number, None)]
+
+    def connect(self, user_id: int, last_event_id: Optional[str] = None) -> Connection:
+        """
+        Open a connection for a user.
+
+        Args:
+            user_id: Owner of the stream
+            last_event_id: Id of the last event the client received, to resume after it
+
+        Returns:
+            Connection whose first frames are the missed notifications and a 'ready' event
+        """
+        stream = self.users.get(user_id)
+        if stream is None:
+            self.generation += 1
+            stream = self.users[user_id] = UserStream(f"{self.epoch}.{self.generation:x}", self.history_size)
+        missed = self._missed(stream, last_event_id)
+        connection = Connection(self.queue_size)
+        connection.queue.append(RETRY)
+        connection.queue.extend(missed or ())
+        ready = json.dumps({"user_id": user_id, "resync": missed is None}, separators=(",", ":"))
+        connection.queue.append(f"id: {stream.epoch}-{stream.sequence}\nevent: ready\ndata: {ready}\n\n".encode())
+        stream.connections.append(connection)
+        self.connections += 1
+        return connection
+
+    def disconnect(self, user_id: int, connection: Connection) -> None:
+        stream = self.users.get(user_id)
+        if stream is None or connection not in stream.connections:
+            return
+        stream.connections.remove(connection)
+        self.connections -= 1
+        if connection.overflowed:
+            logger.warning("Notification stream of user %d fell %d events behind; closed", user_id, self.queue_size)
+        if not stream.connections:
+            stream.idle_since = time.monotonic()
+
+    async def stream(self, user_id: int, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Frames of a new connection until it closes; the connection is registered while iterating."""
+        connection = self.connect(user_id, last_event_id)
+        try:
+            while True:
+                chunk = await connection.read()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.disconnect(user_id, connection)
+
+    async def _forward(self, subscription: Subscription) -> None:
+        try:
+            while True:
+                events = await subscription.get_batch(1024)
+                self.dispatch(subscription.topic, [event.data for event in events])
+        except SubscriptionClosed:
+            pass
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            expired = time.monotonic() - self.resume_seconds
+            for user_id, stream in list(self.users.items()):
+                if stream.connections:
+                    for connection in stream.connections:
+                        connection.beat()
+                elif stream.idle_since < expired:
+                    del self.users[user_id]
+
+    def start(self) -> None:
+        """Subscribe to the bus and start heartbeats on the running event loop."""
+        if not self._tasks:
+            # Blocking: routing never waits, so the hub only holds up publishers if it stops.
+            # Subscribed here rather than in the tasks so nothing published from now on is missed.
+            self._subscriptions = [self.bus.subscribe(topic, "block") for topic in EVENT_NAMES]
+            self._tasks = [asyncio.create_task(self._forward(subscription)) for subscription in self._subscriptions]
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        """Close every connection and stop forwarding."""
+        for stream in self.users.values():
+            for connection in stream.connections:
+                connection.close()
+        for subscription in self._subscriptions:
+            subscription.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._subscriptions = []
+        self._tasks = []
+
+
+# Global notification hub
+notification_hub = NotificationHub()
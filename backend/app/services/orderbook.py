@@ -0,0 +1,307 @@
+"""
+Locally maintained L2 order books.
+Each book is built from a snapshot and kept current with incremental diffs.
+Diffs carry exchange update ids; a gap in the sequence marks the book out of
+sync and triggers a resync from a fresh snapshot.
+
+Live diffs come from the exchange depth stream (BinanceDepthFeed) for the symbols
+in ORDERBOOK_FEED_SYMBOLS. Other symbols are served from snapshots refreshed once
+older than ORDERBOOK_SNAPSHOT_TTL_SECONDS.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import websockets
+
+logger = logging.getLogger(__name__)
+
+Level = Tuple[float, float]  # (price, quantity)
+
+
+@dataclass
+class BookDiff:
+    """An incremental book update covering exchange update ids first_id..last_id."""
+    symbol: str
+    first_id: int
+    last_id: int
+    bids: Sequence[Level] = field(default_factory=list)
+    asks: Sequence[Level] = field(default_factory=list)
+
+
+class SequenceGap(Exception):
+    """Raised when a diff does not continue the book's update sequence."""
+
+
+class BookSide:
+    """
+    One side of a book: price levels in a sorted list plus a price -> quantity map.
+    Keys are ordered so the best price is at the end of the list, where most
+    inserts and deletes happen, keeping list shifts short.
+    """
+    __slots__ = ("keys", "quantities", "sign")
+
+    def __init__(self, is_bid: bool):
+        # Bids sort ascending by price; asks by negated price
+        self.sign = 1.0 if is_bid else -1.0
+        self.keys: List[float] = []
+        self.quantities: Dict[float, float] = {}
+
+    def clear(self) -> None:
+        self.keys.clear()
+        self.quantities.clear()
+
+    def set(self, price: float, quantity: float) -> None:
+        """Set the quantity at a price level; zero removes the level."""
+        quantities = self.quantities
+        if quantity <= 0:
+            if quantities.pop(price, None) is not None:
+                keys = self.keys
+                del keys[bisect_left(keys, price * self.sign)]
+        elif price in quantities:
+            quantities[price] = quantity
+        else:
+            quantities[price] = quantity
+            key = price * self.sign
+            keys = self.keys
+            keys.insert(bisect_left(keys, key), key)
+
+    def update(self, levels: Iterable[Level]) -> None:
+        for price, quantity in levels:
+            self.set(float(price), float(quantity))
+
+    def best(self) -> Optional[float]:
+        return self.keys[-1] * self.sign if self.keys else None
+
+    def top(self, depth: int) -> List[Level]:
+        """Best depth levels, best first."""
+        sign, quantities = self.sign, self.quantities
+        return [(key * sign, quantities[key * sign]) for key in reversed(self.keys[-depth:])]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class OrderBook:
+    """L2 book for one symbol."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.last_update_id = 0
+        self.synced = False
+        self.snapshot_applied = False
+        self.updated_at = 0.0
+
+    def load_snapshot(self, bids: Iterable[Level], asks: Iterable[Level], update_id: int) -> None:
+        """Replace the book contents with a snapshot taken at update_id."""
+        self.bids.clear()
+        self.asks.clear()
+        self.bids.update(bids)
+        self.asks.update(asks)
+        self.last_update_id = update_id
+        self.synced = True
+        self.snapshot_applied = True
+        self.updated_at = time.time()
+
+    def apply(self, diff: BookDiff) -> bool:
+        """
+        Apply a diff if it continues the sequence.
+
+        Returns:
+            True if applied, False if it was older than the book and skipped
+
+        Raises:
+            SequenceGap: If updates between the book and the diff are missing
+        """
+        if diff.last_id <= self.last_update_id:
+            return False
+
+        expected = self.last_update_id + 1
+        if self.snapshot_applied:
+            # First diff after a snapshot only has to straddle the snapshot id
+            if not diff.first_id <= expected <= diff.last_id:
+                self.synced = False
+                raise SequenceGap(f"{self.symbol}: diff {diff.first_id}-{diff.last_id} after snapshot {self.last_update_id}")
+        elif diff.first_id != expected:
+            self.synced = False
+            raise SequenceGap(f"{self.symbol}: expected update {expected}, got {diff.first_id}")
+
+        self.bids.update(diff.bids)
+        self.asks.update(diff.asks)
+        self.last_update_id = diff.last_id
+        self.snapshot_applied = False
+        self.updated_at = time.time()
+        return True
+
+    def view(self, depth: int) -> Dict:
+        """Top levels, spread and mid price."""
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        spread = mid = None
+        if best_bid is not None and best_ask is not None:
+            spread = best_ask - best_bid
+            mid = (best_ask + best_bid) / 2
+        return {
+            "symbol": self.symbol,
+            "bids": self.bids.top(depth),
+            "asks": self.asks.top(depth),
+            "spread": spread,
+            "mid_price": mid,
+            "last_update_id": self.last_update_id,
+            "updated_at": self.updated_at,
+        }
+
+
+SnapshotFetcher = Callable[[str, int], Dict]
+
+
+class OrderBookManager:
+    """
+    Keeps one in-memory book per symbol.
+    Books are fed by diff feeds; when no feed is running for a symbol, the
+    book is refreshed from a snapshot once it is older than snapshot_ttl.
+    Diffs received while a book is out of sync are buffered for the next
+    resync, at most max_pending per symbol: past that the buffer is dropped,
+    which only means the resync starts from a newer snapshot.
+    """
+
+    def __init__(
+        self,
+        fetch_snapshot: SnapshotFetcher,
+        snapshot_depth: int = 1000,
+        snapshot_ttl: float = 5.0,
+        max_pending: int = 1000
+    ):
+        self.fetch_snapshot = fetch_snapshot
+        self.snapshot_depth = snapshot_depth
+        self.snapshot_ttl = snapshot_ttl
+        self.max_pending = max_pending
+        self.books: Dict[str, OrderBook] = {}
+        self.fed: Dict[str, asyncio.Task] = {}
+        self.pending: Dict[str, List[BookDiff]] = {}
+        self.resyncs = 0
+        self.overflows = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def resync(self, symbol: str) -> OrderBook:
+        """Reload a book from a snapshot and replay diffs buffered while out of sync."""
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            book = self.books.setdefault(symbol, OrderBook(symbol))
+            snapshot = await asyncio.to_thread(self.fetch_snapshot, symbol, self.snapshot_depth)
+            book.load_snapshot(snapshot["bids"], snapshot["asks"], int(snapshot.get("nonce") or 0))
+            self.resyncs += 1
+
+            for diff in self.pending.pop(symbol, []):
+                try:
+                    book.apply(diff)
+                except SequenceGap:
+                    # Buffered diffs do not connect; the next live diff resyncs again
+                    break
+            return book
+
+    def apply(self, diff: BookDiff) -> bool:
+        """
+        Apply a live diff; on a gap or while out of sync, buffer it for the next resync.
+
+        Returns:
+            True if the book is in sync after the diff
+        """
+        book = self.books.get(diff.symbol)
+        if book is not None and book.synced:
+            try:
+                book.apply(diff)
+                return True
+            except SequenceGap as gap:
+                logger.warning("Order book out of sync, resyncing: %s", gap)
+        self._buffer(diff)
+        return False
+
+    def _buffer(self, diff: BookDiff) -> None:
+        pending = self.pending.setdefault(diff.symbol, [])
+        if len(pending) >= self.max_pending:
+            # Still behind after max_pending diffs: start over from the next snapshot
+            logger.warning("Order book %s: %d diffs buffered while out of sync, dropping them", diff.symbol, len(pending))
+            pending.clear()
+            self.overflows += 1
+        pending.append(diff)
+
+    async def run_feed(self, feed: AsyncIterator[BookDiff]) -> None:
+        """Apply diffs from a feed, resyncing any book that falls out of sync."""
+        async for diff in feed:
+            if not self.apply(diff):
+                try:
+                    await self.resync(diff.symbol)
+                except Exception as e:
+                    # Diffs keep buffering (bounded); the next one retries the resync
+                    logger.warning("Order book %s snapshot failed: %s", diff.symbol, e)
+
+    def attach_feed(self, symbol: str, feed: AsyncIterator[BookDiff]) -> asyncio.Task:
+        """Run a diff feed for a symbol in the background."""
+        task = asyncio.create_task(self.run_feed(feed))
+        self.fed[symbol] = task
+        task.add_done_callback(lambda _: self.fed.pop(symbol, None))
+        return task
+
+    async def stop(self) -> None:
+        """Stop every diff feed."""
+        tasks = list(self.fed.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_book(self, symbol: str) -> OrderBook:
+        """Return an in-sync book, loading or refreshing it from a snapshot when needed."""
+        book = self.books.get(symbol)
+        if book is None or not book.synced:
+            return await self.resync(symbol)
+        if symbol not in self.fed and time.time() - book.updated_at > self.snapshot_ttl:
+            return await self.resync(symbol)
+        return book
+
+
+class ReplayFeed:
+    """Feeds recorded diffs to a manager, optionally paced to a target rate."""
+
+    def __init__(self, diffs: Iterable[BookDiff], rate: Optional[float] = None):
+        self.diffs = diffs
+        self.rate = rate
+
+    async def __aiter__(self):
+        interval = 1.0 / self.rate if self.rate else 0.0
+        started = time.perf_counter()
+        for index, diff in enumerate(self.diffs):
+            if interval:
+                delay = started + index * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield diff
+
+
+class BinanceDepthFeed:
+    """
+    Diffs from the Binance depth stream of one symbol, reconnecting when the
+    connection drops. Updates missed while disconnected show up as a sequence
+    gap, so the manager resyncs the book from a snapshot.
+    """
+
+    def __init__(self, symbol: str, url: str = "wss://stream.binance.com:9443/ws", reconnect_delay: float = 1.0):
+        self.symbol = symbol
+        self.url = f"{url.rstrip('/')}/{symbol.replace('/', '').lower()}@depth@100ms"
+        self.reconnect_delay = reconnect_delay
+
+    async def __aiter__(self):
+        while True:
+            try:
+                async with websockets.connect(self.url) as connection:
+                    async for message in connection:
+                        update = json.loads(message)
+                        yield BookDiff(self.symbol, update["U"], update["u"], update["b"], update["a"])
+            except (OSError, websockets.WebSocketException) as e:
+                logger.warning("Depth stream for %s disconnected: %s", self.symbol, e)
+            await asyncio.sleep(self.reconnect_delay)
@@ -0,0 +1,124 @@
+"""
+Order placement helpers shared by the trading routes.
+Covers API key lookup, order validation, trade row construction and
+(simulated) execution.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models import Trade, ExchangeAPIKey, OrderType, OrderStatus
+from app.schemas import TradeCreate
+from app.services.accounting import fee_rate
+from app.services.credentials import Credentials
+
+# Order types that rest until their price is crossed
+CONDITIONAL_ORDER_TYPES = (OrderType.STOP_LOSS, OrderType.TAKE_PROFIT)
+
+
+def get_active_api_key(db: Session, user_id: int) -> Optional[ExchangeAPIKey]:
+    """Return the user's active exchange API key, if any."""
+    return db.query(ExchangeAPIKey).filter(
+        ExchangeAPIKey.user_id == user_id,
+        ExchangeAPIKey.is_active == True
+    ).first()
+
+
+def validate_order(trade_data: TradeCreate) -> Optional[str]:
+    """
+    Check order fields that depend on each other.
+
+    Args:
+        trade_data: Order to validate
+
+    Returns:
+        Error message, or None when the order is valid
+    """
+    if "/" not in trade_data.symbol:
+        return "Symbol must be a trading pair such as BTC/USDT"
+    if trade_data.order_type != OrderType.MARKET and trade_data.price is None:
+        return f"{trade_data.order_type.value} orders require a price"
+    return None
+
+
+def is_conditional(order_type: OrderType) -> bool:
+    """Whether an order rests until a trigger price instead of executing immediately."""
+    return order_type in CONDITIONAL_ORDER_TYPES
+
+
+def build_trade_values(
+    user_id: int,
+    exchange_name: str,
+    trade_data: TradeCreate,
+    strategy_id: Optional[int] = None
+) -> Dict:
+    """Column values for a new pending trade row."""
+    return {
+        "user_id": user_id,
+        "strategy_id": strategy_id,
+        "exchange_name": exchange_name,
+        "symbol": trade_data.symbol,
+        "order_type": trade_data.order_type,
+        "order_side": trade_data.order_side,
+        "price": trade_data.price,
+        "quantity": trade_data.quantity,
+        "order_status": OrderStatus.PENDING,
+    }
+
+
+async def execute_order(
+    trade: Trade,
+    executed_at: Optional[datetime] = None,
+    fill_price: Optional[float] = None,
+    credentials: Optional[Credentials] = None
+) -> Trade:
+    """
+    Execute a pending trade and record the execution details on it.
+
+    Args:
+        trade: Pending trade
+        executed_at: Execution time (defaults to now; replays pass virtual time)
+        fill_price: Execution price (defaults to the order price)
+        credentials: Decrypted API key to sign the exchange order with (unused while execution is simulated)
+
+    Returns:
+        The same trade, filled
+    """
+    # TODO: Execute actual trade on exchange using CCXT
+    # For now, we'll simulate the trade
+    # In production, you would:
+    # 1. Initialize exchange with user's API keys
+    # 2. Execute the order
+    # 3. Update trade record with execution details
+
+    # Simulated execution
+    trade.order_status = OrderStatus.FILLED
+    trade.filled_quantity = trade.quantity
+    trade.average_price = fill_price or trade.price or 0
+    trade.total_cost = trade.filled_quantity * trade.average_price
+    trade.fee = trade.total_cost * fee_rate(trade.exchange_name, trade.order_type)
+    trade.executed_at = executed_at or datetime.utcnow()
+
+    return trade
+
+
+def claim_pending(db: Session, trade_id: int, order_status: OrderStatus) -> bool:
+    """
+    Move a trade out of pending with a single conditional UPDATE.
+    Only one session (or worker) can win the claim; the others get False and must
+    leave the trade alone. The claim is part of the session's transaction.
+    """
+    result = db.execute(
+        update(Trade)
+        .where(Trade.id == trade_id, Trade.order_status == OrderStatus.PENDING)
+        .values(order_status=order_status)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def load_trades(db: Session, trade_ids: List[int]) -> Dict[int, Trade]:
+    """Load (or refresh) several trades with a single query, keyed by id."""
+    trades = db.query(Trade).filter(Trade.id.in_(trade_ids)).populate_existing().all()
+    return {trade.id: trade for trade in trades}
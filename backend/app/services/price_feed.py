@@ -0,0 +1,76 @@
+"""
+Background ticker polling for the price-driven services.
+Resting stop-loss / take-profit orders, price alerts, grid strategies and the
+risk engine's marks move on the tickers this poller fetches, and only on those:
+the market GET routes only read prices, so serving a page never fills an order,
+and a stop does not wait for somebody to open the dashboard.
+
+Each poll fetches the watched symbols (the major pairs plus every symbol with a
+resting order, alert or grid) and hands each ticker to the same callback the
+market routes use. A failed fetch is logged and retried at the next interval.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# async fetch(symbols) -> {symbol: ccxt-style ticker dict}
+TickerSource = Callable[[List[str]], Awaitable[Dict[str, Dict]]]
+
+
+class PricePoller:
+    """Polls tickers every interval seconds and passes each one to on_ticker."""
+
+    def __init__(
+        self,
+        fetch: TickerSource,
+        on_ticker: Callable[[str, Dict], Awaitable[None]],
+        symbols: Callable[[], Iterable[str]],
+        interval: float = 2.0
+    ):
+        self.fetch = fetch
+        self.on_ticker = on_ticker
+        self.symbols = symbols
+        self.interval = interval
+        self.polls = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll(self) -> int:
+        """Fetch the watched symbols once; returns the number of tickers passed on."""
+        symbols = sorted(set(self.symbols()))
+        if not symbols:
+            return 0
+        self.polls += 1
+        try:
+            tickers = await self.fetch(symbols)
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Ticker poll of %d symbols failed: %s", len(symbols), e)
+            return 0
+        for symbol, ticker in tickers.items():
+            await self.on_ticker(symbol, ticker)
+        return len(tickers)
+
+    async def run(self) -> None:
+        """Poll every interval seconds."""
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start polling on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop polling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
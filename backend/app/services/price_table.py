@@ -0,0 +1,279 @@
+"""
+Shared-memory latest-price table.
+One market-data process (market_data.py) polls the exchange and writes the
+latest ticker of each symbol into a fixed-layout multiprocessing.shared_memory
+segment; every uvicorn worker maps the same segment and reads it without locks,
+system calls or messages to another process.
+
+Layout (little-endian):
+
+    header  64 bytes   magic, layout version, slot count, writer pid, heartbeat
+    slot    128 bytes  per symbol, in the order the writer was given them:
+                       symbol (24 bytes, fixed at creation), then the seqlock
+                       sequence, last, percentage, quote volume, exchange
+                       timestamp (ms) and write time
+
+Each slot is guarded by its own seqlock. The writer makes the sequence odd,
+stores the values, then makes it even again; a reader copies the values between
+two reads of the sequence and retries if it was odd or changed. Readers never
+block the writer and a torn read is never returned. Stores are plain memory
+writes issued in program order, which x86-64 keeps in order for other cores.
+
+The heartbeat is the time of the writer's last successful poll. Readers treat a
+table older than max_age as absent (and re-attach, in case the writer restarted
+with a new segment), so workers fall back to calling the exchange themselves.
+"""
+
+import math
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+MAGIC = b"PRICETBL"
+VERSION = 1
+
+HEADER = struct.Struct("<8sIIqd")  # magic, version, slots, writer pid, heartbeat
+HEADER_SIZE = 64
+SYMBOL = struct.Struct("<24s")
+SEQUENCE = struct.Struct("<Q")
+VALUES = struct.Struct("<dddqd")  # last, percentage, quote volume, timestamp ms, updated
+STATE = struct.Struct("<Qdddqd")  # The sequence and the values, read with one unpack
+SLOT_SIZE = 128  # Two cache lines, so neighbouring slots are not written through the same line
+SEQUENCE_OFFSET = SYMBOL.size
+VALUES_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+HEARTBEAT_OFFSET = 24
+assert VALUES_OFFSET + VALUES.size <= SLOT_SIZE
+
+MAX_RETRIES = 1000  # Reads that keep colliding with writes give up and report the slot missing
+
+
+class SharedTicker(NamedTuple):
+    symbol: str
+    last: float
+    percentage: Optional[float]
+    quote_volume: Optional[float]
+    timestamp: Optional[int]  # Exchange timestamp, epoch ms
+    updated: float  # time.time() of the write
+
+    def as_ccxt(self) -> dict:
+        """The ticker in the shape ccxt returns it."""
+        return {
+            "symbol": self.symbol,
+            "last": self.last,
+            "percentage": self.percentage,
+            "quoteVolume": self.quote_volume,
+            "timestamp": self.timestamp,
+        }
+
+
+def _number(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Map an existing segment without registering it with this process tree's
+    resource tracker, which would unlink the writer's segment when it exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    if os.name != "posix":
+        return shared_memory.SharedMemory(name)  # No resource tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class PriceTable:
+    """A mapped price table; create() it in the writer, attach() to it in readers."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.buffer = memory.buf
+        self.owner = owner
+        magic, version, slots, self.writer_pid, _ = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory {memory.name!r} is not a version {VERSION} price table")
+        self.offsets: Dict[str, int] = {}
+        for slot in range(slots):
+            offset = HEADER_SIZE + slot * SLOT_SIZE
+            name = SYMBOL.unpack_from(self.buffer, offset)[0].rstrip(b"\0").decode()
+            self.offsets[name] = offset
+        self.symbols = list(self.offsets)
+
+    @classmethod
+    def create(cls, name: str, symbols: Iterable[str]) -> "PriceTable":
+        """Create (or replace) the named table with a slot per symbol; the caller is its only writer."""
+        symbols = list(dict.fromkeys(symbols))
+        size = HEADER_SIZE + len(symbols) * SLOT_SIZE
+        try:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        memory = shared_memory.SharedMemory(name, create=True, size=size)
+        buffer = memory.buf
+        buffer[:size] = bytes(size)
+        for slot, symbol in enumerate(symbols):
+            encoded = symbol.encode()
+            if len(encoded) > SYMBOL.size:
+                raise ValueError(f"Symbol {symbol!r} is longer than {SYMBOL.size} bytes")
+            SYMBOL.pack_into(buffer, HEADER_SIZE + slot * SLOT_SIZE, encoded)
+        HEADER.pack_into(buffer, 0, MAGIC, VERSION, len(symbols), os.getpid(), 0.0)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> Optional["PriceTable"]:
+        """Map an existing table, or None if no writer has created it."""
+        try:
+            memory = _attach_untracked(name)
+        except FileNotFoundError:
+            return None
+        try:
+            return cls(memory, owner=False)
+        except ValueError:
+            memory.close()
+            raise
+
+    def close(self) -> None:
+        """Unmap the table; the writer also removes it."""
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+    # Writer side
+
+    def write(
+        self,
+        symbol: str,
+        last: float,
+        percentage: Optional[float] = None,
+        quote_volume: Optional[float] = None,
+        timestamp: Optional[int] = None
+    ) -> bool:
+        """Store a symbol's latest values; returns False for symbols without a slot."""
+        offset = self.offsets.get(symbol)
+        if offset is None:
+            return False
+        buffer = self.buffer
+        sequence = SEQUENCE.unpack_from(buffer, offset + SEQUENCE_OFFSET)[0]
+        SEQUENCE.pack_into(buffer, offset + SEQUENCE_OFFSET, sequence + 1)
+        VALUES.pack_into(
+            buffer, offset + VALUES_OFFSET,
+            float(last), _number(percentage), _number(quote_volume), timestamp or 0, time.time()
+        )
+        SEQUENCE.pack_into(buffer, offset + SEQUENCE_OFFSET, sequence + 2)
+        return True
+
+    def write_tickers(self, tickers: Dict[str, dict]) -> int:
+        """Store ccxt tickers and beat the heartbeat; returns how many were stored."""
+        written = 0
+        for symbol, ticker in tickers.items():
+            if ticker.get("last") is not None:
+                written += self.write(
+                    symbol, ticker["last"], ticker.get("percentage"), ticker.get("quoteVolume"),
+                    ticker.get("timestamp")
+                )
+        self.beat()
+        return written
+
+    def beat(self) -> None:
+        struct.pack_into("<d", self.buffer, HEARTBEAT_OFFSET, time.time())
+
+    # Reader side
+
+    @property
+    def heartbeat(self) -> float:
+        return struct.unpack_from("<d", self.buffer, HEARTBEAT_OFFSET)[0]
+
+    def read(self, symbol: str) -> Optional[SharedTicker]:
+        """A symbol's latest values, or None if it has no slot or was never written."""
+        offset = self.offsets.get(symbol)
+        if offset is None:
+            return None
+        buffer = self.buffer
+        sequence_at = offset + SEQUENCE_OFFSET
+        for _ in range(MAX_RETRIES):
+            sequence, last, percentage, quote_volume, timestamp, updated = STATE.unpack_from(buffer, sequence_at)
+            if not sequence & 1 and SEQUENCE.unpack_from(buffer, sequence_at)[0] == sequence:
+                break
+        else:
+            return None
+        if sequence == 0:
+            return None
+        return SharedTicker(symbol, last, _optional(percentage), _optional(quote_volume), timestamp or None, updated)
+
+    def read_many(self, symbols: Iterable[str]) -> Dict[str, SharedTicker]:
+        """Latest values of the symbols that have been written."""
+        tickers = {}
+        for symbol in symbols:
+            ticker = self.read(symbol)
+            if ticker is not None:
+                tickers[symbol] = ticker
+        return tickers
+
+
+class PriceTableReader:
+    """
+    A worker's handle on the table: attaches when the writer is up, ignores the
+    table while its heartbeat is older than max_age and re-attaches after that.
+    """
+
+    def __init__(self, name: str, max_age: float, retry_seconds: float = 1.0):
+        self.name = name
+        self.max_age = max_age
+        self.retry_seconds = retry_seconds
+        self.table: Optional[PriceTable] = None
+        self.next_attempt = 0.0
+
+    def _table(self) -> Optional[PriceTable]:
+        table = self.table
+        now = time.time()
+        if table is not None and now - table.heartbeat <= self.max_age:
+            return table
+        if time.monotonic() < self.next_attempt:
+            return None
+        self.next_attempt = time.monotonic() + self.retry_seconds
+        if table is not None:
+            self.table = None
+            table.close()
+        try:
+            table = PriceTable.attach(self.name)
+        except ValueError:
+            return None
+        if table is None or now - table.heartbeat > self.max_age:
+            if table is not None:
+                table.close()
+            return None
+        self.table = table
+        return table
+
+    def tickers(self, symbols: List[str]) -> Optional[Dict[str, dict]]:
+        """ccxt-shaped tickers for all of symbols, or None if the table cannot answer for all of them."""
+        table = self._table()
+        if table is None:
+            return None
+        found = table.read_many(symbols)
+        if len(found) < len(symbols):
+            return None
+        return {symbol: ticker.as_ccxt() for symbol, ticker in found.items()}
+
+    def close(self) -> None:
+        if self.table is not None:
+            self.table.close()
+            self.table = None
@@ -0,0 +1,295 @@
+"""
+On-demand request profiling.
+A request runs under a profiler when an admin asks for it (X-Profile header or
+profile query parameter, value 'sample' or 'cprofile') or when its route is
+sampled (every Nth request, per PROFILE_SAMPLE_ROUTES). Two profilers exist:
+
+    sample    A background thread records the event loop thread's stack every
+              PROFILE_SAMPLE_INTERVAL_MS and writes folded stacks ("a;b;c 12" per
+              line), the input of flamegraph.pl, inferno and speedscope.
+    cprofile  Deterministic cProfile; writes a pstats file (snakeviz, flameprof)
+              and a text summary. Only one runs at a time; concurrent requests
+              fall back to sampling.
+
+Both watch the event loop thread, so a profile also shows whatever else the loop
+ran during the request; work handed to worker threads is not included.
+
+Profiles are stored under PROFILE_DIR with an id returned in the X-Profile-Id
+response header. When PROFILING_ENABLED is off the middleware is not installed.
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from starlette.routing import compile_path
+from app.config import settings
+from app.database import SessionLocal
+from app.middleware import get_current_admin, get_current_user
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+
+# Stored files per profile, by format
+FORMATS = {"folded": ".folded", "pstats": ".prof", "text": ".txt"}
+
+PROFILE_ID_PATTERN = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        """Folded stacks, root first, one 'frame;frame;frame count' line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Profiles on disk: one metadata file plus one file per output format, keyed by id."""
+
+    def __init__(self, directory: str, max_profiles: int = 200):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    @staticmethod
+    def new_id() -> str:
+        """UTC start time to the microsecond plus a random suffix, e.g. 20240105T093012123456-1f2e3d4c."""
+        now = time.time()
+        return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now % 1 * 1e6):06d}-{secrets.token_hex(4)}"
+
+    def save(self, profile_id: str, meta: Dict, outputs: Dict[str, bytes]) -> None:
+        """Write a profile and drop the oldest ones beyond max_profiles."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name, data in outputs.items():
+            with open(os.path.join(self.directory, profile_id + FORMATS[name]), "wb") as f:
+                f.write(data)
+        meta = dict(meta, id=profile_id, formats=sorted(outputs))
+        with open(os.path.join(self.directory, profile_id + ".json"), "w") as f:
+            json.dump(meta, f)
+
+        # Ids start with their UTC timestamp, so name order is age order
+        for stale in self.ids()[self.max_profiles:]:
+            for suffix in (".json", *FORMATS.values()):
+                path = os.path.join(self.directory, stale + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def ids(self) -> List[str]:
+        """Stored profile ids, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")), reverse=True)
+
+    def list(self, limit: int = 100) -> List[Dict]:
+        """Metadata of the newest profiles."""
+        entries = []
+        for profile_id in self.ids()[:limit]:
+            with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                entries.append(json.load(f))
+        return entries
+
+    def path(self, profile_id: str, output: str) -> Optional[str]:
+        """File of one output of a profile, or None if there is none."""
+        if not PROFILE_ID_PATTERN.match(profile_id) or output not in FORMATS:
+            return None
+        path = os.path.join(self.directory, profile_id + FORMATS[output])
+        return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running flagged or sampled requests under a profiler."""
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        sample_routes: Optional[Dict[str, int]] = None,
+        interval: float = 0.001
+    ):
+        self.app = app
+        self.store = store
+        self.interval = interval
+        self.routes = [
+            (compile_path(template)[0], template, every)
+            for template, every in (sample_routes or {}).items() if every > 0
+        ]
+        self.counters: Counter = Counter()
+        self._cprofile_busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = requested_mode(scope)
+        if mode is not None:
+            denied = await authorize(scope)
+            if denied is not None:
+                return await send_error(send, *denied)
+            trigger = "admin"
+        else:
+            sampled = self._sampled(scope) if self.routes else None
+            if sampled is None:
+                return await self.app(scope, receive, send)
+            mode, trigger = "sample", "1 in {1} of {0}".format(*sampled)
+        await self._profile(scope, receive, send, mode, trigger)
+
+    def _sampled(self, scope) -> Optional[Tuple[str, int]]:
+        """(route template, N) if this request is the Nth one to a sampled route."""
+        for regex, template, every in self.routes:
+            if regex.match(scope["path"]):
+                self.counters[template] += 1
+                return (template, every) if self.counters[template] % every == 0 else None
+        return None
+
+    async def _profile(self, scope, receive, send, mode: str, trigger: str) -> None:
+        profile_id = self.store.new_id()
+        status_code = 0
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        if mode == "cprofile" and self._cprofile_busy:
+            mode = "sample"
+        profiler = sampler = None
+        if mode == "cprofile":
+            self._cprofile_busy = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_busy = False
+            else:
+                sampler.stop()
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "mode": mode,
+                "trigger": trigger,
+                "started_at": time.time() - duration,
+            }
+            await asyncio.to_thread(self._save, profile_id, meta, profiler, sampler)
+
+    def _save(self, profile_id: str, meta: Dict, profiler, sampler) -> None:
+        try:
+            if profiler is not None:
+                text = io.StringIO()
+                stats = pstats.Stats(profiler, stream=text)
+                stats.sort_stats("cumulative").print_stats(40)
+                # Same bytes Stats.dump_stats writes
+                outputs = {"pstats": marshal.dumps(stats.stats), "text": text.getvalue().encode()}
+            else:
+                meta["samples"] = sum(sampler.stacks.values())
+                outputs = {"folded": sampler.folded().encode()}
+            self.store.save(profile_id, meta, outputs)
+        except OSError as e:
+            logger.warning("Could not store profile %s: %s", profile_id, e)
+
+
+def requested_mode(scope) -> Optional[str]:
+    """Profiler asked for by the X-Profile header or the profile query parameter."""
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return _mode(value.decode("latin-1"))
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        for pair in query.decode("latin-1").split("&"):
+            key, _, value = pair.partition("=")
+            if key == "profile":
+                return _mode(value)
+    return None
+
+
+def _mode(value: str) -> Optional[str]:
+    value = value.strip().lower()
+    if value in ("", "0", "false", "off"):
+        return None
+    return value if value in MODES else "sample"
+
+
+async def authorize(scope) -> Optional[tuple]:
+    """None if the bearer token belongs to an active admin, else (status, detail)."""
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                token = credentials.strip()
+    if not token:
+        return 401, "Not authenticated"
+
+    db = SessionLocal()
+    try:
+        await get_current_admin(await get_current_user(token, db))
+    except Exception as e:
+        return getattr(e, "status_code", 401), getattr(e, "detail", "Could not validate credentials")
+    finally:
+        db.close()
+    return None
+
+
+async def send_error(send, status_code: int, detail: str) -> None:
+    """Send a JSON error response like FastAPI's HTTPException handler."""
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Stored profiles, shared by the middleware and the admin routes
+profile_store = ProfileStore(settings.profile_dir, max_profiles=settings.profile_max_files)
@@ -0,0 +1,243 @@
+"""
+Per-request SQL statistics.
+Dialect events (installed on the app engine by app.database) time every statement and
+add it to the statistics of the request being served, found through a context
+variable, so work in asyncio.to_thread is attributed to its request as well.
+Per request this gives the query count, total database time, slow statements
+and statement shapes repeated within the request: the same SELECT run over and
+over with different parameters is the signature of an N+1 lazy load.
+
+Requests are summed per route into QueryMetrics, exported as JSON or in the
+Prometheus text format. In debug mode every response carries a summary in
+X-DB-* headers.
+"""
+
+import logging
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Placeholder styles of the supported drivers: qmark (sqlite), pyformat (psycopg2), numeric (asyncpg)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+# Expanded IN lists, e.g. (?, ?, ?)
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def statement_shape(statement: str) -> str:
+    """Statement text with placeholders, IN-list lengths and whitespace normalized."""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class RequestQueries:
+    """Statements executed while serving one request."""
+    __slots__ = ("count", "seconds", "statements", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()  # Raw statement text -> executions
+        self.slow: List[Tuple[float, str]] = []
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """SELECT shapes executed at least threshold times."""
+        shapes: Counter = Counter()
+        for statement, count in self.statements.items():
+            shapes[statement_shape(statement)] += count
+        return {
+            shape: count for shape, count in shapes.most_common()
+            if count >= threshold and shape[:6].upper() == "SELECT"
+        }
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+class RouteTotals:
+    """Sums over the requests to one route."""
+    __slots__ = ("requests", "queries", "seconds", "max_queries", "slow_queries", "repeated_requests")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.max_queries = 0
+        self.slow_queries = 0
+        self.repeated_requests = 0
+
+
+class QueryMetrics:
+    """Process-wide SQL statistics: per-route totals, recent slow statements and repeated shapes."""
+
+    def __init__(self, slow_ms: float = 100.0, repeat_threshold: int = 5, keep: int = 50):
+        self.slow_seconds = slow_ms / 1000
+        self.repeat_threshold = repeat_threshold
+        self.routes: Dict[str, RouteTotals] = {}
+        self.background = RouteTotals()  # Statements outside any request
+        self.slow: Deque[Dict] = deque(maxlen=keep)
+        self.repeated: Counter = Counter()  # "route | shape" -> requests that repeated it
+
+    def record(self, statement: str, seconds: float) -> None:
+        """Account one statement; called from the dialect events."""
+        queries = current_queries.get()
+        if queries is None:
+            self.background.queries += 1
+            self.background.seconds += seconds
+            if seconds >= self.slow_seconds:
+                self.background.slow_queries += 1
+                self._slow(statement, seconds, None)
+            return
+        queries.count += 1
+        queries.seconds += seconds
+        queries.statements[statement] += 1
+        if seconds >= self.slow_seconds:
+            queries.slow.append((seconds, statement))
+
+    def finish(self, route: str, queries: RequestQueries) -> Dict[str, int]:
+        """Fold a finished request into the route totals; returns its repeated shapes."""
+        totals = self.routes.get(route)
+        if totals is None:
+            totals = self.routes[route] = RouteTotals()
+        totals.requests += 1
+        totals.queries += queries.count
+        totals.seconds += queries.seconds
+        totals.max_queries = max(totals.max_queries, queries.count)
+        totals.slow_queries += len(queries.slow)
+        for seconds, statement in queries.slow:
+            self._slow(statement, seconds, route)
+
+        repeated = queries.repeated(self.repeat_threshold) if queries.count >= self.repeat_threshold else {}
+        if repeated:
+            totals.repeated_requests += 1
+            for shape, count in repeated.items():
+                self.repeated[f"{route} | {shape}"] += 1
+                logger.warning("%s ran the same statement %d times (possible N+1): %s", route, count, shape[:300])
+        return repeated
+
+    def _slow(self, statement: str, seconds: float, route: Optional[str]) -> None:
+        logger.warning("Slow query (%.1f ms) in %s: %s", seconds * 1000, route or "background", statement[:500])
+        self.slow.append({"route": route, "ms": round(seconds * 1000, 3), "statement": statement[:2000],
+                          "at": time.time()})
+
+    def snapshot(self) -> Dict:
+        """Aggregates as plain data."""
+        def totals(item: RouteTotals) -> Dict:
+            return {name: getattr(item, name) for name in RouteTotals.__slots__}
+        return {
+            "routes": {route: totals(item) for route, item in sorted(self.routes.items())},
+            "background": totals(self.background),
+            "slow_statements": list(self.slow),
+            "repeated_statements": [
+                {"route": key.split(" | ", 1)[0], "shape": key.split(" | ", 1)[1], "requests": count}
+                for key, count in self.repeated.most_common(50)
+            ],
+        }
+
+    def prometheus(self) -> str:
+        """Route totals in the Prometheus text exposition format."""
+        series = [
+            ("sql_requests_total", "counter", "Requests served", "requests"),
+            ("sql_queries_total", "counter", "Statements executed", "queries"),
+            ("sql_query_seconds_total", "counter", "Time spent in statements", "seconds"),
+            ("sql_slow_queries_total", "counter", "Statements slower than the slow-query threshold", "slow_queries"),
+            ("sql_repeated_statement_requests_total", "counter",
+             "Requests repeating one SELECT shape (possible N+1)", "repeated_requests"),
+            ("sql_max_queries_per_request", "gauge", "Most statements in one request", "max_queries"),
+        ]
+        routes = list(self.routes.items()) + [("background", self.background)]
+        lines = []
+        for name, kind, help_text, field in series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for route, item in routes:
+                if field == "requests" and route == "background":
+                    continue
+                label = route.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{route="{label}"}} {getattr(item, field)}')
+        return "\n".join(lines) + "\n"
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware giving each HTTP request its own statement statistics."""
+
+    def __init__(self, app, metrics: QueryMetrics, headers: bool = False):
+        self.app = app
+        self.metrics = metrics
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        send_with_headers = send
+        if self.headers:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    # Statements of a streamed body run after this point and are not included
+                    repeated = queries.repeated(self.metrics.repeat_threshold)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-query-count", str(queries.count).encode()),
+                        (b"x-db-time-ms", f"{queries.seconds * 1000:.2f}".encode()),
+                        (b"x-db-repeated-statements", str(len(repeated)).encode()),
+                    ]
+                await send(message)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_queries.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            self.metrics.finish(f"{scope['method']} {template}", queries)
+
+
+def instrument(engine: Engine, metrics: QueryMetrics) -> None:
+    """
+    Time every statement run on engine and record it in metrics.
+
+    Hooks the dialect's do_execute* calls rather than the connection-level
+    before/after_cursor_execute events: any connection event switches every
+    execute, begin and commit onto SQLAlchemy's event-dispatch path, which
+    costs several microseconds per statement, while dialect events are only
+    consulted around the DBAPI call itself. Failed statements raise through
+    and are not recorded.
+    """
+    dialect = engine.dialect
+    perf_counter = time.perf_counter
+
+    @event.listens_for(engine, "do_execute")
+    def timed_execute(cursor, statement, parameters, context):
+        started = perf_counter()
+        dialect.do_execute(cursor, statement, parameters, context)
+        metrics.record(statement, perf_counter() - started)
+        return True
+
+    @event.listens_for(engine, "do_execute_no_params")
+    def timed_execute_no_params(cursor, statement, context):
+        started = perf_counter()
+        dialect.do_execute_no_params(cursor, statement, context)
+        metrics.record(statement, perf_counter() - started)
+        return True
+
+    @event.listens_for(engine, "do_executemany")
+    def timed_executemany(cursor, statement, parameters, context):
+        started = perf_counter()
+        dialect.do_executemany(cursor, statement, parameters, context)
+        metrics.record(statement, perf_counter() - started)
+        return True
+
+
+# Statistics of the application engine, shared by the middleware and the admin routes
+query_metrics = QueryMetrics(slow_ms=settings.sql_slow_query_ms, repeat_threshold=settings.sql_repeat_threshold)
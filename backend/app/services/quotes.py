@@ -0,0 +1,219 @@
+"""
+Consolidated quotes across exchanges.
+Each venue is polled by its own task with its own timeout and writes into one
+in-memory table keyed by normalized symbol. Consolidated answers (best bid/ask
+across venues plus per-venue prices) are read from the table only, so a slow or
+failing venue just leaves its entries stale; it never delays a response.
+
+A symbol nobody has asked for yet is fetched from every venue at once and the
+caller waits only for the first venue to answer; the rest fill in behind it.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Venue-specific currency codes and their common names
+CURRENCY_ALIASES = {"XBT": "BTC", "XDG": "DOGE"}
+
+# Quote currencies recognised at the end of separator-less ids such as BTCUSDT
+QUOTE_CURRENCIES = ("USDT", "USDC", "BUSD", "USD", "EUR", "BTC", "ETH")
+
+# async fetch(symbols) -> {venue symbol: ccxt-style ticker dict}
+TickerFetcher = Callable[[List[str]], Awaitable[Dict[str, Dict]]]
+
+
+def normalize_symbol(symbol: str, default_quote: str = "USDT") -> str:
+    """
+    Return the BASE/QUOTE form of a venue or user supplied symbol.
+
+    Examples:
+        'btc' -> 'BTC/USDT', 'BTC-USDT' -> 'BTC/USDT', 'XBT/USD' -> 'BTC/USD',
+        'ETHBTC' -> 'ETH/BTC', 'BTC/USDT:USDT' -> 'BTC/USDT'
+    """
+    text = symbol.strip().upper().replace("-", "/").replace("_", "/")
+    if "/" in text:
+        base, quote = text.split("/", 1)
+        quote = quote.split(":", 1)[0]
+    else:
+        base, quote = text, default_quote
+        for currency in QUOTE_CURRENCIES:
+            if text.endswith(currency) and len(text) > len(currency):
+                base, quote = text[:-len(currency)], currency
+                break
+    return f"{CURRENCY_ALIASES.get(base, base)}/{CURRENCY_ALIASES.get(quote, quote)}"
+
+
+class VenueQuote(NamedTuple):
+    """Latest top of book from one venue."""
+    venue: str
+    bid: Optional[float]
+    ask: Optional[float]
+    last: Optional[float]
+    received_at: float
+
+
+class ConsolidatedQuote(NamedTuple):
+    """Best bid/ask across fresh venue quotes."""
+    symbol: str
+    best_bid: Optional[float]
+    best_bid_venue: Optional[str]
+    best_ask: Optional[float]
+    best_ask_venue: Optional[str]
+    venues: List[VenueQuote]
+
+
+class QuoteTable:
+    """Latest quote per (symbol, venue)."""
+
+    def __init__(self, max_age: float = 10.0, clock: Callable[[], float] = time.time):
+        self.max_age = max_age
+        self.clock = clock
+        self.quotes: Dict[str, Dict[str, VenueQuote]] = {}
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.quotes
+
+    def update(self, symbol: str, venue: str, ticker: Dict) -> None:
+        """Store a venue's ticker for a normalized symbol."""
+        self.quotes.setdefault(symbol, {})[venue] = VenueQuote(
+            venue, ticker.get("bid"), ticker.get("ask"), ticker.get("last"), self.clock()
+        )
+
+    def consolidated(self, symbol: str) -> Optional[ConsolidatedQuote]:
+        """Best bid/ask over venues quoted within max_age; None if no venue is fresh."""
+        by_venue = self.quotes.get(symbol)
+        if not by_venue:
+            return None
+        cutoff = self.clock() - self.max_age
+        fresh = [quote for quote in by_venue.values() if quote.received_at >= cutoff]
+        if not fresh:
+            return None
+
+        best_bid = best_ask = None
+        best_bid_venue = best_ask_venue = None
+        for quote in fresh:
+            if quote.bid is not None and (best_bid is None or quote.bid > best_bid):
+                best_bid, best_bid_venue = quote.bid, quote.venue
+            if quote.ask is not None and (best_ask is None or quote.ask < best_ask):
+                best_ask, best_ask_venue = quote.ask, quote.venue
+        return ConsolidatedQuote(symbol, best_bid, best_bid_venue, best_ask, best_ask_venue, fresh)
+
+
+@dataclass
+class VenueStats:
+    """Fetch outcomes for one venue."""
+    fetches: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    last_latency_ms: float = 0.0
+
+
+def ccxt_fetcher(exchange) -> TickerFetcher:
+    """Adapt a synchronous ccxt exchange to an async ticker fetcher."""
+    async def fetch(symbols: List[str]) -> Dict[str, Dict]:
+        return await asyncio.to_thread(exchange.fetch_tickers, symbols)
+    return fetch
+
+
+class QuoteAggregator:
+    """Polls venues independently and serves consolidated quotes from a QuoteTable."""
+
+    def __init__(
+        self,
+        venues: Dict[str, TickerFetcher],
+        timeout: float = 2.0,
+        interval: float = 1.0,
+        max_age: float = 10.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.venues = venues
+        self.timeout = timeout
+        self.interval = interval
+        self.table = QuoteTable(max_age, clock)
+        self.watched: Set[str] = set()
+        self.stats: Dict[str, VenueStats] = {venue: VenueStats() for venue in venues}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def fetch_venue(self, venue: str, symbols: List[str]) -> bool:
+        """
+        Fetch tickers from one venue into the table, bounded by the venue timeout.
+
+        Returns:
+            True if the venue answered in time
+        """
+        stats = self.stats[venue]
+        stats.fetches += 1
+        started = time.perf_counter()
+        try:
+            tickers = await asyncio.wait_for(self.venues[venue](symbols), self.timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logger.warning("%s did not answer within %.1fs", venue, self.timeout)
+            return False
+        except Exception as exc:
+            stats.errors += 1
+            logger.warning("Failed to fetch tickers from %s: %s", venue, exc)
+            return False
+        stats.last_latency_ms = (time.perf_counter() - started) * 1000
+
+        for venue_symbol, ticker in tickers.items():
+            self.table.update(normalize_symbol(venue_symbol), venue, ticker)
+        return True
+
+    async def _poll(self, venue: str) -> None:
+        while True:
+            if self.watched:
+                await self.fetch_venue(venue, sorted(self.watched))
+            await asyncio.sleep(self.interval)
+
+    def watch(self, symbols: Iterable[str]) -> None:
+        """Add normalized symbols to the set every poller fetches."""
+        self.watched.update(symbols)
+
+    async def warm(self, symbols: List[str]) -> None:
+        """
+        Fetch symbols from all venues, returning once the first venue has answered
+        (or every venue has failed). Slower venues keep updating the table afterwards.
+        """
+        tasks = [asyncio.create_task(self.fetch_venue(venue, symbols)) for venue in self.venues]
+        self._inflight.update(tasks)
+        for task in tasks:
+            task.add_done_callback(self._inflight.discard)
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(task.result() for task in done):
+                return
+
+    async def quotes(self, symbols: List[str]) -> Dict[str, Optional[ConsolidatedQuote]]:
+        """
+        Consolidated quotes for normalized symbols.
+        Symbols not in the table yet are watched from now on and warmed first.
+        """
+        missing = [symbol for symbol in symbols if symbol not in self.table]
+        if missing:
+            self.watch(missing)
+            await self.warm(missing)
+        return {symbol: self.table.consolidated(symbol) for symbol in symbols}
+
+    def start(self, symbols: Iterable[str] = ()) -> None:
+        """Start one poller per venue on the running event loop."""
+        self.watch(symbols)
+        for venue in self.venues:
+            if venue not in self._tasks:
+                self._tasks[venue] = asyncio.create_task(self._poll(venue))
+
+    async def stop(self) -> None:
+        """Cancel pollers and outstanding warm-up fetches."""
+        tasks = list(self._tasks.values()) + list(self._inflight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
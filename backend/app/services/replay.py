@@ -0,0 +1,314 @@
+"""
+Deterministic market replay.
+Recorded candles or ticks are pushed through the live code paths on a virtual
+clock. Each price update goes to the market-data layer, then to the alert checks,
+the resting stop-loss / take-profit orders and the grid strategies. Each bar close runs the strategy scheduler, whose signals go through
+the same simulated fill path as create_trade. Nothing reads wall-clock time, so
+the same input and starting database give the same trades and alerts, which
+the report summarizes as a digest for regression comparisons. Strategy indicator
+states are kept in memory only and start empty on every run.
+"""
+
+import hashlib
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import func
+from app.database import SessionLocal
+from app.models import Alert, Trade
+from app.services.alerts import AlertMonitor
+from app.services.analytics import rebuild_positions
+from app.services.conditional_orders import ConditionalOrderMonitor
+from app.services.events import EventBus
+from app.services.grid import GridEngine
+from app.services.risk import RiskEngine
+from app.services.strategy_scheduler import StrategyScheduler, TIMEFRAME_SECONDS
+from app.services.tick_recorder import TickReader
+
+# Timed stages, in pipeline order
+STAGES = ("market_data", "alerts", "stops", "grids", "strategies", "fills")
+
+
+class VirtualClock:
+    """Replay time in epoch seconds; only moves when the driver advances it."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def advance_to(self, timestamp: float) -> None:
+        if timestamp < self.now:
+            raise ValueError("Virtual clock cannot move backwards")
+        self.now = timestamp
+
+
+class ReplayCandleSource:
+    """Scheduler candle source serving candles that closed by the virtual clock."""
+
+    def __init__(self, clock: VirtualClock, timeframe: str):
+        self.clock = clock
+        self.step_ms = TIMEFRAME_SECONDS[timeframe] * 1000
+        self.candles: Dict[str, List[list]] = {}
+        self.fetches = 0
+
+    def add(self, symbol: str, candle: list) -> None:
+        self.candles.setdefault(symbol, []).append(candle)
+
+    async def fetch(self, symbol: str, timeframe: str, limit: int) -> List[list]:
+        self.fetches += 1
+        candles = self.candles.get(symbol, [])
+        cutoff = self.clock.time() * 1000 - self.step_ms
+        end = len(candles)
+        while end and candles[end - 1][0] > cutoff:
+            end -= 1
+        return candles[max(0, end - limit):end]
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of a replay run."""
+    events: int = 0
+    bars: int = 0
+    signals: int = 0
+    fills: int = 0
+    alerts_triggered: int = 0
+    grid_fills: int = 0
+    elapsed_seconds: float = 0.0
+    stages: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    digest: str = ""
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+def stage_summary(samples: array) -> Dict[str, float]:
+    """Count and latency percentiles (microseconds) for one stage."""
+    if not samples:
+        return {"count": 0, "mean_us": 0.0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+    values = np.frombuffer(samples, dtype=np.int64) / 1000
+    p50, p99 = np.percentile(values, [50, 99])
+    return {
+        "count": len(values),
+        "mean_us": float(values.mean()),
+        "p50_us": float(p50),
+        "p99_us": float(p99),
+        "max_us": float(values.max()),
+    }
+
+
+def ticks_from_recorder(root: str, symbols: Iterable[str], start_ns: int, end_ns: int) -> Dict[str, np.ndarray]:
+    """Recorded ticks for several symbols over a time range, ready for replay_ticks."""
+    reader = TickReader(root)
+    return {symbol: reader.read_concatenated(symbol, start_ns, end_ns) for symbol in symbols}
+
+
+class MarketReplay:
+    """
+    Drives recorded market data through alerts, conditional orders, grids, strategies
+    and order fills. Strategies on the replay timeframe, active grids, price alerts
+    and pending conditional orders are loaded from the database at the start of a run.
+    """
+
+    def __init__(self, timeframe: str = "1m", session_factory: Callable = SessionLocal, timeout: Optional[float] = None):
+        self.timeframe = timeframe
+        self.step_ms = TIMEFRAME_SECONDS[timeframe] * 1000
+        self.session_factory = session_factory
+        self.clock = VirtualClock()
+        self.source = ReplayCandleSource(self.clock, timeframe)
+        self.risk = RiskEngine(clock=self.clock.time)
+        self.bus = EventBus()
+        self.scheduler = StrategyScheduler(
+            session_factory, self.source, timeout, clock=self.clock.time, risk=self.risk, bus=self.bus,
+            persist_indicators=False
+        )
+        self.monitor = ConditionalOrderMonitor(session_factory, self.risk, self.clock.time, bus=self.bus)
+        self.grids = GridEngine(session_factory, self.risk, self.clock.time, bus=self.bus)
+        self.alerts = AlertMonitor(session_factory, self.clock.time, bus=self.bus)
+        self.latest: Dict[str, float] = {}
+        self.stages: Dict[str, array] = {}
+        self.report = ReplayReport()
+        self.triggered: List[int] = []
+        self.stop_fills: List[int] = []
+        self.grid_fills = 0
+        self.db = None
+        self.first_trade_id = 0
+
+    def _start(self) -> None:
+        self.db = self.session_factory()
+        self.first_trade_id = (self.db.query(func.max(Trade.id)).scalar() or 0) + 1
+        self.alerts.load(self.db)
+        # Lots as of the starting database, so a replay does not depend on what ran before it
+        rebuild_positions(self.db)
+        self.risk.reconcile(self.db)
+        self.monitor.load(self.db)
+        self.grids.load(self.db)
+        self.scheduler.load_strategies()
+        self.scheduler.load_indicators()
+        self.stages = {name: array("q") for name in STAGES}
+        self.report = ReplayReport()
+        self.triggered = []
+        self.stop_fills = []
+        self.grid_fills = 0
+
+    async def _on_price(self, symbol: str, low: float, high: float) -> None:
+        """Alert checks, conditional orders and grids for one price update; all write immediately."""
+        started = time.perf_counter_ns()
+        self.triggered.extend(await self.alerts.on_price(symbol, low, high))
+        checked = time.perf_counter_ns()
+        self.stages["alerts"].append(checked - started)
+        self.stop_fills.extend(await self.monitor.on_price(symbol, low, high))
+        stopped = time.perf_counter_ns()
+        self.stages["stops"].append(stopped - checked)
+        self.grid_fills += len(await self.grids.on_price(symbol, low, high))
+        self.stages["grids"].append(time.perf_counter_ns() - stopped)
+
+    async def _close_bar(self, close_ms: int) -> None:
+        """Advance to a bar close and run the strategies on it."""
+        self.clock.advance_to(close_ms / 1000)
+        bar = await self.scheduler.run_bar(self.timeframe, close_ms / 1000)
+        self.stages["strategies"].append(int((bar.latency_ms - bar.submit_ms) * 1e6))
+        self.stages["fills"].append(int(bar.submit_ms * 1e6))
+        self.report.bars += 1
+        self.report.signals += bar.signals
+
+    async def replay_candles(self, candles: Dict[str, List[list]]) -> ReplayReport:
+        """
+        Replay OHLCV candles ([open_ms, open, high, low, close, volume]) on the
+        replay timeframe. Candles sharing a close time are delivered in symbol order,
+        then the bar is run.
+
+        Args:
+            candles: Candles per symbol, oldest first
+
+        Returns:
+            Replay report
+        """
+        self._start()
+        started = time.perf_counter()
+        try:
+            events = sorted(
+                (candle[0], symbol, candle)
+                for symbol in sorted(candles)
+                for candle in candles[symbol]
+            )
+            market_data = self.stages["market_data"]
+            index = 0
+            while index < len(events):
+                open_ms = events[index][0]
+                self.clock.advance_to((open_ms + self.step_ms) / 1000)
+                while index < len(events) and events[index][0] == open_ms:
+                    _, symbol, candle = events[index]
+                    tick_started = time.perf_counter_ns()
+                    self.latest[symbol] = candle[4]
+                    self.risk.update_price(symbol, candle[4])
+                    self.source.add(symbol, candle)
+                    market_data.append(time.perf_counter_ns() - tick_started)
+                    await self._on_price(symbol, candle[3], candle[2])
+                    index += 1
+                await self._close_bar(open_ms + self.step_ms)
+            self.report.events = len(events)
+            return self._finish(started)
+        finally:
+            self.db.close()
+
+    async def replay_ticks(self, ticks: Dict[str, np.ndarray]) -> ReplayReport:
+        """
+        Replay recorded ticks (TICK_DTYPE arrays). Ticks are merged across symbols by
+        timestamp (ties in symbol order) and built into candles on the replay
+        timeframe; every completed bar is closed and run. A trailing partial bar is
+        not closed.
+
+        Args:
+            ticks: Tick arrays per symbol, each in timestamp order
+
+        Returns:
+            Replay report
+        """
+        self._start()
+        started = time.perf_counter()
+        try:
+            symbols = sorted(symbol for symbol in ticks if len(ticks[symbol]))
+            if not symbols:
+                return self._finish(started)
+            stamps = np.concatenate([ticks[symbol]["timestamp"] for symbol in symbols])
+            prices = np.concatenate([ticks[symbol]["price"] for symbol in symbols])
+            sizes = np.concatenate([ticks[symbol]["size"] for symbol in symbols])
+            owners = np.repeat(np.arange(len(symbols)), [len(ticks[symbol]) for symbol in symbols])
+            order = np.argsort(stamps, kind="stable")
+
+            market_data = self.stages["market_data"]
+            step_ms = self.step_ms
+            building: Dict[str, list] = {}
+            bar_open: Optional[int] = None
+            for stamp, owner, price, size in zip(
+                stamps[order].tolist(), owners[order].tolist(), prices[order].tolist(), sizes[order].tolist()
+            ):
+                tick_open = stamp // 1_000_000 // step_ms * step_ms
+                if tick_open != bar_open:
+                    if bar_open is not None:
+                        for symbol in sorted(building):
+                            self.source.add(symbol, building[symbol])
+                        building = {}
+                        await self._close_bar(bar_open + step_ms)
+                    bar_open = tick_open
+                self.clock.advance_to(stamp / 1e9)
+
+                tick_started = time.perf_counter_ns()
+                symbol = symbols[owner]
+                self.latest[symbol] = price
+                self.risk.update_price(symbol, price)
+                candle = building.get(symbol)
+                if candle is None:
+                    building[symbol] = [tick_open, price, price, price, price, size]
+                else:
+                    if price > candle[2]:
+                        candle[2] = price
+                    elif price < candle[3]:
+                        candle[3] = price
+                    candle[4] = price
+                    candle[5] += size
+                market_data.append(time.perf_counter_ns() - tick_started)
+                await self._on_price(symbol, price, price)
+
+            self.report.events = len(stamps)
+            return self._finish(started)
+        finally:
+            self.db.close()
+
+    def _finish(self, started: float) -> ReplayReport:
+        report = self.report
+        report.elapsed_seconds = time.perf_counter() - started
+        report.stages = {name: stage_summary(samples) for name, samples in self.stages.items()}
+        report.alerts_triggered = len(self.triggered)
+        report.grid_fills = self.grid_fills
+        report.fills, report.digest = self._digest()
+        return report
+
+    def _digest(self):
+        """Fill count and SHA-256 over the run's fills and triggered alerts, in order."""
+        digest = hashlib.sha256()
+        trades = self.db.query(Trade).filter(Trade.id >= self.first_trade_id).order_by(Trade.id).all()
+        # Conditional orders placed before the run but filled during it
+        if self.stop_fills:
+            resting = {
+                trade.id: trade
+                for trade in self.db.query(Trade).filter(Trade.id.in_(self.stop_fills), Trade.id < self.first_trade_id)
+            }
+            trades = [resting[trade_id] for trade_id in self.stop_fills if trade_id in resting] + trades
+        for trade in trades:
+            digest.update(repr((
+                trade.strategy_id, trade.symbol, trade.order_side.value, trade.order_status.value,
+                trade.filled_quantity, trade.average_price, trade.fee,
+                trade.executed_at.isoformat() if trade.executed_at else None
+            )).encode())
+        if self.triggered:
+            rows = self.db.query(Alert.id, Alert.triggered_at).filter(Alert.id.in_(self.triggered)).all()
+            triggered_at = dict(rows)
+            for alert_id in self.triggered:
+                digest.update(repr((alert_id, triggered_at[alert_id].isoformat())).encode())
+        return len(trades), digest.hexdigest()
@@ -0,0 +1,464 @@
+"""
+Pre-trade risk checks.
+Positions, open-order notional and realized daily P&L are kept in memory and
+updated as orders are placed and filled, so a check is a handful of dict
+lookups with no database access. The state is rebuilt from the database at
+startup and periodically after that, so any drift is corrected. The periodic
+rebuild reads the database in a worker thread; entries that orders and fills
+change while it runs keep their in-memory value, as do reservations for orders
+not yet in the database (journaled and batched orders, strategy signals).
+
+Limits:
+    - Strategy.max_position_size caps a strategy's position plus open buys (base units)
+    - Strategy.stop_loss_percentage / take_profit_percentage block new buys while the
+      strategy's position is beyond either level; the position can still be sold
+    - RISK_MAX_USER_EXPOSURE caps a user's marked position value plus the order
+    - RISK_MAX_OPEN_ORDER_NOTIONAL caps a user's unfilled order value
+    - RISK_MAX_DAILY_LOSS blocks new buys once a user's realized loss today reaches it
+"""
+
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import (
+    Trade, Strategy, Portfolio, PortfolioHolding, DailyTradeRollup, OrderSide, OrderStatus
+)
+from app.services.accounting import LotBook, lot_book
+from app.services.analytics import apply_average_cost, base_asset, fill_day
+
+logger = logging.getLogger(__name__)
+
+# Statuses whose unfilled quantity counts as open
+OPEN_STATUSES = (OrderStatus.PENDING, OrderStatus.PARTIALLY_FILLED)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Attributes replaced when a rebuilt state is adopted
+STATE = (
+    "holdings", "lots", "strategy_positions", "strategies", "open_orders", "open_notional", "open_buys", "daily_pnl"
+)
+
+
+class StrategyLimits(NamedTuple):
+    """Risk settings of one strategy."""
+    user_id: int
+    max_position_size: Optional[float]
+    stop_loss_percentage: Optional[float]
+    take_profit_percentage: Optional[float]
+
+
+class OpenOrder(NamedTuple):
+    """Unfilled part of an accepted order."""
+    user_id: int
+    strategy_id: Optional[int]
+    symbol: str
+    side: OrderSide
+    quantity: float
+    notional: float
+
+
+class RiskEngine:
+    """In-memory exposure tracking and pre-trade limit checks."""
+
+    def __init__(
+        self,
+        max_user_exposure: Optional[float] = None,
+        max_open_order_notional: Optional[float] = None,
+        max_daily_loss: Optional[float] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_user_exposure = settings.risk_max_user_exposure if max_user_exposure is None else max_user_exposure
+        self.max_open_order_notional = (
+            settings.risk_max_open_order_notional if max_open_order_notional is None else max_open_order_notional
+        )
+        self.max_daily_loss = settings.risk_max_daily_loss if max_daily_loss is None else max_daily_loss
+        self.clock = clock
+        self.marks: Dict[str, float] = {}
+        self._reset()
+        # Entries changed while a rebuild reads the database, as (section, key)
+        self._touched: Optional[set] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _reset(self) -> None:
+        # user_id -> asset -> [quantity, average price], mirroring PortfolioHolding
+        self.holdings: Dict[int, Dict[str, List[float]]] = {}
+        # Lots behind the holdings, matched like the holdings' own
+        self.lots = LotBook(lot_book.method)
+        # (strategy_id, symbol) -> [quantity, average price]
+        self.strategy_positions: Dict[Tuple[int, str], List[float]] = {}
+        self.strategies: Dict[int, StrategyLimits] = {}
+        self.open_orders: Dict[Hashable, OpenOrder] = {}
+        self.open_notional: Dict[int, float] = {}
+        self.open_buys: Dict[Tuple[int, str], float] = {}
+        # (user_id, day ordinal) -> realized P&L
+        self.daily_pnl: Dict[Tuple[int, int], float] = {}
+        # Highest trade id the last rebuild read
+        self.last_trade_id = 0
+
+    def today(self) -> int:
+        """Current UTC day as a date ordinal."""
+        return int(self.clock() // 86400) + EPOCH_ORDINAL
+
+    def update_price(self, symbol: str, price: float) -> None:
+        """Record the latest price for a pair."""
+        if price:
+            self.marks[base_asset(symbol)] = price
+
+    def set_strategy(self, strategy: Strategy) -> None:
+        """Refresh a strategy's limits from its row."""
+        if self._touched is not None:
+            self._touched.add(("strategies", strategy.id))
+        self.strategies[strategy.id] = StrategyLimits(
+            strategy.user_id,
+            strategy.max_position_size,
+            strategy.stop_loss_percentage,
+            strategy.take_profit_percentage
+        )
+
+    def exposure(self, user_id: int) -> float:
+        """Marked value of a user's holdings (average price when no mark is known)."""
+        marks = self.marks
+        return sum(
+            quantity * marks.get(asset, average)
+            for asset, (quantity, average) in self.holdings.get(user_id, {}).items()
+        )
+
+    def check(
+        self,
+        user_id: int,
+        symbol: str,
+        side: OrderSide,
+        quantity: float,
+        price: Optional[float] = None,
+        strategy_id: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Check an order against the user's and strategy's limits.
+
+        Args:
+            user_id: Order owner
+            symbol: Trading pair
+            side: Order side
+            quantity: Order quantity (base units)
+            price: Limit price; market orders are valued at the last known price
+            strategy_id: Strategy placing the order, if any
+
+        Returns:
+            Rejection reason, or None when the order is allowed
+        """
+        is_buy = side == OrderSide.BUY
+        reference = price or self.marks.get(base_asset(symbol))
+        notional = quantity * reference if reference else 0.0
+
+        if strategy_id is not None and is_buy:
+            limits = self.strategies.get(strategy_id)
+            if limits is not None:
+                position = self.strategy_positions.get((strategy_id, symbol))
+                held = position[0] if position else 0.0
+                if limits.max_position_size is not None:
+                    projected = held + self.open_buys.get((strategy_id, symbol), 0.0) + quantity
+                    if projected > limits.max_position_size + 1e-12:
+                        return (
+                            f"Position {projected:g} would exceed the strategy's "
+                            f"max position size {limits.max_position_size:g}"
+                        )
+                if held > 0 and reference and position[1] > 0:
+                    change = (reference / position[1] - 1) * 100
+                    if limits.stop_loss_percentage and change <= -limits.stop_loss_percentage:
+                        return f"Strategy position is {-change:.2f}% under entry, past its stop loss"
+                    if limits.take_profit_percentage and change >= limits.take_profit_percentage:
+                        return f"Strategy position is {change:.2f}% over entry, past its take profit"
+
+        if self.max_open_order_notional and notional:
+            open_notional = self.open_notional.get(user_id, 0.0) + notional
+            if open_notional > self.max_open_order_notional:
+                return f"Open order notional {open_notional:,.2f} would exceed {self.max_open_order_notional:,.2f}"
+
+        if is_buy:
+            if self.max_daily_loss:
+                realized = self.daily_pnl.get((user_id, self.today()), 0.0)
+                if realized <= -self.max_daily_loss:
+                    return f"Daily loss limit reached ({-realized:,.2f} of {self.max_daily_loss:,.2f})"
+            if self.max_user_exposure and notional:
+                exposure = self.exposure(user_id) + notional
+                if exposure > self.max_user_exposure:
+                    return f"Exposure {exposure:,.2f} would exceed {self.max_user_exposure:,.2f}"
+        return None
+
+    def reserve(
+        self,
+        key: Hashable,
+        user_id: int,
+        symbol: str,
+        side: OrderSide,
+        quantity: float,
+        price: Optional[float] = None,
+        strategy_id: Optional[int] = None
+    ) -> None:
+        """Count an accepted order as open until it fills or is released."""
+        reference = price or self.marks.get(base_asset(symbol))
+        order = OpenOrder(user_id, strategy_id, symbol, side, quantity, quantity * reference if reference else 0.0)
+        self.release(key)
+        self._open(key, order)
+
+    def _open(self, key: Hashable, order: OpenOrder) -> None:
+        self.open_orders[key] = order
+        self.open_notional[order.user_id] = self.open_notional.get(order.user_id, 0.0) + order.notional
+        if order.strategy_id is not None and order.side == OrderSide.BUY:
+            position_key = (order.strategy_id, order.symbol)
+            self.open_buys[position_key] = self.open_buys.get(position_key, 0.0) + order.quantity
+
+    def reserve_trade(self, trade: Trade) -> None:
+        """Reserve the unfilled part of a trade row, keyed by its id."""
+        remaining = trade.quantity - (trade.filled_quantity or 0.0)
+        if remaining > 0:
+            self.reserve(trade.id, trade.user_id, trade.symbol, trade.order_side, remaining, trade.price, trade.strategy_id)
+
+    def release(self, key: Hashable) -> None:
+        """Drop an open order (cancelled, failed or filled)."""
+        if self._touched is not None:
+            self._touched.add(("open_orders", key))
+        order = self.open_orders.pop(key, None)
+        if order is None:
+            return
+        self.open_notional[order.user_id] -= order.notional
+        if order.strategy_id is not None and order.side == OrderSide.BUY:
+            self.open_buys[(order.strategy_id, order.symbol)] -= order.quantity
+
+    def on_fill(self, trade: Trade) -> float:
+        """
+        Apply a filled (or partially filled) trade.
+
+        Args:
+            trade: Trade after execution
+
+        Returns:
+            Realized profit/loss of the fill, as recorded in the holdings
+        """
+        self.release(trade.id)
+        filled = trade.filled_quantity or 0.0
+        if trade.order_status == OrderStatus.PARTIALLY_FILLED:
+            self.reserve_trade(trade)
+        if not filled:
+            return 0.0
+
+        fill_price = trade.average_price or 0.0
+        fee = trade.fee or 0.0
+        asset = base_asset(trade.symbol)
+        if fill_price:
+            self.marks[asset] = fill_price
+
+        holdings = self.holdings.setdefault(trade.user_id, {})
+        holding = holdings.get(asset, (0.0, 0.0))
+        key = (trade.user_id, asset)
+        if self._touched is not None:
+            self._touched.add(("holdings", key))
+        realized = self.lots.apply(key, trade.order_side, filled, fill_price, fee, opening=tuple(holding))
+        position = self.lots.positions[key]
+        holdings[asset] = [position.quantity, position.average_price]
+
+        if trade.strategy_id is not None:
+            position_key = (trade.strategy_id, trade.symbol)
+            position = self.strategy_positions.get(position_key, (0.0, 0.0))
+            quantity, average, _ = apply_average_cost(
+                position[0], position[1], trade.order_side, filled, fill_price, fee
+            )
+            self.strategy_positions[position_key] = [quantity, average]
+            if self._touched is not None:
+                self._touched.add(("strategy_positions", position_key))
+
+        day_key = (trade.user_id, fill_day(trade).toordinal())
+        if self._touched is not None:
+            self._touched.add(("daily_pnl", day_key))
+        self.daily_pnl[day_key] = self.daily_pnl.get(day_key, 0.0) + realized
+        return realized
+
+    def reconcile(self, db: Session, chunk_size: int = 10000) -> Dict[str, float]:
+        """
+        Rebuild all state from the database and report how far memory had drifted.
+
+        Args:
+            db: Database session
+            chunk_size: Trades fetched per round trip when rebuilding strategy positions
+
+        Returns:
+            Largest absolute difference per tracked quantity
+        """
+        return self._adopt(*self._read(db, chunk_size))
+
+    async def refresh(self, chunk_size: int = 10000) -> Dict[str, float]:
+        """Like reconcile, but reads the database in a worker thread so the event loop keeps running."""
+        self._touched = set()
+        try:
+            fresh, recorded = await asyncio.to_thread(self._read_new_session, chunk_size)
+        except BaseException:
+            self._touched = None
+            raise
+        return self._adopt(fresh, recorded)
+
+    def _read_new_session(self, chunk_size: int) -> Tuple["RiskEngine", List]:
+        db = SessionLocal()
+        try:
+            return self._read(db, chunk_size)
+        finally:
+            db.close()
+
+    def _read(self, db: Session, chunk_size: int) -> Tuple["RiskEngine", List]:
+        """
+        Build the state from the database into a new engine, leaving this one untouched.
+        Also returns the recorded holdings, whose lots are taken from the live book on adoption.
+        """
+        fresh = RiskEngine(self.max_user_exposure, self.max_open_order_notional, self.max_daily_loss, self.clock)
+        fresh.marks = self.marks
+        fresh.last_trade_id = db.scalar(select(func.max(Trade.id))) or 0
+
+        for strategy in db.query(Strategy):
+            fresh.set_strategy(strategy)
+
+        holdings = db.execute(
+            select(Portfolio.user_id, PortfolioHolding.symbol, PortfolioHolding.quantity, PortfolioHolding.average_buy_price)
+            .join(Portfolio, PortfolioHolding.portfolio_id == Portfolio.id)
+            .where(PortfolioHolding.quantity > 0)
+        )
+        recorded = []
+        for user_id, asset, quantity, average in holdings:
+            fresh.holdings.setdefault(user_id, {})[asset] = [quantity, average or 0.0]
+            recorded.append(((user_id, asset), quantity, average or 0.0))
+
+        # Strategy positions are not stored, so replay the strategies' fills
+        fills = select(
+            Trade.strategy_id, Trade.symbol, Trade.order_side, Trade.filled_quantity, Trade.average_price, Trade.fee
+        ).where(
+            Trade.strategy_id.isnot(None),
+            Trade.order_status.in_((OrderStatus.FILLED, OrderStatus.PARTIALLY_FILLED))
+        ).order_by(Trade.id).execution_options(yield_per=chunk_size)
+        for strategy_id, symbol, side, filled, fill_price, fee in db.execute(fills):
+            position = fresh.strategy_positions.get((strategy_id, symbol), (0.0, 0.0))
+            quantity, average, _ = apply_average_cost(
+                position[0], position[1], side, filled or 0.0, fill_price or 0.0, fee or 0.0
+            )
+            fresh.strategy_positions[(strategy_id, symbol)] = [quantity, average]
+
+        for trade in db.query(Trade).filter(Trade.order_status.in_(OPEN_STATUSES)).order_by(Trade.id):
+            # Only the first leg of an OCO pair counts, as only one leg can fill
+            if trade.linked_trade_id is None or trade.linked_trade_id > trade.id:
+                fresh.reserve_trade(trade)
+
+        today = fresh.today()
+        daily = db.execute(
+            select(DailyTradeRollup.user_id, func.sum(DailyTradeRollup.realized_profit_loss))
+            .where(DailyTradeRollup.day == date.fromordinal(today))
+            .group_by(DailyTradeRollup.user_id)
+        )
+        for user_id, realized in daily:
+            fresh.daily_pnl[(user_id, today)] = realized or 0.0
+        return fresh, recorded
+
+    def _adopt(self, fresh: "RiskEngine", recorded: List) -> Dict[str, float]:
+        """Replace the state with a rebuilt one, keeping what changed in memory since it was read."""
+        touched, self._touched = self._touched or set(), None
+        fresh.lots.load(recorded, lot_book)
+
+        # Reservations of orders the rebuild could not see: not stored yet, or stored after it read
+        for key, order in self.open_orders.items():
+            if not isinstance(key, int) or key > fresh.last_trade_id:
+                fresh.release(key)
+                fresh._open(key, order)
+        for section, key in touched:
+            if section == "open_orders":
+                fresh.release(key)
+                if key in self.open_orders:
+                    fresh._open(key, self.open_orders[key])
+            elif section == "holdings":
+                user_id, asset = key
+                holding = self.holdings.get(user_id, {}).get(asset)
+                assets = fresh.holdings.setdefault(user_id, {})
+                if holding is None:
+                    assets.pop(asset, None)
+                    fresh.lots.positions.pop(key, None)
+                else:
+                    assets[asset] = list(holding)
+                    fresh.lots.positions[key] = self.lots.positions[key].copy()
+            elif key in getattr(self, section):
+                getattr(fresh, section)[key] = getattr(self, section)[key]
+            else:
+                getattr(fresh, section).pop(key, None)
+
+        before = self.snapshot()
+        for name in STATE:
+            setattr(self, name, getattr(fresh, name))
+        self.last_trade_id = fresh.last_trade_id
+        return compare_snapshots(before, self.snapshot())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Comparable view of the tracked state (zero entries omitted)."""
+        today = self.today()
+        return {
+            "holdings": {
+                (user_id, asset): (quantity, average)
+                for user_id, assets in self.holdings.items()
+                for asset, (quantity, average) in assets.items() if quantity
+            },
+            "strategy_positions": {
+                key: (quantity, average) for key, (quantity, average) in self.strategy_positions.items() if quantity
+            },
+            "open_notional": {user_id: value for user_id, value in self.open_notional.items() if value},
+            "open_buys": {key: value for key, value in self.open_buys.items() if value},
+            "daily_pnl": {
+                user_id: value for (user_id, day), value in self.daily_pnl.items() if day == today and value
+            },
+        }
+
+    async def run(self, interval: float) -> None:
+        """Reconcile with the database every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                drift = await self.refresh()
+                if any(value > 1e-6 for value in drift.values()):
+                    logger.warning("Risk state drifted from the database: %s", drift)
+            except Exception:
+                logger.exception("Risk reconciliation failed")
+
+    def start(self, interval: float) -> None:
+        """Start periodic reconciliation on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic reconciliation."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def compare_snapshots(expected: Dict[str, Dict], actual: Dict[str, Dict]) -> Dict[str, float]:
+    """Largest absolute difference per section between two snapshots."""
+    drift = {}
+    for section, values in expected.items():
+        other = actual[section]
+        largest = 0.0
+        for key in values.keys() | other.keys():
+            left, right = values.get(key, 0.0), other.get(key, 0.0)
+            if isinstance(left, tuple) or isinstance(right, tuple):
+                left = left if isinstance(left, tuple) else (0.0, 0.0)
+                right = right if isinstance(right, tuple) else (0.0, 0.0)
+                largest = max(largest, *(abs(a - b) for a, b in zip(left, right)))
+            else:
+                largest = max(largest, abs(left - right))
+        drift[section] = largest
+    return drift
+
+
+# Global risk engine instance
+risk_engine = RiskEngine()
@@ -0,0 +1,86 @@
+"""
+Signal evaluators for candle-driven strategy types.
+Each evaluator declares the indicator series it needs so the scheduler can
+compute every distinct series once per bar and share it between strategies.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.models import OrderSide
+from app.services.indicators import Series
+
+
+class IndicatorSpec(NamedTuple):
+    """An indicator and its parameters, e.g. IndicatorSpec('sma', (20,))."""
+    name: str
+    params: Tuple
+
+
+SeriesLookup = Callable[[IndicatorSpec], Series]
+
+
+def crossed_above(first: Series, second: Series) -> bool:
+    """Whether first crossed above second on the last bar."""
+    if len(first) < 2 or None in (first[-2], first[-1], second[-2], second[-1]):
+        return False
+    return first[-2] <= second[-2] and first[-1] > second[-1]
+
+
+def crossed_below(first: Series, second: Series) -> bool:
+    """Whether first crossed below second on the last bar."""
+    return crossed_above(second, first)
+
+
+class MovingAverageCrossover:
+    """Buy when the fast SMA crosses above the slow SMA, sell on the opposite cross."""
+
+    def _periods(self, params: Dict) -> Tuple[int, int]:
+        return int(params.get("fast_period", 9)), int(params.get("slow_period", 21))
+
+    def lookback(self, params: Dict) -> int:
+        return max(self._periods(params)) + 2
+
+    def indicators(self, params: Dict) -> List[IndicatorSpec]:
+        fast, slow = self._periods(params)
+        return [IndicatorSpec("sma", (fast,)), IndicatorSpec("sma", (slow,))]
+
+    def evaluate(self, params: Dict, series: SeriesLookup, closes: Sequence[float]) -> Optional[OrderSide]:
+        fast_spec, slow_spec = self.indicators(params)
+        fast, slow = series(fast_spec), series(slow_spec)
+        if crossed_above(fast, slow):
+            return OrderSide.BUY
+        if crossed_below(fast, slow):
+            return OrderSide.SELL
+        return None
+
+
+class RsiReversal:
+    """Buy when RSI climbs back above the oversold level, sell when it drops below overbought."""
+
+    def _period(self, params: Dict) -> int:
+        return int(params.get("period", 14))
+
+    def lookback(self, params: Dict) -> int:
+        # Wilder smoothing needs extra history to converge
+        return self._period(params) * 5
+
+    def indicators(self, params: Dict) -> List[IndicatorSpec]:
+        return [IndicatorSpec("rsi", (self._period(params),))]
+
+    def evaluate(self, params: Dict, series: SeriesLookup, closes: Sequence[float]) -> Optional[OrderSide]:
+        values = series(self.indicators(params)[0])
+        if len(values) < 2 or values[-2] is None or values[-1] is None:
+            return None
+        oversold = float(params.get("oversold", 30))
+        overbought = float(params.get("overbought", 70))
+        if values[-2] <= oversold < values[-1]:
+            return OrderSide.BUY
+        if values[-2] >= overbought > values[-1]:
+            return OrderSide.SELL
+        return None
+
+
+# Evaluators by Strategy.strategy_type
+EVALUATORS = {
+    "ma_crossover": MovingAverageCrossover(),
+    "rsi": RsiReversal(),
+}
@@ -0,0 +1,607 @@
+"""
+Event-driven scheduler for active strategies.
+Strategies run when a candle closes on their timeframe. Candles are fetched once per
+(symbol, timeframe) and each indicator once per bar, then shared by every strategy
+that uses it. Indicators are streaming: each (symbol, timeframe, indicator) keeps
+its state, is fed only the candles closed since its last bar and is saved to
+indicator_states after every bar, so a warm group (also after a restart) fetches
+a few candles instead of its whole lookback. The closes handed to evaluators are
+kept the same way, as a window of the group's lookback. A state that does not
+line up with the fetched candles (a gap, or a state ahead of them) is rebuilt
+from the lookback. Evaluators can only look up the series they declare.
+
+Evaluations are isolated from each other and time-limited: synchronous evaluators
+run on a dedicated thread pool, so one that overruns its timeout is abandoned (its
+thread finishes in the background) instead of blocking the event loop, and cannot
+starve other to_thread users such as candle fetches.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import ccxt
+from sqlalchemy import insert, update
+from app.config import settings
+from app.database import SessionLocal
+from app.models import IndicatorState, Strategy, StrategyStatus, Trade, ExchangeAPIKey, OrderSide, OrderType
+from app.schemas import TradeCreate
+from app.services import orders
+from app.services.analytics import record_fills
+from app.services.events import CandleClose, EventBus, event_bus, publish_orders
+from app.services.indicators import STREAMING_BY_NAME, RollingWindow, Series, StreamingIndicator
+from app.services.risk import RiskEngine, risk_engine
+from app.services.strategies import EVALUATORS, IndicatorSpec
+
+logger = logging.getLogger(__name__)
+
+# Tracked like an indicator: the closes of a group's lookback, given to its evaluators
+CLOSES = "closes"
+
+# Candle length per supported timeframe
+TIMEFRAME_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+
+@dataclass
+class ScheduledStrategy:
+    """An active strategy as loaded by the scheduler."""
+    id: int
+    user_id: int
+    strategy_type: str
+    symbol: str
+    timeframe: str
+    quantity: float
+    params: Dict = field(default_factory=dict)
+
+
+@dataclass
+class Signal:
+    """An order requested by a strategy on a bar close."""
+    strategy: ScheduledStrategy
+    side: OrderSide
+    price: float
+
+
+@dataclass
+class BarReport:
+    """Outcome of running one bar close."""
+    timeframe: str
+    bar_close: float
+    strategies: int = 0
+    signals: int = 0
+    failures: int = 0
+    series_computed: int = 0
+    latency_ms: float = 0.0
+    submit_ms: float = 0.0
+
+
+class CandleSource:
+    """Fetches OHLCV candles from the exchange without blocking the event loop."""
+
+    def __init__(self, exchange=None):
+        self.exchange = exchange or ccxt.binance()
+
+    async def fetch(self, symbol: str, timeframe: str, limit: int) -> List[list]:
+        return await asyncio.to_thread(self.exchange.fetch_ohlcv, symbol, timeframe, None, limit)
+
+
+def indicator_key(spec: IndicatorSpec) -> str:
+    """Stored name of an indicator spec, e.g. 'sma:20' or 'macd:12,26,9'."""
+    return f"{spec.name}:{','.join(str(param) for param in spec.params)}"
+
+
+class TrackedIndicator:
+    """A streaming indicator fed candle by candle, with its value on the bar before the last."""
+    __slots__ = ("indicator", "last_bar", "previous")
+
+    def __init__(self, indicator: StreamingIndicator, last_bar: int = -1, previous: Any = None):
+        self.indicator = indicator
+        self.last_bar = last_bar  # Open time (ms) of the last candle fed
+        self.previous = previous
+
+    @classmethod
+    def start(cls, spec: IndicatorSpec) -> "TrackedIndicator":
+        indicator_class = RollingWindow if spec.name == CLOSES else STREAMING_BY_NAME[spec.name]
+        return cls(indicator_class(*spec.params))
+
+    def feed(self, candles: List[list]) -> None:
+        indicator = self.indicator
+        for candle in candles:
+            self.previous = indicator.value
+            indicator.update(candle[4])
+            self.last_bar = candle[0]
+
+    def series(self):
+        """Values on the last two bars, shaped like the batch indicator's series."""
+        value, previous = self.indicator.value, self.previous
+        if isinstance(value, (tuple, list)):
+            # MACD: (line, signal, histogram)
+            previous = previous or (None,) * len(value)
+            return tuple([before, after] for before, after in zip(previous, value))
+        return [previous, value]
+
+    def to_json(self) -> str:
+        # A window is updated in place, so its previous value is the window itself
+        previous = None if self.previous is self.indicator.value else self.previous
+        return json.dumps({"indicator": self.indicator.checkpoint(), "previous": previous})
+
+    @classmethod
+    def from_json(cls, last_bar: int, text: str) -> "TrackedIndicator":
+        state = json.loads(text)
+        return cls(StreamingIndicator.restore(state["indicator"]), last_bar, state["previous"])
+
+
+class IndicatorCache:
+    """Indicator series for one (symbol, timeframe) bar, looked up by the evaluators."""
+
+    def __init__(self, closes: List[float], series: Optional[Dict[IndicatorSpec, Series]] = None):
+        self.closes = closes
+        self.series: Dict[IndicatorSpec, Series] = series or {}
+
+    def get(self, spec: IndicatorSpec) -> Series:
+        try:
+            return self.series[spec]
+        except KeyError:
+            # Only declared series are kept up to date; the closes may not cover an undeclared one
+            raise KeyError(f"Indicator {indicator_key(spec)} is not declared by the strategy's indicators()") from None
+
+
+class GroupRun:
+    """
+    Progress of one thread evaluating strategies of a group in order. The lock
+    makes abandoning the run and recording an outcome mutually exclusive.
+    """
+
+    def __init__(self, start: int):
+        self.lock = threading.Lock()
+        self.current: Optional[Tuple[int, float]] = None  # (index, perf_counter at start) in progress
+        self.start = start
+        self.abandoned = False
+
+
+def parse_strategy(strategy: Strategy) -> Optional[ScheduledStrategy]:
+    """
+    Build a scheduled strategy from a database row.
+
+    Args:
+        strategy: Strategy row; parameters must be JSON with at least 'symbol'
+
+    Returns:
+        Scheduled strategy, or None if the type or parameters are not runnable
+    """
+    if strategy.strategy_type not in EVALUATORS:
+        return None
+    try:
+        params = json.loads(strategy.parameters or "{}")
+    except ValueError:
+        logger.warning("Strategy %s has invalid JSON parameters", strategy.id)
+        return None
+
+    timeframe = params.get("timeframe", "1h")
+    if "symbol" not in params or timeframe not in TIMEFRAME_SECONDS:
+        logger.warning("Strategy %s needs a symbol and a supported timeframe", strategy.id)
+        return None
+
+    return ScheduledStrategy(
+        id=strategy.id,
+        user_id=strategy.user_id,
+        strategy_type=strategy.strategy_type,
+        symbol=params["symbol"],
+        timeframe=timeframe,
+        quantity=float(params.get("quantity", 0)) or (strategy.max_position_size or 0.0),
+        params=params
+    )
+
+
+def next_bar_close(now: float, timeframes) -> Tuple[float, List[str]]:
+    """Earliest upcoming candle close among timeframes, and every timeframe closing then."""
+    closes = {tf: (int(now // TIMEFRAME_SECONDS[tf]) + 1) * TIMEFRAME_SECONDS[tf] for tf in timeframes}
+    earliest = min(closes.values())
+    return earliest, [tf for tf, close in closes.items() if close == earliest]
+
+
+class StrategyScheduler:
+    """Runs active strategies on candle close for their timeframe."""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        candle_source: Optional[CandleSource] = None,
+        timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+        risk: Optional[RiskEngine] = None,
+        bus: Optional[EventBus] = None,
+        persist_indicators: bool = True
+    ):
+        self.session_factory = session_factory
+        self.candle_source = candle_source or CandleSource()
+        self.timeout = timeout if timeout is not None else settings.strategy_eval_timeout_seconds
+        self.clock = clock
+        self.risk = risk or risk_engine
+        self.bus = bus or event_bus
+        self.groups: Dict[Tuple[str, str], List[ScheduledStrategy]] = {}
+        self.reports: List[BarReport] = []
+        self.executor = ThreadPoolExecutor(settings.strategy_eval_workers, thread_name_prefix="strategy-eval")
+        self.persist_indicators = persist_indicators
+        # Streaming indicators by (symbol, timeframe, indicator key); loaded on the first bar
+        self.indicators: Optional[Dict[Tuple[str, str, str], TrackedIndicator]] = None
+        self.dirty: Set[Tuple[str, str, str]] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def load_strategies(self) -> int:
+        """Reload active strategies from the database, grouped by (symbol, timeframe)."""
+        db = self.session_factory()
+        try:
+            rows = db.query(Strategy).filter(Strategy.status == StrategyStatus.ACTIVE).all()
+        finally:
+            db.close()
+
+        groups: Dict[Tuple[str, str], List[ScheduledStrategy]] = {}
+        for row in rows:
+            self.risk.set_strategy(row)
+            scheduled = parse_strategy(row)
+            if scheduled is not None:
+                groups.setdefault((scheduled.symbol, scheduled.timeframe), []).append(scheduled)
+        self.groups = groups
+        return sum(len(group) for group in groups.values())
+
+    def load_indicators(self) -> int:
+        """Load the saved indicator states (none when not persisting them)."""
+        self.indicators = {}
+        self.dirty = set()
+        if not self.persist_indicators:
+            return 0
+        db = self.session_factory()
+        try:
+            for row in db.query(IndicatorState):
+                self.indicators[(row.symbol, row.timeframe, row.indicator)] = TrackedIndicator.from_json(
+                    row.last_bar, row.state
+                )
+        finally:
+            db.close()
+        return len(self.indicators)
+
+    def save_indicators(self) -> int:
+        """Save the indicator states fed since the last save."""
+        dirty, self.dirty = self.dirty, set()
+        if not self.persist_indicators or not dirty:
+            return 0
+        db = self.session_factory()
+        try:
+            for symbol, timeframe, name in dirty:
+                tracked = self.indicators[(symbol, timeframe, name)]
+                db.merge(IndicatorState(
+                    symbol=symbol, timeframe=timeframe, indicator=name,
+                    last_bar=tracked.last_bar, state=tracked.to_json()
+                ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.dirty |= dirty
+            logger.exception("Failed to save %d indicator states", len(dirty))
+            return 0
+        finally:
+            db.close()
+        return len(dirty)
+
+    def _lines_up(self, key: Tuple[str, str, str], closed: List[list], step_ms: int) -> bool:
+        """Whether a saved state can take these candles: it exists, is not ahead of them and leaves no gap."""
+        tracked = self.indicators.get(key)
+        if tracked is None or tracked.last_bar > closed[-1][0]:
+            return False
+        for candle in closed:
+            if candle[0] > tracked.last_bar:
+                return candle[0] == tracked.last_bar + step_ms
+        return True
+
+    def _evaluate_from(
+        self,
+        run: GroupRun,
+        group: List[ScheduledStrategy],
+        cache: IndicatorCache,
+        outcomes: List[Optional[Tuple[Any, float]]]
+    ) -> None:
+        """Worker thread: evaluate group[run.start:] in order until done or abandoned."""
+        for index in range(run.start, len(group)):
+            strategy = group[index]
+            with run.lock:
+                if run.abandoned:
+                    return
+                run.current = (index, time.perf_counter())
+            try:
+                outcome = EVALUATORS[strategy.strategy_type].evaluate(strategy.params, cache.get, cache.closes)
+            except Exception as e:
+                outcome = e
+            with run.lock:
+                if run.abandoned:
+                    return
+                outcomes[index] = (outcome, time.perf_counter() - run.current[1])
+
+    async def _evaluate_group(
+        self,
+        group: List[ScheduledStrategy],
+        cache: IndicatorCache
+    ) -> List[Optional[Tuple[Any, float]]]:
+        """
+        Evaluate a group's strategies off the event loop, each within the timeout.
+
+        Returns:
+            (signal, exception or TimeoutError, seconds taken) per strategy, in group order
+        """
+        loop = asyncio.get_running_loop()
+        outcomes: List[Optional[Tuple[Any, float]]] = [None] * len(group)
+        start = 0
+        while start < len(group):
+            run = GroupRun(start)
+            job = loop.run_in_executor(self.executor, self._evaluate_from, run, group, cache, outcomes)
+            while True:
+                current = run.current
+                # Time spent waiting for a free thread does not count against the timeout
+                wait = self.timeout if current is None else current[1] + self.timeout - time.perf_counter()
+                done, _ = await asyncio.wait({job}, timeout=max(wait, 0.0))
+                if done:
+                    job.result()
+                    start = len(group)
+                    break
+                with run.lock:
+                    current = run.current
+                    if current is None or time.perf_counter() - current[1] < self.timeout:
+                        continue
+                    run.abandoned = True
+                outcomes[current[0]] = (asyncio.TimeoutError(), time.perf_counter() - current[1])
+                start = current[0] + 1
+                break
+
+        # Async evaluators return awaitables; they get the timeout on the loop
+        for index, outcome in enumerate(outcomes):
+            if outcome is not None and inspect.isawaitable(outcome[0]):
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(outcome[0], self.timeout)
+                except Exception as e:
+                    result = e
+                outcomes[index] = (result, outcome[1] + time.perf_counter() - started)
+        return outcomes
+
+    async def _run_group(
+        self,
+        symbol: str,
+        timeframe: str,
+        bar_close: float,
+        report: BarReport
+    ) -> Tuple[List[Signal], Dict[int, float]]:
+        """Run every strategy on one (symbol, timeframe) for a closed bar."""
+        group = self.groups.get((symbol, timeframe), [])
+        lookback = max(EVALUATORS[s.strategy_type].lookback(s.params) for s in group)
+        window = IndicatorSpec(CLOSES, (lookback,))
+        keys = {
+            spec: (symbol, timeframe, indicator_key(spec))
+            for s in group for spec in EVALUATORS[s.strategy_type].indicators(s.params) + [window]
+        }
+        bar_close_ms = bar_close * 1000
+        step_ms = TIMEFRAME_SECONDS[timeframe] * 1000
+
+        # Warm indicators only need the candles closed since their last bar
+        limit = lookback + 1
+        tracked = [self.indicators.get(key) for key in keys.values()]
+        if tracked and None not in tracked:
+            behind = int(bar_close_ms - step_ms - min(entry.last_bar for entry in tracked)) // step_ms
+            if 0 <= behind < lookback:
+                limit = behind + 2  # The last candle fed, those since and the one still forming
+
+        while True:
+            candles = await self.candle_source.fetch(symbol, timeframe, limit)
+            # Drop the candle that is still forming
+            closed = [candle for candle in candles if candle[0] + step_ms <= bar_close_ms]
+            if not closed:
+                return [], {}
+            rebuild = {spec for spec, key in keys.items() if not self._lines_up(key, closed, step_ms)}
+            if not rebuild or limit == lookback + 1:
+                break
+            limit = lookback + 1  # Some state has to be rebuilt from the full lookback
+
+        await self.bus.publish("candle_close", CandleClose(symbol, timeframe, list(closed[-1])))
+
+        series: Dict[IndicatorSpec, Series] = {}
+        for spec, key in keys.items():
+            if spec in rebuild:
+                tracked = self.indicators[key] = TrackedIndicator.start(spec)
+                report.series_computed += spec != window
+            else:
+                tracked = self.indicators[key]
+            fresh = [candle for candle in closed if candle[0] > tracked.last_bar]
+            if fresh:
+                tracked.feed(fresh)
+                self.dirty.add(key)
+            if spec != window:
+                series[spec] = tracked.series()
+        closes = list(self.indicators[keys[window]].indicator.value)
+        cache = IndicatorCache(closes, series)
+        signals: List[Signal] = []
+        latencies: Dict[int, float] = {}
+
+        for strategy, (outcome, seconds) in zip(group, await self._evaluate_group(group, cache)):
+            latencies[strategy.id] = seconds * 1000
+            if isinstance(outcome, asyncio.TimeoutError):
+                report.failures += 1
+                logger.warning("Strategy %s timed out after %.2fs", strategy.id, self.timeout)
+            elif isinstance(outcome, Exception):
+                report.failures += 1
+                logger.error("Strategy %s failed", strategy.id, exc_info=outcome)
+            elif outcome is not None and strategy.quantity > 0:
+                signals.append(Signal(strategy, outcome, closes[-1]))
+
+        return signals, latencies
+
+    async def run_bar(self, timeframe: str, bar_close: float) -> BarReport:
+        """
+        Run all strategies on a timeframe for the bar closing at bar_close.
+
+        Args:
+            timeframe: Timeframe whose candle closed
+            bar_close: Close time of the bar (epoch seconds)
+
+        Returns:
+            Report with counts and end-to-end latency
+        """
+        started = time.perf_counter()
+        report = BarReport(timeframe=timeframe, bar_close=bar_close)
+        if self.indicators is None:
+            self.load_indicators()
+        symbols = [symbol for symbol, tf in self.groups if tf == timeframe]
+        report.strategies = sum(len(self.groups[(symbol, timeframe)]) for symbol in symbols)
+
+        outcomes = await asyncio.gather(
+            *(self._run_group(symbol, timeframe, bar_close, report) for symbol in symbols),
+            return_exceptions=True
+        )
+
+        signals: List[Signal] = []
+        latencies: Dict[int, float] = {}
+        for symbol, outcome in zip(symbols, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error("Candles for %s %s unavailable: %s", symbol, timeframe, outcome)
+                report.failures += len(self.groups[(symbol, timeframe)])
+                continue
+            signals.extend(outcome[0])
+            latencies.update(outcome[1])
+        self.save_indicators()
+
+        # Submit in a stable order so trade ids do not depend on task scheduling
+        signals.sort(key=lambda signal: signal.strategy.id)
+        report.signals = len(signals)
+        submit_started = time.perf_counter()
+        await self.submit_signals(signals, latencies)
+        report.submit_ms = (time.perf_counter() - submit_started) * 1000
+
+        report.latency_ms = (time.perf_counter() - started) * 1000
+        self.reports = (self.reports + [report])[-100:]
+        return report
+
+    async def submit_signals(self, signals: List[Signal], latencies: Dict[int, float]) -> None:
+        """Send signals through the order path and record execution time and latency."""
+        db = self.session_factory()
+        try:
+            executed_at = datetime.utcfromtimestamp(self.clock())
+            if latencies:
+                db.execute(update(Strategy), [
+                    {"id": strategy_id, "last_executed_at": executed_at, "last_execution_latency_ms": latency}
+                    for strategy_id, latency in latencies.items()
+                ])
+
+            if signals:
+                user_ids = {signal.strategy.user_id for signal in signals}
+                keys = {}
+                for key in db.query(ExchangeAPIKey).filter(
+                    ExchangeAPIKey.user_id.in_(user_ids),
+                    ExchangeAPIKey.is_active == True
+                ):
+                    keys.setdefault(key.user_id, key)
+
+                rows = []
+                for signal in signals:
+                    strategy = signal.strategy
+                    key = keys.get(strategy.user_id)
+                    if key is None:
+                        logger.warning("Strategy %s signalled but its user has no active API key", strategy.id)
+                        continue
+                    rejection = self.risk.check(
+                        strategy.user_id, strategy.symbol, signal.side, strategy.quantity, signal.price, strategy.id
+                    )
+                    if rejection:
+                        logger.info("Strategy %s signal rejected: %s", strategy.id, rejection)
+                        continue
+                    # Count the signal as open so later signals of the same user see it
+                    self.risk.reserve(
+                        ("signal", strategy.id), strategy.user_id, strategy.symbol, signal.side,
+                        strategy.quantity, signal.price, strategy.id
+                    )
+                    trade_data = TradeCreate(
+                        symbol=strategy.symbol,
+                        order_type=OrderType.MARKET,
+                        order_side=signal.side,
+                        quantity=strategy.quantity,
+                        price=signal.price
+                    )
+                    rows.append(orders.build_trade_values(strategy.user_id, key.exchange_name, trade_data, strategy.id))
+
+                for signal in signals:
+                    self.risk.release(("signal", signal.strategy.id))
+
+                if rows:
+                    trade_ids = list(db.scalars(insert(Trade).returning(Trade.id, sort_by_parameter_order=True), rows))
+                    db.commit()
+                    loaded = orders.load_trades(db, trade_ids)
+                    trades = [loaded[trade_id] for trade_id in trade_ids]
+                    for trade in trades:
+                        self.risk.reserve_trade(trade)
+                    await asyncio.gather(*(orders.execute_order(trade, executed_at) for trade in trades))
+                    record_fills(db, trades)
+                    for strategy_id, count in Counter(trade.strategy_id for trade in trades).items():
+                        db.execute(
+                            update(Strategy)
+                            .where(Strategy.id == strategy_id)
+                            .values(total_trades=Strategy.total_trades + count)
+                        )
+                    db.commit()
+                    filled = orders.load_trades(db, trade_ids)
+                    realized = {trade_id: self.risk.on_fill(filled[trade_id]) for trade_id in trade_ids}
+                    await publish_orders(self.bus, [filled[trade_id] for trade_id in trade_ids], realized)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to submit %d strategy signals", len(signals))
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        """Run bars forever, reloading strategies before each close."""
+        while True:
+            self.load_strategies()
+            timeframes = {tf for _, tf in self.groups} or {"1m"}
+            bar_close, closing = next_bar_close(self.clock(), timeframes)
+            await asyncio.sleep(max(0.0, bar_close + settings.strategy_close_delay_seconds - self.clock()))
+
+            # Pick up strategies activated while waiting
+            self.load_strategies()
+            reports = await asyncio.gather(
+                *(self.run_bar(tf, bar_close) for tf in closing),
+                return_exceptions=True
+            )
+            for report in reports:
+                if isinstance(report, Exception):
+                    logger.error("Bar run failed: %s", report)
+
+    def start(self) -> None:
+        """Start the scheduler loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the scheduler loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global scheduler instance
+scheduler = StrategyScheduler()
@@ -0,0 +1,368 @@
+"""
+Append-only tick recorder.
+Every price update is stored as a fixed-width binary record in one file per
+symbol per UTC day. Readers memory-map those files and get zero-copy NumPy
+views for a time range.
+
+File layout: headerless arrays of TICK_DTYPE records under {root}/{SYMBOL}/.
+Each process appends to its own part file, {YYYYMMDD}.{pid}.ticks, so workers
+never interleave records in one file. Compaction merges a closed day's parts
+into {YYYYMMDD}.ticks in timestamp order, and readers merge whatever files a
+day has. A writer opens its part only for the length of a flush, so a part
+removed by compaction is simply started again by a late flush and merged by the
+next compaction. A partially written trailing record (e.g. after a crash) is
+ignored by readers and dropped by compaction.
+"""
+
+import mmap
+import os
+import re
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Side codes
+SIDE_UNKNOWN = 0
+SIDE_BUY = 1
+SIDE_SELL = -1
+
+# 32-byte aligned record: timestamp (ns since epoch), price, size, side
+TICK_DTYPE = np.dtype({
+    "names": ["timestamp", "price", "size", "side"],
+    "formats": ["<i8", "<f8", "<f8", "i1"],
+    "offsets": [0, 8, 16, 24],
+    "itemsize": 32,
+})
+RECORD = struct.Struct("<qddb7x")
+assert RECORD.size == TICK_DTYPE.itemsize
+
+NANOS_PER_DAY = 86_400 * 1_000_000_000
+FILE_SUFFIX = ".ticks"
+# {YYYYMMDD}.ticks (compacted) or {YYYYMMDD}.{pid}.ticks (appended by one process)
+FILE_NAME = re.compile(r"^(\d{8})(?:\.(\d+))?\.ticks$")
+
+# Parts written to this recently may still get a flush and are left for the next compaction
+COMPACT_GRACE_SECONDS = 300
+
+
+def symbol_dir(symbol: str) -> str:
+    """Directory name for a symbol ('BTC/USDT' -> 'BTC-USDT')."""
+    return symbol.upper().replace("/", "-")
+
+
+def day_name(day: int) -> str:
+    """File stem for a day number (days since epoch)."""
+    return (datetime(1970, 1, 1) + timedelta(days=day)).strftime("%Y%m%d")
+
+
+def parse_day(name: str) -> int:
+    """Day number for a file stem."""
+    return (datetime.strptime(name, "%Y%m%d") - datetime(1970, 1, 1)).days
+
+
+def day_files(directory: str) -> Dict[int, List[str]]:
+    """Files of each day in a symbol directory, the compacted file first."""
+    files: Dict[int, List[str]] = {}
+    if not os.path.isdir(directory):
+        return files
+    for name in sorted(os.listdir(directory)):
+        match = FILE_NAME.match(name)
+        if match:
+            paths = files.setdefault(parse_day(match.group(1)), [])
+            path = os.path.join(directory, name)
+            if match.group(2) is None:
+                paths.insert(0, path)
+            else:
+                paths.append(path)
+    return files
+
+
+def is_part(path: str) -> bool:
+    """Whether a file is a per-process part rather than a compacted day."""
+    return FILE_NAME.match(os.path.basename(path)).group(2) is not None
+
+
+def map_file(path: str) -> np.ndarray:
+    """Memory-map a tick file as a read-only structured array (no copy; the array keeps the mapping alive)."""
+    with open(path, "rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        count = size // TICK_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=TICK_DTYPE)
+        mapping = mmap.mmap(handle.fileno(), count * TICK_DTYPE.itemsize, access=mmap.ACCESS_READ)
+    return np.frombuffer(mapping, dtype=TICK_DTYPE, count=count)
+
+
+def in_order(ticks: np.ndarray) -> bool:
+    stamps = ticks["timestamp"]
+    return bool(np.all(stamps[1:] >= stamps[:-1])) if len(ticks) > 1 else True
+
+
+def merge(arrays: List[np.ndarray]) -> np.ndarray:
+    """Ticks of several files as one array in timestamp order (stable, so ties keep file order)."""
+    if len(arrays) == 1:
+        ticks = arrays[0]
+    else:
+        # Filled in place: concatenate would drop the record padding from the dtype
+        ticks = np.empty(sum(len(array) for array in arrays), dtype=TICK_DTYPE)
+        offset = 0
+        for array in arrays:
+            ticks[offset:offset + len(array)] = array
+            offset += len(array)
+    return ticks if in_order(ticks) else ticks[np.argsort(ticks["timestamp"], kind="stable")]
+
+
+class TickWriter:
+    """
+    Buffered appender for one symbol.
+    Records are packed into a preallocated buffer and written to this process's
+    part file of their day, opened O_APPEND for each flush.
+    """
+
+    def __init__(self, root: str, symbol: str, buffer_records: int = 65536, fsync: bool = False):
+        self.directory = os.path.join(root, symbol_dir(symbol))
+        os.makedirs(self.directory, exist_ok=True)
+        self.symbol = symbol
+        self.fsync = fsync
+        self.capacity = buffer_records
+        self.buffer = bytearray(buffer_records * RECORD.size)
+        self.view = memoryview(self.buffer)
+        self.count = 0
+        self.day: Optional[int] = None  # Day of the buffered records
+
+    def path(self, day: int) -> str:
+        """This process's part file for a day."""
+        return os.path.join(self.directory, f"{day_name(day)}.{os.getpid()}{FILE_SUFFIX}")
+
+    def append(self, timestamp_ns: int, price: float, size: float = 0.0, side: int = SIDE_UNKNOWN) -> None:
+        """Append one tick."""
+        day = timestamp_ns // NANOS_PER_DAY
+        if day != self.day:
+            self.flush()
+            self.day = day
+        elif self.count == self.capacity:
+            self.flush()
+        RECORD.pack_into(self.buffer, self.count * RECORD.size, timestamp_ns, price, size, side)
+        self.count += 1
+
+    def append_batch(self, timestamps: np.ndarray, prices: np.ndarray, sizes=None, sides=None) -> None:
+        """
+        Append many ticks at once (vectorized). Timestamps must be non-decreasing.
+
+        Args:
+            timestamps: Nanosecond timestamps (int64)
+            prices: Prices
+            sizes: Sizes, or None for zeros
+            sides: Side codes, or None for SIDE_UNKNOWN
+        """
+        count = len(timestamps)
+        if count == 0:
+            return
+        records = np.empty(count, dtype=TICK_DTYPE)
+        records["timestamp"] = timestamps
+        records["price"] = prices
+        records["size"] = 0.0 if sizes is None else sizes
+        records["side"] = SIDE_UNKNOWN if sides is None else sides
+
+        # Split at day boundaries so each slice goes to its own file
+        days = records["timestamp"] // NANOS_PER_DAY
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        self.flush()
+        for chunk in np.split(records, boundaries):
+            self._write(int(chunk["timestamp"][0] // NANOS_PER_DAY), chunk.view(np.uint8))
+
+    def _write(self, day: int, data) -> None:
+        fd = os.open(self.path(day), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self) -> None:
+        """Write buffered ticks to their day's part file."""
+        if self.count:
+            self._write(self.day, self.view[:self.count * RECORD.size])
+            self.count = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.day = None
+
+
+class TickRecorder:
+    """Records ticks for many symbols, flushing buffers at least every flush_interval seconds."""
+
+    def __init__(self, root: str, flush_interval: float = 1.0, buffer_records: int = 65536, fsync: bool = False):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.buffer_records = buffer_records
+        self.fsync = fsync
+        self.writers: Dict[str, TickWriter] = {}
+        self.last_flush = time.monotonic()
+
+    def writer(self, symbol: str) -> TickWriter:
+        writer = self.writers.get(symbol)
+        if writer is None:
+            writer = TickWriter(self.root, symbol, self.buffer_records, self.fsync)
+            self.writers[symbol] = writer
+        return writer
+
+    def record(
+        self,
+        symbol: str,
+        price: float,
+        size: float = 0.0,
+        side: int = SIDE_UNKNOWN,
+        timestamp_ns: Optional[int] = None
+    ) -> None:
+        """Record one price update (timestamp defaults to now)."""
+        self.writer(symbol).append(timestamp_ns if timestamp_ns is not None else time.time_ns(), price, size, side)
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        for writer in self.writers.values():
+            writer.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+
+class TickReader:
+    """Zero-copy access to recorded ticks through memory-mapped files."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def days(self, symbol: str) -> List[int]:
+        """Day numbers with recorded ticks for a symbol, oldest first."""
+        return sorted(day_files(os.path.join(self.root, symbol_dir(symbol))))
+
+    def map_day(self, symbol: str, day: int) -> np.ndarray:
+        """
+        One day's ticks as a read-only structured array in timestamp order.
+        A day held in one ordered file (always so once compacted) is memory-mapped
+        without copying; parts of several workers, or out of order, are merged
+        into a sorted copy.
+        """
+        paths = day_files(os.path.join(self.root, symbol_dir(symbol))).get(day, [])
+        if not paths:
+            return np.empty(0, dtype=TICK_DTYPE)
+        arrays = [map_file(path) for path in paths]
+        if len(arrays) == 1 and not is_part(paths[0]):
+            return arrays[0]
+        return merge(arrays)
+
+    def read(self, symbol: str, start_ns: int, end_ns: int) -> List[np.ndarray]:
+        """
+        Ticks with start_ns <= timestamp < end_ns, one array per day; zero-copy
+        views for days map_day can map without copying.
+
+        Args:
+            symbol: Trading pair
+            start_ns: Range start (inclusive), ns since epoch
+            end_ns: Range end (exclusive), ns since epoch
+
+        Returns:
+            List of structured array views
+        """
+        first_day, last_day = start_ns // NANOS_PER_DAY, (end_ns - 1) // NANOS_PER_DAY
+        views = []
+        for day in self.days(symbol):
+            if day < first_day or day > last_day:
+                continue
+            ticks = self.map_day(symbol, day)
+            stamps = ticks["timestamp"]
+            low = np.searchsorted(stamps, start_ns, side="left")
+            high = np.searchsorted(stamps, end_ns, side="left")
+            if high > low:
+                views.append(ticks[low:high])
+        return views
+
+    def read_concatenated(self, symbol: str, start_ns: int, end_ns: int) -> np.ndarray:
+        """Ticks in a time range as one (copied) array."""
+        views = self.read(symbol, start_ns, end_ns)
+        if not views:
+            return np.empty(0, dtype=TICK_DTYPE)
+        return views[0] if len(views) == 1 else np.concatenate(views)
+
+
+def compact_day(
+    root: str,
+    symbol: str,
+    day: int,
+    grace_seconds: float = COMPACT_GRACE_SECONDS,
+    now: Optional[float] = None
+) -> Tuple[int, bool]:
+    """
+    Merge a closed day's part files into its compacted file, in timestamp order,
+    dropping partial trailing records. The new file is written next to the old
+    one and swapped in atomically before the merged parts are removed. Parts
+    written to in the last grace_seconds are left for the next run, as their
+    writer may not be done with them.
+
+    Returns:
+        Tuple of (record count, whether the file was rewritten)
+    """
+    directory = os.path.join(root, symbol_dir(symbol))
+    paths = day_files(directory).get(day, [])
+    now = time.time() if now is None else now
+    settled = [path for path in paths if not is_part(path) or os.path.getmtime(path) <= now - grace_seconds]
+    if not settled:
+        return 0, False
+    arrays = [map_file(path) for path in settled]
+    if len(settled) == 1 and not is_part(settled[0]) and os.path.getsize(settled[0]) % TICK_DTYPE.itemsize == 0:
+        return len(arrays[0]), False
+
+    compacted = np.array(merge(arrays))
+    path = os.path.join(directory, day_name(day) + FILE_SUFFIX)
+    temporary = path + ".compact"
+    with open(temporary, "wb") as handle:
+        compacted.tofile(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    del arrays
+    os.replace(temporary, path)
+    for part in settled:
+        if part != path:
+            os.remove(part)
+    return len(compacted), True
+
+
+def run_maintenance(root: str, retention_days: int, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Compact closed day files and delete files past retention.
+
+    Args:
+        root: Tick data directory
+        retention_days: Days of data to keep (0 keeps everything)
+        now: Current time (defaults to UTC now)
+
+    Returns:
+        Counts of compacted and deleted files
+    """
+    now = now or datetime.now(timezone.utc)
+    today = (now.replace(tzinfo=None) - datetime(1970, 1, 1)).days
+    stats = {"compacted": 0, "deleted": 0}
+    if not os.path.isdir(root):
+        return stats
+
+    for directory in sorted(os.listdir(root)):
+        symbol = directory.replace("-", "/")
+        for day, paths in sorted(day_files(os.path.join(root, directory)).items()):
+            if retention_days and day < today - retention_days:
+                for path in paths:
+                    os.remove(path)
+                stats["deleted"] += len(paths)
+            elif day < today and compact_day(root, symbol, day)[1]:
+                stats["compacted"] += 1
+    return stats
@@ -0,0 +1,40 @@
+"""
+Analytics Rollup Backfill
+Rebuild the daily trade rollups from the raw trades table
+"""
+
+import argparse
+import time
+from datetime import date
+from app.database import SessionLocal, engine, Base, upgrade_schema
+from app.services.analytics import rebuild_rollups
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Rebuild daily trade rollups from trade history")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild rollups for this user")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Trades fetched per round trip")
+    return parser.parse_args()
+
+
+def main():
+    """Run the backfill"""
+    args = parse_args()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        written = rebuild_rollups(db, args.user_id, args.start, args.end, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"✓ Rebuilt {written:,} rollup rows in {elapsed:.2f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
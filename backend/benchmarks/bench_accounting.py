@@ -0,0 +1,265 @@
+"""
+Lot Accounting Benchmark
+Match a synthetic stream of fills spread over many (user, asset) positions:
+
+    - through LotBook.apply_batch (vectorized FIFO, tight loop for average cost),
+      which has to reach --target fills/sec (1M by default) for each method
+    - through LotBook.apply one fill at a time (the live path), which must give
+      the same realized profit/loss and open lots; average cost must also match
+      apply_average_cost
+    - end to end through record_fills: holdings, rollups and strategy counters
+      must agree with a replay of the trades table, and a rolled-back batch must
+      leave the lot book untouched; a restart replays only the trades after the
+      saved position checkpoint and gets the same lots
+
+Usage:
+    python -m benchmarks.bench_accounting --fills 1000000 --keys 3000
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_accounting.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import numpy as np  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import (  # noqa: E402
+    DailyTradeRollup, OrderSide, OrderStatus, OrderType, Portfolio, PortfolioHolding, Strategy, StrategyStatus, Trade, User
+)
+from app.schemas import TradeCreate  # noqa: E402
+from app.services import orders  # noqa: E402
+from app.services.accounting import LotBook, apply_average_cost, fee_rate, lot_book  # noqa: E402
+from app.services.analytics import rebuild_positions, rebuild_rollups, record_fills  # noqa: E402
+
+EXCHANGES = ("binance", "coinbase", "kraken", "kucoin")
+SYMBOLS = ("BTC/USDT", "ETH/USDT", "SOL/USDT")
+
+
+def synthetic_fills(count: int, keys: int, seed: int = 3):
+    """Keys, sides, quantities, prices and fees; slightly more buys than sells"""
+    rng = np.random.default_rng(seed)
+    key_ids = rng.integers(0, keys, count)
+    buys = rng.random(count) < 0.55
+    quantities = rng.uniform(0.01, 2.0, count)
+    prices = 100 * np.exp(rng.normal(0, 0.05, count))
+    limit = rng.random(count) < 0.5
+    rates = np.array([
+        [fee_rate(exchange, OrderType.MARKET), fee_rate(exchange, OrderType.LIMIT)] for exchange in EXCHANGES
+    ])
+    fees = quantities * prices * rates[key_ids % len(EXCHANGES), limit.astype(int)]
+    return [(key // len(SYMBOLS), key % len(SYMBOLS)) for key in key_ids.tolist()], buys, quantities, prices, fees
+
+
+def scalar(method: str, keys, buys, quantities, prices, fees):
+    book = LotBook(method)
+    apply = book.apply
+    sides = [OrderSide.BUY if buy else OrderSide.SELL for buy in buys.tolist()]
+    started = time.perf_counter()
+    realized = [
+        apply(key, side, quantity, price, fee)
+        for key, side, quantity, price, fee in zip(keys, sides, quantities.tolist(), prices.tolist(), fees.tolist())
+    ]
+    return book, np.array(realized), time.perf_counter() - started
+
+
+def same_positions(left: LotBook, right: LotBook) -> bool:
+    for key in set(left.positions) | set(right.positions):
+        a, b = left.positions.get(key), right.positions.get(key)
+        if a is None or b is None:
+            return False
+        if not math.isclose(a.quantity, b.quantity, rel_tol=1e-9, abs_tol=1e-9):
+            return False
+        if not math.isclose(a.cost, b.cost, rel_tol=1e-9, abs_tol=1e-6):
+            return False
+        if len(a.lots) != len(b.lots) and a.quantity > 1e-9:
+            return False
+    return True
+
+
+def matching_benchmark(args) -> bool:
+    keys, buys, quantities, prices, fees = synthetic_fills(args.fills, args.keys)
+    ok = True
+    for method in ("fifo", "average"):
+        rates = []
+        for _ in range(args.repeat):
+            book = LotBook(method)
+            started = time.perf_counter()
+            realized = book.apply_batch(keys, buys, quantities, prices, fees)
+            rates.append(args.fills / (time.perf_counter() - started))
+        best = max(rates)
+        one_by_one, expected, elapsed = scalar(method, keys, buys, quantities, prices, fees)
+        drift = float(np.max(np.abs(realized - expected)))
+        match = drift <= 1e-6 and same_positions(book, one_by_one)
+        ok &= match and best >= args.target
+        print(f"{method}: {args.fills:,} fills over {args.keys:,} positions")
+        print(f"  apply_batch {best:,.0f} fills/s ({'meets' if best >= args.target else 'below'} {args.target:,.0f} target), "
+              f"apply {args.fills / elapsed:,.0f} fills/s")
+        print(f"  realized {realized.sum():,.2f}, max difference batch vs apply {drift:.2g}: "
+              f"{'match' if match else 'MISMATCH'}")
+
+    # Average cost must be exactly what apply_average_cost computes
+    count = min(args.fills, 200_000)
+    book, realized, _ = scalar("average", keys[:count], buys[:count], quantities[:count], prices[:count], fees[:count])
+    state = {}
+    expected = []
+    for key, buy, quantity, price, fee in zip(keys[:count], buys.tolist(), quantities.tolist(), prices.tolist(),
+                                              fees.tolist()):
+        held, average, pnl = apply_average_cost(
+            *state.get(key, (0.0, 0.0)), OrderSide.BUY if buy else OrderSide.SELL, quantity, price, fee
+        )
+        state[key] = (held, average)
+        expected.append(pnl)
+    same = np.allclose(realized, expected, rtol=1e-12, atol=1e-9)
+    print(f"  average cost vs apply_average_cost on {count:,} fills: {'match' if same else 'MISMATCH'}")
+    return ok and same
+
+
+def seed(users: int, strategies: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(Portfolio), [{"user_id": uid} for uid in range(1, users + 1)])
+        db.execute(insert(Strategy), [
+            {"id": sid, "user_id": sid % users + 1, "name": f"s{sid}", "strategy_type": "rsi",
+             "status": StrategyStatus.ACTIVE}
+            for sid in range(1, strategies + 1)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def record(db, rng, users: int, strategies: int, count: int):
+    """Insert, fill and account a batch of orders the way the order paths do"""
+    rows = []
+    for _ in range(count):
+        strategy_id = int(rng.integers(1, strategies + 1)) if rng.random() < 0.7 else None
+        user_id = strategy_id % users + 1 if strategy_id else int(rng.integers(1, users + 1))
+        symbol = SYMBOLS[int(rng.integers(0, len(SYMBOLS)))]
+        trade = TradeCreate(
+            symbol=symbol,
+            order_type=OrderType.LIMIT if rng.random() < 0.5 else OrderType.MARKET,
+            order_side=OrderSide.BUY if rng.random() < 0.55 else OrderSide.SELL,
+            quantity=round(float(rng.uniform(0.1, 2.0)), 4),
+            price=round(float(100 * np.exp(rng.normal(0, 0.05))), 4),
+        )
+        rows.append(orders.build_trade_values(user_id, EXCHANGES[user_id % len(EXCHANGES)], trade, strategy_id))
+    trade_ids = list(db.scalars(insert(Trade).returning(Trade.id, sort_by_parameter_order=True), rows))
+    loaded = orders.load_trades(db, trade_ids)
+    trades = [loaded[trade_id] for trade_id in trade_ids]
+    for trade in trades:
+        await orders.execute_order(trade, fill_price=trade.price)
+    return trades, record_fills(db, trades)
+
+
+async def database_benchmark(args) -> bool:
+    users, strategies = 50, 40
+    seed(users, strategies)
+    lot_book.positions = {}
+    rng = np.random.default_rng(11)
+    db = SessionLocal()
+    try:
+        results = {}
+        started = time.perf_counter()
+        for _ in range(args.trades // 100):
+            trades, realized = await record(db, rng, users, strategies, 100)
+            db.commit()
+            for trade, pnl in zip(trades, realized):
+                if trade.strategy_id is not None and trade.order_side == OrderSide.SELL:
+                    totals = results.setdefault(trade.strategy_id, [0, 0.0])
+                    totals[0] += pnl > 0
+                    totals[1] += pnl
+        elapsed = time.perf_counter() - started
+        print(f"record_fills: {args.trades:,} trades in {elapsed:.2f}s ({args.trades / elapsed:,.0f} trades/s "
+              f"including inserts and commits)")
+
+        # A rolled-back batch must not reach the book
+        before = {key: (position.quantity, position.cost) for key, position in lot_book.positions.items()}
+        await record(db, rng, users, strategies, 100)
+        db.rollback()
+        after = {key: (position.quantity, position.cost) for key, position in lot_book.positions.items()}
+        ok = before == after
+        print(f"  rollback leaves the lot book unchanged: {'yes' if ok else 'NO'}")
+
+        holdings = {
+            (holding.portfolio.user_id, holding.symbol): holding for holding in db.query(PortfolioHolding)
+        }
+        held = all(
+            math.isclose(holdings[key].quantity, position.quantity, rel_tol=1e-9, abs_tol=1e-9)
+            and math.isclose(holdings[key].average_buy_price, position.average_price, rel_tol=1e-9, abs_tol=1e-9)
+            for key, position in lot_book.positions.items()
+        )
+        live = LotBook(lot_book.method)
+        live.positions = lot_book.positions
+        replayed = rebuild_positions(db)
+        rebuilt = same_positions(live, lot_book)
+        print(f"  holdings match the lot book: {'yes' if held else 'NO'}; "
+              f"replay of {replayed:,} trades gives the same lots: {'yes' if rebuilt else 'NO'}")
+        ok &= held and rebuilt
+
+        counters = all(
+            row.winning_trades == results.get(row.id, [0, 0.0])[0]
+            and math.isclose(row.total_profit_loss, results.get(row.id, [0, 0.0])[1], rel_tol=1e-9, abs_tol=1e-9)
+            for row in db.query(Strategy)
+        )
+        live_total = db.query(func.sum(DailyTradeRollup.realized_profit_loss)).scalar()
+        rebuild_rollups(db)
+        rebuilt_total = db.query(func.sum(DailyTradeRollup.realized_profit_loss)).scalar()
+        rollups = math.isclose(live_total, rebuilt_total, rel_tol=1e-9, abs_tol=1e-6)
+        print(f"  strategy counters match: {'yes' if counters else 'NO'}; realized in rollups {live_total:,.4f}, "
+              f"after rebuild {rebuilt_total:,.4f}")
+        ok &= counters and rollups
+
+        # Restart after more fills: only the trades after the checkpoint are replayed
+        await record(db, rng, users, strategies, 100)
+        db.commit()
+        live = LotBook(lot_book.method)
+        live.positions = lot_book.positions
+        started = time.perf_counter()
+        resumed = rebuild_positions(db)
+        elapsed = time.perf_counter() - started
+        checkpointed = resumed == 100 and same_positions(live, lot_book)
+        # A trade the checkpoint covers changing status makes it stale: everything is replayed
+        oldest = db.query(func.min(Trade.id)).scalar()
+        db.query(Trade).filter(Trade.id == oldest).update({Trade.order_status: OrderStatus.FAILED})
+        db.commit()
+        stale = rebuild_positions(db) == db.query(Trade).filter(Trade.order_status == OrderStatus.FILLED).count()
+        print(f"  restart replays {resumed:,} trades after the checkpoint in {elapsed * 1000:.1f} ms, same lots: "
+              f"{'yes' if checkpointed else 'NO'}; stale checkpoint falls back to a full replay: "
+              f"{'yes' if stale else 'NO'}")
+        ok &= checkpointed and stale
+        return ok
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fills", type=int, default=1_000_000)
+    parser.add_argument("--keys", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--target", type=float, default=1_000_000, help="apply_batch fills/sec to reach")
+    parser.add_argument("--trades", type=int, default=5000)
+    args = parser.parse_args()
+
+    ok = matching_benchmark(args)
+    ok &= asyncio.run(database_benchmark(args))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
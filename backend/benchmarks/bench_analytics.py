@@ -0,0 +1,138 @@
+"""
+Analytics Benchmark
+Compare raw trade-table scans against daily rollups for range queries, check
+that both give the same per-symbol totals, and fail unless the rollups answer
+the full range faster.
+
+Usage:
+    python -m benchmarks.bench_analytics --trades 10000000
+"""
+
+import argparse
+import os
+import math
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Trade, OrderSide, OrderStatus, OrderType
+from app.services import analytics
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT", "ADA/USDT", "BNB/USDT"]
+
+
+def populate(session, trades: int, users: int, days: int, chunk_size: int = 50000):
+    """Insert synthetic filled trades spread over users, symbols and days"""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, trades, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, trades - offset)):
+            quantity = rng.uniform(0.01, 2.0)
+            price = rng.uniform(10, 50000)
+            executed_at = start + timedelta(seconds=rng.randrange(days * 86400))
+            rows.append({
+                "user_id": rng.randint(1, users),
+                "exchange_name": "binance",
+                "symbol": rng.choice(SYMBOLS),
+                "order_type": OrderType.MARKET,
+                "order_side": rng.choice((OrderSide.BUY, OrderSide.SELL)),
+                "order_status": OrderStatus.FILLED,
+                "price": price,
+                "quantity": quantity,
+                "filled_quantity": quantity,
+                "average_price": price,
+                "total_cost": quantity * price,
+                "fee": quantity * price * 0.001,
+                "created_at": executed_at,
+                "executed_at": executed_at,
+            })
+        session.execute(insert(Trade), rows)
+        session.commit()
+
+
+def raw_scan(session, user_id: int, start_date: date, end_date: date):
+    """Per-symbol totals computed directly from the trades table"""
+    query = select(
+        Trade.symbol,
+        func.count(Trade.id),
+        func.sum(Trade.filled_quantity),
+        func.sum(Trade.total_cost),
+        func.sum(Trade.fee)
+    ).where(
+        Trade.user_id == user_id,
+        Trade.order_status == OrderStatus.FILLED,
+        Trade.executed_at >= datetime.combine(start_date, datetime.min.time()),
+        Trade.executed_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    ).group_by(Trade.symbol)
+    return session.execute(query).all()
+
+
+def rollups_match(session, user_id: int, start_date: date, end_date: date) -> bool:
+    """Whether the rollup per-symbol totals equal those of the raw scan"""
+    raw = {row[0]: row[1:] for row in raw_scan(session, user_id, start_date, end_date)}
+    rolled = {
+        row["symbol"]: (row["trade_count"], row["volume"], row["notional"], row["fees"])
+        for row in analytics.get_symbol_breakdown(session, user_id, start_date, end_date)
+    }
+    return raw.keys() == rolled.keys() and all(
+        all(math.isclose(a, b, rel_tol=1e-9) for a, b in zip(raw[symbol], rolled[symbol])) for symbol in raw
+    )
+
+
+def timed(label: str, fn, repeat: int = 5):
+    """Run fn several times and print the best wall time"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<32} {best * 1000:10.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_analytics.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    print(f"Populating {args.trades:,} trades ({args.users} users, {args.days} days)...")
+    started = time.perf_counter()
+    populate(session, args.trades, args.users, args.days)
+    print(f"  inserted in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    written = analytics.rebuild_rollups(session)
+    print(f"  backfilled {written:,} rollup rows in {time.perf_counter() - started:.1f}s\n")
+
+    start_date = date(2024, 1, 1)
+    ok = True
+    for span in (7, 30, args.days):
+        end_date = start_date + timedelta(days=span - 1)
+        print(f"Range of {span} days, user 1:")
+        raw = timed("raw trades scan", lambda: raw_scan(session, 1, start_date, end_date))
+        timed("rollup summary", lambda: analytics.get_summary(session, 1, start_date, end_date))
+        rolled = timed("rollup per-symbol", lambda: analytics.get_symbol_breakdown(session, 1, start_date, end_date))
+        match = rollups_match(session, 1, start_date, end_date)
+        print(f"  totals match raw scan: {match}\n")
+        ok &= match
+    ok &= rolled < raw
+
+    session.close()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Batch Order Benchmark
+Compare orders/sec through POST /api/trading/trades (one request per order)
+against POST /api/trading/trades/batch, and fail unless batches are at least
+--min-speedup times faster.
+
+Usage:
+    python -m benchmarks.bench_batch_orders --orders 2000 --batch-size 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_orders.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models import User, Portfolio, ExchangeAPIKey  # noqa: E402
+from main import app  # noqa: E402
+
+
+def create_user() -> str:
+    """Create a user with an API key and return a bearer token"""
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(Portfolio(user_id=user.id))
+        db.add(ExchangeAPIKey(user_id=user.id, exchange_name="binance", api_key="key", api_secret="secret"))
+        db.commit()
+        return create_access_token({"sub": user.email})
+    finally:
+        db.close()
+
+
+def order(index: int) -> dict:
+    """A limit order alternating sides"""
+    return {
+        "symbol": "BTC/USDT",
+        "order_type": "limit",
+        "order_side": "buy" if index % 2 == 0 else "sell",
+        "quantity": 0.01,
+        "price": 40000 + index % 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--min-speedup", type=float, default=5.0, help="Batch over per-order orders/sec to reach")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_user()}"}
+
+    started = time.perf_counter()
+    for index in range(args.orders):
+        response = client.post("/api/trading/trades", json=order(index), headers=headers)
+        assert response.status_code == 201, response.text
+    single = args.orders / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for offset in range(0, args.orders, args.batch_size):
+        items = [order(index) for index in range(offset, min(offset + args.batch_size, args.orders))]
+        response = client.post("/api/trading/trades/batch", json={"trades": items}, headers=headers)
+        assert response.status_code == 201, response.text
+        assert response.json()["failed"] == 0
+    batched = args.orders / (time.perf_counter() - started)
+
+    print(f"Orders: {args.orders:,}")
+    print(f"  per-order endpoint      {single:10,.0f} orders/s")
+    print(f"  batch endpoint (x{args.batch_size:<3})  {batched:10,.0f} orders/s  ({batched / single:.1f}x)")
+    ok = batched >= args.min_speedup * single
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Chart History Benchmark
+Serve months of minute candles from a fake exchange and time:
+
+    - LTTB and min/max downsampling against a pure-Python LTTB reference
+      (the kept indices must match exactly)
+    - the first, cached and incrementally refreshed /history requests,
+      counting upstream OHLCV calls
+
+Usage:
+    python -m benchmarks.bench_chart_history --days 90 --points 1000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from app.services.candles import CandleStore, ChartHistory
+from app.services.downsample import lttb, minmax
+from app.services.strategy_scheduler import TIMEFRAME_SECONDS
+
+MINUTE_MS = 60_000
+
+
+class FakeExchange:
+    """fetch_ohlcv over a random-walk minute series, aggregated to any timeframe on request"""
+
+    def __init__(self, days: int, seed: int = 8):
+        rng = np.random.default_rng(seed)
+        minutes = days * 1440
+        self.start_ms = 1_700_006_400_000 - (1_700_006_400_000 % 86_400_000)
+        # One spare day of minutes past "now" for incremental refreshes
+        self.close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.0008, minutes + 1440)))
+        self.close[rng.integers(0, minutes, 20)] *= rng.choice([0.9, 1.1], 20)  # flash spikes
+        self.volume = rng.gamma(2.0, 3.0, minutes + 1440)
+        self.now_ms = self.start_ms + minutes * MINUTE_MS - 1
+        self.calls = 0
+
+    def clock(self) -> float:
+        return self.now_ms / 1000
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=1000):
+        self.calls += 1
+        per = TIMEFRAME_SECONDS[timeframe] // 60
+        available = (self.now_ms - self.start_ms) // MINUTE_MS + 1
+        first = max(0, -(-(since - self.start_ms) // (per * MINUTE_MS))) if since is not None else 0
+        rows = []
+        for bar in range(first, first + limit):
+            lo, hi = bar * per, min((bar + 1) * per, available)
+            if lo >= hi:
+                break
+            closes = self.close[lo:hi]
+            rows.append([
+                self.start_ms + lo * MINUTE_MS, float(closes[0]), float(closes.max()), float(closes.min()),
+                float(closes[-1]), float(self.volume[lo:hi].sum())
+            ])
+        return rows
+
+
+def reference_lttb(x, y, threshold):
+    """Straightforward per-point LTTB"""
+    n = len(x)
+    edges = [int(edge) for edge in np.linspace(1, n - 1, threshold - 1).astype(np.int64)]
+    kept = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < threshold - 2:
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+            cx = sum(x[next_start:next_stop]) / (next_stop - next_start)
+            cy = sum(y[next_start:next_stop]) / (next_stop - next_start)
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        ax, ay = x[previous], y[previous]
+        best, best_area = start, -1.0
+        for index in range(start, stop):
+            area = abs((ax - cx) * (y[index] - ay) - (ax - x[index]) * (cy - ay))
+            if area > best_area:
+                best, best_area = index, area
+        kept.append(best)
+        previous = best
+    kept.append(n - 1)
+    return kept
+
+
+def shape_error(x, y, kept):
+    """Mean absolute error of the kept points linearly interpolated back onto every point, in % of range"""
+    rebuilt = np.interp(x, x[kept], y[kept])
+    return float(np.abs(rebuilt - y).mean() / (y.max() - y.min()) * 100)
+
+
+async def run(args) -> bool:
+    exchange = FakeExchange(args.days)
+    ok = True
+
+    # Raw downsampling over every minute candle
+    y = exchange.close[:args.days * 1440]
+    x = exchange.start_ms + np.arange(len(y), dtype=np.int64) * MINUTE_MS
+    print(f"{len(y):,} minute candles -> {args.points:,} points")
+    for name, function in (("lttb", lambda: lttb(x, y, args.points)), ("minmax", lambda: minmax(y, args.points))):
+        kept = function()
+        started = time.perf_counter()
+        for _ in range(20):
+            function()
+        elapsed = (time.perf_counter() - started) / 20
+        extremes = y.argmin() in kept and y.argmax() in kept
+        print(f"  {name:<7} {elapsed * 1000:7.2f} ms, {len(kept):,} points, mean error {shape_error(x, y, kept):.3f}% "
+              f"of range, global min/max kept: {extremes}")
+        ok &= len(kept) <= args.points
+        if name == "minmax":
+            ok &= extremes
+
+    sample = min(len(y), 50_000)
+    started = time.perf_counter()
+    expected = reference_lttb(x[:sample].tolist(), y[:sample].tolist(), args.points)
+    reference_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    kept = lttb(x[:sample], y[:sample], args.points)
+    vectorized_ms = (time.perf_counter() - started) * 1000
+    same = kept.tolist() == expected
+    ok &= same
+    print(f"  reference LTTB on {sample:,} points: {reference_ms:.1f} ms vs {vectorized_ms:.2f} ms, "
+          f"identical indices: {same}")
+
+    # Through the candle store and chart cache
+    store = CandleStore(exchange.fetch_ohlcv, clock=exchange.clock)
+    history = ChartHistory(store)
+    range_seconds = args.days * 86400
+    for label, timeframe in (("auto timeframe", None), ("1m candles", "1m")):
+        calls = exchange.calls
+        started = time.perf_counter()
+        first = await history.get("BTC/USDT", range_seconds, args.points, "lttb", timeframe)
+        first_ms = (time.perf_counter() - started) * 1000
+        first_calls = exchange.calls - calls
+
+        calls = exchange.calls
+        started = time.perf_counter()
+        for _ in range(1000):
+            cached = await history.get("BTC/USDT", range_seconds, args.points, "lttb", timeframe)
+        cached_us = (time.perf_counter() - started) / 1000 * 1e6
+        ok &= cached is first and exchange.calls == calls
+
+        # One more minute closes: one upstream call, result recomputed
+        exchange.now_ms += MINUTE_MS
+        calls = exchange.calls
+        started = time.perf_counter()
+        refreshed = await history.get("BTC/USDT", range_seconds, args.points, "lttb", timeframe)
+        refresh_ms = (time.perf_counter() - started) * 1000
+        refresh_calls = exchange.calls - calls
+        ok &= refreshed is not first and refresh_calls == 1
+        print(f"{label} ({first.timeframe}, {first.source_points:,} candles -> {len(first.prices):,} points): "
+              f"first {first_ms:.0f} ms / {first_calls} calls, cached {cached_us:.1f} us / 0 calls, "
+              f"after next candle {refresh_ms:.1f} ms / {refresh_calls} call")
+
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--points", type=int, default=1000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
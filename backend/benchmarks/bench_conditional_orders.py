@@ -0,0 +1,263 @@
+"""
+Conditional Order Benchmark
+Rest a large number of stop-loss / take-profit triggers (some paired as OCO),
+drive a random-walk price feed through the trigger book and verify that exactly
+the crossed orders fired. Then fill pending stop trades end to end through the
+monitor and check their rows moved from pending to filled, and that two workers
+(monitors with their own books) seeing the same price fill each order only once.
+Finally, check that the background ticker poller alone (no client requesting
+prices) fills a stop, and keeps polling after a failed fetch.
+
+Usage:
+    python -m benchmarks.bench_conditional_orders --stops 500000 --updates 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_conditional.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import func, insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, Portfolio, Trade, OrderType, OrderSide, OrderStatus  # noqa: E402
+from app.services.conditional_orders import ConditionalOrderMonitor, TriggerBook, RISING  # noqa: E402
+from app.services.price_feed import PricePoller  # noqa: E402
+from app.services.risk import RiskEngine  # noqa: E402
+
+
+def book_benchmark(args) -> bool:
+    rng = random.Random(4)
+    symbols = [f"COIN{index}/USDT" for index in range(args.symbols)]
+    book = TriggerBook()
+    orders = {}
+    pairs = []
+
+    started = time.perf_counter()
+    trade_id = 0
+    while trade_id < args.stops:
+        symbol = rng.choice(symbols)
+        if rng.random() < 0.2 and trade_id + 2 <= args.stops:
+            # Sell OCO protecting a long: stop below, take-profit above
+            stop, target = 100 * (1 - rng.uniform(0.01, 0.2)), 100 * (1 + rng.uniform(0.01, 0.2))
+            book.add(trade_id, symbol, 1 - RISING, stop, trade_id + 1)
+            book.add(trade_id + 1, symbol, RISING, target, trade_id)
+            orders[trade_id] = (symbol, 1 - RISING, stop)
+            orders[trade_id + 1] = (symbol, RISING, target)
+            pairs.append((trade_id, trade_id + 1))
+            trade_id += 2
+        else:
+            direction = rng.choice((RISING, 1 - RISING))
+            trigger = 100 * (1 + rng.uniform(0.01, 0.2) * (1 if direction == RISING else -1))
+            book.add(trade_id, symbol, direction, trigger)
+            orders[trade_id] = (symbol, direction, trigger)
+            trade_id += 1
+    elapsed = time.perf_counter() - started
+    print(f"Rested {len(book):,} orders ({len(pairs):,} OCO pairs) in {elapsed:.2f}s")
+
+    prices = {symbol: 100.0 for symbol in symbols}
+    low = dict(prices)
+    high = dict(prices)
+    filled = {}
+    cancelled = set()
+    bad_fills = 0
+    check = book.check
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        symbol = symbols[rng.randrange(len(symbols))]
+        price = prices[symbol] * (1 + rng.gauss(0, 0.002))
+        prices[symbol] = price
+        if price < low[symbol]:
+            low[symbol] = price
+        elif price > high[symbol]:
+            high[symbol] = price
+        triggered, siblings = check(symbol, price)
+        for order, fill_price in triggered:
+            filled[order.trade_id] = fill_price
+            if (order.direction == RISING) != (order.trigger <= price):
+                bad_fills += 1
+        cancelled.update(order.trade_id for order in siblings)
+    elapsed = time.perf_counter() - started
+    print(f"Applied {args.updates:,} price updates in {elapsed:.2f}s -> {args.updates / elapsed:,.0f} updates/s "
+          f"({elapsed / args.updates * 1e6:.2f} us each)")
+    print(f"  filled {len(filled):,}, OCO siblings cancelled {len(cancelled):,}, still resting {len(book):,}")
+
+    # Nothing still resting may have been crossed by the range each symbol traded in
+    missed = sum(
+        1 for trade_id, (symbol, direction, trigger) in orders.items()
+        if trade_id in book.orders and (trigger <= high[symbol] if direction == RISING else trigger >= low[symbol])
+    )
+    broken_pairs = sum(
+        1 for stop, target in pairs
+        if (stop in filled) + (target in filled) > 1
+        or ((stop in filled or target in filled) and not (stop in cancelled or target in cancelled))
+    )
+    print(f"  crossed but still resting: {missed}, fills on the wrong side: {bad_fills}, broken OCO pairs: {broken_pairs}")
+    return missed == 0 and bad_fills == 0 and broken_pairs == 0
+
+
+def seed(pending: int) -> None:
+    """One user with pending sell stops spread below 100"""
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [{"id": 1, "email": "u1@example.com", "username": "u1", "hashed_password": "x"}])
+        db.execute(insert(Portfolio), [{"user_id": 1}])
+        db.execute(insert(Trade), [
+            {
+                "user_id": 1,
+                "exchange_name": "binance",
+                "symbol": "BTC/USDT",
+                "order_type": OrderType.STOP_LOSS,
+                "order_side": OrderSide.SELL,
+                "order_status": OrderStatus.PENDING,
+                "price": 100 - (index % 1000) * 0.01,
+                "quantity": 0.1,
+            }
+            for index in range(pending)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def monitor_benchmark(args) -> bool:
+    Base.metadata.create_all(bind=engine)
+    seed(args.pending)
+    monitor = ConditionalOrderMonitor(risk=RiskEngine())
+    db = SessionLocal()
+    try:
+        monitor.load(db)
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    filled = 0
+    price = 100.0
+    while price > 89:
+        price -= 0.5
+        filled += len(await monitor.on_price("BTC/USDT", price))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        statuses = dict(db.query(Trade.order_status, func.count()).group_by(Trade.order_status).all())
+    finally:
+        db.close()
+    print(f"Monitor: filled {filled:,} of {args.pending:,} pending stops in {elapsed:.2f}s "
+          f"({filled / elapsed:,.0f} fills/s incl. holdings and rollups)")
+    print(f"  rows: {statuses.get(OrderStatus.FILLED, 0):,} filled, {statuses.get(OrderStatus.PENDING, 0):,} pending")
+    return statuses.get(OrderStatus.FILLED, 0) == args.pending and len(monitor.book) == 0
+
+
+async def two_workers_check() -> bool:
+    """Two monitors over one database, both holding the same orders, see the same price"""
+    db = SessionLocal()
+    try:
+        rows = [
+            {
+                "user_id": 1,
+                "exchange_name": "binance",
+                "symbol": "ETH/USDT",
+                "order_type": order_type,
+                "order_side": OrderSide.SELL,
+                "order_status": OrderStatus.PENDING,
+                "price": price,
+                "quantity": 0.1,
+            }
+            for order_type, price in [(OrderType.STOP_LOSS, 50 - index * 0.01) for index in range(200)]
+            + [(OrderType.STOP_LOSS, 45), (OrderType.TAKE_PROFIT, 60)]
+        ]
+        db.execute(insert(Trade), rows)
+        stop, target = [trade_id for (trade_id,) in db.query(Trade.id).filter(
+            Trade.symbol == "ETH/USDT").order_by(Trade.id.desc()).limit(2)][::-1]
+        db.query(Trade).filter(Trade.id == stop).update({Trade.linked_trade_id: target})
+        db.query(Trade).filter(Trade.id == target).update({Trade.linked_trade_id: stop})
+        db.commit()
+        workers = [ConditionalOrderMonitor(risk=RiskEngine()) for _ in range(2)]
+        for monitor in workers:
+            monitor.load(db)
+    finally:
+        db.close()
+
+    # Each worker on its own thread and event loop, as in separate processes
+    first, second = await asyncio.gather(*(
+        asyncio.to_thread(asyncio.run, monitor.on_price("ETH/USDT", 40.0)) for monitor in workers
+    ))
+    db = SessionLocal()
+    try:
+        statuses = dict(db.query(Trade.order_status, func.count()).filter(
+            Trade.symbol == "ETH/USDT").group_by(Trade.order_status).all())
+        target_status = db.get(Trade, target).order_status
+    finally:
+        db.close()
+    once = not set(first) & set(second) and len(first) + len(second) == 201
+    ok = once and statuses.get(OrderStatus.FILLED, 0) == 201 and target_status == OrderStatus.CANCELLED
+    print(f"Two workers: {len(first)} + {len(second)} fills of 201 crossed orders, "
+          f"rows {statuses.get(OrderStatus.FILLED, 0)} filled, OCO sibling {target_status.value}: "
+          f"{'each filled once' if ok else 'DOUBLE FILLS'}")
+    return ok
+
+
+async def poller_check() -> bool:
+    """A stop on a symbol nobody requests fills from background polling alone"""
+    db = SessionLocal()
+    try:
+        db.execute(insert(Trade), [{
+            "user_id": 1, "exchange_name": "binance", "symbol": "SOL/USDT", "order_type": OrderType.STOP_LOSS,
+            "order_side": OrderSide.SELL, "order_status": OrderStatus.PENDING, "price": 20.0, "quantity": 1.0,
+        }])
+        db.commit()
+        monitor = ConditionalOrderMonitor(risk=RiskEngine())
+        monitor.load(db)
+    finally:
+        db.close()
+
+    prices = iter([25.0, None, 22.0, 19.5])  # None: the exchange call fails
+
+    async def fetch(symbols):
+        price = next(prices, 19.5)
+        if price is None:
+            raise ConnectionError("exchange unavailable")
+        return {symbol: {"last": price} for symbol in symbols}
+
+    filled = []
+
+    async def on_ticker(symbol, ticker):
+        filled.extend(await monitor.on_price(symbol, ticker["last"]))
+
+    poller = PricePoller(fetch, on_ticker, monitor.symbols, interval=0.01)
+    poller.start()
+    for _ in range(500):
+        if filled:
+            break
+        await asyncio.sleep(0.01)
+    await poller.stop()
+    ok = len(filled) == 1 and poller.failures == 1 and not monitor.symbols()
+    print(f"Poller: stop filled without client requests after {poller.polls} polls "
+          f"({poller.failures} failed fetch): {'yes' if ok else 'NO'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=500_000)
+    parser.add_argument("--updates", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--pending", type=int, default=5000, help="Pending stop trades for the end-to-end test")
+    args = parser.parse_args()
+
+    ok = book_benchmark(args)
+    ok = asyncio.run(monitor_benchmark(args)) and ok
+    ok = asyncio.run(two_workers_check()) and ok
+    ok = asyncio.run(poller_check()) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Encrypted API Key Benchmark
+Measure what envelope encryption of exchange API keys costs order placement and
+check the decrypted-key cache:
+
+    - seal, open and cached lookups per key pair, against deriving the master
+      key with scrypt on every open (what a naive KDF-per-decrypt would pay)
+    - POST /api/trading/trades latency for a user whose key is stored as
+      plaintext, one whose key is encrypted (cached) and the same encrypted key
+      with the cache disabled; orders are interleaved so all see the same noise
+    - keys added through the API are stored encrypted, listed masked, and the
+      secret never reaches the database files
+    - rotation and deactivation drop the cached entry; a rotation made by
+      another process (row changed behind the cache) is not served stale;
+      entries expire after the TTL and the cache stays within its size
+    - values copied to another row or column do not open; after a master key
+      rotation old values open through the previous key and re-wrap
+
+Usage:
+    python -m benchmarks.bench_credentials --orders 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_credentials.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import numpy as np  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models import User, Portfolio, ExchangeAPIKey  # noqa: E402
+from app.services.credentials import (  # noqa: E402
+    CredentialError, CredentialVault, credential_vault, derive_master_key
+)
+from main import app  # noqa: E402
+
+SECRET = "s3cr3t-never-on-disk-9f2c41d7"
+
+
+def create_user(name: str) -> tuple:
+    """A user without API keys; returns the user id and auth headers."""
+    db = SessionLocal()
+    try:
+        user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(Portfolio(user_id=user.id))
+        db.commit()
+        return user.id, {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+    finally:
+        db.close()
+
+
+def load_key(key_id: int) -> ExchangeAPIKey:
+    db = SessionLocal()
+    try:
+        key = db.get(ExchangeAPIKey, key_id)
+        db.expunge(key)
+        return key
+    finally:
+        db.close()
+
+
+def order(index: int) -> dict:
+    return {
+        "symbol": "BTC/USDT",
+        "order_type": "limit",
+        "order_side": "buy" if index % 2 == 0 else "sell",
+        "quantity": 0.01,
+        "price": 40000 + index % 100,
+    }
+
+
+def timed(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench_vault() -> bool:
+    credential_vault.unlock()
+    sealed = credential_vault.seal_columns(1, "key-0123456789", SECRET)
+    key = ExchangeAPIKey(id=-1, user_id=1, **sealed)
+    seal = timed(lambda: credential_vault.seal_columns(1, "key-0123456789", SECRET), 2000)
+    opened = timed(lambda: (credential_vault.open(key.api_key, 1, "api_key"),
+                            credential_vault.open(key.api_secret, 1, "api_secret")), 2000)
+    credential_vault.credentials(key)
+    cached = timed(lambda: credential_vault.credentials(key), 20000)
+    kdf = timed(lambda: derive_master_key("passphrase"), 3)
+    credential_vault.invalidate(key.id)
+    print(f"Per key pair: seal {seal * 1e6:.1f} us, open {opened * 1e6:.1f} us, cached {cached * 1e6:.2f} us; "
+          f"scrypt per open would add {kdf * 1000:.0f} ms")
+    return credential_vault.credentials(key).api_secret == SECRET
+
+
+def bench_orders(args, client: TestClient) -> bool:
+    plain_id, plain_headers = create_user("plain")
+    encrypted_id, encrypted_headers = create_user("encrypted")
+    db = SessionLocal()
+    db.add(ExchangeAPIKey(user_id=plain_id, exchange_name="binance", api_key="key", api_secret="plain-secret"))
+    db.commit()
+    db.close()
+    response = client.post("/api/trading/api-keys", headers=encrypted_headers, json={
+        "exchange_name": "binance", "api_key": "key-0123456789", "api_secret": SECRET
+    })
+    ok = response.status_code == 201
+
+    modes = {"plaintext key": [], "encrypted, cached": [], "encrypted, no cache": []}
+    headers = {"plaintext key": plain_headers, "encrypted, cached": encrypted_headers,
+               "encrypted, no cache": encrypted_headers}
+    cache_size = credential_vault.cache_size
+    for index in range(args.warmup + args.orders):
+        for mode, latencies in modes.items():
+            credential_vault.cache_size = 0 if mode == "encrypted, no cache" else cache_size
+            if credential_vault.cache_size == 0:
+                credential_vault.clear()
+            started = time.perf_counter()
+            response = client.post("/api/trading/trades", json=order(index), headers=headers[mode])
+            elapsed = time.perf_counter() - started
+            ok &= response.status_code == 201
+            if index >= args.warmup:
+                latencies.append(elapsed)
+    credential_vault.cache_size = cache_size
+
+    baseline = np.median(modes["plaintext key"])
+    print(f"POST /api/trading/trades, {args.orders:,} orders each (interleaved):")
+    for mode, latencies in modes.items():
+        latencies = np.array(latencies) * 1000
+        print(f"  {mode:<20} p50 {np.median(latencies):.3f} ms  p99 {np.percentile(latencies, 99):.3f} ms  "
+              f"({(np.median(latencies) / 1000 / baseline - 1) * 100:+.1f}% p50)")
+    close = np.median(modes["encrypted, cached"]) <= baseline * (1 + args.tolerance)
+    print(f"  encrypted p50 within {args.tolerance:.0%} of plaintext: {'yes' if close else 'NO'}; "
+          f"cache {credential_vault.stats()}")
+    return ok and close
+
+
+def check_api(client: TestClient) -> bool:
+    user_id, headers = create_user("keys")
+    created = client.post("/api/trading/api-keys", headers=headers, json={
+        "exchange_name": "kraken", "api_key": "key-abcdefghij", "api_secret": SECRET
+    }).json()
+    key = load_key(created["id"])
+    stored = key.api_key.startswith("enc:v1:") and key.api_secret.startswith("enc:v1:") and SECRET not in key.api_secret
+    listed = client.get("/api/trading/api-keys", headers=headers).json()
+    masked = created["api_key"] == "****ghij" and [item["api_key"] for item in listed] == ["****ghij"]
+    placed = client.post("/api/trading/trades", json=order(0), headers=headers).status_code == 201
+    cached = key.id in credential_vault.cache
+
+    rotated = client.put(f"/api/trading/api-keys/{key.id}", headers=headers, json={
+        "api_key": "key-rotated-0001", "api_secret": "rotated-secret"
+    }).json()
+    rotation = key.id not in credential_vault.cache and rotated["api_key"] == "****0001"
+    rotation &= credential_vault.credentials(load_key(key.id)).api_secret == "rotated-secret"
+
+    # Rotated elsewhere: the row changes without this process invalidating its entry
+    db = SessionLocal()
+    row = db.get(ExchangeAPIKey, key.id)
+    for column, value in credential_vault.seal_columns(user_id, "key-elsewhere-02", "elsewhere-secret").items():
+        setattr(row, column, value)
+    db.commit()
+    db.close()
+    rotation &= credential_vault.credentials(load_key(key.id)).api_secret == "elsewhere-secret"
+
+    deactivated = client.post(f"/api/trading/api-keys/{key.id}/deactivate", headers=headers).json()
+    deactivation = not deactivated["is_active"] and key.id not in credential_vault.cache
+    deactivation &= client.post("/api/trading/trades", json=order(1), headers=headers).status_code == 400
+
+    on_disk = b""
+    for suffix in ("", "-wal"):
+        if os.path.exists(DB_PATH + suffix):
+            with open(DB_PATH + suffix, "rb") as file:
+                on_disk += file.read()
+    not_on_disk = len(on_disk) > 0 and SECRET.encode() not in on_disk
+    print(f"API: stored encrypted {'yes' if stored else 'NO'}, listed masked {'yes' if masked else 'NO'}, "
+          f"order placed and key cached {'yes' if placed and cached else 'NO'}")
+    print(f"  rotation drops the entry, also when done by another process: {'yes' if rotation else 'NO'}; "
+          f"deactivation drops it and blocks orders: {'yes' if deactivation else 'NO'}; "
+          f"secret absent from the database files: {'yes' if not_on_disk else 'NO'}")
+    return stored and masked and placed and cached and rotation and deactivation and not_on_disk
+
+
+def check_cache() -> bool:
+    now = [0.0]
+    vault = CredentialVault("passphrase", cache_size=3, cache_ttl=10.0, clock=lambda: now[0])
+    keys = [ExchangeAPIKey(id=index, user_id=index, **vault.seal_columns(index, f"key-{index}", f"secret-{index}"))
+            for index in range(5)]
+    for key in keys:
+        vault.credentials(key)
+    bounded = list(vault.cache) == [2, 3, 4]
+    now[0] = 5.0
+    vault.credentials(keys[0])
+    now[0] = 11.0
+    vault.purge()
+    expired = list(vault.cache) == [0]
+    hidden = "secret-1" not in repr(vault.credentials(keys[1]))
+
+    # Values copied to another column or row
+    copied = []
+    for api_key, api_secret, user_id in ((keys[1].api_secret, keys[1].api_secret, 1),
+                                         (keys[1].api_key, keys[1].api_secret, 2)):
+        try:
+            vault.open(api_key, user_id, "api_key")
+            copied.append(False)
+        except CredentialError:
+            copied.append(True)
+
+    # Master key rotation: the old key becomes a previous key, values are re-wrapped
+    rotated = CredentialVault("new passphrase", ["passphrase"])
+    old = keys[1].api_secret
+    readable = rotated.open(old, 1, "api_secret") == "secret-1"
+    rewrapped = rotated.rewrap(old, 1, "api_secret")
+    same_data = rewrapped.rsplit(":", 1)[1] == old.rsplit(":", 1)[1]
+    only_new = CredentialVault("new passphrase").open(rewrapped, 1, "api_secret") == "secret-1"
+    ok = bounded and expired and hidden and all(copied) and readable and same_data and only_new
+    print(f"Cache bounded and TTL'd, reprs masked: {'yes' if bounded and expired and hidden else 'NO'}; "
+          f"copied values refused: {'yes' if all(copied) else 'NO'}; master key rotation re-wraps data keys: "
+          f"{'yes' if readable and same_data and only_new else 'NO'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed p50 slowdown of encrypted keys")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    ok = bench_vault()
+    ok &= bench_orders(args, client)
+    ok &= check_api(client)
+    ok &= check_cache()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
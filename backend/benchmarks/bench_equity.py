@@ -0,0 +1,192 @@
+"""
+Equity Curve Benchmark
+Fill a scratch database with months of trades over a few assets, serve candles
+from fake exchanges, and time /api/portfolio/equity computations:
+
+    - cold (no checkpoints: every fill is replayed) and warm (resumed from the
+      newest checkpoint before the range) requests
+    - a backdated fill, which must drop the checkpoints behind it
+
+Sampled points are checked against a brute-force replay of every fill up to
+each point.
+
+Usage:
+    python -m benchmarks.bench_equity --days 90 --fills 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+# Point the app at a scratch database before it is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_equity.db')}")
+
+import numpy as np  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import EquitySnapshot, OrderSide, OrderStatus, OrderType, Trade, User  # noqa: E402
+from app.services.analytics import apply_average_cost  # noqa: E402
+from app.services.candles import TIMEFRAME_SECONDS, CandleStore  # noqa: E402
+from app.services.equity import from_ms, get_equity_curve  # noqa: E402
+from benchmarks.bench_chart_history import MINUTE_MS, FakeExchange  # noqa: E402
+
+ASSETS = ["BTC", "ETH", "SOL", "ADA", "XRP"]
+
+
+class FakeMarket:
+    """One fake exchange per symbol, sharing a clock"""
+
+    def __init__(self, days: int):
+        self.exchanges = {f"{asset}/USDT": FakeExchange(days, seed=index) for index, asset in enumerate(ASSETS)}
+        self.base = next(iter(self.exchanges.values()))
+
+    def clock(self) -> float:
+        return self.base.clock()
+
+    def advance(self, ms: int) -> None:
+        for exchange in self.exchanges.values():
+            exchange.now_ms += ms
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=1000):
+        return self.exchanges[symbol].fetch_ohlcv(symbol, timeframe, since, limit)
+
+    def price(self, asset: str, time_ms: int) -> float:
+        exchange = self.exchanges[f"{asset}/USDT"]
+        return float(exchange.close[(time_ms - exchange.start_ms) // MINUTE_MS])
+
+
+def make_fills(market: FakeMarket, count: int, days: int, seed: int = 5):
+    """Random buys and sells at the market price; sells never exceed the position"""
+    rng = np.random.default_rng(seed)
+    start = market.base.start_ms
+    times = np.sort(rng.integers(start, start + days * 86_400_000 - MINUTE_MS, count))
+    positions = {asset: 0.0 for asset in ASSETS}
+    rows = []
+    for time_ms in times.tolist():
+        asset = ASSETS[rng.integers(len(ASSETS))]
+        price = market.price(asset, time_ms)
+        if positions[asset] > 0 and rng.random() < 0.45:
+            side, quantity = OrderSide.SELL, positions[asset] * rng.uniform(0.1, 1.0)
+        else:
+            side, quantity = OrderSide.BUY, 1000 / price * rng.uniform(0.5, 2.0)
+        positions[asset] += quantity if side == OrderSide.BUY else -quantity
+        rows.append(dict(
+            user_id=1, exchange_name="binance", symbol=f"{asset}/USDT", order_type=OrderType.MARKET,
+            order_side=side, order_status=OrderStatus.FILLED, quantity=quantity, filled_quantity=quantity,
+            average_price=price, fee=quantity * price * 0.001, total_cost=quantity * price,
+            executed_at=from_ms(int(time_ms)), created_at=from_ms(int(time_ms))
+        ))
+    return rows
+
+
+def reference_point(rows, market: FakeMarket, time_ms: int, step: int):
+    """Replay every fill up to time_ms and value the positions at the last closed bar"""
+    positions, realized = {}, 0.0
+    for row in rows:
+        if row["executed_at"] > from_ms(time_ms):
+            break
+        asset = row["symbol"].split("/")[0]
+        quantity, average = positions.get(asset, (0.0, 0.0))
+        quantity, average, pnl = apply_average_cost(
+            quantity, average, row["order_side"], row["filled_quantity"], row["average_price"], row["fee"]
+        )
+        positions[asset] = (quantity, average)
+        realized += pnl
+    value = 0.0
+    for asset, (quantity, average) in positions.items():
+        if quantity:
+            # Close of the last bar ended by time_ms (or the latest minute for the live point)
+            bar_end = time_ms if time_ms == int(market.clock() * 1000) else time_ms - time_ms % step
+            value += quantity * market.price(asset, bar_end - 1)
+    return value, realized
+
+
+async def run(args) -> bool:
+    Base.metadata.create_all(bind=engine)
+    market = FakeMarket(args.days)
+    rows = make_fills(market, args.fills, args.days)
+    db = SessionLocal()
+    db.add(User(id=1, email="bench@example.com", username="bench", hashed_password="-"))
+    db.commit()
+    db.execute(insert(Trade), rows)
+    db.commit()
+
+    store = CandleStore(market.fetch_ohlcv, clock=market.clock)
+    range_seconds = args.range_days * 86400
+    resolution = args.resolution
+    step = TIMEFRAME_SECONDS[resolution] * 1000
+    ok = True
+
+    def check(curve, label):
+        nonlocal ok
+        timestamps = curve.points["timestamp"]
+        rng = np.random.default_rng(1)
+        sample = sorted(set(rng.integers(0, len(timestamps), 30).tolist()) | {len(timestamps) - 1})
+        worst = 0.0
+        for index in sample:
+            value, realized = reference_point(rows, market, int(timestamps[index]), step)
+            worst = max(worst, abs(value - curve.points["value"][index]),
+                        abs(realized - curve.points["realized_profit_loss"][index]))
+        ok &= worst < 1e-6
+        print(f"  {label}: {len(timestamps):,} points, {curve.replayed_fills:,} fills replayed, "
+              f"resumed from {curve.checkpoint_at or 'start'}, max deviation from reference {worst:.2e}")
+
+    # Candles are loaded on the first request; time the equity work once they are cached
+    await get_equity_curve(db, 1, store, range_seconds, resolution)
+    db.query(EquitySnapshot).delete()
+    db.commit()
+
+    started = time.perf_counter()
+    cold = await get_equity_curve(db, 1, store, range_seconds, resolution)
+    cold_ms = (time.perf_counter() - started) * 1000
+    checkpoints = db.query(EquitySnapshot).count()
+    print(f"{args.fills:,} fills over {args.days} days, {args.range_days}d range at {resolution}")
+    print(f"Cold request: {cold_ms:.1f} ms, {checkpoints} checkpoints written")
+    check(cold, "cold")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        warm = await get_equity_curve(db, 1, store, range_seconds, resolution)
+    warm_ms = (time.perf_counter() - started) / args.repeat * 1000
+    print(f"Warm request: {warm_ms:.1f} ms ({cold_ms / warm_ms:.1f}x faster)")
+    check(warm, "warm")
+    ok &= warm.replayed_fills < cold.replayed_fills
+
+    # A fill recorded behind the checkpoints (e.g. journal recovery) must invalidate them
+    late = dict(rows[len(rows) // 2])
+    late_time = late["executed_at"] + timedelta(seconds=1)
+    late.update(executed_at=late_time, created_at=late_time, order_side=OrderSide.BUY, quantity=0.5,
+                filled_quantity=0.5, fee=0.0)
+    db.execute(insert(Trade), [late])
+    db.commit()
+    rows.insert(len(rows) // 2 + 1, late)
+    rows.sort(key=lambda row: row["executed_at"])
+    started = time.perf_counter()
+    healed = await get_equity_curve(db, 1, store, range_seconds, resolution)
+    print(f"After a backdated fill: {(time.perf_counter() - started) * 1000:.1f} ms")
+    check(healed, "healed")
+    ok &= healed.checkpoint_at is None or healed.checkpoint_at < late_time
+
+    db.close()
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--fills", type=int, default=20000)
+    parser.add_argument("--range-days", type=int, default=7)
+    parser.add_argument("--resolution", default="1h")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Event Bus Benchmark
+Measure fan-out throughput of the event bus and check its overflow policies:
+
+    - events published in batches and one at a time to several subscribers
+      draining their queues concurrently, reported as events and deliveries
+      per second; batched publishing has to reach --target deliveries/sec
+      (1M by default), and no event may be lost or reordered
+    - two producers publishing to a 'block' subscriber that is full: the
+      subscriber still gets the events in sequence order
+    - drop_oldest keeps the newest maxsize events of a stalled subscriber
+    - coalesce_latest keeps one event per key, the latest, in first-arrival order
+    - block loses nothing and keeps order with a slow subscriber, and the
+      publisher's waiting shows up in the metrics
+    - payloads of the wrong type are rejected
+
+Usage:
+    python -m benchmarks.bench_events --events 1000000 --subscribers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_events.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from app.services.events import EventBus, Fill, OrderUpdate, SubscriptionClosed, Ticker  # noqa: E402
+
+SYMBOLS = [f"COIN{index}/USDT" for index in range(50)]
+
+
+async def drain(subscription, counts, index):
+    """Take batches until the subscription closes; counts events and checks their order."""
+    last = 0
+    in_order = True
+    try:
+        while True:
+            events = await subscription.get_batch(4096)
+            counts[index] += len(events)
+            in_order &= events[0].sequence > last and all(
+                a.sequence < b.sequence for a, b in zip(events, events[1:])
+            )
+            last = events[-1].sequence
+    except SubscriptionClosed:
+        return in_order
+
+
+async def fan_out(args, batch: int) -> tuple:
+    """
+    Deliveries per second with args.subscribers concurrent drop_oldest subscribers.
+    Returns the rate and whether every event was delivered (or counted as dropped) in order.
+    """
+    bus = EventBus(queue_size=args.queue_size)
+    subscriptions = [bus.subscribe("ticker") for _ in range(args.subscribers)]
+    counts = [0] * args.subscribers
+    consumers = [asyncio.create_task(drain(sub, counts, index)) for index, sub in enumerate(subscriptions)]
+    payloads = [Ticker(SYMBOLS[index % len(SYMBOLS)], 100.0 + index % 7, None) for index in range(batch)]
+
+    events = args.events if batch > 1 else args.events // 5
+    started = time.perf_counter()
+    if batch > 1:
+        for _ in range(events // batch):
+            await bus.publish_many("ticker", payloads)
+            await asyncio.sleep(0)  # Let the consumers run
+    else:
+        publish = bus.publish
+        for index in range(events):
+            await publish("ticker", payloads[0])
+            if index % 512 == 511:
+                await asyncio.sleep(0)
+    published = bus.channels["ticker"].published
+    while sum(counts) + sum(sub.dropped for sub in subscriptions) < published * args.subscribers:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    for subscription in subscriptions:
+        subscription.close()
+    ordered = all(await asyncio.gather(*consumers))
+    complete = sum(counts) + sum(sub.dropped for sub in subscriptions) == published * args.subscribers
+
+    stats = bus.snapshot()["ticker"]
+    rate = published * args.subscribers / elapsed
+    mode = f"batches of {batch}" if batch > 1 else "one at a time"
+    print(f"Fan-out, {mode}: {published:,} events x {args.subscribers} subscribers in {elapsed:.2f}s")
+    print(f"  {published / elapsed:,.0f} events/s, {rate:,.0f} deliveries/s "
+          f"({'meets' if rate >= args.target else 'below'} {args.target:,.0f} target); dropped {stats['dropped']:,}, "
+          f"mean lag {stats['mean_lag_ms']:.3f} ms, max lag {stats['max_lag_ms']:.3f} ms, "
+          f"in order: {'yes' if ordered else 'NO'}, none lost: {'yes' if complete else 'NO'}")
+    return rate, ordered and complete
+
+
+async def policies() -> bool:
+    bus = EventBus()
+    ok = True
+
+    # drop_oldest: a stalled subscriber keeps the newest events
+    with bus.subscribe("ticker", "drop_oldest", maxsize=100) as stalled:
+        await bus.publish_many("ticker", [Ticker("BTC/USDT", float(price), None) for price in range(1000)])
+        kept = [event.data.price for event in stalled.get_nowait(1000)]
+        good = kept == [float(price) for price in range(900, 1000)] and stalled.dropped == 900
+        print(f"drop_oldest: kept {len(kept)} newest, dropped {stalled.dropped}: {'ok' if good else 'WRONG'}")
+        ok &= good
+
+    # coalesce_latest: one event per symbol, the latest, in order of first arrival
+    with bus.subscribe("ticker", "coalesce_latest", maxsize=1000) as latest:
+        updates = [Ticker(SYMBOLS[index % 10], float(index), None) for index in range(1000)]
+        await bus.publish_many("ticker", updates)
+        kept = [(event.data.symbol, event.data.price) for event in latest.get_nowait(1000)]
+        expected = [(SYMBOLS[index], float(990 + index)) for index in range(10)]
+        good = kept == expected and latest.coalesced == 990
+        print(f"coalesce_latest: {len(kept)} events for 10 symbols, coalesced {latest.coalesced}: "
+              f"{'ok' if good else 'WRONG'}")
+        ok &= good
+
+    # coalesce_latest over capacity: new keys push out the oldest key
+    with bus.subscribe("ticker", "coalesce_latest", maxsize=5) as small:
+        await bus.publish_many("ticker", [Ticker(symbol, 1.0, None) for symbol in SYMBOLS[:8]])
+        kept = [event.data.symbol for event in small.get_nowait()]
+        good = kept == SYMBOLS[3:8] and small.dropped == 3
+        print(f"coalesce_latest over capacity: kept {len(kept)} newest keys: {'ok' if good else 'WRONG'}")
+        ok &= good
+
+    # block: a slow subscriber gets everything, in order, and the publisher waits
+    slow = bus.subscribe("fill", "block", maxsize=10)
+    received = []
+
+    async def consume():
+        try:
+            while True:
+                received.extend(event.data.trade_id for event in await slow.get_batch(3))
+                await asyncio.sleep(0.0005)
+        except SubscriptionClosed:
+            pass
+
+    consumer = asyncio.create_task(consume())
+    fills = [Fill(trade_id, 1, None, "BTC/USDT", "buy", "market", 1.0, 100.0, 0.1, 0.0, None)
+             for trade_id in range(1, 201)]
+    started = time.perf_counter()
+    for item in fills:
+        await bus.publish("fill", item)
+    elapsed = time.perf_counter() - started
+    while slow.queue:
+        await asyncio.sleep(0.001)
+    slow.close()
+    await consumer
+    stats = bus.snapshot()["fill"]
+    good = received == list(range(1, 201)) and stats["blocked"] > 0 and stats["dropped"] == 0
+    print(f"block: {len(received)} of 200 received in order, publisher blocked {stats['blocked']} times "
+          f"for {stats['blocked_seconds']:.3f}s of {elapsed:.3f}s: {'ok' if good else 'WRONG'}")
+    ok &= good
+
+    try:
+        await bus.publish("ticker", {"symbol": "BTC/USDT"})
+        rejected = False
+    except TypeError:
+        rejected = True
+    print(f"wrong payload type: {'rejected' if rejected else 'ACCEPTED'}")
+    exported = bus.prometheus()
+    good = rejected and 'event_bus_published_total{topic="fill"} 200' in exported
+    print(f"Prometheus export: {len(exported.splitlines())} lines")
+    return ok and good
+
+
+async def block_ordering() -> bool:
+    """Producers racing a full 'block' subscriber: its events must stay in sequence order."""
+    bus = EventBus()
+    slow = bus.subscribe("order_update", "block", maxsize=2)
+    received = []
+
+    async def consume():
+        try:
+            while True:
+                received.extend(event.sequence for event in await slow.get_batch(1))
+                await asyncio.sleep(0.0002)
+        except SubscriptionClosed:
+            pass
+
+    async def produce(offset):
+        for index in range(100):
+            await bus.publish("order_update", OrderUpdate(offset + index, 1, None, "BTC/USDT", "buy", "market",
+                                                          "filled", 1.0, 1.0, 100.0))
+            if index % 7 == 0:
+                await asyncio.sleep(0)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.gather(*(produce(offset) for offset in (0, 1000, 2000)))
+    while slow.queue:
+        await asyncio.sleep(0.001)
+    slow.close()
+    await consumer
+    good = received == list(range(1, 301))
+    print(f"block with 3 producers: {len(received)} of 300 received in sequence order: {'ok' if good else 'WRONG'}")
+    return good
+
+
+async def run(args) -> bool:
+    batched, ok = await fan_out(args, 1000)
+    _, correct = await fan_out(args, 1)
+    ok &= correct and batched >= args.target
+    ok &= await policies()
+    ok &= await block_ordering()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=65536)
+    parser.add_argument("--target", type=float, default=1_000_000, help="Batched deliveries/sec to reach")
+    args = parser.parse_args()
+    ok = asyncio.run(run(args))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Export Memory Benchmark
+Stream a large trade history through each export format and check that
+resident memory stays within a fixed budget regardless of row count.
+
+Usage:
+    python -m benchmarks.bench_export --trades 50000000 --budget-mb 64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_export.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from datetime import datetime, timedelta  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Trade, OrderSide, OrderStatus, OrderType  # noqa: E402
+from app.services import export  # noqa: E402
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def populate(trades: int, chunk_size: int = 100000):
+    """Insert synthetic trades for user 1"""
+    start = datetime(2024, 1, 1)
+    db = SessionLocal()
+    try:
+        for offset in range(0, trades, chunk_size):
+            rows = [
+                {
+                    "user_id": 1,
+                    "exchange_name": "binance",
+                    "symbol": "BTC/USDT",
+                    "order_type": OrderType.LIMIT,
+                    "order_side": OrderSide.BUY if index % 2 else OrderSide.SELL,
+                    "order_status": OrderStatus.FILLED,
+                    "price": 40000.0 + index % 1000,
+                    "quantity": 0.01,
+                    "filled_quantity": 0.01,
+                    "average_price": 40000.0 + index % 1000,
+                    "total_cost": 400.0,
+                    "fee": 0.4,
+                    "created_at": start + timedelta(seconds=index),
+                    "executed_at": start + timedelta(seconds=index),
+                }
+                for index in range(offset, min(offset + chunk_size, trades))
+            ]
+            db.execute(insert(Trade), rows)
+            db.commit()
+    finally:
+        db.close()
+
+
+def run_export(export_format: str, chunk_size: int):
+    """Consume an export stream, tracking bytes and peak RSS growth"""
+    stream = export.stream_trades(1, export_format, chunk_size=chunk_size)
+    baseline = None
+    peak = 0.0
+    total_bytes = 0
+    started = time.perf_counter()
+
+    for index, block in enumerate(stream):
+        total_bytes += len(block)
+        rss = current_rss_mb()
+        # Measure growth relative to the steady state after warm-up
+        if index == 5:
+            baseline = rss
+        if baseline is not None:
+            peak = max(peak, rss - baseline)
+
+    return time.perf_counter() - started, total_bytes, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=2_000_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--budget-mb", type=float, default=64.0, help="Allowed RSS growth after warm-up")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    print(f"Populating {args.trades:,} trades...")
+    populate(args.trades)
+
+    formats = ["csv"] + (["parquet", "arrow"] if export.columnar_available() else [])
+    failed = False
+    for export_format in formats:
+        elapsed, total_bytes, growth = run_export(export_format, args.chunk_size)
+        within = growth <= args.budget_mb
+        failed |= not within
+        print(
+            f"  {export_format:<8} {args.trades / elapsed:12,.0f} rows/s  "
+            f"{total_bytes / (1024 * 1024):10.1f} MB out  "
+            f"RSS growth {growth:6.1f} MB  {'OK' if within else 'OVER BUDGET'}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Grid Strategy Benchmark
+Run thousands of grids with hundreds of levels each over recorded random-walk
+ticks:
+
+    - through the grid book alone, reporting ticks/sec and fills/sec, and
+      checking every grid of one symbol against a brute-force reference that
+      tests every slot on every tick
+    - end to end through the market replay on a smaller set, checking that the
+      strategies' total_trades, winning_trades and total_profit_loss match the
+      grids and that a fresh engine resumes every grid from its saved state
+
+Usage:
+    python -m benchmarks.bench_grid --grids 5000 --symbols 10 --ticks 50000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_grid.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import numpy as np  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import ExchangeAPIKey, Portfolio, Strategy, StrategyStatus, Trade, User  # noqa: E402
+from app.services.grid import GridBook, GridEngine, parse_grid  # noqa: E402
+from app.services.replay import MarketReplay, ticks_from_recorder  # noqa: E402
+from app.services.tick_recorder import TickWriter  # noqa: E402
+
+START_MS = 1_700_000_000_000 // 60_000 * 60_000
+
+
+def symbols(count: int):
+    return [f"COIN{index}/USDT" for index in range(count)]
+
+
+def grid_rows(count: int, symbol_count: int, max_levels: int, users: int):
+    """Strategy rows for grids spread around 100 with random widths and level counts"""
+    rng = random.Random(5)
+    rows = []
+    for index in range(count):
+        width = rng.uniform(0.1, 0.3)
+        params = {
+            "symbol": symbols(symbol_count)[index % symbol_count],
+            "lower_price": round(100 * (1 - width * rng.uniform(0.3, 1)), 4),
+            "upper_price": round(100 * (1 + width * rng.uniform(0.3, 1)), 4),
+            "levels": rng.randint(max(2, max_levels // 4), max_levels),
+            "quantity": 0.01,
+            "spacing": rng.choice(("arithmetic", "geometric")),
+        }
+        rows.append({
+            "id": index + 1,
+            "user_id": index % users + 1,
+            "name": f"grid {index}",
+            "strategy_type": "grid",
+            "status": StrategyStatus.ACTIVE,
+            "parameters": json.dumps(params),
+        })
+    return rows
+
+
+def record_ticks(root: str, symbol_count: int, count: int):
+    """Write random-walk ticks to a tick store; returns the covered range (ns)"""
+    rng = np.random.default_rng(8)
+    per_symbol = count // symbol_count
+    start_ns = START_MS * 1_000_000
+    span_ns = max(1, count // 100) * 1_000_000_000
+    for symbol in symbols(symbol_count):
+        stamps = np.sort(rng.integers(start_ns, start_ns + span_ns, per_symbol))
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.0002, per_symbol)))
+        writer = TickWriter(root, symbol)
+        writer.append_batch(stamps, prices, rng.uniform(0.01, 1, per_symbol))
+        writer.close()
+    return start_ns, start_ns + span_ns
+
+
+def merged(ticks):
+    """(symbol, price) in timestamp order across symbols"""
+    names = sorted(ticks)
+    stamps = np.concatenate([ticks[name]["timestamp"] for name in names])
+    prices = np.concatenate([ticks[name]["price"] for name in names])
+    owners = np.repeat(np.arange(len(names)), [len(ticks[name]) for name in names])
+    order = np.argsort(stamps, kind="stable")
+    return [(names[owner], price) for owner, price in zip(owners[order].tolist(), prices[order].tolist())]
+
+
+def reference(grids, prices):
+    """Every grid of one symbol, testing every slot on every tick"""
+    lows = np.concatenate([grid.levels[:-1] for grid in grids])
+    highs = np.concatenate([grid.levels[1:] for grid in grids])
+    owner = np.repeat(np.arange(len(grids)), [len(grid.levels) - 1 for grid in grids])
+    quantity, fees = grids[0].quantity, grids[0].fees
+    start = prices[0]
+    holding = lows >= start
+    costs = np.where(holding, start * (1 + fees.taker), 0.0)
+    realized = np.zeros(len(grids))
+    cycles = np.zeros(len(grids), dtype=np.int64)
+    winning = np.zeros(len(grids), dtype=np.int64)
+    for price in prices[1:]:
+        buys = ~holding & (lows >= price)
+        sells = holding & (highs <= price)
+        if sells.any():
+            profit = quantity * (highs[sells] * (1 - fees.maker) - costs[sells])
+            np.add.at(realized, owner[sells], profit)
+            np.add.at(cycles, owner[sells], 1)
+            np.add.at(winning, owner[sells], profit > 0)
+            holding[sells] = False
+        if buys.any():
+            costs[buys] = lows[buys] * (1 + fees.maker)
+            holding[buys] = True
+    return holding, realized, cycles, winning
+
+
+def book_benchmark(args, ticks) -> bool:
+    db = SessionLocal()
+    try:
+        rows = db.query(Strategy).order_by(Strategy.id).all()
+        grids = [parse_grid(row, args.levels) for row in rows]
+    finally:
+        db.close()
+    book = GridBook()
+    for grid in grids:
+        book.add(grid)
+    levels = sum(len(grid.levels) for grid in grids)
+    stream = merged(ticks)
+
+    fills = 0
+    started = time.perf_counter()
+    on_price = book.on_price
+    for symbol, price in stream:
+        fills += len(on_price(symbol, price))
+    elapsed = time.perf_counter() - started
+    print(f"Grid book: {len(grids):,} grids, {levels:,} levels on {args.symbols} symbols")
+    print(f"  {len(stream):,} ticks in {elapsed:.2f}s -> {len(stream) / elapsed:,.0f} ticks/s, "
+          f"{fills:,} fills ({fills / elapsed:,.0f} fills/s)")
+
+    # Brute force over the first symbol's grids
+    symbol = symbols(args.symbols)[0]
+    checked = [grid for grid in grids if grid.symbol == symbol]
+    prices = [price for name, price in stream if name == symbol]
+    started = time.perf_counter()
+    holding, realized, cycles, winning = reference(checked, prices)
+    ours = np.concatenate([np.frombuffer(grid.holding, dtype=np.uint8) for grid in checked]).astype(bool)
+    ok = (
+        np.array_equal(holding, ours)
+        and np.allclose(realized, [grid.realized for grid in checked], rtol=1e-9, atol=1e-9)
+        and np.array_equal(cycles, [grid.cycles for grid in checked])
+        and np.array_equal(winning, [grid.winning for grid in checked])
+    )
+    print(f"  reference check on {len(checked):,} grids of {symbol} ({time.perf_counter() - started:.1f}s): "
+          f"{'match' if ok else 'MISMATCH'}")
+    return ok
+
+
+def replay_benchmark(args, ticks) -> bool:
+    replay = MarketReplay("1m")
+    report = asyncio.run(replay.replay_ticks(ticks))
+    grids = replay.grids.book.grids
+    print(f"Replay: {report.events:,} ticks, {args.replay_grids:,} grids in {report.elapsed_seconds:.2f}s "
+          f"-> {report.events_per_second:,.0f} ticks/s, {report.grid_fills:,} grid fills")
+    stage = report.stages["grids"]
+    print(f"  grids stage mean {stage['mean_us']:.1f}us  p50 {stage['p50_us']:.1f}us  "
+          f"p99 {stage['p99_us']:.1f}us  max {stage['max_us']:.1f}us")
+
+    db = SessionLocal()
+    try:
+        strategies = {row.id: row for row in db.query(Strategy).filter(Strategy.id <= args.replay_grids)}
+        trades = dict(db.query(Trade.strategy_id, func.count()).group_by(Trade.strategy_id).all())
+        ok = len(grids) == args.replay_grids and sum(trades.values()) == report.grid_fills == report.fills
+        for strategy_id, grid in grids.items():
+            row = strategies[strategy_id]
+            ok &= row.winning_trades == grid.winning
+            ok &= math.isclose(row.total_profit_loss, grid.realized, rel_tol=1e-9, abs_tol=1e-9)
+            ok &= row.total_trades == trades.get(strategy_id, 0)
+        print(f"  strategy counters: {'match' if ok else 'MISMATCH'} "
+              f"(profit {sum(row.total_profit_loss for row in strategies.values()):,.4f}, "
+              f"{sum(row.winning_trades for row in strategies.values()):,} winning cycles)")
+
+        # A new engine resumes every grid where the replay left it
+        resumed = GridEngine(SessionLocal)
+        resumed.load(db)
+        same = all(
+            strategy_id in resumed.book.grids
+            and resumed.book.grids[strategy_id].open_orders() == grid.open_orders()
+            and resumed.book.grids[strategy_id].realized == grid.realized
+            for strategy_id, grid in grids.items()
+        )
+        print(f"  resume from saved state: {'same orders' if same else 'DIFFERENT'}")
+        return ok and same
+    finally:
+        db.close()
+
+
+def seed(rows, users: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(Portfolio), [{"user_id": uid} for uid in range(1, users + 1)])
+        db.execute(insert(ExchangeAPIKey), [
+            {"user_id": uid, "exchange_name": "binance", "api_key": "k", "api_secret": "s"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(Strategy), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grids", type=int, default=5000)
+    parser.add_argument("--levels", type=int, default=200, help="Most levels per grid")
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=50_000)
+    parser.add_argument("--replay-grids", type=int, default=200)
+    parser.add_argument("--replay-ticks", type=int, default=5_000)
+    args = parser.parse_args()
+
+    users = max(1, args.grids // 20)
+    tick_root = tempfile.mkdtemp()
+    try:
+        start_ns, end_ns = record_ticks(tick_root, args.symbols, args.ticks)
+        ticks = ticks_from_recorder(tick_root, symbols(args.symbols), start_ns, end_ns)
+        seed(grid_rows(args.grids, args.symbols, args.levels, users), users)
+        ok = book_benchmark(args, ticks)
+
+        replay_ticks = {symbol: series[:args.replay_ticks // args.symbols] for symbol, series in ticks.items()}
+        seed(grid_rows(args.replay_grids, args.symbols, args.levels, users), users)
+        ok &= replay_benchmark(args, replay_ticks)
+    finally:
+        shutil.rmtree(tick_root, ignore_errors=True)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
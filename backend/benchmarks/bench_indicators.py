@@ -0,0 +1,122 @@
+"""
+Streaming Indicator Benchmark
+Check that streaming indicators match the batch versions within float tolerance
+on a long random-walk series (including a checkpoint/restore half way), and
+report the per-update cost.
+
+Usage:
+    python -m benchmarks.bench_indicators --bars 1000000
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from app.services.indicators import BATCH_INDICATORS, STREAMING_BY_NAME, StreamingIndicator
+
+CASES = [
+    ("sma", (20,)),
+    ("ema", (20,)),
+    ("rsi", (14,)),
+    ("macd", (12, 26, 9)),
+    ("rolling_std", (20,)),
+    ("rolling_min", (50,)),
+    ("rolling_max", (50,)),
+]
+
+
+def random_walk(bars: int, seed: int = 1):
+    """Geometric random walk price series"""
+    rng = random.Random(seed)
+    price = 100.0
+    prices = []
+    for _ in range(bars):
+        price *= 1 + rng.gauss(0, 0.01)
+        prices.append(price)
+    return prices
+
+
+def restored(indicator: StreamingIndicator) -> StreamingIndicator:
+    """Simulate a restart: serialize, restore, continue without history"""
+    return StreamingIndicator.restore(json.loads(json.dumps(indicator.checkpoint())))
+
+
+def flatten(name: str, outputs):
+    """Streaming outputs as one series laid out like the flattened batch result"""
+    if name != "macd":
+        return outputs
+    outputs = [value for output in outputs for value in (output or (None, None, None))]
+    return outputs[0::3] + outputs[1::3] + outputs[2::3]
+
+
+def batch_series(name: str, params, prices):
+    """Batch result as one series; MACD's three series are concatenated"""
+    expected = BATCH_INDICATORS[name](prices, *params)
+    if name == "macd":
+        expected = [value for series in expected for value in series]
+    return expected
+
+
+def stream_series(name: str, params, prices, restore_at=()):
+    """Streaming values per price, restored from a checkpoint at each index in restore_at"""
+    indicator = STREAMING_BY_NAME[name](*params)
+    outputs = []
+    for index, price in enumerate(prices):
+        if index in restore_at:
+            indicator = restored(indicator)
+        outputs.append(indicator.update(price))
+    return flatten(name, outputs)
+
+
+def mismatches(expected, actual, tolerance: float) -> int:
+    """Count positions where two series differ beyond tolerance"""
+    count = 0
+    for a, b in zip(expected, actual):
+        if (a is None) != (b is None):
+            count += 1
+        elif a is not None and not math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance):
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=1_000_000)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    prices = random_walk(args.bars)
+    restore_at = args.bars // 2
+    failed = False
+
+    print(f"{'indicator':<14}{'batch':>12}{'streaming':>12}{'ns/update':>12}{'mismatches':>12}")
+    for name, params in CASES:
+        started = time.perf_counter()
+        expected = batch_series(name, params, prices)
+        batch_seconds = time.perf_counter() - started
+
+        indicator = STREAMING_BY_NAME[name](*params)
+        update = indicator.update
+        actual = []
+        started = time.perf_counter()
+        for index, price in enumerate(prices):
+            if index == restore_at:
+                indicator = restored(indicator)
+                update = indicator.update
+            actual.append(update(price))
+        streaming_seconds = time.perf_counter() - started
+
+        bad = mismatches(expected, flatten(name, actual), args.tolerance)
+        failed |= bad > 0
+        print(
+            f"{name:<14}{batch_seconds:>11.2f}s{streaming_seconds:>11.2f}s"
+            f"{streaming_seconds / args.bars * 1e9:>12.0f}{bad:>12}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Trade Write Benchmark
+Push the same stream of market orders through three write paths, each against
+its own SQLite file:
+
+    rollback   create_trade as before: insert + commit, fill + commit, default journal
+    wal        the same two commits with WAL and synchronous=NORMAL
+    journal    WAL plus the group-commit trade journal, with concurrent submitters
+
+Then simulate a crash between the journal fsync and the database commit (with a
+torn trailing entry and an aborted group) and check recovery replays exactly the
+missing trades, once. Fails unless the journal path is --min-speedup times
+faster than the rollback path.
+
+Usage:
+    python -m benchmarks.bench_journal --trades 3000 --clients 64
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DB_DIR, 'bench_journal.db')}"
+
+from sqlalchemy import func, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from app.database import Base, create_app_engine  # noqa: E402
+from app.models import User, Portfolio, PortfolioHolding, Trade, OrderType, OrderSide, OrderStatus  # noqa: E402
+from app.schemas import TradeCreate  # noqa: E402
+from app.services import orders  # noqa: E402
+from app.services.analytics import record_fill  # noqa: E402
+from app.services.journal import TradeJournal, KIND_TRADE, KIND_ABORT, encode_trade, format_line  # noqa: E402
+
+
+def make_database(name: str, wal: bool) -> sessionmaker:
+    """A seeded database file with one user and an empty portfolio"""
+    engine = create_app_engine(
+        f"sqlite:///{os.path.join(DB_DIR, name + '.db')}", sqlite_wal=wal, sqlite_synchronous="NORMAL"
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    try:
+        db.execute(insert(User), [{"id": 1, "email": "u1@example.com", "username": "u1", "hashed_password": "x"}])
+        db.execute(insert(Portfolio), [{"user_id": 1}])
+        db.commit()
+    finally:
+        db.close()
+    return factory
+
+
+def order_stream(count: int):
+    """Deterministic market orders; sells never exceed what was bought"""
+    rng = random.Random(11)
+    position = 0.0
+    stream = []
+    for _ in range(count):
+        quantity = round(rng.uniform(0.01, 0.5), 3)
+        side = OrderSide.SELL if position > quantity and rng.random() < 0.4 else OrderSide.BUY
+        position += quantity if side == OrderSide.BUY else -quantity
+        price = round(40000 * (1 + rng.gauss(0, 0.01)), 2)
+        stream.append(TradeCreate(
+            symbol="BTC/USDT", order_type=OrderType.MARKET, order_side=side, quantity=quantity, price=price
+        ))
+    return stream
+
+
+def new_trade(trade_data: TradeCreate) -> Trade:
+    return Trade(**orders.build_trade_values(1, "binance", trade_data))
+
+
+async def direct_path(factory: sessionmaker, stream) -> float:
+    """The non-journaled create_trade sequence, one order at a time"""
+    started = time.perf_counter()
+    for trade_data in stream:
+        db = factory()
+        try:
+            trade = new_trade(trade_data)
+            db.add(trade)
+            db.commit()
+            db.refresh(trade)
+            await orders.execute_order(trade)
+            record_fill(db, trade)
+            db.commit()
+            db.refresh(trade)
+        finally:
+            db.close()
+    return time.perf_counter() - started
+
+
+async def journal_path(factory: sessionmaker, stream, clients: int, group_size: int, delay_ms: float):
+    """Concurrent submitters sharing the group-commit journal"""
+    journal = TradeJournal(os.path.join(DB_DIR, "bench.journal"), factory, group_size, delay_ms)
+    journal.start()
+    queue = list(reversed(stream))
+
+    async def client():
+        while queue:
+            trade = new_trade(queue.pop())
+            await orders.execute_order(trade)
+            trade = await journal.submit(trade)
+            assert trade.id is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    await journal.stop()
+    return elapsed, journal.groups
+
+
+def summary(factory: sessionmaker):
+    """(filled trades, BTC holding quantity)"""
+    db = factory()
+    try:
+        filled = db.query(func.count(Trade.id)).filter(Trade.order_status == OrderStatus.FILLED).scalar()
+        holding = db.query(PortfolioHolding.quantity).filter(PortfolioHolding.symbol == "BTC").scalar()
+        return filled, round(holding or 0.0, 9)
+    finally:
+        db.close()
+
+
+def crash_recovery() -> bool:
+    """Journal entries written but never applied must be replayed exactly once"""
+    factory = make_database("crash", wal=True)
+    path = os.path.join(DB_DIR, "crash.journal")
+    stream = order_stream(120)
+
+    lines = []
+    expected_quantity = 0.0
+    for sequence, trade_data in enumerate(stream, start=1):
+        trade = new_trade(trade_data)
+        asyncio.run(orders.execute_order(trade))
+        lines.append(format_line(sequence, {"kind": KIND_TRADE, "trade": encode_trade(trade)}))
+        if sequence <= 100:
+            expected_quantity += trade.quantity if trade.order_side == OrderSide.BUY else -trade.quantity
+    # The last 20 entries belong to a group whose commit failed and was aborted
+    lines += [format_line(120 + index, {"kind": KIND_ABORT, "sequence": sequence})
+              for index, sequence in enumerate(range(101, 121), start=1)]
+    with open(path, "wb") as handle:
+        handle.write(b"".join(lines))
+        handle.write(lines[0][:17])  # torn tail from the interrupted next write
+
+    replayed = TradeJournal(path, factory).recover()
+    again = TradeJournal(path, factory).recover()
+    filled, quantity = summary(factory)
+    ok = replayed == 100 and again == 0 and filled == 100 and abs(quantity - expected_quantity) < 1e-9
+    print(f"Crash recovery: replayed {replayed} (expected 100), second pass {again}, "
+          f"{filled} filled rows, holding {quantity:.3f} (expected {expected_quantity:.3f}) -> {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=3000)
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent submitters in journal mode")
+    parser.add_argument("--group-size", type=int, default=256)
+    parser.add_argument("--group-delay-ms", type=float, default=2.0)
+    parser.add_argument("--min-speedup", type=float, default=10.0, help="Journal over rollback trades/sec to reach")
+    args = parser.parse_args()
+
+    stream = order_stream(args.trades)
+    results = {}
+
+    factory = make_database("rollback", wal=False)
+    elapsed = rollback_elapsed = asyncio.run(direct_path(factory, stream))
+    results["rollback"] = summary(factory)
+    print(f"rollback: {args.trades:,} trades in {elapsed:.2f}s -> {args.trades / elapsed:,.0f} trades/s")
+
+    factory = make_database("wal", wal=True)
+    elapsed = asyncio.run(direct_path(factory, stream))
+    results["wal"] = summary(factory)
+    print(f"wal:      {args.trades:,} trades in {elapsed:.2f}s -> {args.trades / elapsed:,.0f} trades/s")
+
+    factory = make_database("journal", wal=True)
+    elapsed, groups = asyncio.run(journal_path(factory, stream, args.clients, args.group_size, args.group_delay_ms))
+    results["journal"] = summary(factory)
+    print(f"journal:  {args.trades:,} trades in {elapsed:.2f}s -> {args.trades / elapsed:,.0f} trades/s "
+          f"({groups:,} group commits, {args.trades / max(groups, 1):.1f} trades each)")
+
+    consistent = len(set(results.values())) == 1 and results["wal"][0] == args.trades
+    print(f"Final state (filled rows, BTC holding): {results} -> {'consistent' if consistent else 'MISMATCH'}")
+
+    fast = rollback_elapsed >= args.min_speedup * elapsed
+    print(f"Journal speedup over rollback: {rollback_elapsed / elapsed:.1f}x (target {args.min_speedup:.0f}x)")
+
+    ok = crash_recovery() and consistent and fast
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Market Listing Benchmark
+Build a ticker snapshot for a synthetic USDT market and time listing queries
+(sorts, prefix search, filters, deep pages) against the precomputed orders,
+next to a baseline that sorts and filters a list of rows on every call. Every
+query is checked against the baseline and must beat it. Finally the /api/market/listing route is
+timed in process.
+
+Usage:
+    python -m benchmarks.bench_market_listing --symbols 5000
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_listing.db')}")
+
+from app.services.market_listing import MarketSnapshot  # noqa: E402
+
+
+def synthetic_tickers(count: int, seed: int = 3):
+    """ccxt-style tickers for count USDT pairs plus as many BTC pairs, which the listing skips"""
+    rng = random.Random(seed)
+    tickers = {}
+    while len(tickers) < 2 * count:
+        base = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 6)))
+        tickers[f"{base}/USDT"] = {
+            "last": round(10 ** rng.uniform(-4, 5), 6),
+            "percentage": round(rng.gauss(0, 8), 2) if rng.random() > 0.02 else None,
+            "quoteVolume": round(10 ** rng.uniform(2, 9), 2) if rng.random() > 0.02 else None,
+        }
+        tickers[f"{base}/BTC"] = {"last": 1.0, "percentage": 0.0, "quoteVolume": 1.0}
+    return tickers
+
+
+def naive_query(rows, sort, descending, prefix, min_volume, min_price, max_price, min_change, max_change, offset, limit):
+    """Filter and sort a list of rows from scratch, as a per-call implementation would"""
+    key = {
+        "volume": "volume_24h", "change": "price_change_percentage_24h", "price": "current_price", "symbol": "symbol"
+    }[sort]
+    matches = [
+        row for row in rows
+        if (prefix is None or row["symbol"].startswith(prefix.upper()))
+        and (min_volume is None or row["volume_24h"] >= min_volume)
+        and (min_price is None or row["current_price"] >= min_price)
+        and (max_price is None or row["current_price"] <= max_price)
+        and (min_change is None or row["price_change_percentage_24h"] >= min_change)
+        and (max_change is None or row["price_change_percentage_24h"] <= max_change)
+    ]
+    matches.sort(key=lambda row: row[key], reverse=descending)
+    return len(matches), matches[offset:offset + limit]
+
+
+QUERIES = {
+    "top 50 by volume": dict(sort="volume", descending=True),
+    "top gainers": dict(sort="change", descending=True),
+    "cheapest": dict(sort="price", descending=False),
+    "A-Z page 40": dict(sort="symbol", descending=False, offset=2000),
+    "prefix 'BT'": dict(sort="volume", descending=True, prefix="bt"),
+    "prefix 'Q'": dict(sort="symbol", descending=False, prefix="Q"),
+    "filtered": dict(sort="change", descending=True, min_volume=1e5, min_price=0.01, max_price=1000, min_change=-5),
+    "filtered deep": dict(sort="price", descending=True, min_volume=1e4, min_change=0, offset=500, limit=100),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    tickers = synthetic_tickers(args.symbols)
+    started = time.perf_counter()
+    snapshot = MarketSnapshot(tickers)
+    print(f"Snapshot: {len(snapshot):,} USDT pairs of {len(tickers):,} tickers built in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    ok = True
+    print(f"{'query':<18} {'matches':>8} {'snapshot':>12} {'per-call sort':>14} {'speedup':>8}")
+    for name, query in QUERIES.items():
+        params = dict(prefix=None, min_volume=None, min_price=None, max_price=None,
+                      min_change=None, max_change=None, offset=0, limit=50)
+        params.update(query)
+
+        page = snapshot.query(**params)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            snapshot.query(**params)
+        fast = (time.perf_counter() - started) / args.repeat
+
+        total, expected = naive_query(snapshot.rows, **params)
+        repeat = max(args.repeat // 20, 10)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            naive_query(snapshot.rows, **params)
+        slow = (time.perf_counter() - started) / repeat
+
+        # Ties may be ordered differently; compare the sequence of sort keys
+        key = {"volume": "volume_24h", "change": "price_change_percentage_24h",
+               "price": "current_price", "symbol": "symbol"}[params["sort"]]
+        same = page.total == total and [row[key] for row in page.rows] == [row[key] for row in expected]
+        ok &= same and fast < slow
+        print(f"{name:<18} {page.total:>8,} {fast * 1e6:>9.1f} us {slow * 1e6:>11.1f} us {slow / fast:>7.0f}x"
+              f"{'' if same else '  MISMATCH'}")
+
+    # Through the route, including validation and serialization of a 50-row page
+    from fastapi.testclient import TestClient
+    from app.routes.market import market_listing
+    from main import app
+    market_listing.snapshot = snapshot
+    market_listing.ttl = float("inf")
+    client = TestClient(app)
+    url = "/api/market/listing?sort=change&order=desc&q=B&min_volume=1000&page=1&page_size=50"
+    response = client.get(url)
+    ok &= response.status_code == 200 and len(response.json()["items"]) == 50
+    started = time.perf_counter()
+    for _ in range(500):
+        client.get(url)
+    elapsed = (time.perf_counter() - started) / 500
+    print(f"GET {url}: {elapsed * 1000:.2f} ms per request (total {response.json()['total']:,})")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Notification Stream Load Test
+Hold many concurrent /api/notifications/stream connections open against a single
+uvicorn worker and check what they receive:
+
+    - every connection is accepted and gets its 'ready' event and heartbeats
+    - one price move triggers an alert for every user; each connection must get
+      exactly its own user's alert, reported as end-to-end latency from the
+      move (picked up by the price poller) to the last delivery
+    - orders placed over REST reach only their owners, as 'order' and 'fill'
+    - clients that disconnect, miss events and reconnect with Last-Event-ID get
+      exactly the missed events; an unknown id is answered with resync
+
+The server runs in a child process on a scratch database, with the exchange
+replaced by one whose price rises by one once the benchmark creates a trigger file.
+
+Usage:
+    python -m benchmarks.bench_notifications --connections 10000 --orders 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported; the server process inherits it
+if "--serve" not in sys.argv:
+    DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_notifications.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+    os.environ["NOTIFICATION_HEARTBEAT_SECONDS"] = "3"
+    os.environ["PRICE_POLL_INTERVAL_SECONDS"] = "0.02"
+    os.environ["BENCH_PRICE_TRIGGER"] = os.path.join(os.path.dirname(DB_PATH), "price_moved")
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+from app.models import Alert, ExchangeAPIKey, Portfolio, User  # noqa: E402
+
+HOST = "127.0.0.1"
+START_PRICE = 100.0
+
+
+class SteppingExchange:
+    """Stands in for ccxt: prices are START_PRICE, one higher once the trigger file exists."""
+
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+
+    def fetch_tickers(self, symbols):
+        price = START_PRICE + (1 if os.path.exists(self.trigger) else 0)
+        return {symbol: {"last": price, "percentage": 0.0, "quoteVolume": 0.0} for symbol in symbols}
+
+
+def serve(port: int) -> None:
+    import uvicorn
+    from app.routes import market
+    from main import app
+
+    market.exchange = SteppingExchange(os.environ["BENCH_PRICE_TRIGGER"])
+    uvicorn.run(app, host=HOST, port=port, log_level="warning", backlog=4096, loop="uvloop", http="httptools",
+                timeout_graceful_shutdown=5)
+
+
+class Client:
+    """One raw HTTP/1.1 connection reading the chunked event stream."""
+
+    def __init__(self, user_id: int, token: str):
+        self.user_id = user_id
+        self.token = token
+        self.events = []  # (event, data, received)
+        self.heartbeats = 0
+        self.ready = None
+        self.last_id = None
+        self.writer = None
+        self.task = None
+
+    async def connect(self, port: int, last_event_id: str = None) -> None:
+        reader, self.writer = await asyncio.open_connection(HOST, port)
+        request = (
+            f"GET /api/notifications/stream HTTP/1.1\r\nHost: {HOST}\r\n"
+            f"Authorization: Bearer {self.token}\r\nAccept: text/event-stream\r\n"
+        )
+        if last_event_id:
+            request += f"Last-Event-ID: {last_event_id}\r\n"
+        self.writer.write((request + "\r\n").encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        if status != 200 or b"chunked" not in head.lower():
+            raise RuntimeError(f"user {self.user_id}: HTTP {status}")
+        self.ready = None
+        self.task = asyncio.create_task(self.read(reader))
+
+    async def read(self, reader) -> None:
+        buffer = b""
+        try:
+            while True:
+                size = int((await reader.readline()).strip() or b"0", 16)
+                if size == 0:
+                    return
+                buffer += (await reader.readexactly(size + 2))[:-2]
+                *frames, buffer = buffer.split(b"\n\n")
+                for frame in frames:
+                    self.handle(frame.decode())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    def handle(self, frame: str) -> None:
+        fields = {}
+        for line in frame.split("\n"):
+            if line.startswith(":"):
+                continue
+            name, _, value = line.partition(": ")
+            fields[name] = value
+        if not fields:
+            self.heartbeats += 1
+        elif "event" in fields:
+            self.last_id = fields["id"]
+            data = json.loads(fields["data"])
+            if fields["event"] == "ready":
+                self.ready = data
+            else:
+                self.events.append((fields["event"], data, time.perf_counter()))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.task
+
+
+def seed(users: int, traders: int) -> list:
+    """Users with a BTC/USDT alert each; the first traders also get an API key. Returns clients."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        connection.execute(insert(Portfolio), [{"user_id": uid} for uid in range(1, users + 1)])
+        connection.execute(insert(ExchangeAPIKey), [
+            {"user_id": uid, "exchange_name": "binance", "api_key": "key", "api_secret": "secret"}
+            for uid in range(1, traders + 1)
+        ])
+        connection.execute(insert(Alert), [
+            {"id": uid, "user_id": uid, "symbol": "BTC/USDT", "alert_type": "price_above",
+             "target_price": START_PRICE + 0.5, "message": f"alert {uid}"}
+            for uid in range(1, users + 1)
+        ])
+    return [Client(uid, create_access_token({"sub": f"u{uid}@example.com"})) for uid in range(1, users + 1)]
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def wait_for(condition, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def order(index: int) -> dict:
+    return {"symbol": "BTC/USDT", "order_type": "limit", "order_side": "buy", "quantity": 0.01, "price": 101 + index}
+
+
+async def place_orders(http: httpx.AsyncClient, clients: list, index: int) -> bool:
+    limit = asyncio.Semaphore(8)  # Below the connection pool size: sessions are checked out on the event loop
+
+    async def place(client):
+        async with limit:
+            response = await http.post(
+                "/api/trading/trades", json=order(index), headers={"Authorization": f"Bearer {client.token}"}
+            )
+            return response.status_code == 201
+
+    return all(await asyncio.gather(*(place(client) for client in clients)))
+
+
+async def load_test(args, clients: list, port: int, server: subprocess.Popen) -> bool:
+    http = httpx.AsyncClient(base_url=f"http://{HOST}:{port}", timeout=60)
+    if not await wait_for_server(http):
+        print("Server did not start")
+        return False
+    idle_rss = rss_mb(server.pid)
+
+    # Connect everyone, a few hundred at a time
+    started = time.perf_counter()
+    failures = 0
+    for offset in range(0, len(clients), 250):
+        results = await asyncio.gather(
+            *(client.connect(port) for client in clients[offset:offset + 250]), return_exceptions=True
+        )
+        failures += sum(isinstance(result, Exception) for result in results)
+    ready = await wait_for(lambda: all(client.ready is not None for client in clients), 60)
+    elapsed = time.perf_counter() - started
+    connected_rss = rss_mb(server.pid)
+    print(f"Connections: {len(clients) - failures:,} of {len(clients):,} open in {elapsed:.2f}s "
+          f"({len(clients) / elapsed:,.0f}/s), all ready: {'yes' if ready else 'NO'}")
+    print(f"  server RSS {idle_rss:.0f} MB idle, {connected_rss:.0f} MB connected "
+          f"({(connected_rss - idle_rss) * 1024 / len(clients):.1f} KB per connection)")
+    ok = failures == 0 and ready
+
+    beats = await wait_for(lambda: all(client.heartbeats for client in clients), 8)
+    print(f"  heartbeats on every idle connection: {'yes' if beats else 'NO'}")
+    ok &= beats
+
+    # One price move crosses every user's alert
+    started = time.perf_counter()
+    open(os.environ["BENCH_PRICE_TRIGGER"], "w").close()
+    delivered = await wait_for(lambda: all(client.events for client in clients), 60)
+    latencies = np.array([client.events[0][2] - started for client in clients if client.events]) * 1000
+    right = all(
+        [(name, data["user_id"], data["alert_id"]) for name, data, _ in client.events]
+        == [("alert", client.user_id, client.user_id)]
+        for client in clients
+    )
+    print(f"Alert fan-out: {len(latencies):,} of {len(clients):,} users notified "
+          f"({len(latencies) / (latencies.max() / 1000):,.0f} notifications/s)")
+    print(f"  latency from the price move p50 {np.percentile(latencies, 50):.1f} ms, "
+          f"p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms; "
+          f"each user got exactly its own alert: {'yes' if right else 'NO'}")
+    ok &= delivered and right
+
+    # Orders reach their owners only
+    traders = clients[:args.orders]
+    started = time.perf_counter()
+    placed = await place_orders(http, traders, 0)
+    arrived = await wait_for(lambda: all(len(client.events) == 3 for client in traders), 30)
+    elapsed = time.perf_counter() - started
+    owned = all(
+        [name for name, _, _ in client.events[1:]] == ["order", "fill"]
+        and all(data["user_id"] == client.user_id for _, data, _ in client.events[1:])
+        for client in traders
+    )
+    isolated = all(len(client.events) == 1 for client in clients[args.orders:])
+    print(f"Orders: {len(traders):,} placed in {elapsed:.2f}s; order and fill to the owner only: "
+          f"{'yes' if placed and arrived and owned and isolated else 'NO'}")
+    ok &= placed and arrived and owned and isolated
+
+    # Disconnect, miss events, resume
+    resuming = traders[:max(1, len(traders) // 2)]
+    last_ids = [client.last_id for client in resuming]
+    await asyncio.gather(*(client.close() for client in resuming))
+    await asyncio.sleep(0.2)
+    placed = await place_orders(http, resuming, 1) and await place_orders(http, resuming, 2)
+    for client in resuming:
+        client.events = []
+    await asyncio.gather(*(client.connect(port, last_id) for client, last_id in zip(resuming, last_ids)))
+    arrived = await wait_for(lambda: all(len(client.events) == 4 for client in resuming), 30)
+    resumed = all(
+        client.ready == {"user_id": client.user_id, "resync": False}
+        and [name for name, _, _ in client.events] == ["order", "fill", "order", "fill"]
+        for client in resuming
+    )
+    stale = resuming[0]
+    await stale.close()
+    await stale.connect(port, "0.0-1")
+    resync = await wait_for(lambda: stale.ready is not None, 10) and stale.ready["resync"]
+    print(f"Resume: {len(resuming):,} clients reconnected with Last-Event-ID and got the 4 missed events: "
+          f"{'yes' if placed and arrived and resumed else 'NO'}; unknown id answered with resync: "
+          f"{'yes' if resync else 'NO'}")
+    ok &= placed and arrived and resumed and resync
+
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    await http.aclose()
+    return ok
+
+
+async def wait_for_server(http: httpx.AsyncClient) -> bool:
+    for _ in range(300):
+        try:
+            if (await http.get("/api/health")).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    return False
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+        return
+
+    import uvloop
+    clients = seed(args.connections, args.orders)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_notifications", "--serve", "--port", str(port)])
+    try:
+        ok = uvloop.run(load_test(args, clients, port, server))
+    finally:
+        server.terminate()
+        server.wait(30)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
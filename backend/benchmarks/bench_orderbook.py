@@ -0,0 +1,102 @@
+"""
+Order Book Benchmark
+Drive the local L2 book from a replay feed of synthetic diffs, measure diffs/sec,
+then drop one diff to force a sequence gap and check the book resyncs to the
+same state as a reference book.
+
+Usage:
+    python -m benchmarks.bench_orderbook --diffs 500000
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from app.services.orderbook import BookDiff, OrderBook, OrderBookManager, ReplayFeed
+
+SYMBOL = "BTC/USDT"
+TICK = 0.01
+
+
+def generate(diffs: int, levels: int, seed: int = 3):
+    """Initial snapshot plus diffs that mostly touch levels near the top of book"""
+    rng = random.Random(seed)
+    mid = 40000.0
+    bids = [(round(mid - TICK * (i + 1), 2), rng.uniform(0.1, 5)) for i in range(levels)]
+    asks = [(round(mid + TICK * (i + 1), 2), rng.uniform(0.1, 5)) for i in range(levels)]
+    snapshot = {"bids": bids, "asks": asks, "nonce": 1000}
+
+    stream = []
+    update_id = 1000
+    for _ in range(diffs):
+        changes = []
+        for _ in range(rng.randint(1, 3)):
+            distance = int(rng.expovariate(0.1)) + 1
+            changes.append((round(mid - TICK * distance, 2), 0.0 if rng.random() < 0.3 else rng.uniform(0.1, 5)))
+        ask_changes = [
+            (round(mid + TICK * (int(rng.expovariate(0.1)) + 1), 2), 0.0 if rng.random() < 0.3 else rng.uniform(0.1, 5))
+            for _ in range(rng.randint(1, 3))
+        ]
+        first = update_id + 1
+        update_id += rng.randint(1, 3)
+        stream.append(BookDiff(SYMBOL, first, update_id, changes, ask_changes))
+    return snapshot, stream
+
+
+def reference_book(snapshot, diffs):
+    """Book built by applying diffs in order with no gaps"""
+    book = OrderBook(SYMBOL)
+    book.load_snapshot(snapshot["bids"], snapshot["asks"], snapshot["nonce"])
+    for diff in diffs:
+        book.apply(diff)
+    return book
+
+
+def as_snapshot(book: OrderBook):
+    """Export a book as a snapshot payload"""
+    return {
+        "bids": book.bids.top(len(book.bids)),
+        "asks": book.asks.top(len(book.asks)),
+        "nonce": book.last_update_id,
+    }
+
+
+async def run(args):
+    snapshot, diffs = generate(args.diffs, args.levels)
+
+    # Throughput: clean replay
+    manager = OrderBookManager(lambda symbol, limit: snapshot)
+    await manager.resync(SYMBOL)
+    started = time.perf_counter()
+    await manager.run_feed(ReplayFeed(diffs))
+    elapsed = time.perf_counter() - started
+    print(f"Applied {len(diffs):,} diffs in {elapsed:.2f}s -> {len(diffs) / elapsed:,.0f} diffs/sec")
+    book = manager.books[SYMBOL]
+    print(f"  levels: {len(book.bids)} bids / {len(book.asks)} asks, spread {book.view(1)['spread']:.2f}")
+
+    # Gap handling: drop one diff; the snapshot served on resync is the true book at that point
+    dropped = len(diffs) // 2
+    resync_snapshot = as_snapshot(reference_book(snapshot, diffs[:dropped + 1]))
+    served = [snapshot, resync_snapshot]
+    manager = OrderBookManager(lambda symbol, limit: served.pop(0))
+    await manager.resync(SYMBOL)
+    await manager.run_feed(ReplayFeed(diffs[:dropped] + diffs[dropped + 1:]))
+
+    expected = reference_book(snapshot, diffs).view(args.levels)
+    actual = manager.books[SYMBOL].view(args.levels)
+    matches = expected["bids"] == actual["bids"] and expected["asks"] == actual["asks"]
+    print(f"Gap test: {manager.resyncs - 1} resync(s), book {'matches' if matches else 'DIFFERS FROM'} reference")
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--diffs", type=int, default=500_000)
+    parser.add_argument("--levels", type=int, default=1000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
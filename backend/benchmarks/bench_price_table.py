@@ -0,0 +1,212 @@
+"""
+Shared Price Table Benchmark
+Measure reads of the shared-memory latest-price table and check what workers see:
+
+    - reads of all major pairs per second in one process, against the same
+      snapshot fetched from a multiprocessing.Manager dict (one IPC round trip)
+    - reader processes hammering the table while a writer process rewrites every
+      slot as fast as it can: no read may be torn (values from two writes) and
+      each symbol's values never go backwards
+    - a table whose writer stopped beating is ignored after max age, and a
+      restarted writer's new table is picked up again
+    - GET /api/market/prices answers from the table without calling the exchange
+      while the table is fresh, and calls it once the table goes stale
+
+Usage:
+    python -m benchmarks.bench_price_table --reads 200000 --readers 3 --seconds 3
+"""
+
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database and a private table before the app is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_price_table.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["SHARED_PRICES_ENABLED"] = "true"
+os.environ["SHARED_PRICE_TABLE_NAME"] = TABLE_NAME = f"bench_prices_{os.getpid()}"
+
+from app.services.price_table import HEARTBEAT_OFFSET, PriceTable, PriceTableReader  # noqa: E402
+
+SYMBOLS = [
+    'BTC/USDT', 'ETH/USDT', 'XRP/USDT', 'BCH/USDT', 'LTC/USDT',
+    'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'XLM/USDT', 'BNB/USDT'
+]
+
+
+def tickers(price: float) -> dict:
+    return {
+        symbol: {"last": price, "percentage": 1.5, "quoteVolume": 1e6, "timestamp": 1_700_000_000_000}
+        for symbol in SYMBOLS
+    }
+
+
+def write_forever(name: str, stop) -> None:
+    """Writer process: every slot gets last == percentage == quote volume == timestamp, rising."""
+    table = PriceTable.attach(name)
+    value = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            value += 1
+            for symbol in SYMBOLS:
+                table.write(symbol, value, value, value, value)
+        table.beat()
+    table.close()
+
+
+def read_forever(name: str, seconds: float, results) -> None:
+    """Reader process: count reads, torn reads and values going backwards."""
+    table = PriceTable.attach(name)
+    latest = dict.fromkeys(SYMBOLS, 0.0)
+    reads = torn = backwards = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            for symbol in SYMBOLS:
+                ticker = table.read(symbol)
+                if ticker is None:
+                    continue
+                reads += 1
+                if not ticker.last == ticker.percentage == ticker.quote_volume == ticker.timestamp:
+                    torn += 1
+                if ticker.last < latest[symbol]:
+                    backwards += 1
+                latest[symbol] = ticker.last
+    table.close()
+    results.put((reads, torn, backwards))
+
+
+def bench_reads(args, table: PriceTable) -> bool:
+    table.write_tickers(tickers(100.0))
+    reader = PriceTableReader(TABLE_NAME, max_age=60)
+    snapshot = reader.tickers(SYMBOLS)
+    started = time.perf_counter()
+    for _ in range(args.reads):
+        reader.tickers(SYMBOLS)
+    shared = (time.perf_counter() - started) / args.reads
+    reader.close()
+
+    with multiprocessing.Manager() as manager:
+        proxy = manager.dict(tickers(100.0))
+        repeat = max(1, args.reads // 20)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            proxy.copy()
+        ipc = (time.perf_counter() - started) / repeat
+
+    ok = snapshot is not None and all(snapshot[symbol]["last"] == 100.0 for symbol in SYMBOLS)
+    print(f"Read {len(SYMBOLS)} pairs: shared memory {shared * 1e6:.2f} us ({1 / shared:,.0f}/s), "
+          f"Manager dict {ipc * 1e6:.1f} us ({1 / ipc:,.0f}/s), {ipc / shared:.0f}x; "
+          f"values right: {'yes' if ok else 'NO'}")
+    return ok
+
+
+def bench_concurrency(args) -> bool:
+    context = multiprocessing.get_context("spawn")  # Nothing inherited: readers map the segment by name
+    stop = context.Event()
+    results = context.Queue()
+    writer = context.Process(target=write_forever, args=(TABLE_NAME, stop))
+    readers = [context.Process(target=read_forever, args=(TABLE_NAME, args.seconds, results))
+               for _ in range(args.readers)]
+    writer.start()
+    for process in readers:
+        process.start()
+    counts = [results.get(timeout=args.seconds + 60) for _ in readers]
+    stop.set()
+    writer.join(30)
+    for process in readers:
+        process.join(30)
+    reads = sum(count[0] for count in counts)
+    torn = sum(count[1] for count in counts)
+    backwards = sum(count[2] for count in counts)
+    ok = reads > 0 and torn == 0 and backwards == 0
+    print(f"Concurrent: {args.readers} readers, 1 writer rewriting every slot for {args.seconds:.0f}s: "
+          f"{reads:,} reads ({reads / args.seconds / args.readers:,.0f}/s per reader), "
+          f"{torn} torn, {backwards} backwards: {'yes' if ok else 'NO'}")
+    return ok
+
+
+def bench_staleness(table: PriceTable) -> tuple:
+    """Returns whether it passed and the restarted writer's table."""
+    reader = PriceTableReader(TABLE_NAME, max_age=0.2, retry_seconds=0.05)
+    table.write_tickers(tickers(200.0))
+    fresh = reader.tickers(SYMBOLS)
+    time.sleep(0.3)
+    stale = reader.tickers(SYMBOLS)
+    table.close()
+    restarted = PriceTable.create(TABLE_NAME, SYMBOLS)
+    restarted.write_tickers(tickers(300.0))
+    time.sleep(0.1)
+    back = reader.tickers(SYMBOLS)
+    reader.close()
+    ok = (fresh is not None and fresh["BTC/USDT"]["last"] == 200.0 and stale is None
+          and back is not None and back["BTC/USDT"]["last"] == 300.0)
+    print(f"Stale heartbeat ignored, restarted writer picked up: {'yes' if ok else 'NO'}")
+    return ok, restarted
+
+
+class CountingExchange:
+    """Stands in for ccxt and counts ticker requests."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_tickers(self, symbols):
+        self.calls += 1
+        return tickers(1.0)
+
+
+def bench_route(args, table: PriceTable) -> bool:
+    from fastapi.testclient import TestClient
+    from app.routes import market
+    from main import app
+
+    exchange = market.exchange = CountingExchange()
+    client = TestClient(app)
+    table.write_tickers(tickers(400.0))
+    started = time.perf_counter()
+    prices = [client.get("/api/market/prices").json() for _ in range(args.requests)]
+    elapsed = (time.perf_counter() - started) / args.requests
+    from_table = exchange.calls == 0 and all(
+        [coin["current_price"] for coin in body] == [400.0] * len(SYMBOLS) for body in prices
+    )
+    print(f"GET /api/market/prices: {elapsed * 1000:.2f} ms per request, "
+          f"{exchange.calls} exchange calls in {args.requests}: {'yes' if from_table else 'NO'}")
+
+    # Stale table: the worker goes back to the exchange
+    struct.pack_into("<d", table.buffer, HEARTBEAT_OFFSET, time.time() - market.price_table.max_age - 1)
+    market.price_table.next_attempt = 0.0
+    body = client.get("/api/market/prices").json()
+    fallback = exchange.calls == 1 and body[0]["current_price"] == 1.0
+    print(f"  stale table falls back to the exchange: {'yes' if fallback else 'NO'}")
+    market.price_table.close()
+    return from_table and fallback
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--readers", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    table = PriceTable.create(TABLE_NAME, SYMBOLS)
+    try:
+        ok = bench_reads(args, table)
+        ok &= bench_concurrency(args)
+        passed, table = bench_staleness(table)
+        ok &= passed
+        ok &= bench_route(args, table)
+    finally:
+        table.close()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
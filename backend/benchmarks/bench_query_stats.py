@@ -0,0 +1,139 @@
+"""
+SQL Instrumentation Benchmark
+Measure the per-statement cost of the engine instrumentation and check what it
+reports through the middleware:
+
+    - an endpoint lazy-loading one relationship per row (N+1) must be flagged,
+      the same endpoint with eager loading must not
+    - a slow statement must be recorded
+    - the debug headers and the Prometheus export must carry the counts
+
+Usage:
+    python -m benchmarks.bench_query_stats --statements 20000 --rows 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_query_stats.db')}")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import selectinload, sessionmaker  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import Base, SessionLocal, create_app_engine, engine  # noqa: E402
+from app.models import OrderSide, OrderStatus, OrderType, Strategy, Trade, User  # noqa: E402
+from app.services.query_stats import QueryStatsMiddleware, query_metrics  # noqa: E402
+
+SLOW_SQL = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 3000000) "
+            "SELECT count(*) FROM c")
+
+
+def seed(rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(id=1, email="bench@example.com", username="bench", hashed_password="-"))
+    for index in range(rows):
+        db.add(Strategy(id=index + 1, user_id=1, name=f"s{index}", strategy_type="grid"))
+        db.add(Trade(user_id=1, strategy_id=index + 1, exchange_name="binance", symbol="BTC/USDT",
+                     order_type=OrderType.MARKET, order_side=OrderSide.BUY, order_status=OrderStatus.FILLED,
+                     quantity=1.0, filled_quantity=1.0, average_price=100.0))
+    db.commit()
+    db.close()
+
+
+def statement_us(session_factory, count: int) -> float:
+    db = session_factory()
+    started = time.perf_counter()
+    for _ in range(count):
+        db.execute(text("SELECT id FROM users WHERE id = :id"), {"id": 1}).first()
+    elapsed = (time.perf_counter() - started) / count * 1e6
+    db.close()
+    return elapsed
+
+
+def demo_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/strategies/lazy")
+    def lazy():
+        db = SessionLocal()
+        try:
+            return [trade.strategy.name for trade in db.query(Trade).all()]
+        finally:
+            db.close()
+
+    @app.get("/strategies/eager")
+    def eager():
+        db = SessionLocal()
+        try:
+            return [trade.strategy.name for trade in db.query(Trade).options(selectinload(Trade.strategy)).all()]
+        finally:
+            db.close()
+
+    @app.get("/slow")
+    def slow():
+        db = SessionLocal()
+        try:
+            return db.execute(text(SLOW_SQL)).scalar()
+        finally:
+            db.close()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+    if not settings.sql_instrumentation_enabled:
+        print("SQL_INSTRUMENTATION_ENABLED is off")
+        sys.exit(1)
+    seed(args.rows)
+    ok = True
+
+    # Same database through the instrumented app engine and a plain one
+    plain = sessionmaker(bind=create_app_engine(settings.database_url))
+    timings = {"plain": [], "instrumented": []}
+    for _ in range(3):
+        timings["plain"].append(statement_us(plain, args.statements))
+        timings["instrumented"].append(statement_us(SessionLocal, args.statements))
+    base, instrumented = min(timings["plain"]), min(timings["instrumented"])
+    print(f"Statement round trip: {base:.1f} us plain, {instrumented:.1f} us instrumented "
+          f"(+{instrumented - base:.1f} us)")
+
+    client = TestClient(QueryStatsMiddleware(demo_app(), query_metrics, headers=True))
+    for path, expect_repeated in (("/strategies/lazy", True), ("/strategies/eager", False)):
+        response = client.get(path)
+        count = int(response.headers["x-db-query-count"])
+        repeated = int(response.headers["x-db-repeated-statements"])
+        ok &= response.status_code == 200 and (repeated > 0) == expect_repeated
+        print(f"GET {path}: {count} statements, {float(response.headers['x-db-time-ms']):.2f} ms in the database, "
+              f"{repeated} repeated shape(s)")
+
+    slow_before = len(query_metrics.slow)
+    client.get("/slow")
+    slow = list(query_metrics.slow)[slow_before:]
+    ok &= len(slow) == 1 and slow[0]["route"] == "GET /slow"
+    print(f"GET /slow: recorded as slow ({slow[0]['ms']:.0f} ms)" if slow else "GET /slow: not recorded")
+
+    lazy = query_metrics.routes["GET /strategies/lazy"]
+    exported = query_metrics.prometheus()
+    ok &= lazy.queries == args.rows + 1 and lazy.repeated_requests == 1
+    ok &= 'sql_repeated_statement_requests_total{route="GET /strategies/lazy"} 1' in exported
+    ok &= any(item["route"] == "GET /strategies/lazy" for item in query_metrics.snapshot()["repeated_statements"])
+    print(f"Prometheus export: {len(exported.splitlines())} lines")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Consolidated Quote Benchmark
+Runs the quote aggregator against local fake venues with injected latency, each
+naming symbols its own way, one of them far slower than the venue timeout.
+Checks that:
+
+    - a cold request returns after the fastest venue, not the slowest
+    - best bid/ask is taken across every venue that answered
+    - warm reads are served from memory while pollers run
+    - a venue that stops answering drops out once its quotes pass the max age
+
+Usage:
+    python -m benchmarks.bench_quotes --reads 200000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from app.services.quotes import QuoteAggregator
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT", "LTC/USDT", "ADA/USDT", "DOT/USDT", "LINK/USDT"]
+BASE_PRICES = {symbol: 10.0 * (len(SYMBOLS) - index) ** 4 for index, symbol in enumerate(SYMBOLS)}
+
+# Each venue spells symbols differently
+STYLES = {
+    "binance": lambda base, quote: f"{base}{quote}",
+    "coinbase": lambda base, quote: f"{base}-{quote}",
+    "kraken": lambda base, quote: f"{'XBT' if base == 'BTC' else base}/{quote}",
+    "kucoin": lambda base, quote: f"{base}_{quote}".lower(),
+}
+
+
+class FakeVenue:
+    """Ticker fetcher that sleeps for an injected latency and quotes around a per-venue skew."""
+
+    def __init__(self, name: str, latency: float, skew: float, seed: int):
+        self.name = name
+        self.latency = latency
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.failing = False
+        self.calls = 0
+        self.last_quotes = {}
+
+    async def __call__(self, symbols):
+        self.calls += 1
+        await asyncio.sleep(self.latency * (1 + self.rng.uniform(-0.1, 0.1)))
+        if self.failing:
+            raise ConnectionError(f"{self.name} unavailable")
+        tickers = {}
+        for symbol in symbols:
+            base, quote = symbol.split("/")
+            mid = BASE_PRICES[symbol] * (1 + self.skew)
+            half_spread = mid * 0.0005
+            tickers[STYLES[self.name](base, quote)] = {"bid": mid - half_spread, "ask": mid + half_spread, "last": mid}
+            self.last_quotes[symbol] = (mid - half_spread, mid + half_spread)
+        return tickers
+
+
+def expected_best(venues, symbol, names):
+    bids = {name: venues[name].last_quotes[symbol][0] for name in names}
+    asks = {name: venues[name].last_quotes[symbol][1] for name in names}
+    return max(bids.values()), min(asks.values())
+
+
+async def run(args) -> bool:
+    venues = {
+        "binance": FakeVenue("binance", 0.005, 0.0004, 1),
+        "coinbase": FakeVenue("coinbase", 0.020, -0.0003, 2),
+        "kucoin": FakeVenue("kucoin", 0.050, 0.0001, 3),
+        "kraken": FakeVenue("kraken", 10.0, 0.0009, 4),  # far past the timeout
+    }
+    aggregator = QuoteAggregator(venues, timeout=args.timeout, interval=args.interval, max_age=args.max_age)
+    ok = True
+
+    # Cold request: answered by the fastest venue
+    started = time.perf_counter()
+    quotes = await aggregator.quotes(SYMBOLS)
+    cold_ms = (time.perf_counter() - started) * 1000
+    answered = sorted({venue.venue for quote in quotes.values() if quote for venue in quote.venues})
+    print(f"Cold request: {cold_ms:.1f} ms (fastest venue 5 ms, slowest 10,000 ms), answered by {answered}")
+    ok &= cold_ms < 40 and all(quotes.values())
+
+    # Every venue within the timeout lands in the table; the slow one times out
+    aggregator.start()
+    await asyncio.sleep(args.timeout + 0.2)
+    fast = ["binance", "coinbase", "kucoin"]
+    mismatches = 0
+    for symbol in SYMBOLS:
+        quote = aggregator.table.consolidated(symbol)
+        if sorted(venue.venue for venue in quote.venues) != sorted(fast):
+            mismatches += 1
+            continue
+        best_bid, best_ask = expected_best(venues, symbol, fast)
+        if abs(quote.best_bid - best_bid) > 1e-9 or abs(quote.best_ask - best_ask) > 1e-9:
+            mismatches += 1
+    btc = aggregator.table.consolidated("BTC/USDT")
+    print(f"After {args.timeout + 0.2:.1f}s: BTC/USDT best bid {btc.best_bid:,.2f} @ {btc.best_bid_venue}, "
+          f"best ask {btc.best_ask:,.2f} @ {btc.best_ask_venue}, venues {sorted(v.venue for v in btc.venues)}")
+    print(f"  consolidated mismatches vs venue quotes: {mismatches}; "
+          f"timeouts: { {name: stats.timeouts for name, stats in aggregator.stats.items()} }")
+    ok &= mismatches == 0 and aggregator.stats["kraken"].timeouts >= 1
+
+    # Warm reads while pollers (including the stuck one) keep running
+    latencies = []
+    started = time.perf_counter()
+    for index in range(args.reads):
+        began = time.perf_counter()
+        await aggregator.quotes(SYMBOLS)
+        latencies.append(time.perf_counter() - began)
+        if index % 1000 == 0:
+            await asyncio.sleep(0)  # let the pollers run
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"Warm reads: {args.reads:,} requests x {len(SYMBOLS)} symbols in {elapsed:.2f}s -> "
+          f"{args.reads / elapsed:,.0f} requests/s, p50 {p50:.1f} us, p99 {p99:.1f} us, "
+          f"max {latencies[-1] * 1e6:,.0f} us (mean {statistics.fmean(latencies) * 1e6:.1f} us)")
+    ok &= latencies[-1] < args.timeout / 10
+
+    # A venue that starts failing ages out of the consolidated answer
+    venues["binance"].failing = True
+    await asyncio.sleep(args.max_age + 2 * args.interval)
+    quote = aggregator.table.consolidated("BTC/USDT")
+    remaining = sorted(venue.venue for venue in quote.venues)
+    best_bid, best_ask = expected_best(venues, "BTC/USDT", ["coinbase", "kucoin"])
+    print(f"After binance fails: venues {remaining}, best bid @ {quote.best_bid_venue}, "
+          f"errors { {name: stats.errors for name, stats in aggregator.stats.items()} }")
+    ok &= remaining == ["coinbase", "kucoin"] and abs(quote.best_bid - best_bid) < 1e-9
+
+    await aggregator.stop()
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--timeout", type=float, default=0.5, help="Per-venue timeout in seconds")
+    parser.add_argument("--interval", type=float, default=0.05, help="Poll interval in seconds")
+    parser.add_argument("--max-age", type=float, default=0.5, help="Quote max age in seconds")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
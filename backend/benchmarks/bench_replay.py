@@ -0,0 +1,160 @@
+"""
+Market Replay Benchmark
+Replay synthetic candles, then recorded ticks, through alerts, strategies and
+simulated fills on a virtual clock. Report events/sec and per-stage latency,
+and run each replay twice on a fresh database to check that the digests match.
+
+Usage:
+    python -m benchmarks.bench_replay --symbols 5 --bars 2000 --ticks 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_replay.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import numpy as np  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, Portfolio, ExchangeAPIKey, Strategy, StrategyStatus, Alert  # noqa: E402
+from app.services.replay import MarketReplay, STAGES, ticks_from_recorder  # noqa: E402
+from app.services.tick_recorder import TickWriter  # noqa: E402
+
+TIMEFRAME = "1m"
+START_MS = 1_700_000_000_000 // 60_000 * 60_000
+
+
+def symbols(count: int):
+    return [f"COIN{index}/USDT" for index in range(count)]
+
+
+def seed(args):
+    """Fresh schema with users, strategies on every symbol and price alerts"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(11)
+    db = SessionLocal()
+    try:
+        users = max(1, args.strategies // 20)
+        db.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(Portfolio), [{"user_id": uid} for uid in range(1, users + 1)])
+        db.execute(insert(ExchangeAPIKey), [
+            {"user_id": uid, "exchange_name": "binance", "api_key": "k", "api_secret": "s"}
+            for uid in range(1, users + 1)
+        ])
+        rows = []
+        for index in range(args.strategies):
+            if index % 2:
+                kind, params = "ma_crossover", {"fast_period": rng.choice((5, 9)), "slow_period": rng.choice((21, 30))}
+            else:
+                kind, params = "rsi", {"period": rng.choice((7, 14))}
+            params.update(symbol=symbols(args.symbols)[index % args.symbols], timeframe=TIMEFRAME, quantity=0.1)
+            rows.append({
+                "user_id": index % users + 1,
+                "name": f"strategy {index}",
+                "strategy_type": kind,
+                "status": StrategyStatus.ACTIVE,
+                "parameters": json.dumps(params),
+            })
+        db.execute(insert(Strategy), rows)
+        db.execute(insert(Alert), [
+            {
+                "user_id": index % users + 1,
+                "symbol": symbols(args.symbols)[index % args.symbols],
+                "alert_type": "price_above" if index % 2 else "price_below",
+                "target_price": 100 * (1 + rng.uniform(-0.05, 0.05)),
+            }
+            for index in range(args.alerts)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def generate_candles(args):
+    """Random-walk 1m candles per symbol"""
+    rng = random.Random(3)
+    candles = {}
+    for symbol in symbols(args.symbols):
+        price, rows = 100.0, []
+        for bar in range(args.bars):
+            prices = [price]
+            for _ in range(4):
+                price *= 1 + rng.gauss(0, 0.002)
+                prices.append(price)
+            rows.append([START_MS + bar * 60_000, prices[0], max(prices), min(prices), prices[-1], 1.0])
+        candles[symbol] = rows
+    return candles
+
+
+def record_ticks(args, root: str):
+    """Write random-walk ticks to a tick store and return the covered range (ns)"""
+    rng = np.random.default_rng(3)
+    per_symbol = args.ticks // args.symbols
+    start_ns = START_MS * 1_000_000
+    span_ns = args.bars * 60 * 1_000_000_000
+    for symbol in symbols(args.symbols):
+        stamps = np.sort(rng.integers(start_ns, start_ns + span_ns, per_symbol))
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, per_symbol)))
+        writer = TickWriter(root, symbol)
+        writer.append_batch(stamps, prices, rng.uniform(0.01, 1, per_symbol))
+        writer.close()
+    return start_ns, start_ns + span_ns
+
+
+def print_report(label: str, report):
+    print(f"{label}: {report.events:,} events, {report.bars:,} bars in {report.elapsed_seconds:.2f}s "
+          f"-> {report.events_per_second:,.0f} events/s")
+    print(f"  signals {report.signals:,}, fills {report.fills:,}, alerts triggered {report.alerts_triggered:,}")
+    for name in STAGES:
+        stage = report.stages[name]
+        print(f"  {name:<12} n={stage['count']:>9,}  mean {stage['mean_us']:9.1f}us  "
+              f"p50 {stage['p50_us']:9.1f}us  p99 {stage['p99_us']:9.1f}us  max {stage['max_us']:10.1f}us")
+    print(f"  digest {report.digest}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=1_000_000)
+    parser.add_argument("--strategies", type=int, default=200)
+    parser.add_argument("--alerts", type=int, default=2000)
+    args = parser.parse_args()
+
+    candles = generate_candles(args)
+    tick_root = tempfile.mkdtemp()
+    try:
+        start_ns, end_ns = record_ticks(args, tick_root)
+        ticks = ticks_from_recorder(tick_root, symbols(args.symbols), start_ns, end_ns)
+
+        reproducible = True
+        for label, replay in (("candles", lambda r: r.replay_candles(candles)), ("ticks", lambda r: r.replay_ticks(ticks))):
+            digests = []
+            for attempt in range(2):
+                seed(args)
+                report = asyncio.run(replay(MarketReplay(TIMEFRAME)))
+                if attempt == 0:
+                    print_report(f"Replay ({label})", report)
+                digests.append(report.digest)
+            same = digests[0] == digests[1]
+            reproducible &= same
+            print(f"  second run digest {'matches' if same else 'DIFFERS'}\n")
+    finally:
+        shutil.rmtree(tick_root, ignore_errors=True)
+    sys.exit(0 if reproducible else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Candle Resampler Benchmark
+Serve months of 1m candles from a fake exchange and check and time:
+
+    - vectorized aggregation into every derived timeframe against a per-candle
+      Python reference (the OHLCV values must match exactly)
+    - bringing every derived series up to date after one more base candle closes,
+      next to aggregating from scratch
+    - upstream OHLCV calls for a dashboard polling every timeframe, next to one
+      fetch per timeframe
+
+Usage:
+    python -m benchmarks.bench_resample --days 120
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from app.services.candles import (
+    BASE_TIMEFRAME, TIMEFRAME_OFFSET_MS, TIMEFRAME_SECONDS, CandleSeries, CandleStore, resample
+)
+from benchmarks.bench_chart_history import MINUTE_MS, FakeExchange
+
+DERIVED = [timeframe for timeframe in TIMEFRAME_SECONDS if timeframe != BASE_TIMEFRAME]
+
+
+def reference_resample(rows, timeframe):
+    """Aggregate [ts, o, h, l, c, v] rows one candle at a time"""
+    step = TIMEFRAME_SECONDS[timeframe] * 1000
+    offset = TIMEFRAME_OFFSET_MS.get(timeframe, 0)
+    candles = []
+    for ts, open_, high, low, close, volume in rows:
+        start = ts - (ts - offset) % step
+        if candles and candles[-1][0] == start:
+            candle = candles[-1]
+            candle[2] = max(candle[2], high)
+            candle[3] = min(candle[3], low)
+            candle[4] = close
+            candle[5] += volume
+        else:
+            candles.append([start, open_, high, low, close, volume])
+    return candles
+
+
+def same_candles(columns, candles) -> bool:
+    expected = np.array(candles, dtype=np.float64).reshape(-1, 6)
+    actual = np.column_stack([columns[name].astype(np.float64) for name in columns])
+    # Volumes are summed in a different order; everything else is picked, not computed
+    return actual.shape == expected.shape and np.array_equal(actual[:, :5], expected[:, :5]) \
+        and np.allclose(actual[:, 5], expected[:, 5], rtol=1e-12)
+
+
+async def run(args) -> bool:
+    exchange = FakeExchange(args.days)
+    ok = True
+
+    rows = exchange.fetch_ohlcv("BTC/USDT", BASE_TIMEFRAME, exchange.start_ms, args.days * 1440)
+    base = CandleSeries()
+    base.merge(rows)
+    columns = base.columns()
+    print(f"{len(base):,} base candles ({args.days} days)")
+    print(f"{'timeframe':<10} {'candles':>8} {'vectorized':>11} {'reference':>11} {'matches':>8}")
+    for timeframe in DERIVED:
+        result = resample(columns, timeframe)
+        started = time.perf_counter()
+        for _ in range(10):
+            resample(columns, timeframe)
+        fast = (time.perf_counter() - started) / 10
+        started = time.perf_counter()
+        expected = reference_resample(rows, timeframe)
+        slow = time.perf_counter() - started
+        same = same_candles(result, expected)
+        ok &= same
+        print(f"{timeframe:<10} {len(result['timestamp']):>8,} {fast * 1000:>8.2f} ms {slow * 1000:>8.0f} ms {str(same):>8}")
+
+    # Every derived series through the store, then one more minute closes
+    store = CandleStore(exchange.fetch_ohlcv, clock=exchange.clock)
+    start_ms = exchange.start_ms
+    calls = exchange.calls
+    started = time.perf_counter()
+    for timeframe in TIMEFRAME_SECONDS:
+        await store.get("BTC/USDT", timeframe, start_ms)
+    print(f"First load of {len(TIMEFRAME_SECONDS)} timeframes: {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"{exchange.calls - calls} upstream calls")
+
+    exchange.now_ms += MINUTE_MS
+    calls = exchange.calls
+    started = time.perf_counter()
+    await store.base("BTC/USDT", start_ms)
+    fetch_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for timeframe in DERIVED:
+        await store.get("BTC/USDT", timeframe, start_ms)
+    sync_us = (time.perf_counter() - started) * 1e6
+    full = store.series["BTC/USDT"].columns()
+    started = time.perf_counter()
+    for timeframe in DERIVED:
+        resample(full, timeframe)
+    full_us = (time.perf_counter() - started) * 1e6
+    ok &= exchange.calls - calls == 1
+    for timeframe in DERIVED:
+        ok &= same_candles(store.derived[("BTC/USDT", timeframe)].columns(), reference_resample(
+            np.column_stack([full[name].astype(np.float64) for name in full]).tolist(), timeframe
+        ))
+    print(f"Next base candle: {exchange.calls - calls} upstream call ({fetch_ms:.1f} ms), "
+          f"{len(DERIVED)} derived series updated in {sync_us:.0f} us vs {full_us:.0f} us rebuilding them")
+
+    # A dashboard polls every timeframe every 15 s for an hour
+    polls = 240
+    calls = exchange.calls
+    for _ in range(polls):
+        exchange.now_ms += 15_000
+        for timeframe in TIMEFRAME_SECONDS:
+            await store.get("BTC/USDT", timeframe, start_ms)
+    derived_calls = exchange.calls - calls
+    # Fetching each timeframe from the exchange refreshes every one of them on every poll
+    per_timeframe_calls = polls * len(TIMEFRAME_SECONDS)
+    ok &= derived_calls <= polls
+    print(f"One hour of 15 s polls over {len(TIMEFRAME_SECONDS)} timeframes: {derived_calls} upstream calls "
+          f"vs {per_timeframe_calls} fetching each timeframe ({per_timeframe_calls / derived_calls:.0f}x fewer)")
+
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=120)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Pre-trade Risk Benchmark
+Push a stream of strategy and manual orders through the risk engine and the
+simulated fill path (leaving some orders open), then check that the in-memory
+state matches a from-scratch rebuild from the database. Finally measure raw
+check() throughput.
+
+Usage:
+    python -m benchmarks.bench_risk --orders 10000 --checks 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_risk.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, Portfolio, Strategy, StrategyStatus, Trade, OrderSide, OrderType  # noqa: E402
+from app.schemas import TradeCreate  # noqa: E402
+from app.services import orders  # noqa: E402
+from app.services.analytics import record_fill  # noqa: E402
+from app.services.risk import RiskEngine, compare_snapshots  # noqa: E402
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT"]
+PRICES = {"BTC/USDT": 40000.0, "ETH/USDT": 2000.0, "SOL/USDT": 60.0, "XRP/USDT": 0.6}
+
+
+def seed(users: int, strategies: int):
+    """Users with portfolios and strategies with position, stop and take-profit limits"""
+    rng = random.Random(5)
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(Portfolio), [{"user_id": uid} for uid in range(1, users + 1)])
+        db.execute(insert(Strategy), [
+            {
+                "id": sid,
+                "user_id": sid % users + 1,
+                "name": f"strategy {sid}",
+                "strategy_type": "rsi",
+                "status": StrategyStatus.ACTIVE,
+                "max_position_size": rng.choice((1.0, 5.0, 20.0)),
+                "stop_loss_percentage": rng.choice((None, 2.0, 5.0)),
+                "take_profit_percentage": rng.choice((None, 5.0, 10.0)),
+            }
+            for sid in range(1, strategies + 1)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def random_order(rng: random.Random, users: int, strategies: int):
+    """(user_id, strategy_id, symbol, side, quantity, price) with prices drifting around a base"""
+    strategy_id = rng.randint(1, strategies) if rng.random() < 0.7 else None
+    user_id = strategy_id % users + 1 if strategy_id else rng.randint(1, users)
+    symbol = SYMBOLS[(strategy_id or user_id) % len(SYMBOLS)]
+    side = OrderSide.BUY if rng.random() < 0.6 else OrderSide.SELL
+    quantity = round(rng.uniform(0.1, 3.0), 3)
+    price = round(PRICES[symbol] * (1 + rng.gauss(0, 0.03)), 4)
+    return user_id, strategy_id, symbol, side, quantity, price
+
+
+async def place(db, risk: RiskEngine, batch, fill_ratio: float, rng: random.Random):
+    """The create_trade sequence for a batch: check, insert, reserve, execute some, record fills"""
+    accepted = []
+    for index, (user_id, strategy_id, symbol, side, quantity, price) in enumerate(batch):
+        if risk.check(user_id, symbol, side, quantity, price, strategy_id) is None:
+            risk.reserve(("bench", index), user_id, symbol, side, quantity, price, strategy_id)
+            accepted.append((user_id, strategy_id, symbol, side, quantity, price))
+    for index in range(len(batch)):
+        risk.release(("bench", index))
+    if not accepted:
+        return 0
+
+    rows = [
+        orders.build_trade_values(
+            user_id, "binance",
+            TradeCreate(symbol=symbol, order_type=OrderType.LIMIT, order_side=side, quantity=quantity, price=price),
+            strategy_id
+        )
+        for user_id, strategy_id, symbol, side, quantity, price in accepted
+    ]
+    trade_ids = list(db.scalars(insert(Trade).returning(Trade.id, sort_by_parameter_order=True), rows))
+    db.commit()
+    loaded = orders.load_trades(db, trade_ids)
+    for trade_id in trade_ids:
+        risk.reserve_trade(loaded[trade_id])
+
+    executed = [trade_id for trade_id in trade_ids if rng.random() < fill_ratio]
+    for trade_id in executed:
+        await orders.execute_order(loaded[trade_id])
+        record_fill(db, loaded[trade_id])
+    db.commit()
+    filled = orders.load_trades(db, executed)
+    for trade_id in executed:
+        risk.on_fill(filled[trade_id])
+    return len(accepted)
+
+
+async def run(args):
+    rng = random.Random(9)
+    risk = RiskEngine(max_user_exposure=250_000, max_open_order_notional=150_000, max_daily_loss=5_000)
+    db = SessionLocal()
+    try:
+        risk.reconcile(db)
+        for symbol, price in PRICES.items():
+            risk.update_price(symbol, price)
+
+        accepted = 0
+        started = time.perf_counter()
+        for offset in range(0, args.orders, 100):
+            batch = [random_order(rng, args.users, args.strategies) for _ in range(min(100, args.orders - offset))]
+            accepted += await place(db, risk, batch, 0.9, rng)
+        elapsed = time.perf_counter() - started
+        print(f"Orders: {args.orders:,} submitted, {accepted:,} accepted, {args.orders - accepted:,} rejected "
+              f"({elapsed:.1f}s including fills)")
+        print(f"  open orders tracked: {len(risk.open_orders):,}")
+
+        rebuilt = RiskEngine()
+        rebuilt.marks = dict(risk.marks)
+        rebuilt.reconcile(db)
+        drift = compare_snapshots(rebuilt.snapshot(), risk.snapshot())
+        sizes = {section: len(values) for section, values in risk.snapshot().items()}
+        for section, value in drift.items():
+            print(f"  {section:<19} {sizes[section]:>6,} entries, max drift vs rebuild {value:.3g}")
+        for user_id in range(1, min(args.users, 3) + 1):
+            print(f"  user {user_id}: exposure {risk.exposure(user_id):,.2f} (rebuild {rebuilt.exposure(user_id):,.2f})")
+    finally:
+        db.close()
+
+    sample = [random_order(rng, args.users, args.strategies) for _ in range(100_000)]
+    check = risk.check
+    rejected = 0
+    started = time.perf_counter()
+    for index in range(args.checks):
+        user_id, strategy_id, symbol, side, quantity, price = sample[index % len(sample)]
+        if check(user_id, symbol, side, quantity, price, strategy_id) is not None:
+            rejected += 1
+    elapsed = time.perf_counter() - started
+    print(f"Checks: {args.checks:,} in {elapsed:.2f}s -> {args.checks / elapsed:,.0f} checks/s "
+          f"({elapsed / args.checks * 1e6:.2f} us each, {rejected / args.checks:.1%} rejected)")
+    return all(value < 1e-6 for value in drift.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--strategies", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    seed(args.users, args.strategies)
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Strategy Scheduler Benchmark
+Run one bar close for many active strategies on a handful of symbols and report
+latency and how many indicator series were actually computed. Then run a bar in
+which some evaluators hang in synchronous code: they must be reported as timed
+out, the other strategies of their group must still signal, and the event loop
+must keep running meanwhile.
+
+Usage:
+    python -m benchmarks.bench_strategy_scheduler --strategies 10000 --symbols 5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_scheduler.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import insert  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User, ExchangeAPIKey, Strategy, StrategyStatus  # noqa: E402
+from app.models import OrderSide  # noqa: E402
+from app.services.strategies import EVALUATORS  # noqa: E402
+from app.services.strategy_scheduler import (  # noqa: E402
+    BarReport, ScheduledStrategy, StrategyScheduler, TIMEFRAME_SECONDS
+)
+
+TIMEFRAME = "1h"
+BAR_CLOSE = 1_700_000_000 // 3600 * 3600
+
+
+class FakeCandleSource:
+    """Deterministic sine-wave candles that count upstream fetches"""
+
+    def __init__(self):
+        self.fetches = 0
+
+    async def fetch(self, symbol, timeframe, limit):
+        self.fetches += 1
+        step = TIMEFRAME_SECONDS[timeframe] * 1000
+        end = BAR_CLOSE * 1000
+        phase = sum(map(ord, symbol))
+        candles = []
+        for index in range(limit, 0, -1):
+            price = 100 + 10 * math.sin((end / step - index + phase) / 7)
+            candles.append([end - index * step, price, price, price, price, 1.0])
+        return candles
+
+
+def seed(strategies: int, symbols: int):
+    """Create users, keys and active strategies with a mix of parameters"""
+    rng = random.Random(7)
+    db = SessionLocal()
+    try:
+        users = max(1, strategies // 100)
+        db.execute(insert(User), [
+            {"id": uid, "email": f"u{uid}@example.com", "username": f"u{uid}", "hashed_password": "x"}
+            for uid in range(1, users + 1)
+        ])
+        db.execute(insert(ExchangeAPIKey), [
+            {"user_id": uid, "exchange_name": "binance", "api_key": "k", "api_secret": "s"}
+            for uid in range(1, users + 1)
+        ])
+        rows = []
+        for index in range(strategies):
+            if index % 2:
+                kind, params = "ma_crossover", {"fast_period": rng.choice((5, 9, 12)), "slow_period": rng.choice((21, 50))}
+            else:
+                kind, params = "rsi", {"period": rng.choice((7, 14))}
+            params.update(symbol=f"COIN{index % symbols}/USDT", timeframe=TIMEFRAME, quantity=0.1)
+            rows.append({
+                "user_id": index % users + 1,
+                "name": f"strategy {index}",
+                "strategy_type": kind,
+                "status": StrategyStatus.ACTIVE,
+                "parameters": json.dumps(params),
+            })
+        db.execute(insert(Strategy), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(args):
+    source = FakeCandleSource()
+    scheduler = StrategyScheduler(candle_source=source)
+    loaded = scheduler.load_strategies()
+    report = await scheduler.run_bar(TIMEFRAME, BAR_CLOSE)
+
+    print(f"Strategies loaded:       {loaded:,}")
+    print(f"Upstream candle fetches: {source.fetches}")
+    print(f"Indicator series built:  {report.series_computed}")
+    print(f"Signals submitted:       {report.signals:,}")
+    print(f"Failures:                {report.failures}")
+    print(f"Bar latency:             {report.latency_ms:,.1f} ms")
+
+
+class Hanging:
+    """Blocks its thread (no await) for longer than the timeout when params say so, else buys"""
+
+    def lookback(self, params):
+        return 2
+
+    def indicators(self, params):
+        return []
+
+    def evaluate(self, params, series, closes):
+        if params.get("hang"):
+            time.sleep(params["hang"])
+        return OrderSide.BUY
+
+
+async def check_timeouts() -> bool:
+    EVALUATORS["hanging"] = Hanging()
+    scheduler = StrategyScheduler(candle_source=FakeCandleSource(), timeout=0.2)
+    group = [
+        ScheduledStrategy(index, 1, "hanging", "HANG/USDT", TIMEFRAME, 0.1, {"hang": 1.0 if index % 5 == 0 else 0})
+        for index in range(20)
+    ]
+    scheduler.groups = {("HANG/USDT", TIMEFRAME): group}
+    scheduler.indicators = {}  # run_bar loads them; this calls _run_group directly
+    hung = sum(1 for strategy in group if strategy.params["hang"])
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    report = BarReport(TIMEFRAME, BAR_CLOSE)
+    started = time.perf_counter()
+    signals, latencies = await scheduler._run_group("HANG/USDT", TIMEFRAME, BAR_CLOSE, report)
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+    del EVALUATORS["hanging"]
+
+    responsive = ticks >= elapsed / 0.01 * 0.5
+    ok = report.failures == hung and len(signals) == len(group) - hung and len(latencies) == len(group)
+    ok &= responsive and elapsed < hung * 1.0
+    print(f"Hanging evaluators: {report.failures} of {hung} timed out after {scheduler.timeout}s, "
+          f"{len(signals)} of {len(group) - hung} others signalled, bar took {elapsed:.2f}s, "
+          f"event loop ticked {ticks} times meanwhile: {'yes' if ok else 'NO'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", type=int, default=10000)
+    parser.add_argument("--symbols", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    seed(args.strategies, args.symbols)
+    asyncio.run(run(args))
+    ok = asyncio.run(check_timeouts())
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Tick Recorder Benchmark
+Measure single-tick and batched append throughput, time-range reads through
+memory-mapped views, and compaction of an out-of-order part file. Fails when
+batched appends miss --target, a read is wrong or copies, or compaction loses
+or misorders ticks.
+
+Usage:
+    python -m benchmarks.bench_tick_recorder --ticks 20000000
+"""
+
+import argparse
+import mmap
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from app.services.tick_recorder import NANOS_PER_DAY, TickReader, TickRecorder, TickWriter, compact_day
+
+SYMBOL = "BTC/USDT"
+DAY_START = 19_700 * NANOS_PER_DAY
+
+
+def owner(array: np.ndarray):
+    """The object that ultimately owns an array's memory"""
+    base = array
+    while isinstance(base, np.ndarray) and base.base is not None:
+        base = base.base
+    return base.obj if isinstance(base, memoryview) else base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=20_000_000)
+    parser.add_argument("--single", type=int, default=2_000_000, help="Ticks for the one-at-a-time test")
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--target", type=float, default=2_000_000, help="append_batch() ticks/sec to reach")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    rng = np.random.default_rng(5)
+    try:
+        # Spread ticks over two days to exercise the file switch
+        step = 2 * NANOS_PER_DAY // args.ticks
+        timestamps = DAY_START + np.arange(args.ticks, dtype=np.int64) * step
+        prices = 40000 + np.cumsum(rng.normal(0, 1, args.ticks))
+        sizes = rng.uniform(0.001, 1, args.ticks)
+        sides = rng.choice(np.array([-1, 1], dtype=np.int8), args.ticks)
+
+        recorder = TickRecorder(root)
+        record = recorder.record
+        single_ts, single_prices = timestamps[:args.single].tolist(), prices[:args.single].tolist()
+        started = time.perf_counter()
+        for timestamp, price in zip(single_ts, single_prices):
+            record("ETH/USDT", price, 0.0, 0, timestamp)
+        recorder.flush()
+        elapsed = time.perf_counter() - started
+        print(f"record() one at a time:  {args.single / elapsed:14,.0f} ticks/s")
+
+        writer = TickWriter(root, SYMBOL)
+        started = time.perf_counter()
+        for offset in range(0, args.ticks, args.batch_size):
+            end = offset + args.batch_size
+            writer.append_batch(timestamps[offset:end], prices[offset:end], sizes[offset:end], sides[offset:end])
+        writer.close()
+        elapsed = time.perf_counter() - started
+        ok = args.ticks / elapsed >= args.target
+        print(f"append_batch() x{args.batch_size:<7,}: {args.ticks / elapsed:14,.0f} ticks/s "
+              f"({args.ticks * 32 / elapsed / 2**20:,.0f} MB/s)")
+
+        reader = TickReader(root)
+        start_ns = DAY_START + NANOS_PER_DAY // 2
+        end_ns = start_ns + NANOS_PER_DAY
+        started = time.perf_counter()
+        views = reader.read(SYMBOL, start_ns, end_ns)
+        elapsed = time.perf_counter() - started
+        selected = sum(len(view) for view in views)
+        zero_copy = all(isinstance(owner(view), mmap.mmap) for view in views)
+        expected = int(np.count_nonzero((timestamps >= start_ns) & (timestamps < end_ns)))
+        print(f"read 24h range:          {selected:,} ticks across {len(views)} file(s) in {elapsed * 1000:.2f} ms "
+              f"(zero-copy: {zero_copy}, correct: {selected == expected})")
+        ok &= zero_copy and selected == expected
+        print(f"  VWAP over range: {sum((v['price'] * v['size']).sum() for v in views) / sum(v['size'].sum() for v in views):,.2f}")
+
+        # Compaction: append out of order, then rewrite sorted
+        writer = TickWriter(root, "SOL/USDT")
+        shuffled = rng.permutation(DAY_START + np.arange(1_000_000, dtype=np.int64))
+        for timestamp in shuffled[:200_000].tolist():
+            writer.append(timestamp, 100.0)
+        writer.close()
+        started = time.perf_counter()
+        count, rewritten = compact_day(root, "SOL/USDT", DAY_START // NANOS_PER_DAY, grace_seconds=0)
+        ticks = reader.map_day("SOL/USDT", DAY_START // NANOS_PER_DAY)
+        in_order = bool(np.all(np.diff(ticks["timestamp"]) >= 0))
+        print(f"compaction:              {count:,} ticks rewritten={rewritten} sorted={in_order} "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        ok &= in_order and count == len(ticks) == 200_000
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
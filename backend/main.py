@@ -5,11 +5,25 @@ Main FastAPI application entry point.
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database import engine, Base
-from app.routes import auth, market, trading
+from app.database import engine, Base, SessionLocal, upgrade_schema
+from app.routes import auth, market, trading, api_keys, analytics, portfolio, admin, notifications
+from app.routes.market import tick_recorder, quote_aggregator, price_table, price_poller, order_books, MAJOR_PAIRS
+from app.services.alerts import alert_monitor
+from app.services.analytics import rebuild_positions
+from app.services.conditional_orders import order_monitor
+from app.services.credentials import check_master_key, credential_vault
+from app.services.grid import grid_engine
+from app.services.journal import trade_journal
+from app.services.notifications import notification_hub
+from app.services.orderbook import BinanceDepthFeed
+from app.services.profiling import ProfilingMiddleware, profile_store
+from app.services.query_stats import QueryStatsMiddleware, query_metrics
+from app.services.risk import risk_engine
+from app.services.strategy_scheduler import scheduler
 
-# Create database tables
+# Create database tables, and add columns newer than an existing database
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -29,10 +43,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request SQL statistics; summary headers in debug mode
+if settings.sql_instrumentation_enabled:
+    app.add_middleware(QueryStatsMiddleware, metrics=query_metrics, headers=settings.debug)
+
+# Profile requests flagged by admins or sampled per route; not installed when disabled
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_routes=settings.profile_sample_route_map,
+        interval=settings.profile_sample_interval_ms / 1000
+    )
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(market.router)
 app.include_router(trading.router)
+app.include_router(api_keys.router)
+app.include_router(analytics.router)
+app.include_router(portfolio.router)
+app.include_router(admin.router)
+app.include_router(notifications.router)
+
+
+@app.on_event("startup")
+async def start_background_services():
+    """Start background services enabled in settings."""
+    # Derive the API key master key once here rather than on the first order
+    check_master_key()
+    credential_vault.unlock()
+    
+    # Replay journaled trades before anything reads positions from the database
+    if trade_journal is not None:
+        trade_journal.start()
+    
+    db = SessionLocal()
+    try:
+        rebuild_positions(db)
+        risk_engine.reconcile(db)
+        alert_monitor.load(db)
+        order_monitor.load(db)
+        grid_engine.load(db)
+    finally:
+        db.close()
+    risk_engine.start(settings.risk_reconcile_interval_seconds)
+    alert_monitor.start(settings.alert_reload_interval_seconds)
+    order_monitor.start(settings.conditional_order_reload_interval_seconds)
+    grid_engine.start(settings.grid_reload_interval_seconds)
+    notification_hub.start()
+    
+    if settings.strategy_scheduler_enabled:
+        scheduler.start()
+    if settings.quote_polling_enabled:
+        quote_aggregator.start(MAJOR_PAIRS)
+    if settings.price_poll_enabled:
+        price_poller.start()
+    for symbol in settings.orderbook_feed_symbol_list:
+        order_books.attach_feed(symbol, BinanceDepthFeed(symbol, settings.orderbook_feed_url))
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    """Stop background services."""
+    await scheduler.stop()
+    await risk_engine.stop()
+    await alert_monitor.stop()
+    await order_monitor.stop()
+    await grid_engine.stop()
+    await notification_hub.stop()
+    await quote_aggregator.stop()
+    await price_poller.stop()
+    await order_books.stop()
+    if trade_journal is not None:
+        await trade_journal.stop()
+    if tick_recorder is not None:
+        tick_recorder.close()
+    if price_table is not None:
+        price_table.close()
 
 
 @app.get("/")
@@ -58,5 +146,6 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        timeout_graceful_shutdown=5  # Open notification streams would otherwise hold up shutdown
     )
@@ -0,0 +1,50 @@
+"""
+Market Data Writer
+Poll the exchange for the major pairs and publish the latest tickers to the
+shared-memory price table read by every web worker (SHARED_PRICES_ENABLED=True).
+Run one per host next to `uvicorn main:app --workers N`.
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import time
+import ccxt
+from app.config import settings
+from app.routes.market import MAJOR_PAIRS
+from app.services.price_table import PriceTable
+
+logger = logging.getLogger("market_data")
+
+
+def main():
+    """Write tickers until interrupted"""
+    parser = argparse.ArgumentParser(description="Publish latest tickers to the shared price table")
+    parser.add_argument("--name", default=settings.shared_price_table_name, help="Shared memory name")
+    parser.add_argument("--interval", type=float, default=settings.shared_price_interval_seconds,
+                        help="Seconds between exchange polls")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    
+    exchange = ccxt.binance()
+    table = PriceTable.create(args.name, MAJOR_PAIRS)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Remove the table on stop too
+    print(f"✓ Publishing {len(MAJOR_PAIRS)} pairs to shared memory {args.name!r} every {args.interval}s")
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                table.write_tickers(exchange.fetch_tickers(MAJOR_PAIRS))
+            except Exception as e:
+                # Workers fall back to the exchange once the heartbeat is older than the max age
+                logger.warning("Ticker poll failed: %s", e)
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+if __name__ == "__main__":
+    main()
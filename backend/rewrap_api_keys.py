@@ -0,0 +1,62 @@
+"""
+API Key Re-wrap
+Wrap every stored API key's data keys with the current CREDENTIAL_MASTER_KEY and
+encrypt keys still stored as plaintext. Run after rotating the master key (old
+key moved to CREDENTIAL_PREVIOUS_MASTER_KEYS); the ciphertexts are not rewritten.
+"""
+
+import argparse
+import time
+from sqlalchemy import select, update
+from app.database import SessionLocal, engine, Base, upgrade_schema
+from app.models import ExchangeAPIKey
+from app.services.credentials import CredentialError, check_master_key, credential_vault
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Re-wrap stored exchange API keys with the current master key")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Keys updated per commit")
+    return parser.parse_args()
+
+
+def main():
+    """Run the re-wrap"""
+    args = parse_args()
+    check_master_key()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = db.execute(
+            select(ExchangeAPIKey.id, ExchangeAPIKey.user_id, ExchangeAPIKey.api_key, ExchangeAPIKey.api_secret)
+        ).all()
+        changes = []
+        failed = []
+        for key_id, user_id, api_key, api_secret in rows:
+            if credential_vault.is_current(api_key) and credential_vault.is_current(api_secret):
+                continue
+            try:
+                changes.append({
+                    "id": key_id,
+                    "api_key": credential_vault.rewrap(api_key, user_id, "api_key"),
+                    "api_secret": credential_vault.rewrap(api_secret, user_id, "api_secret"),
+                })
+            except CredentialError:
+                failed.append(key_id)
+        
+        for offset in range(0, len(changes), args.chunk_size):
+            db.execute(update(ExchangeAPIKey), changes[offset:offset + args.chunk_size])
+            db.commit()
+        elapsed = time.perf_counter() - started
+        print(f"✓ Re-wrapped {len(changes):,} of {len(rows):,} API key(s) in {elapsed:.2f}s")
+        if failed:
+            print(f"✗ {len(failed):,} key(s) could not be decrypted with the configured master keys: {failed}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Shared test setup.
+The app reads DATABASE_URL when it is imported, so the scratch database is set
+here, before any test module imports it.
+"""
+
+import os
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "tests.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("PRICE_POLL_ENABLED", "false")
+
+import pytest  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+@pytest.fixture()
+def db_tables():
+    """Fresh tables for one test."""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
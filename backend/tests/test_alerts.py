@@ -0,0 +1,68 @@
+"""Crossed alerts trigger once, in order of crossing, even with several workers watching them."""
+
+import asyncio
+import pytest
+from app.database import SessionLocal
+from app.models import Alert, User
+from app.services.alerts import AlertBook, AlertMonitor
+from app.services.events import EventBus
+
+
+@pytest.fixture()
+def alerts(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add_all([
+        Alert(id=1, user_id=1, symbol="BTC/USDT", alert_type="price_above", target_price=110.0),
+        Alert(id=2, user_id=1, symbol="BTC/USDT", alert_type="price_below", target_price=90.0),
+        Alert(id=3, user_id=1, symbol="BTC/USDT", alert_type="price_above", target_price=120.0),
+        Alert(id=4, user_id=1, symbol="ETH/USDT", alert_type="price_above", target_price=10.0),
+    ])
+    db.commit()
+    db.close()
+
+
+def monitor():
+    bus = EventBus()
+    subscription = bus.subscribe("alert")
+    watcher = AlertMonitor(SessionLocal, clock=lambda: 1_700_000_000.0, bus=bus)
+    db = SessionLocal()
+    watcher.load(db)
+    db.close()
+    return watcher, subscription
+
+
+def test_book_returns_only_crossed_alerts():
+    book = AlertBook()
+    book.add(1, "BTC/USDT", "price_above", 110.0)
+    book.add(2, "BTC/USDT", "price_below", 90.0)
+    book.add(3, "BTC/USDT", "price_above", 120.0)
+    assert book.check("BTC/USDT", 100.0, 100.0) == []
+    assert book.check("BTC/USDT", 85.0, 115.0) == [1, 2]
+    assert book.check("BTC/USDT", 85.0, 115.0) == []
+    assert len(book) == 1
+
+
+def test_alert_triggers_once_across_workers(alerts):
+    first, first_events = monitor()
+    second, second_events = monitor()
+
+    assert asyncio.run(first.on_price("BTC/USDT", 111.0)) == [1]
+    assert asyncio.run(second.on_price("BTC/USDT", 112.0)) == []
+    assert [event.data.alert_id for event in first_events.get_nowait()] == [1]
+    assert second_events.get_nowait() == []
+    assert 1 not in second.alerts  # Not retried either
+
+    db = SessionLocal()
+    assert [alert.id for alert in db.query(Alert).filter(Alert.is_triggered == True)] == [1]
+    db.close()
+
+
+def test_deactivated_alert_is_not_published(alerts):
+    watcher, events = monitor()
+    db = SessionLocal()
+    db.get(Alert, 2).is_active = False
+    db.commit()
+    db.close()
+    assert asyncio.run(watcher.on_price("BTC/USDT", 80.0)) == []
+    assert events.get_nowait() == []
@@ -0,0 +1,108 @@
+"""Rollups answer range queries like a raw scan, and replays match what the live fill path recorded."""
+
+from datetime import date, datetime
+import pytest
+from fastapi import HTTPException
+from app.database import SessionLocal
+from app.models import DailyTradeRollup, OrderSide, OrderStatus, OrderType, Trade, User
+from app.services import analytics
+from app.routes.analytics import validate_range
+from app.services.accounting import lot_book
+from benchmarks.bench_analytics import populate, rollups_match
+
+
+def trade(trade_id, side, quantity, price, executed_at):
+    return Trade(id=trade_id, user_id=1, exchange_name="binance", symbol="BTC/USDT", order_type=OrderType.MARKET,
+                 order_side=side, order_status=OrderStatus.FILLED, quantity=quantity, filled_quantity=quantity,
+                 average_price=price, total_cost=quantity * price, fee=0.0, executed_at=executed_at)
+
+
+@pytest.fixture()
+def history(db_tables):
+    """Fills whose ids are not in execution order: sell 2 was placed early and filled last."""
+    fills = [
+        trade(1, OrderSide.BUY, 1.0, 100.0, datetime(2024, 1, 1, 10)),
+        trade(3, OrderSide.BUY, 1.0, 200.0, datetime(2024, 1, 1, 11)),
+        trade(4, OrderSide.SELL, 1.0, 120.0, datetime(2024, 1, 2, 10)),
+        trade(2, OrderSide.SELL, 1.0, 300.0, datetime(2024, 1, 3, 10)),
+    ]
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    lot_book.positions = {}
+    realized = []
+    for fill in fills:
+        db.add(fill)
+        db.flush()
+        realized.append(analytics.record_fill(db, fill))
+        db.commit()
+    yield db, realized
+    db.close()
+    lot_book.positions = {}
+
+
+def rollups(db):
+    return {
+        row.day: (row.trade_count, row.realized_profit_loss)
+        for row in db.query(DailyTradeRollup).order_by(DailyTradeRollup.day)
+    }
+
+
+def test_live_path_matches_in_fill_order(history):
+    db, realized = history
+    if lot_book.method == "fifo":
+        assert realized == [0.0, 0.0, 20.0, 100.0]
+    assert sum(realized) == pytest.approx(120.0)
+
+
+def test_rebuild_rollups_matches_live_rollups(history):
+    db, _ = history
+    live = rollups(db)
+    analytics.rebuild_rollups(db)
+    assert rollups(db) == pytest.approx(live)
+    assert set(live) == {date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)}
+
+
+def test_rebuild_positions_matches_live_book(history):
+    db, _ = history
+    live = {key: (position.quantity, position.cost) for key, position in lot_book.positions.items()}
+    lot_book.positions = {}
+    assert analytics.rebuild_positions(db) == 4
+    assert {key: (position.quantity, position.cost) for key, position in lot_book.positions.items()} == live
+
+
+@pytest.fixture()
+def many_trades(db_tables):
+    """Random fills of several users and symbols over two months, rolled up by the backfill."""
+    db = SessionLocal()
+    populate(db, 3_000, users=3, days=60)
+    analytics.rebuild_rollups(db)
+    yield db
+    db.close()
+    lot_book.positions = {}
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 1, 1), date(2024, 1, 1)),
+    (date(2024, 1, 5), date(2024, 1, 31)),
+    (date(2023, 12, 1), date(2024, 12, 31)),
+])
+def test_rollup_ranges_match_raw_scan(many_trades, start, end):
+    for user_id in (1, 2, 3):
+        assert rollups_match(many_trades, user_id, start, end)
+
+
+def test_summary_and_daily_series_add_up(many_trades):
+    db = many_trades
+    summary = analytics.get_summary(db, 1, date(2024, 1, 1), date(2024, 1, 31))
+    daily = analytics.get_daily_series(db, 1, date(2024, 1, 1), date(2024, 1, 31))
+    assert [row["day"] for row in daily] == sorted(row["day"] for row in daily)
+    assert sum(row["trade_count"] for row in daily) == summary["trade_count"]
+    assert sum(row["fees"] for row in daily) == pytest.approx(summary["fees"])
+    assert summary["win_rate"] == pytest.approx(summary["winning_trades"] / summary["closing_trades"] * 100)
+    assert analytics.get_summary(db, 1, date(2025, 1, 1), date(2025, 1, 31))["win_rate"] == 0.0
+
+
+def test_reversed_range_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        validate_range(date(2024, 2, 1), date(2024, 1, 1))
+    assert error.value.status_code == 400
@@ -0,0 +1,78 @@
+"""Batch orders are validated as a whole, inserted together and answered per item in request order."""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.database import SessionLocal
+from app.models import ExchangeAPIKey, OrderStatus, Portfolio, Trade, User
+from app.routes import trading
+from app.schemas import TradeBatchCreate
+from app.services.accounting import lot_book
+from app.services.conditional_orders import ConditionalOrderMonitor
+from app.services.credentials import credential_vault
+from app.services.events import EventBus
+from app.services.risk import RiskEngine
+
+
+@pytest.fixture()
+def account(db_tables, monkeypatch):
+    risk = RiskEngine(max_user_exposure=0, max_open_order_notional=0, max_daily_loss=0)
+    monkeypatch.setattr(trading, "risk_engine", risk)
+    monkeypatch.setattr(trading, "order_monitor", ConditionalOrderMonitor(SessionLocal, risk, bus=EventBus()))
+    monkeypatch.setattr(trading, "event_bus", EventBus())
+    lot_book.positions = {}
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Portfolio(user_id=1))
+    db.add(ExchangeAPIKey(user_id=1, exchange_name="binance", **credential_vault.seal_columns(1, "key", "secret")))
+    db.commit()
+    yield db, db.get(User, 1), risk
+    db.close()
+    lot_book.positions = {}
+
+
+def order(side="buy", price=100.0, order_type="limit", symbol="BTC/USDT"):
+    return {"symbol": symbol, "order_type": order_type, "order_side": side, "quantity": 1.0, "price": price}
+
+
+def submit(db, user, *items):
+    return asyncio.run(trading.create_trades_batch(TradeBatchCreate(trades=list(items)), user, db))
+
+
+def test_results_follow_request_order(account):
+    db, user, risk = account
+    response = submit(db, user, order(price=100.0), order("sell", 110.0), order("sell", 90.0, "stop_loss"))
+    assert [result.index for result in response.results] == [0, 1, 2]
+    assert [result.trade.price for result in response.results] == [100.0, 110.0, 90.0]
+    assert (response.submitted, response.filled, response.failed) == (3, 2, 0)
+    # The stop-loss rests until its trigger and stays reserved
+    assert response.results[2].trade.order_status == OrderStatus.PENDING
+    assert risk.open_orders.keys() == {response.results[2].trade.id}
+    assert [trade.id for trade in db.query(Trade).order_by(Trade.id)] == [result.trade.id for result in response.results]
+
+
+def test_one_invalid_order_rejects_the_batch(account):
+    db, user, _ = account
+    with pytest.raises(HTTPException) as error:
+        submit(db, user, order(), order(symbol="BTCUSDT"), order(price=None))
+    assert error.value.status_code == 422
+    assert [item["index"] for item in error.value.detail] == [1, 2]
+    assert db.query(Trade).count() == 0
+
+
+def test_earlier_orders_count_against_risk_limits(account):
+    db, user, risk = account
+    risk.max_open_order_notional = 250.0
+    with pytest.raises(HTTPException) as error:
+        submit(db, user, order(), order(), order())
+    assert [item["index"] for item in error.value.detail] == [2]
+    assert db.query(Trade).count() == 0
+    assert risk.open_orders == {}
+
+
+def test_batch_size_is_capped(account, monkeypatch):
+    db, user, _ = account
+    monkeypatch.setattr(trading.settings, "max_batch_orders", 2)
+    with pytest.raises(HTTPException) as error:
+        submit(db, user, order(), order(), order())
+    assert error.value.status_code == 400
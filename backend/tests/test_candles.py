@@ -0,0 +1,88 @@
+"""Every timeframe is derived from 1m candles, matches a per-candle aggregation and stays current incrementally."""
+
+import asyncio
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from app.services.candles import CandleSeries, CandleStore, DerivedSeries, parse_range, resample
+from benchmarks.bench_chart_history import MINUTE_MS, FakeExchange
+from benchmarks.bench_resample import DERIVED, reference_resample, same_candles
+
+SYMBOL = "BTC/USDT"
+
+
+@pytest.fixture(scope="module")
+def rows():
+    """Ten days of 1m candles with a few hundred missing, as exchanges do during outages."""
+    exchange = FakeExchange(days=10)
+    rows = exchange.fetch_ohlcv(SYMBOL, "1m", exchange.start_ms, 10 * 1440)
+    missing = set(np.random.default_rng(2).choice(len(rows), 300, replace=False).tolist())
+    return [row for index, row in enumerate(rows) if index not in missing]
+
+
+def base_series(rows):
+    series = CandleSeries()
+    series.merge(rows)
+    return series
+
+
+@pytest.mark.parametrize("timeframe", DERIVED)
+def test_resample_matches_reference(rows, timeframe):
+    assert same_candles(resample(base_series(rows).columns(), timeframe), reference_resample(rows, timeframe))
+
+
+def test_weekly_candles_open_on_monday(rows):
+    weekly = resample(base_series(rows).columns(), "1w")
+    assert {datetime.fromtimestamp(ms / 1000, timezone.utc).weekday() for ms in weekly["timestamp"].tolist()} == {0}
+
+
+@pytest.mark.parametrize("timeframe", ["5m", "4h", "1w"])
+def test_incremental_sync_equals_a_full_rebuild(rows, timeframe):
+    base = base_series(rows[:5_000])
+    derived = DerivedSeries(timeframe)
+    derived.sync(base)
+    # New candles at the tail, then backfilled history at the head
+    for start, stop in ((5_000, 5_001), (5_001, 5_130), (5_130, len(rows))):
+        base.merge(rows[start:stop])
+        derived.sync(base)
+        assert same_candles(derived.columns(), reference_resample(rows[:stop], timeframe))
+    head = base_series(rows[3_000:])
+    derived = DerivedSeries(timeframe)
+    derived.sync(head)
+    head.merge(rows[:3_000])
+    derived.sync(head)
+    assert same_candles(derived.columns(), reference_resample(rows, timeframe))
+
+
+def test_derived_timeframes_cost_no_upstream_calls():
+    exchange = FakeExchange(days=3)
+    store = CandleStore(exchange.fetch_ohlcv, clock=exchange.clock)
+    start = exchange.start_ms + 86400 * 1000
+
+    async def scenario():
+        # Weekly buckets reach back furthest, so this loads every base candle the others need
+        await store.get(SYMBOL, "1w", start)
+        loaded = exchange.calls
+        for timeframe in ["1m"] + DERIVED:
+            await store.get(SYMBOL, timeframe, start)
+        derived = exchange.calls - loaded
+        exchange.now_ms += MINUTE_MS
+        hourly = await store.get(SYMBOL, "1h", start)
+        return derived, exchange.calls - loaded, hourly
+
+    derived_calls, total_calls, hourly = asyncio.run(scenario())
+    assert derived_calls == 0
+    assert total_calls == 1  # Only the newly closed minute
+    base_rows = np.column_stack(list(store.series[SYMBOL].columns().values())).tolist()
+    assert same_candles(hourly.columns(), reference_resample(base_rows, "1h"))
+
+
+@pytest.mark.parametrize("text, seconds", [("12h", 43200), ("30d", 2592000), ("2w", 1209600), ("1y", 31536000)])
+def test_parse_range(text, seconds):
+    assert parse_range(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "d", "1m", "1000d", "-1d"])
+def test_parse_range_rejects(text):
+    with pytest.raises(ValueError):
+        parse_range(text)
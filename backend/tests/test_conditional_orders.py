@@ -0,0 +1,119 @@
+"""Resting stop-loss and take-profit orders fill once when crossed, and an OCO leg cancels its sibling."""
+
+import asyncio
+import pytest
+from app.database import SessionLocal
+from app.models import OrderSide, OrderStatus, OrderType, Portfolio, Trade, User
+from app.services.accounting import lot_book
+from app.services.conditional_orders import FALLING, RISING, ConditionalOrderMonitor, TriggerBook, trigger_direction
+from app.services.events import EventBus
+from app.services.risk import RiskEngine
+
+SYMBOL = "BTC/USDT"
+
+
+def leg(trade_id, order_type, price, linked=None, side=OrderSide.SELL):
+    return Trade(id=trade_id, user_id=1, exchange_name="binance", symbol=SYMBOL, order_type=order_type,
+                 order_side=side, order_status=OrderStatus.PENDING, price=price, quantity=1.0,
+                 linked_trade_id=linked)
+
+
+@pytest.fixture()
+def resting(db_tables):
+    """An OCO pair protecting a long (stop 90, take-profit 110) and a lone buy stop at 120."""
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Portfolio(user_id=1))
+    db.add_all([
+        leg(1, OrderType.STOP_LOSS, 90.0, linked=2),
+        leg(2, OrderType.TAKE_PROFIT, 110.0, linked=1),
+        leg(3, OrderType.STOP_LOSS, 120.0, side=OrderSide.BUY),
+    ])
+    db.commit()
+    db.close()
+    lot_book.positions = {}
+    yield
+    lot_book.positions = {}
+
+
+def monitor():
+    bus = EventBus()
+    watcher = ConditionalOrderMonitor(
+        SessionLocal, RiskEngine(max_user_exposure=0, max_open_order_notional=0, max_daily_loss=0),
+        clock=lambda: 1_700_000_000.0, bus=bus
+    )
+    db = SessionLocal()
+    watcher.load(db)
+    db.close()
+    return watcher, bus.subscribe("order_update")
+
+
+def statuses():
+    db = SessionLocal()
+    try:
+        return {trade.id: trade.order_status for trade in db.query(Trade)}
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("order_type, side, direction", [
+    (OrderType.STOP_LOSS, OrderSide.SELL, FALLING),
+    (OrderType.TAKE_PROFIT, OrderSide.BUY, FALLING),
+    (OrderType.STOP_LOSS, OrderSide.BUY, RISING),
+    (OrderType.TAKE_PROFIT, OrderSide.SELL, RISING),
+])
+def test_trigger_direction(order_type, side, direction):
+    assert trigger_direction(order_type, side) == direction
+
+
+def test_book_pops_only_crossed_orders_at_clamped_prices():
+    book = TriggerBook()
+    book.add(1, SYMBOL, FALLING, 95.0)
+    book.add(2, SYMBOL, FALLING, 90.0)
+    book.add(3, SYMBOL, RISING, 105.0)
+    assert book.check(SYMBOL, 100.0) == ([], [])
+    triggered, _ = book.check(SYMBOL, 93.0, 101.0)
+    assert [(order.trade_id, price) for order, price in triggered] == [(1, 95.0)]
+    # A gap through the trigger fills at the price seen, not the trigger
+    triggered, _ = book.check(SYMBOL, 80.0)
+    assert [(order.trade_id, price) for order, price in triggered] == [(2, 80.0)]
+    assert len(book) == 1
+
+
+def test_cancelled_order_never_triggers():
+    book = TriggerBook()
+    book.add(1, SYMBOL, RISING, 105.0)
+    assert book.cancel(1).trade_id == 1
+    assert book.check(SYMBOL, 200.0) == ([], [])
+    assert book.cancel(1) is None
+
+
+def test_oco_leg_cancels_its_sibling(resting):
+    watcher, events = monitor()
+    assert asyncio.run(watcher.on_price(SYMBOL, 111.0)) == [2]
+    assert statuses() == {1: OrderStatus.CANCELLED, 2: OrderStatus.FILLED, 3: OrderStatus.PENDING}
+    assert [(event.data.trade_id, event.data.status) for event in events.get_nowait()] == [
+        (2, "filled"), (1, "cancelled")
+    ]
+    # The cancelled leg is gone from the book, so a later fall does nothing
+    assert asyncio.run(watcher.on_price(SYMBOL, 85.0)) == []
+    assert watcher.symbols() == {SYMBOL}
+
+
+def test_both_legs_crossed_by_one_range_fill_one(resting):
+    watcher, _ = monitor()
+    assert len(asyncio.run(watcher.on_price(SYMBOL, 85.0, 121.0))) == 2  # One OCO leg and the buy stop
+    states = statuses()
+    assert sorted([states[1], states[2]]) == sorted([OrderStatus.CANCELLED, OrderStatus.FILLED])
+    assert states[3] == OrderStatus.FILLED
+
+
+def test_order_fills_once_across_workers(resting):
+    first, _ = monitor()
+    second, second_events = monitor()
+    assert asyncio.run(first.on_price(SYMBOL, 121.0)) == [2, 3]
+    assert asyncio.run(second.on_price(SYMBOL, 122.0)) == []
+    assert second_events.get_nowait() == []
+    db = SessionLocal()
+    assert db.query(Trade).filter(Trade.order_status == OrderStatus.FILLED).count() == 2
+    db.close()
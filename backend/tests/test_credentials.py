@@ -0,0 +1,176 @@
+"""
+API key columns are sealed per user and column, cached briefly once opened,
+re-wrapped after a master key rotation; the placeholder master key is refused
+outside debug mode.
+"""
+
+import asyncio
+import pytest
+from app.config import Settings, settings
+from app.database import SessionLocal
+from app.models import ExchangeAPIKey, User
+from app.routes import api_keys
+from app.schemas import ExchangeAPIKeyRotate
+from app.services import credentials
+from app.services.credentials import CredentialError, CredentialVault, credential_vault
+
+PLACEHOLDER = Settings.model_fields["credential_master_key"].default
+
+
+def test_placeholder_master_key_refused_without_debug(monkeypatch):
+    monkeypatch.setattr(settings, "credential_master_key", PLACEHOLDER)
+    monkeypatch.setattr(settings, "debug", False)
+    with pytest.raises(RuntimeError, match="CREDENTIAL_MASTER_KEY"):
+        credentials.check_master_key()
+
+
+def test_placeholder_master_key_logged_in_debug(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "credential_master_key", PLACEHOLDER)
+    monkeypatch.setattr(settings, "debug", True)
+    credentials.check_master_key()
+    assert "secrets.token_urlsafe(32)" in caplog.text
+
+
+def test_own_master_key_accepted(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "credential_master_key", "a-random-key-of-our-own")
+    assert not settings.credential_master_key_is_default
+    credentials.check_master_key()
+    assert not caplog.text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def old_vault():
+    vault = CredentialVault("old-master-key")
+    vault.unlock()
+    return vault
+
+
+@pytest.fixture(scope="module")
+def rotated_vault():
+    """The master key rotated: the old one is still listed as a previous key."""
+    vault = CredentialVault("new-master-key", ["old-master-key"])
+    vault.unlock()
+    return vault
+
+
+def row(vault, key_id=1, user_id=7, api_key="key-0123456789", api_secret="secret-0123456789"):
+    return ExchangeAPIKey(id=key_id, user_id=user_id, **vault.seal_columns(user_id, api_key, api_secret))
+
+
+def test_seal_open_round_trip(old_vault):
+    sealed = old_vault.seal("secret-value", 7, "api_secret")
+    assert sealed.startswith(credentials.PREFIX) and "secret-value" not in sealed
+    assert old_vault.open(sealed, 7, "api_secret") == "secret-value"
+    # Every value gets its own data key and nonce
+    assert old_vault.seal("secret-value", 7, "api_secret") != sealed
+    # Plaintext from before encryption is returned as it is
+    assert old_vault.open("legacy-plaintext", 7, "api_key") == "legacy-plaintext"
+
+
+def test_value_moved_to_another_user_or_column_does_not_open(old_vault):
+    sealed = old_vault.seal("secret-value", 7, "api_secret")
+    with pytest.raises(CredentialError):
+        old_vault.open(sealed, 8, "api_secret")
+    with pytest.raises(CredentialError):
+        old_vault.open(sealed, 7, "api_key")
+
+
+def test_tampered_or_unknown_key_does_not_open(old_vault, rotated_vault):
+    sealed = rotated_vault.seal("secret-value", 7, "api_key")
+    prefix, ciphertext = sealed.rsplit(":", 1)
+    flipped = ciphertext[:-2] + ("A" if ciphertext[-2] != "A" else "B") + ciphertext[-1]
+    with pytest.raises(CredentialError):
+        rotated_vault.open(f"{prefix}:{flipped}", 7, "api_key")
+    # The old vault does not know the new master key
+    with pytest.raises(CredentialError, match="unknown master key"):
+        old_vault.open(sealed, 7, "api_key")
+
+
+def test_cache_entries_expire_after_ttl(old_vault):
+    clock = Clock()
+    vault = CredentialVault("old-master-key", cache_ttl=60, clock=clock)
+    vault._master_keys, vault.current_id = old_vault._keys(), old_vault.current_id
+    key = row(vault)
+    assert vault.credentials(key) == ("key-0123456789", "secret-0123456789")
+    vault.credentials(key)
+    assert vault.stats() == {"cached": 1, "hits": 1, "misses": 1}
+    clock.now += 61
+    vault.credentials(key)
+    assert vault.misses == 2
+    clock.now += 61
+    vault.purge()
+    assert not vault.cache
+
+
+def test_cache_evicts_oldest_beyond_its_size(old_vault):
+    vault = CredentialVault("old-master-key", cache_size=2)
+    vault._master_keys, vault.current_id = old_vault._keys(), old_vault.current_id
+    keys = [row(vault, key_id) for key_id in (1, 2, 3)]
+    for key in keys:
+        vault.credentials(key)
+    assert list(vault.cache) == [2, 3]
+
+
+def test_cache_never_serves_a_rotated_value(old_vault):
+    vault = CredentialVault("old-master-key")
+    vault._master_keys, vault.current_id = old_vault._keys(), old_vault.current_id
+    key = row(vault)
+    vault.credentials(key)
+    # Rotated in another worker: the row holds new values, the cached entry is not used
+    rotated = row(vault, api_key="rotated-key-0000", api_secret="rotated-secret")
+    key.api_key, key.api_secret = rotated.api_key, rotated.api_secret
+    assert vault.credentials(key) == ("rotated-key-0000", "rotated-secret")
+    assert vault.misses == 2
+
+
+def test_rotate_route_drops_cached_credentials(db_tables):
+    db = SessionLocal()
+    user = User(id=1, email="u@example.com", username="u", hashed_password="x")
+    db.add(user)
+    key = ExchangeAPIKey(user_id=1, exchange_name="binance",
+                         **credential_vault.seal_columns(1, "key-0123456789", "secret-0123456789"))
+    db.add(key)
+    db.commit()
+    credential_vault.credentials(key)
+    assert key.id in credential_vault.cache
+
+    rotation = ExchangeAPIKeyRotate(api_key="new-key-0123456789", api_secret="new-secret-0123456789")
+    asyncio.run(api_keys.rotate_api_key(key.id, rotation, user, db))
+    assert key.id not in credential_vault.cache
+    assert credential_vault.credentials(key) == ("new-key-0123456789", "new-secret-0123456789")
+
+    asyncio.run(api_keys.deactivate_api_key(key.id, user, db))
+    assert key.id not in credential_vault.cache
+    db.close()
+
+
+def test_rewrap_with_previous_master_key(old_vault, rotated_vault):
+    sealed = old_vault.seal("secret-value", 7, "api_secret")
+    # Still opens with the old key listed as previous
+    assert not rotated_vault.is_current(sealed)
+    assert rotated_vault.open(sealed, 7, "api_secret") == "secret-value"
+
+    rewrapped = rotated_vault.rewrap(sealed, 7, "api_secret")
+    assert rotated_vault.is_current(rewrapped)
+    # Only the data key is re-wrapped; the ciphertext stays
+    assert rewrapped.rsplit(":", 1)[1] == sealed.rsplit(":", 1)[1]
+    assert rotated_vault.open(rewrapped, 7, "api_secret") == "secret-value"
+    assert rotated_vault.rewrap(rewrapped, 7, "api_secret") == rewrapped
+    # The re-wrapped value no longer needs the old master key
+    new_only = CredentialVault("new-master-key")
+    new_only._master_keys = {rotated_vault.current_id: rotated_vault._keys()[rotated_vault.current_id]}
+    new_only.current_id = rotated_vault.current_id
+    assert new_only.open(rewrapped, 7, "api_secret") == "secret-value"
+    with pytest.raises(CredentialError):
+        new_only.open(sealed, 7, "api_secret")
+    # Plaintext values are sealed by the re-wrap
+    assert rotated_vault.open(rotated_vault.rewrap("legacy", 7, "api_key"), 7, "api_key") == "legacy"
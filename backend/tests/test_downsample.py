@@ -0,0 +1,73 @@
+"""Downsampled chart series keep the shape of the candles and are cached per request until a new candle closes."""
+
+import asyncio
+import numpy as np
+import pytest
+from app.services.candles import CandleStore, ChartHistory
+from app.services.downsample import lttb, minmax
+from benchmarks.bench_chart_history import MINUTE_MS, FakeExchange, reference_lttb
+
+
+@pytest.fixture(scope="module")
+def exchange():
+    return FakeExchange(days=7)
+
+
+def series(exchange, minutes):
+    y = exchange.close[:minutes]
+    x = exchange.start_ms + np.arange(len(y), dtype=np.int64) * MINUTE_MS
+    return x, y
+
+
+@pytest.mark.parametrize("minutes, threshold", [(5_000, 3), (5_000, 500), (10_007, 999), (1_000, 998)])
+def test_lttb_matches_reference(exchange, minutes, threshold):
+    x, y = series(exchange, minutes)
+    assert lttb(x, y, threshold).tolist() == reference_lttb(x.tolist(), y.tolist(), threshold)
+
+
+@pytest.mark.parametrize("method", [lttb, lambda x, y, points: minmax(y, points)], ids=["lttb", "minmax"])
+def test_kept_points_are_sorted_with_both_ends(exchange, method):
+    x, y = series(exchange, 10_000)
+    kept = method(x, y, 400)
+    assert len(kept) <= 400
+    assert kept[0] == 0 and kept[-1] == len(y) - 1
+    assert np.all(np.diff(kept) > 0)
+    # Nothing to drop when the budget covers every point
+    assert len(method(x[:300], y[:300], 400)) == 300
+
+
+def test_minmax_never_drops_a_spike(exchange):
+    _, y = series(exchange, 10_000)
+    y = y.copy()
+    y[4_321] = y.max() * 2
+    y[777] = y.min() / 2
+    kept = minmax(y, 100)
+    assert 4_321 in kept and 777 in kept
+
+
+def test_history_is_cached_until_the_next_candle():
+    exchange = FakeExchange(days=3)
+    history = ChartHistory(CandleStore(exchange.fetch_ohlcv, clock=exchange.clock))
+
+    async def scenario():
+        first = await history.get("BTC/USDT", 2 * 86400, 500, "lttb", "1m")
+        calls = exchange.calls
+        cached = await history.get("BTC/USDT", 2 * 86400, 500, "lttb", "1m")
+        other = await history.get("BTC/USDT", 2 * 86400, 200, "minmax", "1m")
+        cached_calls = exchange.calls - calls
+        exchange.now_ms += MINUTE_MS
+        refreshed = await history.get("BTC/USDT", 2 * 86400, 500, "lttb", "1m")
+        return first, cached, cached_calls, other, refreshed, exchange.calls - calls
+
+    first, cached, cached_calls, other, refreshed, refresh_calls = asyncio.run(scenario())
+    assert cached is first and cached_calls == 0 and refresh_calls == 1
+    assert first.source_points == 2 * 1440 and len(first.prices) == 500
+    assert len(other.prices) <= 200
+    assert refreshed is not first and refreshed.timestamps[-1] == first.timestamps[-1] + MINUTE_MS
+
+
+def test_timeframe_follows_range_and_points():
+    history = ChartHistory(CandleStore(FakeExchange(days=1).fetch_ohlcv), oversample=4)
+    assert history.pick_timeframe(90 * 86400, 1000) == "15m"
+    assert history.pick_timeframe(365 * 86400, 2000) == "1h"
+    assert history.pick_timeframe(3600, 1000) == "1m"
@@ -0,0 +1,136 @@
+"""Equity curves replay average-cost fills, resume from checkpoints and drop the ones a backdated fill invalidates."""
+
+import asyncio
+from datetime import timedelta
+import numpy as np
+import pytest
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app.models import EquitySnapshot, OrderSide, Trade, User
+from app.services.candles import TIMEFRAME_SECONDS, CandleStore
+from app.services.equity import (
+    EquityState, Fill, default_resolution, equity_curve, get_equity_curve, held_assets, replay_fills
+)
+from benchmarks.bench_equity import FakeMarket, make_fills, reference_point
+
+BUY, SELL = OrderSide.BUY, OrderSide.SELL
+FILLS = [
+    Fill(5, "BTC", BUY, 2.0, 100.0, 1.0),
+    Fill(12, "BTC", BUY, 2.0, 200.0, 0.0),
+    Fill(15, "ETH", BUY, 1.0, 10.0, 0.0),
+    Fill(31, "BTC", SELL, 1.0, 300.0, 1.0),
+]
+
+
+def test_replay_keeps_average_cost_positions():
+    replay = replay_fills(EquityState(), FILLS)
+    assert replay.end.positions == {"BTC": (3.0, 150.0), "ETH": (1.0, 10.0)}
+    assert replay.realized.tolist() == [0.0, 0.0, 0.0, 149.0]  # 1 * (300 - 150) less the sell fee
+    assert replay.end.last_prices == {"BTC": 300.0, "ETH": 10.0}
+    assert replay.checkpoints == []
+
+
+def test_checkpoints_follow_the_last_fill_before_each_boundary():
+    replay = replay_fills(EquityState(), FILLS, start_count=7, interval_ms=10)
+    assert [(boundary, count) for boundary, count, _ in replay.checkpoints] == [(10, 8), (20, 10), (40, 11)]
+    assert replay.checkpoints[1][2].positions == {"BTC": (4.0, 150.0), "ETH": (1.0, 10.0)}
+    # Boundaries still in the future are not checkpointed
+    replay = replay_fills(EquityState(), FILLS, interval_ms=10, now_ms=35)
+    assert [boundary for boundary, _, _ in replay.checkpoints] == [10, 20]
+
+
+def test_resumed_replay_matches_a_full_one():
+    full = replay_fills(EquityState(), FILLS, interval_ms=10)
+    boundary, count, state = full.checkpoints[0]
+    resumed = replay_fills(EquityState.from_json(state.to_json()), FILLS[count:])
+    assert resumed.end.positions == full.end.positions
+    assert resumed.end.realized == full.end.realized
+    grid = np.array([12, 14, 20, 40])
+    assert equity_curve(resumed, grid, {})["value"].tolist() == equity_curve(full, grid, {})["value"].tolist()
+
+
+def test_curve_marks_at_closes_then_fill_prices():
+    replay = replay_fills(EquityState(), FILLS)
+    closes = {"BTC": (np.array([20]), np.array([400.0]))}
+    points = equity_curve(replay, np.array([4, 5, 14, 40]), closes)
+    assert points["value"].tolist() == [0.0, 200.0, 800.0, 1210.0]
+    assert points["cost_basis"].tolist() == [0.0, 200.0, 600.0, 460.0]
+    assert points["realized_profit_loss"].tolist() == [0.0, 0.0, 0.0, 149.0]
+    assert points["profit_loss"].tolist() == [0.0, 0.0, 200.0, 899.0]
+
+
+def test_quote_currency_is_marked_at_one():
+    replay = replay_fills(EquityState(), [Fill(1, "USDT", BUY, 50.0, 0.99, 0.0)])
+    assert equity_curve(replay, np.array([2]), {})["value"].tolist() == [50.0]
+
+
+def test_held_assets():
+    replay = replay_fills(EquityState(), [
+        Fill(5, "BTC", BUY, 1.0, 100.0, 0.0),
+        Fill(12, "BTC", SELL, 1.0, 110.0, 0.0),
+        Fill(20, "ETH", BUY, 1.0, 10.0, 0.0),
+    ])
+    assert held_assets(replay, 0) == ["BTC", "ETH"]
+    assert held_assets(replay, 8) == ["BTC", "ETH"]
+    assert held_assets(replay, 15) == ["ETH"]
+
+
+def test_default_resolution_keeps_enough_points():
+    for days in (1, 7, 90, 365):
+        resolution = default_resolution(days * 86400)
+        assert days * 86400 // TIMEFRAME_SECONDS[resolution] >= 200
+
+
+@pytest.fixture()
+def market(db_tables):
+    market = FakeMarket(10)
+    rows = make_fills(market, 300, 10)
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.commit()
+    db.execute(insert(Trade), rows)
+    db.commit()
+    yield market, rows, db
+    db.close()
+
+
+def assert_matches_reference(curve, rows, market, step):
+    timestamps = curve.points["timestamp"].tolist()
+    for index in sorted({0, len(timestamps) // 2, len(timestamps) - 1}):
+        value, realized = reference_point(rows, market, timestamps[index], step)
+        assert curve.points["value"][index] == pytest.approx(value, abs=1e-6)
+        assert curve.points["realized_profit_loss"][index] == pytest.approx(realized, abs=1e-6)
+
+
+def test_requests_resume_from_checkpoints(market):
+    market, rows, db = market
+    store = CandleStore(market.fetch_ohlcv, clock=market.clock)
+    step = TIMEFRAME_SECONDS["1h"] * 1000
+
+    cold = asyncio.run(get_equity_curve(db, 1, store, 3 * 86400, "1h"))
+    assert cold.checkpoint_at is None and cold.replayed_fills == len(rows)
+    assert db.query(EquitySnapshot).count() > 0
+    assert_matches_reference(cold, rows, market, step)
+
+    warm = asyncio.run(get_equity_curve(db, 1, store, 3 * 86400, "1h"))
+    assert warm.checkpoint_at is not None and warm.replayed_fills < cold.replayed_fills
+    assert warm.points["value"].tolist() == pytest.approx(cold.points["value"].tolist(), abs=1e-6)
+
+    # A fill recorded behind the checkpoints, e.g. by journal recovery
+    late = dict(rows[len(rows) // 2])
+    late_time = late["executed_at"] + timedelta(seconds=1)
+    late.update(executed_at=late_time, created_at=late_time, order_side=BUY, quantity=0.5,
+                filled_quantity=0.5, fee=0.0)
+    db.execute(insert(Trade), [late])
+    db.commit()
+    rows = sorted(rows + [late], key=lambda row: row["executed_at"])
+    healed = asyncio.run(get_equity_curve(db, 1, store, 3 * 86400, "1h"))
+    assert healed.checkpoint_at is None or healed.checkpoint_at < late_time
+    assert_matches_reference(healed, rows, market, step)
+
+
+def test_too_many_points_is_rejected(market):
+    market, _, db = market
+    store = CandleStore(market.fetch_ohlcv, clock=market.clock)
+    with pytest.raises(ValueError):
+        asyncio.run(get_equity_curve(db, 1, store, 7 * 86400, "1m", max_points=1000))
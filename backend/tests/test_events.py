@@ -0,0 +1,78 @@
+"""Topic order and the overflow policies of the event bus."""
+
+import asyncio
+import pytest
+from app.services.events import BLOCK, COALESCE_LATEST, EventBus, OrderUpdate, SubscriptionClosed, Ticker
+
+
+def update(trade_id):
+    return OrderUpdate(trade_id, 1, None, "BTC/USDT", "buy", "market", "filled", 1.0, 1.0, 100.0)
+
+
+def ticker(symbol, last):
+    return Ticker(symbol, last, 1_700_000_000_000)
+
+
+async def drain(subscription, received, pause):
+    try:
+        while True:
+            received.extend(await subscription.get_batch(1))
+            await asyncio.sleep(pause)
+    except SubscriptionClosed:
+        pass
+
+
+def test_blocking_subscriber_keeps_order_with_several_producers():
+    async def scenario():
+        bus = EventBus()
+        slow = bus.subscribe("order_update", BLOCK, maxsize=2)
+        received = []
+        consumer = asyncio.create_task(drain(slow, received, 0.0005))
+
+        async def produce(offset):
+            for index in range(40):
+                await bus.publish("order_update", update(offset + index))
+                if index % 5 == 0:
+                    await asyncio.sleep(0)
+
+        await asyncio.gather(produce(0), produce(100), produce(200))
+        while slow.queue:
+            await asyncio.sleep(0.001)
+        slow.close()
+        await consumer
+        return received
+
+    received = asyncio.run(scenario())
+    assert [event.sequence for event in received] == list(range(1, 121))
+    # Each producer's own events arrive in the order it published them
+    for offset in (0, 100, 200):
+        mine = [event.data.trade_id for event in received if offset <= event.data.trade_id < offset + 100]
+        assert mine == list(range(offset, offset + 40))
+
+
+def test_drop_oldest_counts_what_it_drops():
+    async def scenario():
+        bus = EventBus()
+        subscription = bus.subscribe("order_update", maxsize=3)
+        await bus.publish_many("order_update", [update(index) for index in range(5)])
+        return subscription, await subscription.get_batch(10)
+
+    subscription, events = asyncio.run(scenario())
+    assert [event.data.trade_id for event in events] == [2, 3, 4]
+    assert subscription.dropped == 2
+
+
+def test_coalesce_latest_keeps_last_per_key():
+    async def scenario():
+        bus = EventBus()
+        subscription = bus.subscribe("ticker", COALESCE_LATEST)
+        await bus.publish_many("ticker", [ticker("BTC/USDT", 1.0), ticker("ETH/USDT", 2.0), ticker("BTC/USDT", 3.0)])
+        return await subscription.get_batch(10)
+
+    events = asyncio.run(scenario())
+    assert sorted((event.data.symbol, event.data.price) for event in events) == [("BTC/USDT", 3.0), ("ETH/USDT", 2.0)]
+
+
+def test_wrong_payload_is_rejected():
+    with pytest.raises(TypeError):
+        asyncio.run(EventBus().publish("fill", update(1)))
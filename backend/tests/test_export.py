@@ -0,0 +1,79 @@
+"""Trade exports stream one encoded block per database chunk, in every format."""
+
+import asyncio
+import csv
+import io
+from datetime import date, datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app.database import SessionLocal
+from app.models import OrderSide, OrderStatus, OrderType, Trade, User
+from app.routes.trading import export_trades
+from app.services import export
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture()
+def trades(db_tables):
+    """25 trades of user 1, one a day, and a few of user 2 in between."""
+    db = SessionLocal()
+    db.add_all([
+        User(id=1, email="a@example.com", username="a", hashed_password="x"),
+        User(id=2, email="b@example.com", username="b", hashed_password="x"),
+    ])
+    for index in range(28):
+        user_id = 2 if index % 9 == 4 else 1
+        db.add(Trade(user_id=user_id, exchange_name="binance", symbol="BTC/USDT", order_type=OrderType.LIMIT,
+                     order_side=OrderSide.BUY, order_status=OrderStatus.FILLED, price=100.0 + index,
+                     quantity=1.0, filled_quantity=1.0, average_price=100.0 + index, total_cost=100.0 + index,
+                     fee=0.1, created_at=START + timedelta(days=index), executed_at=START + timedelta(days=index)))
+    db.commit()
+    ids = [trade_id for trade_id, in db.query(Trade.id).filter(Trade.user_id == 1).order_by(Trade.id)]
+    db.close()
+    return ids
+
+
+def test_csv_has_one_block_per_chunk(trades):
+    blocks = list(export.stream_trades(1, "csv", chunk_size=10))
+    assert len(blocks) == 3
+    rows = list(csv.DictReader(io.StringIO(b"".join(blocks).decode())))
+    assert [int(row["id"]) for row in rows] == trades
+    assert rows[0]["order_side"] == "buy"
+    assert rows[0]["created_at"] == START.isoformat()
+
+
+def test_date_range_selects_creation_days(trades):
+    rows = list(csv.DictReader(io.StringIO(b"".join(
+        export.stream_trades(1, "csv", date(2024, 1, 3), date(2024, 1, 5))
+    ).decode())))
+    # Day 5 (2024-01-05) belongs to user 2
+    assert [row["created_at"][:10] for row in rows] == ["2024-01-03", "2024-01-04"]
+
+
+def test_no_trades_is_a_header(db_tables):
+    assert b"".join(export.stream_trades(1, "csv")).decode().strip() == ",".join(export.EXPORT_FIELDS)
+
+
+@pytest.mark.skipif(not export.columnar_available(), reason="pyarrow is not installed")
+def test_parquet_has_one_row_group_per_chunk(trades):
+    import pyarrow.parquet as pq
+    data = b"".join(export.stream_trades(1, "parquet", chunk_size=10))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == 3
+    assert parquet.read().column("id").to_pylist() == trades
+
+
+@pytest.mark.skipif(not export.columnar_available(), reason="pyarrow is not installed")
+def test_arrow_stream_has_one_batch_per_chunk(trades):
+    import pyarrow as pa
+    reader = pa.ipc.open_stream(b"".join(export.stream_trades(1, "arrow", chunk_size=10)))
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
+    assert pa.Table.from_batches(batches).column("id").to_pylist() == trades
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(export_trades("xlsx", None, None, User(id=1)))
+    assert error.value.status_code == 400
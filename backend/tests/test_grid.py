@@ -0,0 +1,175 @@
+"""Grids fill each crossed level once, replace it on the neighbouring level, and resume from their saved state."""
+
+import asyncio
+import json
+import math
+import pytest
+from app.database import SessionLocal
+from app.models import ExchangeAPIKey, GridState, OrderSide, Portfolio, Strategy, StrategyStatus, Trade, User
+from app.services.accounting import FeeSchedule, lot_book
+from app.services.events import EventBus
+from app.services.grid import Grid, GridBook, GridEngine, GridOrder, grid_levels, parse_grid
+from app.services.risk import RiskEngine
+
+SYMBOL = "BTC/USDT"
+FEES = FeeSchedule(maker=0.001, taker=0.002)
+BUY, SELL = OrderSide.BUY, OrderSide.SELL
+
+
+def grid(strategy_id=1, levels=(100.0, 110.0, 120.0, 130.0, 140.0), quantity=2.0):
+    return Grid(strategy_id, 1, SYMBOL, list(levels), quantity, fees=FEES)
+
+
+def test_levels():
+    assert grid_levels(100, 140, 5) == [100, 110, 120, 130, 140]
+    geometric = grid_levels(100, 400, 3, "geometric")
+    assert geometric[-1] == 400 and geometric[1] == pytest.approx(200)
+
+
+def test_start_buys_the_slots_above_the_price():
+    started = grid()
+    [fill] = started.start(125.0)
+    assert (fill.side, fill.level, fill.price, fill.quantity) == (BUY, None, 125.0, 2.0)
+    assert started.open_orders() == [
+        GridOrder(BUY, 0, 100.0), GridOrder(BUY, 1, 110.0), GridOrder(BUY, 2, 120.0), GridOrder(SELL, 4, 140.0)
+    ]
+    assert (started.buy_at, started.sell_at) == (120.0, 140.0)
+    assert grid().start(150.0) == []
+
+
+def test_crossed_levels_fill_in_price_order_and_are_replaced():
+    moving = grid()
+    moving.start(125.0)
+    fills = []
+    moving.move(105.0, fills)
+    assert [(fill.side, fill.price, fill.replacement) for fill in fills] == [
+        (BUY, 120.0, GridOrder(SELL, 3, 130.0)), (BUY, 110.0, GridOrder(SELL, 2, 120.0))
+    ]
+    assert (moving.buy_at, moving.sell_at) == (100.0, 120.0)
+
+    fills = []
+    moving.move(135.0, fills)
+    assert [(fill.side, fill.price, fill.replacement) for fill in fills] == [
+        (SELL, 120.0, GridOrder(BUY, 1, 110.0)), (SELL, 130.0, GridOrder(BUY, 2, 120.0))
+    ]
+    # Cycle profit is net of the maker fee on both legs
+    profits = [2.0 * (120.0 * 0.999 - 110.0 * 1.001), 2.0 * (130.0 * 0.999 - 120.0 * 1.001)]
+    assert [fill.profit for fill in fills] == pytest.approx(profits)
+    assert moving.realized == pytest.approx(sum(profits)) and (moving.cycles, moving.winning) == (2, 2)
+    assert moving.level_fills.tolist() == [0, 1, 2, 1, 0]
+
+    # Nothing rests between the levels either side of the price
+    fills = []
+    moving.move(128.0, fills)
+    assert fills == []
+
+
+def test_state_round_trip():
+    running = grid()
+    running.start(125.0)
+    running.move(105.0, [])
+    resumed = grid()
+    assert resumed.restore(json.loads(json.dumps(running.state())))
+    assert resumed.open_orders() == running.open_orders()
+    assert (resumed.buy_at, resumed.sell_at) == (running.buy_at, running.sell_at)
+    assert not grid(quantity=3.0).restore(running.state())
+
+
+def test_book_moves_only_the_grids_it_reaches():
+    book = GridBook()
+    near, far = grid(1, levels=(340.0, 345.0, 350.0, 355.0, 360.0)), grid(2, levels=(200.0, 300.0, 400.0))
+    far.start(350.0)
+    book.add(near)
+    book.add(far)
+    # An unstarted grid waits for the next price of its symbol
+    assert len(book) == 2 and list(book.grids) == [2]
+    assert [fill.strategy_id for fill in book.on_price(SYMBOL, 350.0)] == [1]
+    assert (far.buy_at, far.sell_at) == (300.0, math.inf)
+
+    assert [(fill.strategy_id, fill.price) for fill in book.on_price(SYMBOL, 343.0)] == [(1, 345.0)]
+    assert far.price == 350.0  # Its triggers were not reached, so it was never visited
+    assert [(fill.strategy_id, fill.price) for fill in book.on_price(SYMBOL, 299.0)] == [(1, 340.0), (2, 300.0)]
+    assert far.price == 299.0
+    assert book.remove(2) is far and book.remove(2) is None
+
+
+def test_range_fills_the_nearer_extreme_first():
+    book = GridBook()
+    book.add(grid())
+    book.on_price(SYMBOL, 125.0)
+    fills = book.on_price(SYMBOL, 118.0, 140.0)
+    assert [(fill.side, fill.price) for fill in fills] == [(BUY, 120.0), (SELL, 130.0), (SELL, 140.0)]
+
+
+@pytest.mark.parametrize("parameters, max_position_size", [
+    ({"symbol": SYMBOL, "lower_price": 100, "upper_price": 90, "quantity": 1}, None),
+    ({"symbol": SYMBOL, "lower_price": 90, "upper_price": 100, "quantity": 1, "levels": 1}, None),
+    ({"symbol": SYMBOL, "lower_price": 90, "upper_price": 100, "quantity": 1, "spacing": "log"}, None),
+    ({"symbol": SYMBOL, "lower_price": 90, "quantity": 1}, None),
+    ({"symbol": SYMBOL, "lower_price": 90, "upper_price": 100, "quantity": 1, "levels": 5}, 3.0),
+])
+def test_unrunnable_parameters(parameters, max_position_size):
+    strategy = Strategy(id=1, user_id=1, parameters=json.dumps(parameters), max_position_size=max_position_size)
+    assert parse_grid(strategy, max_levels=100) is None
+
+
+PARAMETERS = {"symbol": SYMBOL, "lower_price": 100, "upper_price": 140, "levels": 5, "quantity": 2}
+
+
+@pytest.fixture()
+def strategy(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Portfolio(user_id=1))
+    db.add(ExchangeAPIKey(user_id=1, exchange_name="binance", api_key="k", api_secret="s"))
+    db.add(Strategy(id=1, user_id=1, name="grid", strategy_type="grid", status=StrategyStatus.ACTIVE,
+                    parameters=json.dumps(PARAMETERS)))
+    db.commit()
+    db.close()
+    lot_book.positions = {}
+    yield
+    lot_book.positions = {}
+
+
+def engine():
+    grids = GridEngine(SessionLocal, RiskEngine(max_user_exposure=0, max_open_order_notional=0, max_daily_loss=0),
+                       clock=lambda: 1_700_000_000.0, bus=EventBus())
+    db = SessionLocal()
+    grids.load(db)
+    db.close()
+    return grids
+
+
+def test_engine_records_fills_and_resumes(strategy):
+    grids = engine()
+    assert grids.symbols() == {SYMBOL}
+    for price in (125.0, 105.0, 135.0):
+        asyncio.run(grids.on_price(SYMBOL, price))
+    running = grids.book.grids[1]
+
+    db = SessionLocal()
+    trades = db.query(Trade).order_by(Trade.id).all()
+    assert [(trade.order_side, trade.average_price) for trade in trades] == [
+        (BUY, 125.0), (BUY, 120.0), (BUY, 110.0), (SELL, 120.0), (SELL, 130.0)
+    ]
+    row = db.get(Strategy, 1)
+    assert (row.total_trades, row.winning_trades) == (5, 2)
+    assert row.total_profit_loss == pytest.approx(running.realized)
+    assert json.loads(db.get(GridState, 1).state)["cycles"] == 2
+    db.close()
+
+    # A restart picks up where the grid left off instead of buying in again
+    resumed = engine()
+    assert resumed.book.grids[1].open_orders() == running.open_orders()
+    assert asyncio.run(resumed.on_price(SYMBOL, 136.0)) == []
+
+
+def test_changed_parameters_open_the_grid_again(strategy):
+    grids = engine()
+    asyncio.run(grids.on_price(SYMBOL, 125.0))
+    db = SessionLocal()
+    db.get(Strategy, 1).parameters = json.dumps(dict(PARAMETERS, quantity=1))
+    db.commit()
+    grids.load(db)
+    db.close()
+    assert grids.book.grids == {} and 1 in grids.book.pending[SYMBOL]
@@ -0,0 +1,69 @@
+"""Streaming indicators give the batch values, also across a checkpoint/restore."""
+
+import json
+import pytest
+from app.services.indicators import STREAMING_BY_NAME, StreamingIndicator
+from benchmarks.bench_indicators import CASES, batch_series, mismatches, random_walk, restored, stream_series
+
+BARS = 100_000
+TOLERANCE = 1e-9
+
+
+def market_prices(bars: int = BARS):
+    """A long random walk with what real feeds have: a halt at a flat price, a crash and a recovery."""
+    prices = random_walk(bars)
+    halt, crash = bars // 4, bars // 2
+    prices[halt:halt + 500] = [prices[halt]] * 500
+    prices[crash:] = [price * 0.6 for price in prices[crash:]]
+    return prices
+
+
+@pytest.fixture(scope="module")
+def prices():
+    return market_prices()
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_streaming_matches_batch_across_restarts(prices, name, params):
+    # Restores during warm-up, in the flat stretch, right at the crash and on the last bar
+    restore_at = {1, 37, BARS // 4 + 10, BARS // 2, BARS - 1}
+    expected = batch_series(name, params, prices)
+    assert mismatches(expected, stream_series(name, params, prices, restore_at), TOLERANCE) == 0
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_restoring_every_bar_changes_nothing(name, params):
+    prices = market_prices(2_000)
+    assert stream_series(name, params, prices, range(len(prices))) == stream_series(name, params, prices)
+
+
+def leaves(state) -> int:
+    """Numbers held in a checkpoint."""
+    if isinstance(state, dict):
+        return sum(leaves(value) for value in state.values())
+    if isinstance(state, list):
+        return sum(leaves(value) for value in state)
+    return 1
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_state_does_not_grow_with_history(prices, name, params):
+    """Updates stay constant-time: the state is bounded by the period, however long the series runs."""
+    indicator = STREAMING_BY_NAME[name](*params)
+    bound = 16 + 4 * max(params)
+    for index, price in enumerate(prices):
+        indicator.update(price)
+        if index % 1_000 == 0 or index == BARS - 1:
+            assert leaves(indicator.checkpoint()) <= bound, f"bar {index}"
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_checkpoint_is_json_and_round_trips(name, params):
+    indicator = STREAMING_BY_NAME[name](*params)
+    for price in random_walk(100):
+        indicator.update(price)
+    state = json.loads(json.dumps(indicator.checkpoint()))
+    restored_indicator = StreamingIndicator.restore(state)
+    assert type(restored_indicator) is type(indicator)
+    assert restored_indicator.checkpoint() == state
+    assert restored(indicator).checkpoint() == state
@@ -0,0 +1,110 @@
+"""The trade journal recovers exactly the trades the database is missing, and never an aborted group."""
+
+import asyncio
+import os
+from datetime import datetime
+import pytest
+from app.database import SessionLocal
+from app.models import JournalCheckpoint, OrderSide, OrderStatus, OrderType, Portfolio, Trade, User
+from app.services.accounting import lot_book
+from app.services.journal import KIND_ABORT, KIND_TRADE, TradeJournal, encode_trade, format_line, read_journal
+
+
+def trade(index, user_id=1):
+    return Trade(user_id=user_id, exchange_name="binance", symbol="BTC/USDT", order_type=OrderType.MARKET,
+                 order_side=OrderSide.BUY, order_status=OrderStatus.FILLED, price=100.0 + index, quantity=1.0,
+                 filled_quantity=1.0, average_price=100.0 + index, total_cost=100.0 + index, fee=0.1,
+                 executed_at=datetime(2024, 1, 1, 0, index))
+
+
+@pytest.fixture()
+def account(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Portfolio(user_id=1))
+    db.commit()
+    db.close()
+    lot_book.positions = {}
+    yield
+    lot_book.positions = {}
+
+
+def stored_prices():
+    db = SessionLocal()
+    try:
+        return [trade.price for trade in db.query(Trade).order_by(Trade.id)]
+    finally:
+        db.close()
+
+
+def test_reading_stops_at_a_torn_or_corrupt_line(tmp_path):
+    path = str(tmp_path / "trades.journal")
+    intact = [format_line(sequence, {"kind": KIND_TRADE, "n": sequence}) for sequence in (1, 2)]
+    corrupt = format_line(3, {"kind": KIND_TRADE, "n": 3}).replace(b'"n":3', b'"n":4')
+    with open(path, "wb") as handle:
+        handle.write(b"".join(intact) + corrupt + format_line(4, {"kind": KIND_TRADE, "n": 4}))
+    assert [sequence for sequence, _ in read_journal(path)] == [1, 2]
+    with open(path, "wb") as handle:
+        handle.write(b"".join(intact) + intact[0][:9])
+    assert [sequence for sequence, _ in read_journal(path)] == [1, 2]
+
+
+def test_recovery_replays_past_the_checkpoint_and_skips_aborted_groups(account, tmp_path):
+    path = str(tmp_path / "trades.journal")
+    db = SessionLocal()
+    db.add(JournalCheckpoint(name="trades", last_sequence=1))
+    db.commit()
+    db.close()
+    lines = [
+        format_line(sequence, {"kind": KIND_TRADE, "trade": encode_trade(trade(sequence))})
+        for sequence in (1, 2, 3, 4)
+    ]
+    # Trade 4's group failed to commit; the torn tail is an interrupted write
+    lines += [format_line(5, {"kind": KIND_ABORT, "sequence": 4}), b"6 0000"]
+    with open(path, "wb") as handle:
+        handle.write(b"".join(lines))
+
+    journal = TradeJournal(path, SessionLocal)
+    assert journal.recover() == 2
+    assert stored_prices() == [102.0, 103.0]
+    assert journal.sequence == 5
+    assert os.path.getsize(path) == 0
+    assert TradeJournal(path, SessionLocal).recover() == 0
+    assert lot_book.positions[(1, "BTC")].quantity == 2.0
+
+
+def test_failed_group_is_aborted_and_never_replayed(account, tmp_path):
+    path = str(tmp_path / "trades.journal")
+    journal = TradeJournal(path, SessionLocal, group_size=8, group_delay_ms=0)
+    journal.open()
+    journal.commit_group([trade(1)])
+    with pytest.raises(Exception):
+        journal.commit_group([trade(2), trade(3, user_id=None)])
+    journal.commit_group([trade(4)])
+    os.close(journal.fd)
+    records = [record["kind"] for _, record in read_journal(path)]
+    assert records == [KIND_TRADE] * 3 + [KIND_ABORT] * 2 + [KIND_TRADE]
+
+    # A crash before the checkpoint moved would replay the good groups only
+    db = SessionLocal()
+    db.query(Trade).delete()
+    db.get(JournalCheckpoint, "trades").last_sequence = 0
+    db.commit()
+    db.close()
+    assert TradeJournal(path, SessionLocal).recover() == 2
+    assert stored_prices() == [101.0, 104.0]
+
+
+def test_concurrent_submits_share_group_commits(account, tmp_path):
+    journal = TradeJournal(str(tmp_path / "trades.journal"), SessionLocal, group_size=16, group_delay_ms=5)
+
+    async def scenario():
+        journal.start()
+        trades = await asyncio.gather(*(journal.submit(trade(index)) for index in range(40)))
+        await journal.stop()
+        return trades
+
+    trades = asyncio.run(scenario())
+    assert all(trade.id is not None for trade in trades)
+    assert journal.records == 40 and journal.groups <= 5
+    assert sorted(stored_prices()) == [100.0 + index for index in range(40)]
@@ -0,0 +1,44 @@
+"""Market GET routes only read prices; the price poller drives the price-driven services."""
+
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.routes import market
+from main import app
+
+
+class Exchange:
+    def fetch_tickers(self, symbols):
+        return {symbol: {"last": 100.0, "percentage": 1.0, "quoteVolume": 10.0} for symbol in symbols}
+
+    def fetch_ticker(self, symbol):
+        return self.fetch_tickers([symbol])[symbol]
+
+
+@pytest.fixture()
+def prices(db_tables, monkeypatch):
+    """Records every price passed to the monitors."""
+    seen = []
+
+    async def on_price(symbol, low, high=None):
+        seen.append(symbol)
+        return []
+
+    monkeypatch.setattr(market, "exchange", Exchange())
+    monkeypatch.setattr(market, "price_table", None)
+    for monitor in (market.alert_monitor, market.order_monitor, market.grid_engine):
+        monkeypatch.setattr(monitor, "on_price", on_price)
+    return seen
+
+
+def test_get_prices_has_no_side_effects(prices):
+    response = TestClient(app).get("/api/market/prices")
+    assert response.status_code == 200
+    assert [coin["current_price"] for coin in response.json()] == [100.0] * len(market.MAJOR_PAIRS)
+    assert prices == []
+
+
+def test_poller_drives_the_monitors(prices):
+    passed = asyncio.run(market.price_poller.poll())
+    assert passed == len(market.MAJOR_PAIRS)
+    assert sorted(prices) == sorted(market.MAJOR_PAIRS * 3)
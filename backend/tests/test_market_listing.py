@@ -0,0 +1,72 @@
+"""Listing pages from the precomputed orders match a from-scratch sort and filter."""
+
+import asyncio
+import pytest
+from app.services.market_listing import MarketListing, MarketSnapshot
+from benchmarks.bench_market_listing import QUERIES, naive_query, synthetic_tickers
+
+KEYS = {"volume": "volume_24h", "change": "price_change_percentage_24h", "price": "current_price", "symbol": "symbol"}
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return MarketSnapshot(synthetic_tickers(3_000))
+
+
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_query_matches_naive_sort(snapshot, name):
+    params = dict(prefix=None, min_volume=None, min_price=None, max_price=None,
+                  min_change=None, max_change=None, offset=0, limit=50)
+    params.update(QUERIES[name])
+    page = snapshot.query(**params)
+    total, expected = naive_query(snapshot.rows, **params)
+    key = KEYS[params["sort"]]
+    # Ties may be ordered differently; the sort keys must agree
+    assert page.total == total
+    assert [row[key] for row in page.rows] == [row[key] for row in expected]
+
+
+def test_only_priced_usdt_pairs_are_listed():
+    snapshot = MarketSnapshot({
+        "BTC/USDT": {"last": 100.0, "percentage": 1.0, "quoteVolume": 5.0},
+        "ETH/BTC": {"last": 0.05},
+        "NEW/USDT": {"last": None},
+        "SOL/USDT": {"last": 10.0, "percentage": None, "quoteVolume": None},
+    })
+    assert [row["symbol"] for row in snapshot.query(sort="symbol", descending=False).rows] == ["BTC", "SOL"]
+    assert snapshot.query(sort="symbol").rows[0]["volume_24h"] == 0.0
+
+
+def test_prefix_search_is_case_insensitive_and_bounded():
+    snapshot = MarketSnapshot({f"{base}/USDT": {"last": 1.0} for base in ("A", "AB", "ABC", "ABD", "AC", "B", "ZZ")})
+    assert sorted(snapshot.bases[index] for index in snapshot.prefix_rows("ab")) == ["AB", "ABC", "ABD"]
+    assert len(snapshot.prefix_rows("ZZZ")) == 0
+    assert snapshot.query(sort="symbol", descending=False, prefix="Z").total == 1
+
+
+def test_pages_cover_the_listing_once(snapshot):
+    seen = []
+    for offset in range(0, len(snapshot), 700):
+        seen += [row["symbol"] for row in snapshot.query(sort="price", offset=offset, limit=700).rows]
+    assert sorted(seen) == sorted(snapshot.bases)
+
+
+def test_stale_snapshot_is_served_while_one_refresh_runs():
+    calls = []
+
+    def source():
+        calls.append(len(calls))
+        return {"BTC/USDT": {"last": 100.0 + len(calls)}}
+
+    async def scenario():
+        listing = MarketListing(source, ttl=0)
+        first = await listing.get()
+        # Stale straight away: each get serves it and at most one rebuild is started
+        served = await asyncio.gather(*(listing.get() for _ in range(5)))
+        await listing._refresh
+        return first, served, listing.snapshot, len(calls)
+
+    first, served, latest, fetches = asyncio.run(scenario())
+    assert all(snapshot is first for snapshot in served)
+    assert fetches == 2
+    assert latest.price.tolist() == [102.0]
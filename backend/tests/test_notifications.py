@@ -0,0 +1,64 @@
+"""Notification streams authenticate browsers with single-use tickets, never a JWT in the URL."""
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.middleware import get_stream_user, hash_ticket, issue_stream_ticket
+from app.models import StreamTicket, User
+from app.routes import notifications
+
+
+@pytest.fixture()
+def user(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.commit()
+    yield db.get(User, 1)
+    db.close()
+
+
+def stream_user(token=None, ticket=None):
+    return asyncio.run(get_stream_user(token, ticket))
+
+
+def test_ticket_opens_one_stream(user):
+    db = SessionLocal()
+    issued = asyncio.run(notifications.create_stream_ticket(user, db))
+    db.close()
+    assert stream_user(ticket=issued["ticket"]).id == 1
+    with pytest.raises(HTTPException) as error:
+        stream_user(ticket=issued["ticket"])
+    assert error.value.status_code == 401
+
+
+def test_expired_ticket_is_rejected_and_purged(user):
+    db = SessionLocal()
+    ticket = issue_stream_ticket(1, db)
+    db.query(StreamTicket).update({StreamTicket.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    with pytest.raises(HTTPException):
+        stream_user(ticket=ticket)
+    # The next issue clears tickets nobody redeemed in time
+    fresh = issue_stream_ticket(1, db)
+    assert [row.ticket_hash for row in db.query(StreamTicket)] == [hash_ticket(fresh)]
+    db.close()
+
+
+def test_only_the_hash_is_stored(user):
+    db = SessionLocal()
+    ticket = issue_stream_ticket(1, db)
+    assert db.query(StreamTicket).one().ticket_hash != ticket
+    db.close()
+
+
+def test_jwt_is_accepted_in_the_header_only(user):
+    token = create_access_token({"sub": "u@example.com"})
+    assert stream_user(token=token).id == 1
+    # A JWT passed where a ticket belongs is not a ticket
+    with pytest.raises(HTTPException):
+        stream_user(ticket=token)
+    with pytest.raises(HTTPException):
+        stream_user()
@@ -0,0 +1,79 @@
+"""Diff buffering while out of sync is bounded, and the depth stream feeds and resyncs books."""
+
+import asyncio
+import json
+import websockets
+from app.services.orderbook import BinanceDepthFeed, BookDiff, OrderBookManager
+
+SYMBOL = "BTC/USDT"
+
+
+def diff(first, last, bids=(), asks=()):
+    return BookDiff(SYMBOL, first, last, list(bids), list(asks))
+
+
+def test_pending_diffs_are_capped():
+    manager = OrderBookManager(lambda symbol, limit: {}, max_pending=10)
+    for update_id in range(1, 26):
+        assert not manager.apply(diff(update_id, update_id))
+    assert manager.overflows == 2
+    assert [d.first_id for d in manager.pending[SYMBOL]] == list(range(21, 26))
+
+
+def test_failed_snapshot_does_not_stop_the_feed():
+    snapshots = [OSError("exchange down"), {"bids": [(99.0, 1.0)], "asks": [(101.0, 1.0)], "nonce": 10}]
+
+    def fetch(symbol, limit):
+        snapshot = snapshots.pop(0)
+        if isinstance(snapshot, Exception):
+            raise snapshot
+        return snapshot
+
+    async def feed():
+        for update_id in range(9, 14):
+            yield diff(update_id, update_id, bids=[(99.0, float(update_id))])
+
+    manager = OrderBookManager(fetch)
+    asyncio.run(manager.run_feed(feed()))
+    book = manager.books[SYMBOL]
+    assert book.synced and book.last_update_id == 13
+    assert book.view(1)["bids"] == [(99.0, 13.0)]
+
+
+def test_depth_stream_feeds_the_book_across_reconnects():
+    messages = [
+        # First connection: straddles the snapshot, then drops after update 12
+        [{"U": 9, "u": 11, "b": [["99.0", "2.0"]], "a": []}, {"U": 12, "u": 12, "b": [], "a": [["101.0", "3.0"]]}],
+        # Second connection: 13-14 were missed while disconnected
+        [{"U": 15, "u": 16, "b": [["98.0", "1.0"]], "a": []}, {"U": 17, "u": 17, "b": [["99.0", "0"]], "a": []}],
+    ]
+    snapshots = [
+        {"bids": [(99.0, 1.0)], "asks": [(101.0, 1.0)], "nonce": 10},
+        {"bids": [(99.0, 2.0), (98.5, 1.0)], "asks": [(101.0, 3.0)], "nonce": 15},
+    ]
+    paths = []
+
+    async def serve(connection):
+        paths.append(connection.path)
+        for message in messages.pop(0):
+            await connection.send(json.dumps(message))
+
+    async def run():
+        async with websockets.serve(serve, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            manager = OrderBookManager(lambda symbol, limit: snapshots.pop(0))
+            manager.attach_feed(SYMBOL, BinanceDepthFeed(SYMBOL, f"ws://127.0.0.1:{port}", reconnect_delay=0.01))
+            for _ in range(500):
+                book = manager.books.get(SYMBOL)
+                if book is not None and book.last_update_id == 17:
+                    break
+                await asyncio.sleep(0.01)
+            await manager.stop()
+            return manager
+
+    manager = asyncio.run(run())
+    book = manager.books[SYMBOL]
+    assert paths == ["/btcusdt@depth@100ms"] * 2
+    assert manager.resyncs == 2 and not manager.fed
+    assert book.view(5)["bids"] == [(98.5, 1.0), (98.0, 1.0)]
+    assert book.view(5)["asks"] == [(101.0, 3.0)]
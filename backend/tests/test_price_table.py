@@ -0,0 +1,113 @@
+"""Workers read the writer's shared price table without locks and never see a torn or stale ticker."""
+
+import multiprocessing
+import os
+import struct
+import time
+import pytest
+from app.services.price_table import (
+    HEARTBEAT_OFFSET, SEQUENCE, SEQUENCE_OFFSET, SLOT_SIZE, PriceTable, PriceTableReader
+)
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+NAME = f"test_prices_{os.getpid()}"
+
+
+@pytest.fixture()
+def table():
+    table = PriceTable.create(NAME, SYMBOLS)
+    yield table
+    table.close()
+
+
+def write_forever(name, stop):
+    """Every slot gets last == percentage == quote volume == timestamp, rising."""
+    table = PriceTable.attach(name)
+    value = 0
+    while not stop.is_set():
+        value += 1
+        for symbol in SYMBOLS:
+            table.write(symbol, value, value, value, value)
+    table.close()
+
+
+def test_readers_see_what_the_writer_stored(table):
+    reader = PriceTable.attach(NAME)
+    assert reader.symbols == SYMBOLS and reader.writer_pid == os.getpid()
+    assert reader.read("BTC/USDT") is None  # Never written
+    assert table.write_tickers({
+        "BTC/USDT": {"last": 100.5, "percentage": -1.5, "quoteVolume": 2e6, "timestamp": 1_700_000_000_000},
+        "ETH/USDT": {"last": 10.0},
+        "SOL/USDT": {"last": None},
+        "XRP/USDT": {"last": 1.0},  # No slot
+    }) == 2
+    assert reader.read("BTC/USDT").as_ccxt() == {
+        "symbol": "BTC/USDT", "last": 100.5, "percentage": -1.5, "quoteVolume": 2e6, "timestamp": 1_700_000_000_000
+    }
+    eth = reader.read("ETH/USDT")
+    assert (eth.percentage, eth.quote_volume, eth.timestamp) == (None, None, None)
+    assert set(reader.read_many(SYMBOLS + ["XRP/USDT"])) == {"BTC/USDT", "ETH/USDT"}
+    assert reader.heartbeat == pytest.approx(time.time(), abs=5)
+    reader.close()
+
+
+def test_slots_do_not_share_cache_lines(table):
+    offsets = sorted(table.offsets.values())
+    assert all(later - earlier == SLOT_SIZE for earlier, later in zip(offsets, offsets[1:]))
+    assert SLOT_SIZE % 64 == 0 and offsets[0] % 64 == 0
+
+
+def test_read_during_a_write_is_retried_not_torn(table):
+    table.write("BTC/USDT", 100.0)
+    sequence_at = table.offsets["BTC/USDT"] + SEQUENCE_OFFSET
+    sequence = SEQUENCE.unpack_from(table.buffer, sequence_at)[0]
+    # A writer stopped halfway: odd sequence, values half stored
+    SEQUENCE.pack_into(table.buffer, sequence_at, sequence + 1)
+    struct.pack_into("<d", table.buffer, sequence_at + SEQUENCE.size, 101.0)
+    assert table.read("BTC/USDT") is None
+    SEQUENCE.pack_into(table.buffer, sequence_at, sequence + 2)
+    assert table.read("BTC/USDT").last == 101.0
+
+
+def test_concurrent_writer_never_tears_a_read(table):
+    context = multiprocessing.get_context("spawn")  # Nothing inherited: the writer maps the segment by name
+    stop = context.Event()
+    writer = context.Process(target=write_forever, args=(NAME, stop))
+    writer.start()
+    latest = dict.fromkeys(SYMBOLS, 0.0)
+    reads = torn = backwards = 0
+    try:
+        deadline = time.monotonic() + 30
+        while reads < 200_000 and time.monotonic() < deadline:
+            for symbol in SYMBOLS:
+                ticker = table.read(symbol)
+                if ticker is None:
+                    continue
+                reads += 1
+                torn += not ticker.last == ticker.percentage == ticker.quote_volume == ticker.timestamp
+                backwards += ticker.last < latest[symbol]
+                latest[symbol] = ticker.last
+    finally:
+        stop.set()
+        writer.join(30)
+    assert reads > 0 and min(latest.values()) > 1
+    assert torn == 0 and backwards == 0
+
+
+def test_reader_ignores_a_stale_table_and_reattaches(table):
+    assert PriceTableReader(f"{NAME}_missing", max_age=60).tickers(SYMBOLS) is None
+    reader = PriceTableReader(NAME, max_age=0.5, retry_seconds=0)
+    table.write_tickers({symbol: {"last": 1.0} for symbol in SYMBOLS[:2]})
+    assert reader.tickers(SYMBOLS) is None  # SOL/USDT was never written
+    assert reader.tickers(SYMBOLS[:2])["ETH/USDT"]["last"] == 1.0
+
+    struct.pack_into("<d", table.buffer, HEARTBEAT_OFFSET, time.time() - 1)
+    assert reader.tickers(SYMBOLS[:2]) is None and reader.table is None
+
+    # A restarted writer replaces the segment; the reader maps the new one
+    table.close()
+    restarted = PriceTable.create(NAME, SYMBOLS)
+    restarted.write_tickers({symbol: {"last": 2.0} for symbol in SYMBOLS})
+    assert reader.tickers(SYMBOLS)["BTC/USDT"]["last"] == 2.0
+    reader.close()
+    restarted.close()
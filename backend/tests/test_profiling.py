@@ -0,0 +1,105 @@
+"""Only admins can profile a request, sampled routes are profiled once every N requests, and profiles are stored by id."""
+
+import asyncio
+import marshal
+import pytest
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.models import User, UserRole
+from app.services.profiling import ProfileStore, ProfilingMiddleware, requested_mode
+
+
+async def endpoint(scope, receive, send):
+    sum(range(10_000))
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def request(app, path="/api/health", query=b"", headers=()):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": list(headers)}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, None, send))
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+
+def bearer(email):
+    return (b"authorization", f"Bearer {create_access_token({'sub': email})}".encode())
+
+
+@pytest.fixture()
+def users(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="admin@example.com", username="admin", hashed_password="x", role=UserRole.ADMIN))
+    db.add(User(id=2, email="u@example.com", username="u", hashed_password="x"))
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize("headers, query, mode", [
+    ([], b"", None),
+    ([(b"x-profile", b"cprofile")], b"", "cprofile"),
+    ([(b"x-profile", b"1")], b"", "sample"),
+    ([(b"x-profile", b"off")], b"profile=cprofile", None),  # The header wins
+    ([], b"range=30d&profile=CProfile", "cprofile"),
+    ([], b"profile=0", None),
+    ([], b"unprofiled=1", None),
+])
+def test_requested_mode(headers, query, mode):
+    assert requested_mode({"headers": headers, "query_string": query}) == mode
+
+
+def test_unflagged_requests_pass_through(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    status, headers = request(ProfilingMiddleware(endpoint, store))
+    assert status == 200 and b"x-profile-id" not in headers
+    assert store.ids() == []
+
+
+def test_only_admins_can_profile(users, tmp_path):
+    app = ProfilingMiddleware(endpoint, ProfileStore(str(tmp_path)))
+    assert request(app, query=b"profile=1")[0] == 401
+    assert request(app, query=b"profile=1", headers=[bearer("u@example.com")])[0] == 403
+    status, headers = request(app, query=b"profile=1", headers=[bearer("admin@example.com")])
+    assert status == 200 and b"x-profile-id" in headers
+
+
+def test_cprofile_run_is_stored_by_id(users, tmp_path):
+    store = ProfileStore(str(tmp_path))
+    app = ProfilingMiddleware(endpoint, store)
+    _, headers = request(app, headers=[bearer("admin@example.com"), (b"x-profile", b"cprofile")])
+    profile_id = headers[b"x-profile-id"].decode()
+    [meta] = store.list()
+    assert meta["id"] == profile_id and meta["mode"] == "cprofile" and meta["trigger"] == "admin"
+    assert meta["status"] == 200 and meta["formats"] == ["pstats", "text"]
+    with open(store.path(profile_id, "pstats"), "rb") as f:
+        assert any(function[2] == "endpoint" for function in marshal.load(f))
+    assert store.path(profile_id, "folded") is None
+    assert store.path("../" + profile_id, "text") is None
+
+
+def test_sampled_route_is_profiled_once_every_n(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    app = ProfilingMiddleware(endpoint, store, {"/api/market/prices/{symbol}": 5}, interval=0.0005)
+    for index in range(20):
+        request(app, f"/api/market/prices/coin{index}")
+        request(app, "/api/health")
+    profiles = store.list()
+    assert len(profiles) == 4
+    assert {profile["trigger"] for profile in profiles} == {"1 in 5 of /api/market/prices/{symbol}"}
+    assert all(profile["formats"] == ["folded"] for profile in profiles)
+
+
+def test_store_keeps_the_newest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_profiles=3)
+    ids = []
+    for index in range(5):
+        ids.append(store.new_id())
+        store.save(ids[-1], {"n": index}, {"folded": b"main;work 1\n"})
+    assert store.ids() == sorted(ids, reverse=True)[:3]
+    assert [profile["n"] for profile in store.list()] == [4, 3, 2]
+    assert len(list(tmp_path.iterdir())) == 6
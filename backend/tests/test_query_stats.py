@@ -0,0 +1,108 @@
+"""Statements are counted per request and route, and a SELECT repeated within one request is flagged as a possible N+1."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import selectinload, sessionmaker
+from app.config import settings
+from app.database import SessionLocal, create_app_engine
+from app.models import OrderSide, OrderStatus, OrderType, Strategy, Trade, User
+from app.services.query_stats import QueryMetrics, QueryStatsMiddleware, RequestQueries, instrument, statement_shape
+
+ROWS = 8
+
+
+@pytest.fixture()
+def stats(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    for index in range(ROWS):
+        db.add(Strategy(id=index + 1, user_id=1, name=f"s{index}", strategy_type="grid"))
+        db.add(Trade(user_id=1, strategy_id=index + 1, exchange_name="binance", symbol="BTC/USDT",
+                     order_type=OrderType.MARKET, order_side=OrderSide.BUY, order_status=OrderStatus.FILLED,
+                     quantity=1.0, filled_quantity=1.0, average_price=100.0))
+    db.commit()
+    db.close()
+
+    # A separately instrumented engine, so the app's shared metrics are left alone
+    metrics = QueryMetrics(slow_ms=100.0, repeat_threshold=5)
+    engine = create_app_engine(settings.database_url)
+    instrument(engine, metrics)
+    session = sessionmaker(bind=engine)
+    app = FastAPI()
+
+    @app.get("/trades/{mode}")
+    def strategy_names(mode: str):
+        db = session()
+        try:
+            query = db.query(Trade)
+            if mode == "eager":
+                query = query.options(selectinload(Trade.strategy))
+            return [trade.strategy.name for trade in query.all()]
+        finally:
+            db.close()
+
+    yield metrics, session, TestClient(QueryStatsMiddleware(app, metrics, headers=True))
+    engine.dispose()
+
+
+@pytest.mark.parametrize("statement, shape", [
+    ("SELECT a FROM t WHERE id = ?", "SELECT a FROM t WHERE id = ?"),
+    ("SELECT a FROM t WHERE id = %(id_1)s", "SELECT a FROM t WHERE id = ?"),
+    ("SELECT a FROM t WHERE id = $1", "SELECT a FROM t WHERE id = ?"),
+    ("SELECT a\n  FROM t WHERE id IN (?, ?,?)", "SELECT a FROM t WHERE id IN (?)"),
+])
+def test_statement_shape(statement, shape):
+    assert statement_shape(statement) == shape
+
+
+def test_only_selects_count_as_repeated():
+    queries = RequestQueries()
+    for index in range(5):
+        queries.statements[f"SELECT * FROM t WHERE id IN ({', '.join('?' * (index + 2))})"] += 1
+        queries.statements["UPDATE t SET x = ?"] += 1
+    assert queries.repeated(5) == {"SELECT * FROM t WHERE id IN (?)": 5}
+    assert queries.repeated(6) == {}
+
+
+def test_lazy_loads_are_flagged_and_eager_loads_are_not(stats):
+    metrics, _, client = stats
+    lazy = client.get("/trades/lazy")
+    eager = client.get("/trades/eager")
+    assert lazy.json() == eager.json() == [f"s{index}" for index in range(ROWS)]
+    assert lazy.headers["x-db-query-count"] == str(ROWS + 1)
+    assert lazy.headers["x-db-repeated-statements"] == "1"
+    assert eager.headers["x-db-query-count"] == "2"
+    assert eager.headers["x-db-repeated-statements"] == "0"
+
+    routes = metrics.snapshot()["routes"]
+    assert routes["GET /trades/{mode}"]["requests"] == 2
+    assert routes["GET /trades/{mode}"]["queries"] == ROWS + 3
+    assert routes["GET /trades/{mode}"]["max_queries"] == ROWS + 1
+    assert routes["GET /trades/{mode}"]["repeated_requests"] == 1
+    [repeated] = metrics.snapshot()["repeated_statements"]
+    assert repeated["route"] == "GET /trades/{mode}" and "FROM strategies" in repeated["shape"]
+    assert 'sql_repeated_statement_requests_total{route="GET /trades/{mode}"} 1' in metrics.prometheus()
+
+
+def test_statements_outside_requests_are_background(stats):
+    metrics, session, client = stats
+    db = session()
+    db.execute(text("SELECT 1")).scalar()
+    db.close()
+    assert metrics.background.queries == 1 and metrics.routes == {}
+    assert 'sql_queries_total{route="background"} 1' in metrics.prometheus()
+    assert client.get("/missing").status_code == 404
+    assert metrics.routes["GET unmatched"].queries == 0
+
+
+def test_slow_statements_are_kept_with_their_route():
+    metrics = QueryMetrics(slow_ms=50.0, keep=2)
+    queries = RequestQueries()
+    queries.count, queries.slow = 3, [(0.06, "SELECT pg_sleep(?)"), (0.2, "SELECT pg_sleep(?)")]
+    metrics.finish("GET /slow", queries)
+    metrics.record("VACUUM", 0.5)
+    assert metrics.routes["GET /slow"].slow_queries == 2 and metrics.background.slow_queries == 1
+    # Only the newest statements are kept
+    assert [(item["route"], item["ms"]) for item in metrics.slow] == [("GET /slow", 200.0), (None, 500.0)]
@@ -0,0 +1,76 @@
+"""Consolidated quotes take the best fresh bid and ask across venues and never wait on a slow venue."""
+
+import asyncio
+import time
+import pytest
+from app.services.quotes import QuoteAggregator, QuoteTable, normalize_symbol
+
+
+@pytest.mark.parametrize("symbol, normalized", [
+    ("btc", "BTC/USDT"),
+    ("BTC-USDT", "BTC/USDT"),
+    ("btc_usdt", "BTC/USDT"),
+    ("BTCUSDT", "BTC/USDT"),
+    ("XBT/USD", "BTC/USD"),
+    ("ETHBTC", "ETH/BTC"),
+    ("BTC/USDT:USDT", "BTC/USDT"),
+])
+def test_normalize_symbol(symbol, normalized):
+    assert normalize_symbol(symbol) == normalized
+
+
+def test_best_bid_and_ask_come_from_fresh_venues():
+    now = [1000.0]
+    table = QuoteTable(max_age=10, clock=lambda: now[0])
+    table.update("BTC/USDT", "kraken", {"bid": 101.0, "ask": 101.5, "last": 101.2})
+    now[0] += 5
+    table.update("BTC/USDT", "binance", {"bid": 100.0, "ask": 100.2, "last": 100.1})
+    table.update("BTC/USDT", "coinbase", {"bid": 100.1, "ask": None, "last": 100.0})
+    quote = table.consolidated("BTC/USDT")
+    assert (quote.best_bid, quote.best_bid_venue, quote.best_ask, quote.best_ask_venue) == (
+        101.0, "kraken", 100.2, "binance"
+    )
+    now[0] += 6  # kraken ages out
+    quote = table.consolidated("BTC/USDT")
+    assert (quote.best_bid_venue, {venue.venue for venue in quote.venues}) == ("coinbase", {"binance", "coinbase"})
+    now[0] += 10
+    assert table.consolidated("BTC/USDT") is None and table.consolidated("ETH/USDT") is None
+
+
+def venue(bid, delay=0.0, fail=False):
+    async def fetch(symbols):
+        await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("venue down")
+        return {symbol.replace("/", "-"): {"bid": bid, "ask": bid + 1, "last": bid} for symbol in symbols}
+    return fetch
+
+
+def test_cold_request_waits_for_the_first_venue_only():
+    aggregator = QuoteAggregator({
+        "fast": venue(100.0),
+        "slow": venue(105.0, delay=0.5),
+        "stuck": venue(110.0, delay=60),
+        "down": venue(0, fail=True),
+    }, timeout=1.0)
+
+    async def scenario():
+        started = time.perf_counter()
+        first = await aggregator.quotes(["BTC/USDT"])
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(1.2)  # The slow venue fills in behind it; the stuck one times out
+        later = await aggregator.quotes(["BTC/USDT"])
+        await aggregator.stop()
+        return first, elapsed, later
+
+    first, elapsed, later = asyncio.run(scenario())
+    assert elapsed < 0.4
+    assert first["BTC/USDT"].best_bid_venue == "fast"
+    assert later["BTC/USDT"].best_bid_venue == "slow" and later["BTC/USDT"].best_ask_venue == "fast"
+    assert aggregator.watched == {"BTC/USDT"}
+    assert aggregator.stats["stuck"].timeouts == 1 and aggregator.stats["down"].errors == 1
+
+
+def test_every_venue_failing_returns_no_quote():
+    aggregator = QuoteAggregator({"down": venue(0, fail=True), "stuck": venue(1.0, delay=60)}, timeout=0.05)
+    assert asyncio.run(aggregator.quotes(["ETH/USDT"])) == {"ETH/USDT": None}
@@ -0,0 +1,87 @@
+"""Risk state rebuilds keep what changed in memory while they read the database."""
+
+import asyncio
+import threading
+from datetime import datetime
+import pytest
+from app.database import SessionLocal
+from app.models import OrderSide, OrderStatus, OrderType, Portfolio, PortfolioHolding, Trade, User
+from app.services.risk import RiskEngine
+
+NOW = datetime(2024, 1, 2, 12, 0)
+
+
+@pytest.fixture()
+def account(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Portfolio(id=1, user_id=1))
+    db.add(PortfolioHolding(portfolio_id=1, symbol="BTC", quantity=2.0, average_buy_price=100.0))
+    db.add(Trade(id=1, user_id=1, exchange_name="binance", symbol="BTC/USDT", order_type=OrderType.LIMIT,
+                 order_side=OrderSide.BUY, order_status=OrderStatus.PENDING, price=90.0, quantity=1.0))
+    db.commit()
+    db.close()
+
+
+def engine():
+    return RiskEngine(max_user_exposure=0, max_open_order_notional=0, max_daily_loss=0,
+                      clock=lambda: NOW.timestamp())
+
+
+def fill(trade_id, side, quantity, price):
+    return Trade(id=trade_id, user_id=1, symbol="BTC/USDT", order_side=side, order_status=OrderStatus.FILLED,
+                 quantity=quantity, filled_quantity=quantity, average_price=price, fee=0.0, executed_at=NOW)
+
+
+def test_reconcile_loads_database_state(account):
+    risk = engine()
+    db = SessionLocal()
+    risk.reconcile(db)
+    db.close()
+    assert risk.holdings == {1: {"BTC": [2.0, 100.0]}}
+    assert risk.open_notional == {1: 90.0}
+
+
+def test_reconcile_keeps_reservations_of_unstored_orders(account):
+    risk = engine()
+    risk.reserve(("journal", 7), 1, "BTC/USDT", OrderSide.BUY, 1.0, 50.0)
+    risk.reserve(99, 1, "BTC/USDT", OrderSide.BUY, 1.0, 10.0)
+    db = SessionLocal()
+    risk.reconcile(db)
+    db.close()
+    assert set(risk.open_orders) == {1, ("journal", 7), 99}
+    assert risk.open_notional == {1: 150.0}
+
+
+def test_refresh_reads_in_a_thread_and_keeps_concurrent_changes(account):
+    risk = engine()
+    db = SessionLocal()
+    risk.reconcile(db)
+    db.close()
+    reading, resume = threading.Event(), threading.Event()
+    read = risk._read_new_session
+
+    def slow_read(chunk_size):
+        reading.set()
+        resume.wait(5)
+        return read(chunk_size)
+
+    risk._read_new_session = slow_read
+
+    async def scenario():
+        task = asyncio.create_task(risk.refresh())
+        while not reading.is_set():
+            await asyncio.sleep(0.001)
+        # The loop keeps running while the database is read; these land mid-rebuild
+        risk.on_fill(fill(5, OrderSide.SELL, 0.5, 120.0))
+        risk.release(1)
+        risk.reserve(("batch", 0), 1, "BTC/USDT", OrderSide.BUY, 1.0, 30.0)
+        resume.set()
+        return await task
+
+    drift = asyncio.run(scenario())
+    assert risk.holdings[1]["BTC"] == [1.5, 100.0]
+    assert risk.daily_pnl[(1, NOW.date().toordinal())] == pytest.approx(10.0)
+    assert set(risk.open_orders) == {("batch", 0)}
+    assert risk.open_notional[1] == 30.0
+    assert max(drift.values()) == 0.0
@@ -0,0 +1,215 @@
+"""
+Strategy indicators are streamed, saved after each bar and resumed after a restart;
+evaluations are time-limited and isolated from each other.
+"""
+
+import asyncio
+import json
+import math
+import time
+import pytest
+from app.database import SessionLocal
+from app.models import IndicatorState, OrderSide, Strategy, StrategyStatus, User
+from app.services.indicators import rsi, sma
+from app.services.risk import RiskEngine
+from app.services.strategies import EVALUATORS, IndicatorSpec
+from app.services.strategy_scheduler import BarReport, ScheduledStrategy, StrategyScheduler
+
+TIMEFRAME = "1h"
+STEP = 3600
+START = 1_700_000_000 // STEP * STEP
+SPECS = [IndicatorSpec("sma", (5,)), IndicatorSpec("rsi", (3,)), IndicatorSpec("macd", (3, 6, 2))]
+
+
+def price(open_ms: int) -> float:
+    return 100 + 10 * math.sin(open_ms / 1000 / STEP / 3)
+
+
+class CandleSource:
+    """Candles up to the bar being run (plus the one still forming); records each fetch limit."""
+
+    def __init__(self):
+        self.bar_close = START
+        self.limits = []
+
+    async def fetch(self, symbol, timeframe, limit):
+        self.limits.append(limit)
+        last_open = self.bar_close * 1000  # Still forming
+        return [
+            [open_ms, price(open_ms), price(open_ms), price(open_ms), price(open_ms), 1.0]
+            for open_ms in range(last_open - (limit - 1) * STEP * 1000, last_open + 1, STEP * 1000)
+        ]
+
+
+class Recording:
+    """Records the last two values of every indicator it sees."""
+
+    def __init__(self):
+        self.seen = []
+        self.closes = []
+
+    def lookback(self, params):
+        return 30
+
+    def indicators(self, params):
+        return SPECS
+
+    def evaluate(self, params, series, closes):
+        self.seen.append({spec: series(spec) for spec in SPECS})
+        self.closes.append(list(closes))
+        return None
+
+
+@pytest.fixture()
+def recording(db_tables, monkeypatch):
+    evaluator = Recording()
+    monkeypatch.setitem(EVALUATORS, "recording", evaluator)
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(Strategy(
+        user_id=1, name="recording", strategy_type="recording", status=StrategyStatus.ACTIVE,
+        parameters=json.dumps({"symbol": "BTC/USDT", "timeframe": TIMEFRAME, "quantity": 0})
+    ))
+    db.commit()
+    db.close()
+    return evaluator
+
+
+def run_bars(scheduler, source, bars):
+    async def run():
+        scheduler.load_strategies()
+        reports = []
+        for bar in bars:
+            source.bar_close = START + bar * STEP
+            reports.append(await scheduler.run_bar(TIMEFRAME, source.bar_close))
+        return reports
+    return asyncio.run(run())
+
+
+def new_scheduler(source, **kwargs):
+    return StrategyScheduler(candle_source=source, risk=RiskEngine(), **kwargs)
+
+
+def flat(values):
+    """A series, or MACD's three series, as one list."""
+    if isinstance(values, tuple):
+        return [value for series in values for value in series]
+    return list(values)
+
+
+def test_restart_resumes_saved_indicators(recording):
+    source = CandleSource()
+    reports = run_bars(new_scheduler(source), source, range(5))
+    assert reports[0].series_computed == len(SPECS)
+    assert all(report.series_computed == 0 for report in reports[1:])
+    assert source.limits == [31, 3, 3, 3, 3]
+
+    db = SessionLocal()
+    saved = {row.indicator: row.last_bar for row in db.query(IndicatorState)}
+    db.close()
+    assert saved == {"sma:5": (START + 3 * STEP) * 1000, "rsi:3": (START + 3 * STEP) * 1000,
+                     "macd:3,6,2": (START + 3 * STEP) * 1000, "closes:30": (START + 3 * STEP) * 1000}
+
+    # Restarted two bars later: only the missed candles are fetched, nothing is rebuilt
+    source.limits = []
+    reports = run_bars(new_scheduler(source), source, [7, 8])
+    assert source.limits == [5, 3]
+    assert all(report.series_computed == 0 for report in reports)
+
+    # Same values as a scheduler that never stopped
+    resumed = recording.seen[-2:]
+    recording.seen = []
+    reference = CandleSource()
+    run_bars(new_scheduler(reference, persist_indicators=False), reference, range(9))
+    expected = recording.seen[-2:]
+    for got, want in zip(resumed, expected):
+        for spec in SPECS:
+            assert flat(got[spec]) == pytest.approx(flat(want[spec]))
+
+    # Fed from the first candle fetched, they equal the batch values over the same closes
+    closes = [price((START + bar * STEP) * 1000) for bar in range(-30, 8)]
+    assert flat(resumed[-1][SPECS[0]]) == pytest.approx(sma(closes, 5)[-2:])
+    assert flat(resumed[-1][SPECS[1]]) == pytest.approx(rsi(closes, 3)[-2:])
+
+    # Evaluators get the whole lookback of closes, also on warm bars after the restart
+    assert recording.closes[-1] == pytest.approx(closes[-30:])
+
+
+def test_gap_or_future_state_is_rebuilt(recording):
+    source = CandleSource()
+    run_bars(new_scheduler(source), source, range(3))
+
+    # Down for longer than the lookback: the states cannot be continued
+    source.limits = []
+    reports = run_bars(new_scheduler(source), source, [60])
+    assert source.limits == [31]
+    assert reports[0].series_computed == len(SPECS)
+
+    # States ahead of the candles (e.g. a restored older database) are rebuilt too
+    source.limits = []
+    reports = run_bars(new_scheduler(source), source, [10])
+    assert source.limits == [31]
+    assert reports[0].series_computed == len(SPECS)
+
+
+def test_not_persisting_leaves_no_state(recording):
+    source = CandleSource()
+    run_bars(new_scheduler(source, persist_indicators=False), source, range(3))
+    db = SessionLocal()
+    assert db.query(IndicatorState).count() == 0
+    db.close()
+
+
+class Scripted:
+    """Buys, unless params say to hang (blocking its thread), fail or read an undeclared series."""
+
+    def lookback(self, params):
+        return 2
+
+    def indicators(self, params):
+        return []
+
+    def evaluate(self, params, series, closes):
+        if params.get("hang"):
+            time.sleep(params["hang"])
+        if params.get("fail"):
+            raise ValueError("broken strategy")
+        if params.get("undeclared"):
+            series(IndicatorSpec("sma", (2,)))
+        return OrderSide.BUY
+
+
+def run_group(params, timeout=0.2):
+    scheduler = new_scheduler(CandleSource(), timeout=timeout, persist_indicators=False)
+    scheduler.indicators = {}
+    scheduler.groups = {
+        ("BTC/USDT", TIMEFRAME): [
+            ScheduledStrategy(index, 1, "scripted", "BTC/USDT", TIMEFRAME, 0.1, entry)
+            for index, entry in enumerate(params)
+        ]
+    }
+    report = BarReport(TIMEFRAME, START)
+    started = time.perf_counter()
+    signals, latencies = asyncio.run(scheduler._run_group("BTC/USDT", TIMEFRAME, START, report))
+    return report, [signal.strategy.id for signal in signals], latencies, time.perf_counter() - started
+
+
+@pytest.fixture()
+def scripted(monkeypatch):
+    monkeypatch.setitem(EVALUATORS, "scripted", Scripted())
+
+
+def test_hanging_strategy_times_out_without_blocking_its_group(scripted):
+    report, signalled, latencies, elapsed = run_group([{}, {"hang": 1.0}, {}, {"hang": 1.0}, {}])
+    assert report.failures == 2
+    assert signalled == [0, 2, 4]
+    assert set(latencies) == {0, 1, 2, 3, 4}
+    # Each hung strategy is given up on after the timeout, not after it returns
+    assert 0.2 <= latencies[1] / 1000 < 0.5
+    assert elapsed < 1.0
+
+
+def test_failing_strategy_does_not_stop_the_others(scripted):
+    report, signalled, _, _ = run_group([{"fail": True}, {}, {"undeclared": True}, {}])
+    assert report.failures == 2
+    assert signalled == [1, 3]
@@ -0,0 +1,115 @@
+"""Ticks from several workers stay readable in order, and compaction never drops a record."""
+
+import mmap
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.services.tick_recorder import (
+    NANOS_PER_DAY, TICK_DTYPE, TickReader, TickWriter, compact_day, day_files, day_name, run_maintenance, symbol_dir
+)
+from benchmarks.bench_tick_recorder import owner
+
+SYMBOL = "BTC/USDT"
+DAY = 19_700
+START = DAY * NANOS_PER_DAY
+DAY_NAME = day_name(DAY)
+
+
+def write_part(root, pid, stamps, prices=None):
+    """Records as another worker process would have appended them."""
+    records = np.zeros(len(stamps), dtype=TICK_DTYPE)
+    records["timestamp"] = stamps
+    records["price"] = stamps if prices is None else prices
+    path = os.path.join(root, symbol_dir(SYMBOL), f"{DAY_NAME}.{pid}.ticks")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as handle:
+        records.tofile(handle)
+    return path
+
+
+def test_writer_appends_to_its_own_part(tmp_path):
+    writer = TickWriter(str(tmp_path), SYMBOL)
+    writer.append(START + 1, 1.0)
+    writer.append(START + NANOS_PER_DAY + 1, 2.0)
+    writer.close()
+    files = day_files(os.path.join(str(tmp_path), symbol_dir(SYMBOL)))
+    assert [os.path.basename(path) for path in files[DAY]] == [f"{DAY_NAME}.{os.getpid()}.ticks"]
+    assert set(files) == {DAY, DAY + 1}
+
+
+def test_range_read_returns_memory_mapped_views(tmp_path):
+    root = str(tmp_path)
+    writer = TickWriter(root, SYMBOL)
+    stamps = START + np.arange(0, 2 * NANOS_PER_DAY, NANOS_PER_DAY // 8)
+    writer.append_batch(stamps, np.arange(len(stamps), dtype=np.float64))
+    writer.close()
+    views = TickReader(root).read(SYMBOL, START + NANOS_PER_DAY // 2, START + 3 * NANOS_PER_DAY // 2)
+    assert [len(view) for view in views] == [4, 4]
+    assert all(isinstance(owner(view), mmap.mmap) for view in views)
+    assert np.concatenate(views)["price"].tolist() == list(range(4, 12))
+
+
+def test_reader_merges_interleaved_workers(tmp_path):
+    root = str(tmp_path)
+    write_part(root, 101, START + np.arange(0, 100, 2))
+    write_part(root, 202, START + np.arange(1, 100, 2))
+    reader = TickReader(root)
+    ticks = reader.read_concatenated(SYMBOL, START + 10, START + 20)
+    assert ticks["timestamp"].tolist() == list(range(START + 10, START + 20))
+
+
+def test_compaction_merges_settled_parts_and_keeps_recent_ones(tmp_path):
+    root = str(tmp_path)
+    old = write_part(root, 101, START + np.arange(0, 100, 2))
+    write_part(root, 202, START + np.arange(1, 100, 2))
+    # A partial record left by a crash is dropped
+    with open(old, "ab") as handle:
+        handle.write(b"\x01" * 7)
+    for path in day_files(os.path.join(root, symbol_dir(SYMBOL)))[DAY]:
+        os.utime(path, (0, 0))
+    recent = write_part(root, 303, [START + 50])
+
+    count, rewritten = compact_day(root, SYMBOL, DAY)
+    assert (count, rewritten) == (100, True)
+    names = [os.path.basename(path) for path in day_files(os.path.join(root, symbol_dir(SYMBOL)))[DAY]]
+    assert names == [f"{DAY_NAME}.ticks", f"{DAY_NAME}.303.ticks"]
+
+    # The part still being written to is merged on read, and by a later compaction
+    reader = TickReader(root)
+    assert len(reader.map_day(SYMBOL, DAY)) == 101
+    os.utime(recent, (0, 0))
+    assert compact_day(root, SYMBOL, DAY) == (101, True)
+    ticks = reader.map_day(SYMBOL, DAY)
+    assert np.all(np.diff(ticks["timestamp"]) >= 0)
+    assert compact_day(root, SYMBOL, DAY) == (101, False)
+
+
+def test_flush_after_compaction_is_not_lost(tmp_path):
+    root = str(tmp_path)
+    writer = TickWriter(root, SYMBOL)
+    writer.append(START + 1, 1.0)
+    writer.flush()
+    writer.append(START + 2, 2.0)  # Still buffered when the day is compacted
+    compact_day(root, SYMBOL, DAY, grace_seconds=0)
+    writer.close()
+    assert TickReader(root).map_day(SYMBOL, DAY)["price"].tolist() == [1.0, 2.0]
+    compact_day(root, SYMBOL, DAY, grace_seconds=0)
+    assert TickReader(root).map_day(SYMBOL, DAY)["price"].tolist() == [1.0, 2.0]
+
+
+def test_retention_deletes_every_file_of_a_day(tmp_path):
+    root = str(tmp_path)
+    write_part(root, 101, [START])
+    write_part(root, 202, [START + 1])
+    stats = run_maintenance(root, 1, datetime(1970, 1, 1) + timedelta(days=DAY + 5))
+    assert stats == {"compacted": 0, "deleted": 2}
+    assert TickReader(root).days(SYMBOL) == []
+
+
+@pytest.mark.parametrize("count", [0, 1])
+def test_empty_day_reads_empty(tmp_path, count):
+    root = str(tmp_path)
+    if count:
+        write_part(root, 101, [])
+    assert len(TickReader(root).map_day(SYMBOL, DAY)) == 0
@@ -0,0 +1,66 @@
+"""The database viewer summarizes in SQL and pages through listings by id without loading whole tables."""
+
+import sys
+from datetime import datetime
+import pytest
+from app.database import SessionLocal
+from app.models import OrderSide, OrderStatus, OrderType, Trade, User
+import view_database
+
+
+@pytest.fixture()
+def trades(db_tables):
+    db = SessionLocal()
+    db.add(User(id=1, email="u@example.com", username="u", hashed_password="x"))
+    db.add(User(id=2, email="v@example.com", username="v", hashed_password="x"))
+    for index in range(25):
+        db.add(Trade(id=index + 1, user_id=1 + index % 2, exchange_name="binance",
+                     symbol="BTC/USDT" if index % 5 else "ETH/USDT", order_type=OrderType.MARKET,
+                     order_side=OrderSide.BUY, order_status=OrderStatus.FILLED if index % 3 else OrderStatus.PENDING,
+                     quantity=1.0, total_cost=100.0, fee=0.1, created_at=datetime(2024, 1, 1 + index)))
+    db.commit()
+    db.close()
+
+
+def run(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["view_database.py", *argv])
+    view_database.main()
+    return capsys.readouterr().out
+
+
+def listed_ids(output):
+    lines = output.split("-" * 12)[-1].split("\n\n")[0].strip().splitlines()
+    return [int(line.split()[0]) for line in lines if line.strip() and not line.startswith("-")]
+
+
+def test_summary_is_computed_in_sql(trades, monkeypatch, capsys):
+    output = run(monkeypatch, capsys, "summary")
+    assert "Total Users: 2" in output
+    assert "Total Trades: 25" in output and "Total Notional: $2,500.00" in output
+    assert "Database view complete" in output
+
+
+def test_pages_continue_after_the_last_id(trades, monkeypatch, capsys):
+    first = run(monkeypatch, capsys, "list", "trades", "--page-size", "10")
+    assert listed_ids(first) == list(range(25, 15, -1))
+    assert "Next page: --after 16" in first
+    second = run(monkeypatch, capsys, "list", "trades", "--page-size", "10", "--after", "16", "--ascending")
+    assert listed_ids(second) == list(range(17, 26)) and "Next page" not in second
+
+
+def test_listing_filters(trades, monkeypatch, capsys):
+    output = run(monkeypatch, capsys, "list", "trades", "--user-id", "1", "--symbol", "ETH/USDT", "--page-size", "50")
+    assert listed_ids(output) == [21, 11, 1]
+    output = run(monkeypatch, capsys, "list", "trades", "--status", "pending", "--since", "2024-01-10",
+                 "--ascending", "--page-size", "50")
+    assert listed_ids(output) == [10, 13, 16, 19, 22, 25]
+
+
+def test_unsupported_filter_is_refused(trades, monkeypatch, capsys):
+    with pytest.raises(SystemExit):
+        run(monkeypatch, capsys, "list", "alerts", "--status", "active")
+
+
+@pytest.mark.parametrize("command", ["sizes", "indexes"])
+def test_storage_reports(trades, monkeypatch, capsys, command):
+    assert "trades" in run(monkeypatch, capsys, command)
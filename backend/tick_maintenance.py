@@ -0,0 +1,24 @@
+"""
+Tick Data Maintenance
+Compact closed tick files and delete files past the retention period
+"""
+
+import argparse
+from app.config import settings
+from app.services.tick_recorder import run_maintenance
+
+
+def main():
+    """Run compaction and retention once"""
+    parser = argparse.ArgumentParser(description="Compact and expire recorded tick files")
+    parser.add_argument("--root", default=settings.tick_data_dir, help="Tick data directory")
+    parser.add_argument("--retention-days", type=int, default=settings.tick_retention_days,
+                        help="Days of tick data to keep (0 keeps everything)")
+    args = parser.parse_args()
+    
+    stats = run_maintenance(args.root, args.retention_days)
+    print(f"✓ Compacted {stats['compacted']} file(s), deleted {stats['deleted']} file(s)")
+
+
+if __name__ == "__main__":
+    main()
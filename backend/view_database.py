@@ -1,23 +1,42 @@
 """
 Database Viewer Utility
-View all stored data in the crypto trading database
+Inspect the crypto trading database without loading whole tables into memory
+
+Usage:
+    python view_database.py                      # summary statistics (default)
+    python view_database.py list trades --user-id 1 --symbol BTC/USDT --page-size 50
+    python view_database.py list trades --after 1200   # next page (keyset)
+    python view_database.py sizes                # table and index sizes
+    python view_database.py indexes              # index definitions and usage
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.config import settings
-from app.models import User, Portfolio, Trade, Strategy, ExchangeAPIKey, Alert
-from datetime import datetime
+import argparse
 import os
+from datetime import datetime
+from sqlalchemy import case, func, select, text
+from app.config import settings
+from app.database import engine
+from app.models import User, Portfolio, PortfolioHolding, Trade, Strategy, ExchangeAPIKey, Alert
 
-# Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Tables available to the list command, with the columns shown and filters accepted
+TABLES = {
+    "users": (User, ["id", "email", "username", "role", "is_active", "is_verified", "created_at"]),
+    "portfolios": (Portfolio, ["id", "user_id", "total_value_usd", "total_profit_loss", "created_at"]),
+    "holdings": (PortfolioHolding, ["id", "portfolio_id", "symbol", "quantity", "average_buy_price", "profit_loss"]),
+    "trades": (Trade, ["id", "user_id", "symbol", "order_type", "order_side", "order_status", "quantity",
+                       "average_price", "total_cost", "created_at"]),
+    "strategies": (Strategy, ["id", "user_id", "name", "strategy_type", "status", "total_trades",
+                              "total_profit_loss", "last_executed_at"]),
+    "keys": (ExchangeAPIKey, ["id", "user_id", "exchange_name", "is_active", "has_trading_permission",
+                              "has_withdrawal_permission", "created_at"]),
+    "alerts": (Alert, ["id", "user_id", "symbol", "alert_type", "target_price", "is_active", "is_triggered"]),
+}
 
-# Create session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Status column used by --status, per table
+STATUS_COLUMNS = {"trades": "order_status", "strategies": "status"}
+
+# Number of rows fetched from the cursor at a time when listing
+FETCH_SIZE = 1000
 
 
 def print_separator(title=""):
@@ -30,166 +49,54 @@ def print_separator(title=""):
         print(f"{'='*80}")
 
 
-def view_users():
-    """View all users in the database"""
-    db = SessionLocal()
-    try:
-        users = db.query(User).all()
-        
-        print_separator("USERS")
-        print(f"Total Users: {len(users)}\n")
-        
-        if not users:
-            print("No users found in database.")
-            return
-        
-        for i, user in enumerate(users, 1):
-            print(f"\n--- User {i} ---")
-            print(f"ID: {user.id}")
-            print(f"Email: {user.email}")
-            print(f"Username: {user.username}")
-            print(f"Full Name: {user.full_name or 'N/A'}")
-            print(f"Role: {user.role}")
-            print(f"Active: {user.is_active}")
-            print(f"Verified: {user.is_verified}")
-            print(f"2FA Enabled: {user.two_factor_enabled}")
-            print(f"Created: {user.created_at}")
-            print(f"Updated: {user.updated_at or 'Never'}")
-            
-    finally:
-        db.close()
-
-
-def view_portfolios():
-    """View all portfolios"""
-    db = SessionLocal()
-    try:
-        portfolios = db.query(Portfolio).all()
-        
-        print_separator("PORTFOLIOS")
-        print(f"Total Portfolios: {len(portfolios)}\n")
-        
-        if not portfolios:
-            print("No portfolios found in database.")
-            return
-        
-        for i, portfolio in enumerate(portfolios, 1):
-            print(f"\n--- Portfolio {i} ---")
-            print(f"ID: {portfolio.id}")
-            print(f"User ID: {portfolio.user_id}")
-            print(f"Total Value (USD): ${portfolio.total_value_usd:,.2f}")
-            print(f"Total P/L: ${portfolio.total_profit_loss:,.2f}")
-            print(f"Total P/L %: {portfolio.total_profit_loss_percentage:.2f}%")
-            print(f"Holdings: {len(portfolio.holdings)}")
-            print(f"Created: {portfolio.created_at}")
-            
-            # Show holdings if any
-            if portfolio.holdings:
-                print("\n  Holdings:")
-                for holding in portfolio.holdings:
-                    print(f"    - {holding.symbol}: {holding.quantity} @ ${holding.average_buy_price:.2f}")
-            
-    finally:
-        db.close()
-
-
-def view_trades():
-    """View all trades"""
-    db = SessionLocal()
-    try:
-        trades = db.query(Trade).order_by(Trade.created_at.desc()).limit(20).all()
-        
-        print_separator("RECENT TRADES (Last 20)")
-        print(f"Total Trades Shown: {len(trades)}\n")
-        
-        if not trades:
-            print("No trades found in database.")
-            return
-        
-        for i, trade in enumerate(trades, 1):
-            print(f"\n--- Trade {i} ---")
-            print(f"ID: {trade.id}")
-            print(f"User ID: {trade.user_id}")
-            print(f"Exchange: {trade.exchange_name}")
-            print(f"Symbol: {trade.symbol}")
-            print(f"Type: {trade.order_type} | Side: {trade.order_side}")
-            print(f"Status: {trade.order_status}")
-            print(f"Quantity: {trade.quantity}")
-            print(f"Price: ${trade.price or 0:.2f}")
-            print(f"Total Cost: ${trade.total_cost or 0:.2f}")
-            print(f"Created: {trade.created_at}")
-            
-    finally:
-        db.close()
-
-
-def view_strategies():
-    """View all strategies"""
-    db = SessionLocal()
-    try:
-        strategies = db.query(Strategy).all()
-        
-        print_separator("TRADING STRATEGIES")
-        print(f"Total Strategies: {len(strategies)}\n")
-        
-        if not strategies:
-            print("No strategies found in database.")
-            return
-        
-        for i, strategy in enumerate(strategies, 1):
-            print(f"\n--- Strategy {i} ---")
-            print(f"ID: {strategy.id}")
-            print(f"User ID: {strategy.user_id}")
-            print(f"Name: {strategy.name}")
-            print(f"Type: {strategy.strategy_type}")
-            print(f"Status: {strategy.status}")
-            print(f"Total Trades: {strategy.total_trades}")
-            print(f"Winning Trades: {strategy.winning_trades}")
-            print(f"Total P/L: ${strategy.total_profit_loss:.2f}")
-            print(f"Created: {strategy.created_at}")
-            
-    finally:
-        db.close()
-
-
-def view_api_keys():
-    """View all API keys (masked)"""
-    db = SessionLocal()
-    try:
-        api_keys = db.query(ExchangeAPIKey).all()
-        
-        print_separator("EXCHANGE API KEYS")
-        print(f"Total API Keys: {len(api_keys)}\n")
-        
-        if not api_keys:
-            print("No API keys found in database.")
-            return
-        
-        for i, key in enumerate(api_keys, 1):
-            print(f"\n--- API Key {i} ---")
-            print(f"ID: {key.id}")
-            print(f"User ID: {key.user_id}")
-            print(f"Exchange: {key.exchange_name}")
-            print(f"Active: {key.is_active}")
-            print(f"Trading Permission: {key.has_trading_permission}")
-            print(f"Withdrawal Permission: {key.has_withdrawal_permission}")
-            print(f"Created: {key.created_at}")
-            
-    finally:
-        db.close()
+def format_value(value):
+    """Format a cell for table output"""
+    if value is None:
+        return "-"
+    if hasattr(value, "value"):
+        return str(value.value)
+    if isinstance(value, float):
+        return f"{value:,.4f}"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def print_rows(headers, rows):
+    """Print rows as an aligned table, streaming row by row after a fixed-width header"""
+    widths = [max(len(header), 12) for header in headers]
+    print("  ".join(header.ljust(width) for header, width in zip(headers, widths)))
+    print("  ".join("-" * width for width in widths))
+    count = 0
+    for row in rows:
+        print("  ".join(format_value(value).ljust(width) for value, width in zip(row, widths)))
+        count += 1
+    return count
+
+
+def print_distribution(conn, title, column, model, limit=10):
+    """Print a GROUP BY distribution computed in SQL"""
+    query = select(column, func.count()).select_from(model).group_by(column).order_by(func.count().desc()).limit(limit)
+    print(f"\n  {title}:")
+    for value, count in conn.execute(query):
+        print(f"    {format_value(value):<24} {count:>14,}")
 
 
 def view_database_info():
     """View database file information"""
     print_separator("DATABASE INFORMATION")
-    
+
+    if engine.dialect.name != "sqlite":
+        print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+        return
+
     db_path = settings.database_url.replace("sqlite:///", "")
-    
+
     if os.path.exists(db_path):
         file_size = os.path.getsize(db_path)
         file_size_mb = file_size / (1024 * 1024)
         modified_time = datetime.fromtimestamp(os.path.getmtime(db_path))
-        
+
         print(f"Database Path: {db_path}")
         print(f"File Size: {file_size_mb:.2f} MB ({file_size:,} bytes)")
         print(f"Last Modified: {modified_time}")
@@ -197,20 +104,240 @@ def view_database_info():
         print(f"Database file not found at: {db_path}")
 
 
+def view_summary():
+    """Summary statistics for every table, computed in SQL"""
+    view_database_info()
+
+    with engine.connect() as conn:
+        print_separator("USERS")
+        total, active, verified = conn.execute(select(
+            func.count(User.id),
+            func.coalesce(func.sum(case((User.is_active == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((User.is_verified == True, 1), else_=0)), 0)
+        )).one()
+        print(f"Total Users: {total:,}  Active: {active:,}  Verified: {verified:,}")
+        print_distribution(conn, "By role", User.role, User)
+
+        print_separator("PORTFOLIOS")
+        total, value, profit_loss = conn.execute(select(
+            func.count(Portfolio.id),
+            func.coalesce(func.sum(Portfolio.total_value_usd), 0),
+            func.coalesce(func.sum(Portfolio.total_profit_loss), 0)
+        )).one()
+        holdings = conn.execute(select(func.count(PortfolioHolding.id))).scalar()
+        print(f"Total Portfolios: {total:,}  Holdings: {holdings:,}")
+        print(f"Total Value (USD): ${value:,.2f}  Total P/L: ${profit_loss:,.2f}")
+        print_distribution(conn, "Holdings by asset", PortfolioHolding.symbol, PortfolioHolding)
+
+        print_separator("TRADES")
+        total, notional, fees, first, last = conn.execute(select(
+            func.count(Trade.id),
+            func.coalesce(func.sum(Trade.total_cost), 0),
+            func.coalesce(func.sum(Trade.fee), 0),
+            func.min(Trade.created_at),
+            func.max(Trade.created_at)
+        )).one()
+        print(f"Total Trades: {total:,}")
+        print(f"Total Notional: ${notional:,.2f}  Total Fees: ${fees:,.2f}")
+        print(f"First: {format_value(first)}  Last: {format_value(last)}")
+        print_distribution(conn, "By status", Trade.order_status, Trade)
+        print_distribution(conn, "By side", Trade.order_side, Trade)
+        print_distribution(conn, "By type", Trade.order_type, Trade)
+        print_distribution(conn, "Top symbols", Trade.symbol, Trade)
+        print_distribution(conn, "Top users", Trade.user_id, Trade)
+
+        print_separator("TRADING STRATEGIES")
+        total, profit_loss, trades = conn.execute(select(
+            func.count(Strategy.id),
+            func.coalesce(func.sum(Strategy.total_profit_loss), 0),
+            func.coalesce(func.sum(Strategy.total_trades), 0)
+        )).one()
+        print(f"Total Strategies: {total:,}  Trades: {trades:,}  Total P/L: ${profit_loss:,.2f}")
+        print_distribution(conn, "By status", Strategy.status, Strategy)
+        print_distribution(conn, "By type", Strategy.strategy_type, Strategy)
+
+        print_separator("EXCHANGE API KEYS")
+        print(f"Total API Keys: {conn.execute(select(func.count(ExchangeAPIKey.id))).scalar():,}")
+        print_distribution(conn, "By exchange", ExchangeAPIKey.exchange_name, ExchangeAPIKey)
+        print_distribution(conn, "By active flag", ExchangeAPIKey.is_active, ExchangeAPIKey)
+
+        print_separator("ALERTS")
+        print(f"Total Alerts: {conn.execute(select(func.count(Alert.id))).scalar():,}")
+        print_distribution(conn, "By type", Alert.alert_type, Alert)
+        print_distribution(conn, "By triggered flag", Alert.is_triggered, Alert)
+
+
+def view_listing(args):
+    """Paginated, filtered listing streamed from the database (keyset pagination on id)"""
+    model, columns = TABLES[args.table]
+    query = select(*[getattr(model, column) for column in columns])
+
+    filters = {"user_id": args.user_id, "symbol": args.symbol}
+    if args.status is not None:
+        if args.table not in STATUS_COLUMNS:
+            raise SystemExit(f"Table '{args.table}' cannot be filtered by status")
+        filters[STATUS_COLUMNS[args.table]] = args.status.lower()
+    for column, value in filters.items():
+        if value is not None:
+            if not hasattr(model, column):
+                raise SystemExit(f"Table '{args.table}' cannot be filtered by {column}")
+            query = query.where(getattr(model, column) == value)
+    if args.since is not None:
+        if not hasattr(model, "created_at"):
+            raise SystemExit(f"Table '{args.table}' cannot be filtered by creation date")
+        query = query.where(model.created_at >= args.since)
+
+    if args.ascending:
+        if args.after is not None:
+            query = query.where(model.id > args.after)
+        query = query.order_by(model.id)
+    else:
+        if args.after is not None:
+            query = query.where(model.id < args.after)
+        query = query.order_by(model.id.desc())
+    query = query.limit(args.page_size)
+
+    print_separator(f"{args.table.upper()} (page of {args.page_size})")
+    last_id = None
+
+    def stream():
+        nonlocal last_id
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(query)
+            for row in result:
+                last_id = row[0]
+                yield row
+
+    shown = print_rows(columns, stream())
+    print(f"\n{shown} row(s) shown.")
+    if shown == args.page_size and last_id is not None:
+        print(f"Next page: --after {last_id}")
+
+
+def view_sizes():
+    """Table and index sizes"""
+    print_separator("TABLE AND INDEX SIZES")
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            rows = conn.execute(text("""
+                SELECT relname,
+                       n_live_tup,
+                       pg_size_pretty(pg_table_size(relid)),
+                       pg_size_pretty(pg_indexes_size(relid)),
+                       pg_size_pretty(pg_total_relation_size(relid))
+                FROM pg_stat_user_tables
+                ORDER BY pg_total_relation_size(relid) DESC
+            """))
+            print_rows(["table", "rows (est.)", "table size", "index size", "total size"], rows)
+            return
+
+        if engine.dialect.name == "sqlite":
+            page_size = conn.execute(text("PRAGMA page_size")).scalar()
+            try:
+                rows = conn.execute(text("""
+                    SELECT name, COUNT(*) AS pages, SUM(pgsize) AS bytes
+                    FROM dbstat GROUP BY name ORDER BY bytes DESC
+                """)).all()
+            except Exception:
+                rows = None
+
+            if rows is None:
+                page_count = conn.execute(text("PRAGMA page_count")).scalar()
+                print("dbstat is not available in this SQLite build; showing the database total only.")
+                print(f"Total: {page_count * page_size / (1024 * 1024):.2f} MB ({page_count:,} pages of {page_size} bytes)")
+                return
+
+            print_rows(
+                ["table/index", "pages", "size (MB)"],
+                ((name, pages, size / (1024 * 1024)) for name, pages, size in rows)
+            )
+            return
+
+        print(f"Size reporting is not supported for {engine.dialect.name}.")
+
+
+def view_indexes():
+    """Index definitions and, where the database tracks it, usage"""
+    print_separator("INDEXES")
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            rows = conn.execute(text("""
+                SELECT relname, indexrelname, idx_scan, idx_tup_read,
+                       pg_size_pretty(pg_relation_size(indexrelid))
+                FROM pg_stat_user_indexes
+                ORDER BY idx_scan ASC, pg_relation_size(indexrelid) DESC
+            """))
+            print_rows(["table", "index", "scans", "tuples read", "size"], rows)
+            print("\nIndexes with 0 scans are candidates for removal.")
+            return
+
+        if engine.dialect.name == "sqlite":
+            # sqlite_stat1 exists only after ANALYZE and holds row estimates per index
+            stats = {}
+            if conn.execute(text("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")).first():
+                stats = {index: stat for _, index, stat in conn.execute(text("SELECT tbl, idx, stat FROM sqlite_stat1"))}
+
+            def rows():
+                for table in TABLES.values():
+                    table_name = table[0].__tablename__
+                    for index in conn.execute(text(f"PRAGMA index_list('{table_name}')")):
+                        index_name = index[1]
+                        columns = ", ".join(info[2] for info in conn.execute(text(f"PRAGMA index_info('{index_name}')")))
+                        yield table_name, index_name, columns, bool(index[2]), stats.get(index_name, "run ANALYZE")
+
+            print_rows(["table", "index", "columns", "unique", "stat"], rows())
+            print("\nSQLite does not track index usage; use EXPLAIN QUERY PLAN to check a query.")
+            return
+
+        print(f"Index reporting is not supported for {engine.dialect.name}.")
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Inspect the crypto trading database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("summary", help="Counts, sums and distributions per table (default)")
+    commands.add_parser("sizes", help="Table and index sizes")
+    commands.add_parser("indexes", help="Index definitions and usage")
+
+    listing = commands.add_parser("list", help="Paginated listing of one table")
+    listing.add_argument("table", choices=sorted(TABLES))
+    listing.add_argument("--page-size", type=int, default=20)
+    listing.add_argument("--after", type=int, default=None, help="Continue after this id (from the previous page)")
+    listing.add_argument("--ascending", action="store_true", help="Oldest first instead of newest first")
+    listing.add_argument("--user-id", type=int, default=None)
+    listing.add_argument("--symbol", default=None)
+    listing.add_argument("--status", default=None, help="Trade order status or strategy status")
+    listing.add_argument("--since", type=datetime.fromisoformat, default=None, help="Created on or after (ISO date)")
+
+    return parser.parse_args()
+
+
 def main():
-    """Main function to display all database information"""
+    """Main function to run the requested inspection command"""
+    args = parse_args()
+
     print("\n")
     print("╔" + "═" * 78 + "╗")
     print("║" + " " * 20 + "CRYPTO TRADING DATABASE VIEWER" + " " * 28 + "║")
     print("╚" + "═" * 78 + "╝")
-    
-    view_database_info()
-    view_users()
-    view_portfolios()
-    view_trades()
-    view_strategies()
-    view_api_keys()
-    
+
+    if args.command == "list":
+        view_listing(args)
+    elif args.command == "sizes":
+        view_sizes()
+    elif args.command == "indexes":
+        view_indexes()
+    else:
+        view_summary()
+
     print_separator()
     print("\n✓ Database view complete!\n")
 